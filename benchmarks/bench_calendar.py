@@ -0,0 +1,60 @@
+"""
+Микробенчмарк отрисовки календаря (keyboards/inline.generate_calendar).
+
+Сравнивает отрисовку без кэша (кэш очищается перед каждым вызовом) и с кэшем
+для типичной навигации клиента: перелистывание 3 месяцев на двух языках.
+
+Запуск: python benchmarks/bench_calendar.py [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ADMIN_ID", "0")
+
+from keyboards.inline import clear_calendar_cache, generate_calendar  # noqa: E402
+from utils import clock, holidays  # noqa: E402
+
+NOW = datetime(2026, 2, 9, 9, 0)  # Понедельник до 12:00 — запись со вторника
+MIN_DATE = date(2026, 2, 10)
+MONTHS = [(2026, 2), (2026, 3), (2026, 4)]
+FULLY_BOOKED = {MIN_DATE + timedelta(days=i) for i in range(0, 90, 5)}
+
+
+def _renders_per_second(seconds: float, cached: bool) -> float:
+    """Количество отрисовок календаря в секунду."""
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for year, month in MONTHS:
+            for lang in ('ru', 'uz'):
+                if not cached:
+                    clear_calendar_cache()
+                generate_calendar(year=year, month=month, fully_booked_dates=FULLY_BOOKED, lang=lang)
+                calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0, help="длительность каждого замера")
+    args = parser.parse_args()
+
+    # Фиксируем время, чтобы результат не зависел от текущей даты
+    with clock.frozen(NOW), patch.dict(holidays._holidays, {"ranges": []}):
+        cold = _renders_per_second(args.seconds, cached=False)
+        clear_calendar_cache()
+        warm = _renders_per_second(args.seconds, cached=True)
+
+    print(f"generate_calendar без кэша: {cold:10.0f} отрисовок/с")
+    print(f"generate_calendar с кэшем:  {warm:10.0f} отрисовок/с")
+    print(f"ускорение: x{warm / cold:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Бенчмарк импорта договоров из Excel (utils/excel_reader.py).
+
+Корпус — книги договоров на 1k, 10k и 100k строк: несколько проектов в
+одном файле, даты сдачи вперемешку строками ДД.ММ.ГГГГ и датами Excel,
+заголовки по именам (с лишними пробелами) или чужие (позиционный режим).
+К каждой книге есть «следующая выгрузка» — те же квартиры с изменениями
+(этаж, подъезд, дата, ФИО, номер договора) и новыми квартирами.
+Книги кэшируются в benchmarks/corpus/ и создаются заново при смене параметров.
+
+Для каждой книги на пустой базе SQLite по порядку, как при загрузке из
+админки: process_excel_file (первичный импорт всех проектов),
+analyze_excel_changes (следующая выгрузка первого проекта) и
+apply_contract_changes (всё найденное, договоры обзора — со всеми
+действиями). Отчёт по операции: строк в секунду, пиковый RSS процесса,
+его прирост за операцию и число SQL-запросов. Каждая книга замеряется в
+отдельном процессе, чтобы память одной не влияла на другую.
+
+По умолчанию — книги на 1k и 10k строк; 100k (импорт и анализ идут
+десятки минут) — через --sizes перед крупными выгрузками.
+
+Запуск: python benchmarks/bench_excel.py [--sizes 1k,10k,100k] [--headers named,positional]
+        [--compare benchmarks/results/excel_<время>.json]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ADMIN_ID", "0")
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.bench_load import RESULTS_DIR, bench_database  # noqa: E402
+from database.models import Booking, Contract  # noqa: E402
+from database.session import SessionLocal  # noqa: E402
+from utils import contract_review, tracing  # noqa: E402
+from utils.excel_reader import EXPECTED_COLUMNS, analyze_excel_changes, apply_contract_changes, process_excel_file  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+DEFAULT_SIZES = "1k,10k"
+HEADERS = ("named", "positional")
+OPERATIONS = ("import", "analyze", "apply")
+DEFAULT_PROJECTS = 3
+
+# Доля квартир следующей выгрузки с изменениями каждого вида и доля новых квартир
+CHANGE_RATES = {"minor": 0.05, "fio": 0.01, "contract": 0.005}
+NEW_APARTMENTS_RATE = 0.02
+# Доля договоров с привязанным Telegram и активной записью (для действий обзора)
+BOOKED_RATE = 0.1
+
+APARTMENTS_PER_FLOOR = 4
+FLOORS = 16
+APARTMENTS_PER_ENTRANCE = APARTMENTS_PER_FLOOR * FLOORS
+
+SURNAMES = ("Алиев", "Каримов", "Рахимов", "Юсупов", "Иванов", "Ташкентов", "Усманов", "Садыков", "Петров", "Норматов")
+NAMES = ("Азиз", "Бахтиёр", "Дильшод", "Жасур", "Алексей", "Рустам", "Шерзод", "Тимур", "Фаррух", "Олег")
+PATRONYMICS = ("Алиевич", "Каримович", "Рустамович", "Сергеевич", "Тимурович", "Шухратович")
+
+
+# ========== КОРПУС ==========
+
+def parse_size(value: str) -> int:
+    """Число строк: 1000, 10k, 0.5k."""
+    value = value.strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1000)
+    return int(value)
+
+
+def project_names(count: int) -> list:
+    return [f"ЖК Бенч {i + 1}" for i in range(count)]
+
+
+def _fio(rng) -> str:
+    return f"{rng.choice(SURNAMES)} {rng.choice(NAMES)} {rng.choice(PATRONYMICS)}"
+
+
+def _apartment(index: int, project: str, number: int, delivery: date, rng) -> dict:
+    """Квартира number проекта: подъезд и этаж по номеру, договор с пробелами и в нижнем регистре."""
+    position = number - 1
+    return {
+        "house_name": project,
+        "apt_num": str(number),
+        "entrance": str(1 + position // APARTMENTS_PER_ENTRANCE),
+        "floor": 1 + position // APARTMENTS_PER_FLOOR % FLOORS,
+        "contract_num": f"{100000 + index} - ghp" if index % 3 else f"{100000 + index}-GHP",
+        "client_fio": _fio(rng),
+        "delivery_date": delivery,
+    }
+
+
+def make_contracts(size: int, projects: int, rng) -> list:
+    """
+    size квартир по projects проектам вперемешку. Дата сдачи общая для
+    подъезда — как в реальных выгрузках.
+    """
+    names = project_names(projects)
+    start = date.today() + timedelta(days=30)
+    deliveries = {}
+    contracts = []
+    for index in range(size):
+        project = names[index % projects]
+        number = index // projects + 1
+        entrance_key = (project, (number - 1) // APARTMENTS_PER_ENTRANCE)
+        if entrance_key not in deliveries:
+            deliveries[entrance_key] = start + timedelta(days=rng.randrange(365))
+        contracts.append(_apartment(index, project, number, deliveries[entrance_key], rng))
+    return contracts
+
+
+def revise_contracts(contracts: list, projects: int, rng) -> list:
+    """
+    Следующая выгрузка: часть квартир с новым этажом, подъездом или датой,
+    новым ФИО или новым номером договора, плюс новые квартиры в конце.
+    """
+    revised = []
+    for contract in contracts:
+        contract = dict(contract)
+        roll = rng.random()
+        if roll < CHANGE_RATES["minor"]:
+            contract["delivery_date"] += timedelta(days=rng.choice((-7, 14, 30)))
+            if rng.random() < 0.3:
+                contract["floor"] += 1
+        elif roll < CHANGE_RATES["minor"] + CHANGE_RATES["fio"]:
+            contract["client_fio"] = _fio(rng) + " (новый)"
+        elif roll < CHANGE_RATES["minor"] + CHANGE_RATES["fio"] + CHANGE_RATES["contract"]:
+            contract["contract_num"] = f"R{contract['contract_num']}"
+            contract["client_fio"] = _fio(rng)
+        revised.append(contract)
+
+    names = project_names(projects)
+    last = {}
+    for contract in contracts:
+        last[contract["house_name"]] = max(last.get(contract["house_name"], 0), int(contract["apt_num"]))
+    delivery = date.today() + timedelta(days=400)
+    for index in range(int(len(contracts) * NEW_APARTMENTS_RATE)):
+        project = names[index % projects]
+        last[project] = last.get(project, 0) + 1
+        revised.append(_apartment(len(contracts) + index, project, last[project], delivery, rng))
+    return revised
+
+
+def contract_frame(contracts: list, named: bool) -> pd.DataFrame:
+    """
+    Таблица для книги: даты сдачи через строку — ДД.ММ.ГГГГ и Timestamp;
+    named=False — заголовки не совпадают с ожидаемыми (позиционный режим).
+    """
+    records = []
+    for i, c in enumerate(contracts):
+        delivery = pd.Timestamp(c["delivery_date"])
+        records.append([
+            c["house_name"], c["apt_num"], c["entrance"], c["floor"], c["contract_num"], c["client_fio"],
+            delivery.strftime("%d.%m.%Y") if i % 2 else delivery,
+        ])
+    if named:
+        columns = [f" {c} " if i % 2 else c for i, c in enumerate(EXPECTED_COLUMNS)]
+    else:
+        columns = ["Объект", "Кв.", "Блок", "Эт.", "Договор", "Покупатель", "Срок сдачи"]
+    return pd.DataFrame(records, columns=columns)
+
+
+def corpus_paths(size: int, headers: str, projects: int, seed_value: int, corpus_dir: str = CORPUS_DIR) -> tuple:
+    """Пути книги и её следующей выгрузки; параметры корпуса — в имени файла."""
+    stem = f"contracts_{size}_{headers}_p{projects}_s{seed_value}"
+    return os.path.join(corpus_dir, f"{stem}.xlsx"), os.path.join(corpus_dir, f"{stem}_next.xlsx")
+
+
+def make_corpus(size: int, headers: str = "named", projects: int = DEFAULT_PROJECTS, seed_value: int = 1,
+                corpus_dir: str = CORPUS_DIR, regenerate: bool = False) -> tuple:
+    """Книга и следующая выгрузка (создаются, если их ещё нет); возвращает пути."""
+    path, next_path = corpus_paths(size, headers, projects, seed_value, corpus_dir)
+    if regenerate or not (os.path.exists(path) and os.path.exists(next_path)):
+        os.makedirs(corpus_dir, exist_ok=True)
+        rng = random.Random(seed_value)
+        contracts = make_contracts(size, projects, rng)
+        revised = revise_contracts(contracts, projects, rng)
+        named = headers == "named"
+        contract_frame(contracts, named).to_excel(path, index=False)
+        contract_frame(revised, named).to_excel(next_path, index=False)
+    return path, next_path
+
+
+# ========== ЗАМЕР ==========
+
+def _reset_peak_rss() -> bool:
+    """Сбросить пик RSS процесса до текущего RSS (Linux); False — сброс недоступен."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_kb(field: str) -> int:
+    """VmRSS или VmHWM (пик) из /proc/self/status; без /proc — ru_maxrss."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(rows: int, func, *args, **kwargs):
+    """Вызвать func; возвращает (результат, замер: строки, время, строк/с, RSS, SQL)."""
+    _reset_peak_rss()
+    rss_before = _rss_kb("VmRSS")
+    with tracing.collect_queries() as trace:
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - started
+    peak = _rss_kb("VmHWM")
+    return result, {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "peak_rss_mb": peak / 1024,
+        "rss_growth_mb": max(0, peak - rss_before) / 1024,
+        "queries": trace.queries,
+        "query_ms": trace.query_seconds * 1000,
+    }
+
+
+def _bind_and_book(rng) -> None:
+    """Привязать Telegram к части договоров и записать их — чтобы действиям обзора было что делать."""
+    with SessionLocal() as session:
+        contracts = session.query(Contract).all()
+        day = date.today() + timedelta(days=3)
+        for contract in contracts:
+            if rng.random() < BOOKED_RATE:
+                contract.telegram_id = 10_000_000 + contract.id
+                session.add(Booking(contract_id=contract.id, user_telegram_id=contract.telegram_id, date=day,
+                                    time_slot=datetime.strptime("10:00", "%H:%M").time(),
+                                    client_phone="+998901234567"))
+        session.commit()
+
+
+def run_case(path: str, next_path: str, projects: int = DEFAULT_PROJECTS, seed_value: int = 1,
+             db_path: str = None) -> dict:
+    """
+    Импорт, анализ и применение изменений одной книги на пустой базе:
+    {операция: замер} и итоги анализа.
+    """
+    rows = len(pd.read_excel(path))
+    next_rows = len(pd.read_excel(next_path))
+    project = project_names(projects)[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with bench_database(db_path or os.path.join(tmp, "bench_excel.db")):
+            results = {}
+            (count, _), results["import"] = measure(rows, process_excel_file, path)
+            _bind_and_book(random.Random(seed_value))
+
+            analysis, results["analyze"] = measure(next_rows, analyze_excel_changes, next_path, project)
+
+            # Как в админке: результат анализа — через сессию обзора, договорам обзора — все действия
+            session_id = contract_review.create_session(analysis)
+            kinds = (contract_review.KIND_NEW, contract_review.KIND_MINOR, contract_review.KIND_REVIEW)
+            changes = contract_review.load_changes(session_id, kinds)
+            for item in changes[contract_review.KIND_REVIEW]:
+                item["actions"] = list(contract_review.REVIEW_ACTIONS)
+            changes_count = sum(len(items) for items in changes.values())
+            applied, results["apply"] = measure(
+                changes_count, apply_contract_changes,
+                new_contracts=changes[contract_review.KIND_NEW] or None,
+                minor_updates=changes[contract_review.KIND_MINOR] or None,
+                review_decisions=changes[contract_review.KIND_REVIEW] or None,
+            )
+            contract_review.discard_session(session_id)
+
+    return {
+        "operations": results,
+        "imported": count,
+        "analysis": {key: len(value) for key, value in analysis.items()},
+        "applied": {key: (len(value) if isinstance(value, list) else value) for key, value in applied.items()},
+    }
+
+
+def run(sizes, headers=HEADERS, projects: int = DEFAULT_PROJECTS, seed_value: int = 1,
+        corpus_dir: str = CORPUS_DIR, regenerate: bool = False, isolate: bool = True) -> dict:
+    """
+    Замеры по всем книгам: {"<строк>_<заголовки>": результат run_case}.
+    isolate — каждая книга в отдельном процессе (пиковый RSS не копится).
+    """
+    results = {}
+    for size in sizes:
+        for header in headers:
+            path, next_path = make_corpus(size, header, projects, seed_value, corpus_dir, regenerate)
+            name = f"{size}_{header}"
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    results[name] = pool.submit(run_case, path, next_path, projects, seed_value).result()
+            else:
+                results[name] = run_case(path, next_path, projects, seed_value)
+    return results
+
+
+# ========== ОТЧЁТ ==========
+
+def print_report(results: dict) -> None:
+    print(f"{'книга':<18}{'операция':<10}{'строк':>8}{'сек':>9}{'строк/с':>10}{'RSS МБ':>9}{'+RSS МБ':>9}"
+          f"{'SQL':>9}{'SQL мс':>9}")
+    for name, case in results.items():
+        for operation in OPERATIONS:
+            m = case["operations"][operation]
+            print(f"{name:<18}{operation:<10}{m['rows']:>8}{m['seconds']:>9.2f}{m['rows_per_second']:>10.0f}"
+                  f"{m['peak_rss_mb']:>9.1f}{m['rss_growth_mb']:>9.1f}{m['queries']:>9}{m['query_ms']:>9.0f}")
+
+
+def print_comparison(results: dict, previous: dict) -> None:
+    """Разница с прошлым прогоном (положительная — стало больше)."""
+    print(f"\nСравнение с прогоном {previous.get('started', '?')}:")
+    for name, case in results.items():
+        old_case = previous.get("cases", {}).get(name)
+        if not old_case:
+            continue
+        for operation in OPERATIONS:
+            new, old = case["operations"][operation], old_case["operations"].get(operation)
+            if not old:
+                continue
+            parts = []
+            for key in ("rows_per_second", "peak_rss_mb", "queries"):
+                if old[key]:
+                    parts.append(f"{key} {(new[key] - old[key]) / old[key]:+.0%}")
+            print(f"  {name:<18}{operation:<10}" + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="строк в книгах через запятую, например 1k,10k")
+    parser.add_argument("--headers", default=",".join(HEADERS), help="заголовки книг: named, positional")
+    parser.add_argument("--projects", type=int, default=DEFAULT_PROJECTS, help="проектов в одной книге")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора корпуса")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="каталог книг корпуса")
+    parser.add_argument("--regenerate", action="store_true", help="создать книги заново")
+    parser.add_argument("--output", help="куда сохранить JSON (по умолчанию benchmarks/results/excel_<время>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    headers = [header.strip() for header in args.headers.split(",")]
+    unknown = set(headers) - set(HEADERS)
+    if unknown:
+        parser.error(f"неизвестные заголовки: {', '.join(sorted(unknown))}")
+
+    started = datetime.now()
+    results = run(sizes, headers, args.projects, args.seed, args.corpus, args.regenerate)
+    print_report(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"excel_{started.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"started": started.isoformat(timespec="seconds"), "projects": args.projects,
+                   "seed": args.seed, "cases": results}, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультат: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Микробенчмарки горячих функций: календарь и слоты (keyboards/inline.py),
+занятость (utils/occupancy.py), проверка телефона (handlers/client.py),
+тексты (utils/language.py), страница списка записей
+(utils/booking_browser.py), столбцы и строки Excel (utils/excel_reader.py).
+
+Данные генерируются под --size (записей в базе и строк Excel). Время
+вызова сравнивается с benchmarks/thresholds.json: замер дольше порога
+больше чем в tolerance раз — регрессия, код выхода 1. Пороги зависят от
+машины: --update перезаписывает их текущими замерами.
+
+Запуск: python benchmarks/bench_helpers.py [--size 1000] [--filter calendar] [--update]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ADMIN_ID", "0")
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.bench_load import bench_database  # noqa: E402
+from database.models import Booking, Contract  # noqa: E402
+from database.session import SessionLocal  # noqa: E402
+from handlers.client import validate_phone_number  # noqa: E402
+from keyboards import inline  # noqa: E402
+from keyboards.inline import DEFAULT_SLOT_TIMES, clear_calendar_cache, generate_calendar, generate_time_slots  # noqa: E402
+from utils import holidays, occupancy  # noqa: E402
+from utils.booking_browser import BOOKINGS_PAGE_SIZE, format_bookings_page  # noqa: E402
+from utils.excel_reader import EXPECTED_COLUMNS, _detect_columns, _normalize_row  # noqa: E402
+from utils.language import get_message  # noqa: E402
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+DEFAULT_SIZE = 1000
+DEFAULT_TOLERANCE = 1.5
+
+PROJECTS = ("ЖК Навои", "ЖК Бенч", "ЖК Тест")
+SLOTS_LIMIT = 2
+
+PHONES = (
+    "+998901234567", "998901234567", "90 123 45 67", "+7 (912) 345-67-89",
+    "8-912-345-67-89", "12345", "+998 (90) 123-45-67", "abc",
+)
+MESSAGES = (
+    ("welcome", {}),
+    ("booking_item", {"date": "01.03.2030", "time": "10:00", "house": "ЖК Навои", "apt": "42"}),
+    ("calendar_header", {"house": "ЖК Навои"}),
+    ("date_selected_choose_time", {"selected_date": "01.03.2030", "delivery_date": "01.02.2030"}),
+)
+
+
+# ========== ГЕНЕРАТОРЫ ДАННЫХ ==========
+
+def working_days(start: date, count: int) -> list:
+    """count будних дней начиная с start."""
+    days = []
+    current = start
+    while len(days) < count:
+        if current.weekday() < 5:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def make_bookings(size: int, rng) -> list:
+    """
+    size записей с договорами [(booking, contract), ...] по проектам, дням и
+    слотам — как строки страницы списка (без базы, SimpleNamespace).
+    """
+    days = working_days(date.today() + timedelta(days=1), max(1, size // (len(DEFAULT_SLOT_TIMES) * SLOTS_LIMIT)))
+    rows = []
+    for i in range(size):
+        contract = SimpleNamespace(
+            house_name=PROJECTS[i % len(PROJECTS)], entrance=str(1 + i % 4), floor=1 + i % 16,
+            apt_num=str(i + 1), contract_num=f"{10000 + i}-GHP",
+        )
+        booking = SimpleNamespace(
+            date=rng.choice(days), time_slot=rng.choice(DEFAULT_SLOT_TIMES), is_first_booking=rng.random() < 0.8,
+        )
+        rows.append((booking, contract))
+    rows.sort(key=lambda row: (row[1].house_name, row[0].date, row[0].time_slot))
+    return rows
+
+
+def seed_bookings(rows: list) -> None:
+    """Записать сгенерированные записи в базу (SessionLocal)."""
+    with SessionLocal() as session:
+        for booking, contract in rows:
+            session.add(Booking(
+                contract=Contract(house_name=contract.house_name, apt_num=contract.apt_num,
+                                  entrance=contract.entrance, floor=contract.floor,
+                                  contract_num=contract.contract_num, client_fio="Клиент"),
+                date=booking.date, time_slot=booking.time_slot, client_phone="+998901234567",
+            ))
+        session.commit()
+
+
+def make_contract_frame(size: int, rng, named: bool = True) -> pd.DataFrame:
+    """
+    Таблица договоров как из pd.read_excel: даты сдачи вперемешку строками
+    ДД.ММ.ГГГГ и Timestamp; named=False — заголовки не совпадают (позиционный режим).
+    """
+    base = pd.Timestamp(date.today())
+    records = []
+    for i in range(size):
+        delivery = base + pd.Timedelta(days=rng.randrange(365))
+        records.append([
+            PROJECTS[i % len(PROJECTS)], 1 + i, 1 + i % 4, 1 + i % 16, f"{10000 + i} - ghp",
+            f"Клиент {i}", delivery.strftime("%d.%m.%Y") if i % 2 else delivery,
+        ])
+    columns = [f" {c} " for c in EXPECTED_COLUMNS] if named else [f"Столбец {i}" for i in range(len(EXPECTED_COLUMNS))]
+    return pd.DataFrame(records, columns=columns)
+
+
+# ========== СЛУЧАИ ==========
+
+def _normalize_all(df, col_map):
+    for _, row in df.iterrows():
+        _normalize_row(row, col_map)
+
+
+def build_cases(size: int, rng) -> list:
+    """[(имя, функция без аргументов, вызовов функции на одну операцию)] — при привязанной базе."""
+    rows = make_bookings(size, rng)
+    seed_bookings(rows)
+    occupancy.reset()
+    occupancy.get_occupancy()
+
+    project = PROJECTS[0]
+    booked = frozenset(b.date for b, _ in rows[::7])
+    today = date.today()
+    month_after = today.replace(day=1) + timedelta(days=32)
+    day = rows[0][0].date
+    slot_counts = {slot: i % (SLOTS_LIMIT + 1) for i, slot in enumerate(DEFAULT_SLOT_TIMES)}
+    page = rows[:BOOKINGS_PAGE_SIZE]
+    page_counts = {}
+    for booking, contract in rows:
+        key = (contract.house_name, booking.date, booking.time_slot)
+        page_counts[key] = page_counts.get(key, 0) + 1
+    project_totals = {name: sum(1 for _, c in rows if c.house_name == name) for name in PROJECTS}
+    named = make_contract_frame(size, rng, named=True)
+    positional = make_contract_frame(size, rng, named=False)
+    col_map, named = _detect_columns(named)
+
+    def calendar_cold():
+        clear_calendar_cache()
+        generate_calendar(month_after.year, month_after.month, fully_booked_dates=booked, lang="ru",
+                          project_name=project)
+
+    def min_booking_cold():
+        inline._min_booking_cache.clear()
+        inline.get_min_booking_date(project)
+
+    def fully_booked_recompute():
+        occupancy._fully_booked_cache.clear()
+        occupancy.get_fully_booked_dates(project, SLOTS_LIMIT)
+
+    def occupancy_load():
+        occupancy.reset()
+        occupancy.get_occupancy()
+
+    return [
+        ("calendar.generate_cold", calendar_cold, 1),
+        ("calendar.generate_cached", lambda: generate_calendar(
+            month_after.year, month_after.month, fully_booked_dates=booked, lang="ru", project_name=project), 1),
+        ("calendar.time_slots", lambda: generate_time_slots(day.isoformat(), slot_counts, SLOTS_LIMIT, "ru"), 1),
+        ("calendar.min_booking_date_cold", min_booking_cold, 1),
+        ("calendar.min_booking_date_cached", lambda: inline.get_min_booking_date(project), 1),
+        ("occupancy.fully_booked_recompute", fully_booked_recompute, 1),
+        ("occupancy.index_load", occupancy_load, 1),
+        ("client.validate_phone_number", lambda: [validate_phone_number(p) for p in PHONES], len(PHONES)),
+        ("language.get_message", lambda: [get_message(k, "ru", **kw) for k, kw in MESSAGES], len(MESSAGES)),
+        ("booking_browser.format_page", lambda: format_bookings_page(page, page_counts, project_totals), 1),
+        ("excel.detect_columns_named", lambda: _detect_columns(named), 1),
+        ("excel.detect_columns_positional", lambda: _detect_columns(positional), 1),
+        ("excel.normalize_row", lambda: _normalize_all(named, col_map), size),
+    ]
+
+
+# ========== ЗАМЕР И ПОРОГИ ==========
+
+def measure(func, min_time: float, repeats: int) -> float:
+    """Лучшее время одного вызова, с: число вызовов в замере подбирается так, чтобы он длился ≥ min_time."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def run(size: int = DEFAULT_SIZE, min_time: float = 0.05, repeats: int = 5, name_filter: str = None,
+        seed_value: int = 1) -> dict:
+    """Замеры всех (или отобранных по подстроке) случаев: {имя: мкс на операцию}."""
+    rng = random.Random(seed_value)
+    results = {}
+    with patch.dict(holidays._holidays, {"ranges": []}), patch.dict(holidays._calendar_cache, clear=True), \
+            bench_database(":memory:"):
+        for name, func, per in build_cases(size, rng):
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(func, min_time, repeats) / per * 1e6
+        clear_calendar_cache()
+        inline._min_booking_cache.clear()
+    return results
+
+
+def load_thresholds(path: str = THRESHOLDS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {"tolerance": DEFAULT_TOLERANCE, "size": DEFAULT_SIZE, "cases": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(results: dict, thresholds: dict) -> list:
+    """[(имя, мкс, порог)] для замеров дольше порога × tolerance."""
+    tolerance = thresholds.get("tolerance", DEFAULT_TOLERANCE)
+    cases = thresholds.get("cases", {})
+    return [
+        (name, us, cases[name]) for name, us in results.items()
+        if name in cases and us > cases[name] * tolerance
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="записей в базе и строк Excel")
+    parser.add_argument("--filter", help="только случаи, в имени которых есть подстрока")
+    parser.add_argument("--min-time", type=float, default=0.05, help="минимальная длительность замера, с")
+    parser.add_argument("--repeats", type=int, default=5, help="повторов замера (берётся лучший)")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH, help="файл порогов")
+    parser.add_argument("--update", action="store_true", help="записать текущие замеры как пороги")
+    args = parser.parse_args()
+
+    results = run(args.size, args.min_time, args.repeats, args.filter)
+    thresholds = load_thresholds(args.thresholds)
+    compare = thresholds.get("size") == args.size
+    cases = thresholds.get("cases", {})
+
+    print(f"{'случай':<36}{'мкс':>12}{'порог':>12}{'×':>7}")
+    for name, us in results.items():
+        threshold = cases.get(name) if compare else None
+        if threshold:
+            print(f"{name:<36}{us:12.2f}{threshold:12.2f}{us / threshold:7.2f}")
+        else:
+            print(f"{name:<36}{us:12.2f}{'—':>12}{'—':>7}")
+
+    if args.update:
+        cases.update({name: round(us, 2) for name, us in results.items()})
+        thresholds.update(size=args.size, cases=dict(sorted(cases.items())))
+        with open(args.thresholds, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\nПороги записаны: {args.thresholds}")
+        return
+    if not compare:
+        print(f"\nПороги сняты для --size {thresholds.get('size')}, сравнение пропущено.")
+        return
+
+    regressions = find_regressions(results, thresholds)
+    if regressions:
+        print(f"\nРегрессии (дольше порога больше чем в {thresholds.get('tolerance', DEFAULT_TOLERANCE)} раза):")
+        for name, us, threshold in regressions:
+            print(f"  {name}: {us:.2f} мкс при пороге {threshold:.2f}")
+        sys.exit(1)
+    print("\nРегрессий нет.")
+
+
+if __name__ == "__main__":
+    main()
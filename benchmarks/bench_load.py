@@ -0,0 +1,500 @@
+"""
+Нагрузочный прогон бота целиком: настоящий Dispatcher с роутерами
+admin / employee / common / client, SQLite во временном файле и заглушка
+Bot API вместо Telegram (сеть не используется).
+
+Виртуальные клиенты параллельно проходят сценарии:
+- booking — /start → «Записаться» → номер договора → дата → время → телефон;
+- cancel — «Отменить запись» → выбор записи → подтверждение;
+- rebook — «Перезапись» → дата → время → подтверждение → сохранённый телефон;
+- staff — сотрудник: «Список записей» → все проекты → все недели → страница 2.
+
+Отчёт: пропускная способность, перцентили времени сценариев и шагов,
+SQL-запросы и вызовы Bot API на сценарий. Результат сохраняется в JSON
+(по умолчанию benchmarks/results/), --compare печатает разницу с прошлым
+прогоном.
+
+Запуск: python benchmarks/bench_load.py [--clients 2000] [--concurrency 200]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager, redirect_stdout
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from itertools import count
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ADMIN_ID", "0")
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.dispatcher.event.bases import UNHANDLED  # noqa: E402
+from aiogram.types import Message, Update  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from database.models import Base, Booking, Contract, ProjectSlots, Staff, UserLanguage  # noqa: E402
+from database.session import SessionLocal  # noqa: E402
+from handlers import admin, client, common, employee  # noqa: E402
+from keyboards.callbacks import ALL_PROJECTS, DateCallback, ProjectCallback, RebookCallback, TimeCallback  # noqa: E402
+from keyboards.inline import get_min_booking_date  # noqa: E402
+from keyboards.reply import BUTTON_TEXTS  # noqa: E402
+from utils import holidays, occupancy, projects, slot_templates, tracing  # noqa: E402
+from utils.fsm_storage import SQLiteStorage  # noqa: E402
+from utils.holidays import is_working_day  # noqa: E402
+from utils.slot_templates import get_day_slots  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+FLOWS = ("booking", "cancel", "rebook", "staff")
+DEFAULT_MIX = "booking=70,cancel=10,rebook=10,staff=10"
+
+CLIENT_ID_BASE = 1_000_000
+STAFF_ID_BASE = 900_000
+
+# Статистика сценария, который сейчас выполняет задача (для подсчёта вызовов Bot API)
+_current_flow = ContextVar("bench_load_flow", default=None)
+
+
+class StubSession(BaseSession):
+    """Bot API без сети: считает вызовы и отвечает успехом (с задержкой latency секунд)."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        stats = _current_flow.get()
+        if stats is not None:
+            stats["api_calls"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.__returning__ is not Message:
+            return True
+        return Message.model_validate({
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(getattr(method, "chat_id", 0) or 0), "type": "private"},
+            "text": getattr(method, "text", None),
+        }, context={"bot": bot})
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+_update_ids = count(1)
+
+
+def _message_update(user_id: int, text: str) -> Update:
+    update_id = next(_update_ids)
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Нагрузка", "language_code": "ru"},
+            "text": text,
+        },
+    })
+
+
+def _callback_update(user_id: int, data: str) -> Update:
+    update_id = next(_update_ids)
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Нагрузка"},
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "Бот"},
+                "text": "…",
+            },
+        },
+    })
+
+
+def _parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in FLOWS:
+            raise SystemExit(f"Неизвестный сценарий {name!r}, доступны: {', '.join(FLOWS)}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def _working_days(project_name: str, start: date, days: int) -> list:
+    """Рабочие дни проекта начиная с start, не больше days штук."""
+    result = []
+    current = start
+    while len(result) < days:
+        if is_working_day(current, project_name):
+            result.append(current)
+        current += timedelta(days=1)
+    return result
+
+
+def _random_slot(rng, project_name: str, days: list, slots_limit: int):
+    day = rng.choice(days)
+    slot_time, _ = rng.choice(get_day_slots(project_name, day.weekday(), slots_limit))
+    return day, slot_time
+
+
+@contextmanager
+def bench_database(path: str):
+    """Привязать SessionLocal к базе бенчмарка; по выходе вернуть прежнюю привязку."""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    previous = SessionLocal.kw.get("bind")
+    SessionLocal.configure(bind=engine)
+    occupancy.reset()
+    projects.invalidate()
+    slot_templates.invalidate()
+    try:
+        yield engine
+    finally:
+        SessionLocal.configure(bind=previous)
+        occupancy.reset()
+        projects.invalidate()
+        slot_templates.invalidate()
+        engine.dispose()
+
+
+def seed(plan: list, project_count: int, staff_count: int, slots_limit: int, rng) -> None:
+    """
+    Данные для плана: проекты с лимитом слотов, договор на каждого клиента,
+    сотрудники; клиентам cancel / rebook — запись через 3–5 недель и телефон.
+    """
+    project_names = [f"ЖК Нагрузка {i + 1}" for i in range(project_count)]
+    delivery = date.today() - timedelta(days=30)
+    booked_days = {name: _working_days(name, date.today() + timedelta(days=21), 10) for name in project_names}
+    with SessionLocal() as session:
+        session.add_all(ProjectSlots(project_name=name, slots_limit=slots_limit) for name in project_names)
+        session.add_all(Staff(telegram_id=STAFF_ID_BASE + i, role="employee") for i in range(staff_count))
+        for item in plan:
+            if item["flow"] == "staff":
+                continue
+            item["house"] = project_names[item["index"] % project_count]
+            contract = Contract(
+                house_name=item["house"], apt_num=str(item["index"] + 1), entrance="1", floor=1,
+                contract_num=item["contract_num"], client_fio=f"Клиент {item['index']}",
+                delivery_date=delivery,
+            )
+            session.add(contract)
+            if item["flow"] in ("cancel", "rebook"):
+                contract.telegram_id = item["user_id"]
+                day, slot_time = _random_slot(rng, item["house"], booked_days[item["house"]], slots_limit)
+                booking = Booking(contract=contract, user_telegram_id=item["user_id"], date=day,
+                                  time_slot=slot_time, client_phone="+998901234567")
+                session.add(booking)
+                session.add(UserLanguage(telegram_id=item["user_id"], language="ru", phone="+998901234567"))
+                item["booking"] = booking
+        session.commit()
+        for item in plan:
+            if "booking" in item:
+                item["booking_id"] = item.pop("booking").id
+
+
+def make_plan(clients: int, weights: dict, staff_count: int, rng) -> list:
+    """Сценарий для каждого виртуального пользователя; listing — по сотрудникам по кругу."""
+    names = list(weights)
+    flows = rng.choices(names, weights=[weights[n] for n in names], k=clients)
+    plan = []
+    for index, flow in enumerate(flows):
+        if flow == "staff":
+            user_id = STAFF_ID_BASE + index % max(staff_count, 1)
+        else:
+            user_id = CLIENT_ID_BASE + index
+        plan.append({"index": index, "flow": flow, "user_id": user_id, "contract_num": f"LT-{index:06d}"})
+    return plan
+
+
+class LoadRun:
+    """Прогон плана: шаги сценариев через dp.feed_update и сбор статистики."""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, slots_limit: int, rng):
+        self.dp = dp
+        self.bot = bot
+        self.slots_limit = slots_limit
+        self.rng = rng
+        self.flows = {}  # сценарий → список {"ms", "queries", "api_calls", "ok"}
+        self.steps = {}  # "сценарий/шаг" → список мс
+        self.updates = 0
+        self.errors = Counter()
+
+    async def _step(self, flow: str, step: str, update: Update) -> bool:
+        started = time.perf_counter()
+        self.updates += 1
+        try:
+            handled = await self.dp.feed_update(self.bot, update) is not UNHANDLED
+        except Exception as e:
+            self.errors[f"{flow}/{step}: {type(e).__name__}: {e}"] += 1
+            handled = False
+        self.steps.setdefault(f"{flow}/{step}", []).append((time.perf_counter() - started) * 1000)
+        return handled
+
+    async def _steps(self, flow: str, user_id: int, steps) -> bool:
+        ok = True
+        for step, kind, payload in steps:
+            update = _message_update(user_id, payload) if kind == "message" else _callback_update(user_id, payload)
+            ok = await self._step(flow, step, update) and ok
+        return ok
+
+    def _new_slot(self, house: str):
+        days = _working_days(house, get_min_booking_date(house), 15)
+        return _random_slot(self.rng, house, days, self.slots_limit)
+
+    async def booking(self, item) -> bool:
+        day, slot_time = self._new_slot(item["house"])
+        return await self._steps("booking", item["user_id"], [
+            ("start", "message", "/start"),
+            ("add_booking", "message", BUTTON_TEXTS["add_booking"]["ru"]),
+            ("contract", "message", item["contract_num"]),
+            ("date", "callback", DateCallback.of(day).pack()),
+            ("time", "callback", TimeCallback.of(day, slot_time).pack()),
+            ("phone", "message", "+998901234567"),
+        ])
+
+    async def cancel(self, item) -> bool:
+        booking_id = item["booking_id"]
+        return await self._steps("cancel", item["user_id"], [
+            ("cancel_button", "message", BUTTON_TEXTS["cancel_booking"]["ru"]),
+            ("select", "callback", f"cancel_{booking_id}"),
+            ("confirm", "callback", f"confirm_cancel_{booking_id}"),
+        ])
+
+    async def rebook(self, item) -> bool:
+        day, slot_time = self._new_slot(item["house"])
+        return await self._steps("rebook", item["user_id"], [
+            ("rebook_button", "message", BUTTON_TEXTS["view_calendar"]["ru"]),
+            ("date", "callback", DateCallback.of(day).pack()),
+            ("time", "callback", TimeCallback.of(day, slot_time).pack()),
+            ("confirm", "callback", RebookCallback.of(day, slot_time).pack()),
+            ("saved_phone", "callback", "calphone"),
+        ])
+
+    async def staff(self, item) -> bool:
+        return await self._steps("staff", item["user_id"], [
+            ("list_button", "message", "📋 Список записей"),
+            ("all_projects", "callback", ProjectCallback(action="emp", project=ALL_PROJECTS).pack()),
+            ("all_weeks", "callback", "empwk_skip"),
+            ("page", "callback", "emppage_1"),
+        ])
+
+    async def _run_flow(self, item) -> None:
+        stats = {"api_calls": 0}
+        token = _current_flow.set(stats)
+        started = time.perf_counter()
+        try:
+            with tracing.collect_queries() as trace:
+                ok = await getattr(self, item["flow"])(item)
+        finally:
+            _current_flow.reset(token)
+        self.flows.setdefault(item["flow"], []).append({
+            "ms": (time.perf_counter() - started) * 1000,
+            "queries": trace.queries,
+            "api_calls": stats["api_calls"],
+            "ok": ok,
+        })
+
+    async def run(self, plan: list, concurrency: int) -> float:
+        """Выполнить план; сценарии одного пользователя — по очереди. Возвращает время, с."""
+        by_user = {}
+        for item in plan:
+            by_user.setdefault(item["user_id"], []).append(item)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def user_task(items):
+            async with semaphore:
+                for item in items:
+                    await self._run_flow(item)
+
+        before = asyncio.all_tasks()
+        started = time.perf_counter()
+        await asyncio.gather(*(user_task(items) for items in by_user.values()))
+        # Уведомления сотрудникам уходят фоновыми задачами — дожидаемся их
+        await asyncio.gather(*(asyncio.all_tasks() - before), return_exceptions=True)
+        return time.perf_counter() - started
+
+
+def percentile(values, quantile: float) -> float:
+    """Перцентиль по ближайшему рангу."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(quantile * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _latency(values) -> dict:
+    return {
+        "p50_ms": round(percentile(values, 0.5), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(max(values), 2) if values else 0.0,
+    }
+
+
+def summarize(run: LoadRun, seconds: float, params: dict, api_calls: Counter) -> dict:
+    flows = {}
+    for name, rows in run.flows.items():
+        flows[name] = {
+            "count": len(rows),
+            "failed": sum(1 for r in rows if not r["ok"]),
+            "per_second": round(len(rows) / seconds, 2),
+            **_latency([r["ms"] for r in rows]),
+            "queries_mean": round(sum(r["queries"] for r in rows) / len(rows), 2),
+            "queries_max": max(r["queries"] for r in rows),
+            "api_calls_mean": round(sum(r["api_calls"] for r in rows) / len(rows), 2),
+        }
+    return {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "totals": {
+            "seconds": round(seconds, 3),
+            "updates": run.updates,
+            "updates_per_second": round(run.updates / seconds, 1),
+            "flows": sum(f["count"] for f in flows.values()),
+            "failed": sum(f["failed"] for f in flows.values()),
+            "api_calls": dict(api_calls),
+        },
+        "flows": flows,
+        "steps": {name: {"count": len(values), **_latency(values)} for name, values in sorted(run.steps.items())},
+        "errors": dict(run.errors.most_common(20)),
+    }
+
+
+async def run_load(clients: int = 2000, concurrency: int = 200, mix: str = DEFAULT_MIX, projects_count: int = 5,
+                   staff_count: int = 10, slots_limit: int = 20, api_latency_ms: float = 0.0,
+                   seed_value: int = 1, db_path: str = None) -> dict:
+    """Подготовить базу, выполнить план и вернуть итоги (как в JSON-результате)."""
+    rng = random.Random(seed_value)
+    params = {
+        "clients": clients, "concurrency": concurrency, "mix": mix, "projects": projects_count,
+        "staff": staff_count, "slots_limit": slots_limit, "api_latency_ms": api_latency_ms, "seed": seed_value,
+    }
+    plan = make_plan(clients, _parse_mix(mix), staff_count, rng)
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.dict(holidays._holidays, {"ranges": []}), patch.dict(holidays._calendar_cache, clear=True), \
+            bench_database(db_path or os.path.join(tmp, "bench_load.db")):
+        seed(plan, projects_count, staff_count, slots_limit, rng)
+
+        session = StubSession(latency=api_latency_ms / 1000)
+        bot = Bot(token="42:LOADTEST", session=session)
+        dp = Dispatcher(storage=SQLiteStorage(SessionLocal))
+        dp.include_router(admin.router)
+        dp.include_router(employee.router)
+        dp.include_router(common.router)
+        dp.include_router(client.router)
+        try:
+            run = LoadRun(dp, bot, slots_limit, rng)
+            seconds = await run.run(plan, concurrency)
+        finally:
+            await dp.storage.close()
+            # Роутеры модулей — общие для процесса: отвязываем, чтобы их можно было подключить снова
+            for router in (admin.router, employee.router, common.router, client.router):
+                router._parent_router = None
+    return summarize(run, seconds, params, session.calls)
+
+
+def print_report(result: dict) -> None:
+    totals = result["totals"]
+    print(f"Прогон: {totals['flows']} сценариев, {totals['updates']} обновлений за {totals['seconds']:.1f} с "
+          f"({totals['updates_per_second']:.0f} обновлений/с), ошибок: {totals['failed']}")
+    print()
+    print(f"{'сценарий':<10}{'всего':>7}{'ошибок':>8}{'в сек':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}"
+          f"{'SQL ср':>8}{'SQL max':>8}{'API ср':>8}")
+    for name, f in result["flows"].items():
+        print(f"{name:<10}{f['count']:>7}{f['failed']:>8}{f['per_second']:>9.1f}{f['p50_ms']:>9.1f}"
+              f"{f['p95_ms']:>9.1f}{f['p99_ms']:>9.1f}{f['queries_mean']:>8.1f}{f['queries_max']:>8}"
+              f"{f['api_calls_mean']:>8.1f}")
+    print()
+    print(f"{'шаг':<26}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}")
+    for name, s in result["steps"].items():
+        print(f"{name:<26}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+    if result["errors"]:
+        print("\nОшибки:")
+        for error, times in result["errors"].items():
+            print(f"  {times} × {error}")
+
+
+def print_comparison(result: dict, previous: dict) -> None:
+    """Разница с прошлым прогоном по каждому сценарию (положительная — стало больше)."""
+    print(f"\nСравнение с прогоном {previous.get('started', '?')}:")
+    for name, f in result["flows"].items():
+        old = previous.get("flows", {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for key in ("per_second", "p50_ms", "p95_ms", "queries_mean"):
+            if old[key]:
+                parts.append(f"{key} {(f[key] - old[key]) / old[key]:+.0%}")
+        print(f"  {name:<10}" + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000, help="виртуальных пользователей (сценариев)")
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременно выполняемых пользователей")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса сценариев, например booking=70,cancel=10")
+    parser.add_argument("--projects", type=int, default=5, help="число проектов (ЖК)")
+    parser.add_argument("--staff", type=int, default=10, help="число сотрудников (получатели уведомлений)")
+    parser.add_argument("--slots-limit", type=int, default=20, help="лимит записей на слот")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="задержка ответа заглушки Bot API")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора сценариев")
+    parser.add_argument("--db", help="файл SQLite (по умолчанию — временный)")
+    parser.add_argument("--output", help="куда сохранить JSON (по умолчанию benchmarks/results/load_<время>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Отладочный print обработчиков не засоряет отчёт (время на форматирование остаётся в замере)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        result = asyncio.run(run_load(
+            clients=args.clients, concurrency=args.concurrency, mix=args.mix, projects_count=args.projects,
+            staff_count=args.staff, slots_limit=args.slots_limit, api_latency_ms=args.api_latency_ms,
+            seed_value=args.seed, db_path=args.db,
+        ))
+    print_report(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультат: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
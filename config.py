@@ -17,4 +17,64 @@ DKS_CONTACTS = {
     "working_hours_uz": "Dush-Jum: 9:00-18:00",
     "latitude": 41.302006,     
     "longitude": 69.292259
-}
\ No newline at end of file
+}
+# Кэш отчётов: пересборка после N изменений записей/договоров,
+# интервал проверки (минуты) и час ночной пересборки (по Ташкенту)
+REPORT_REBUILD_THRESHOLD = int(os.getenv("REPORT_REBUILD_THRESHOLD", "20"))
+REPORT_REFRESH_MINUTES = int(os.getenv("REPORT_REFRESH_MINUTES", "10"))
+REPORT_NIGHTLY_HOUR = int(os.getenv("REPORT_NIGHTLY_HOUR", "3"))
+
+# Горизонт (дней вперёд), на который заранее рассчитываются рабочие дни
+# с учётом праздников и закрытых дат
+HOLIDAY_HORIZON_DAYS = int(os.getenv("HOLIDAY_HORIZON_DAYS", "365"))
+
+# Хранилище состояний FSM (utils/fsm_storage.py): через сколько часов брошенное
+# состояние удаляется, задержка объединения записей в базу (секунды)
+# и сколько состояний держать в памяти
+FSM_STATE_TTL_HOURS = int(os.getenv("FSM_STATE_TTL_HOURS", "72"))
+FSM_FLUSH_SECONDS = float(os.getenv("FSM_FLUSH_SECONDS", "1"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "1000"))
+
+# Режим webhook (utils/webhook.py): без WEBHOOK_URL бот работает через long polling.
+# WEBHOOK_SECRET — секрет заголовка X-Telegram-Bot-Api-Secret-Token (пустой —
+# генерируется при запуске)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Обработка обновлений (utils/update_scheduler.py): сколько обновлений разных
+# чатов обрабатывается одновременно и сколько принятых может ждать обработки —
+# сверх этого polling приостанавливается, а webhook отвечает Telegram 429
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_MAX_IN_FLIGHT = int(os.getenv("UPDATE_MAX_IN_FLIGHT", "1000"))
+
+# HTTP-сессия Bot API (utils/bot_session.py): keep-alive соединения в пуле.
+# BOT_API_INSECURE_SSL=1 — без проверки сертификатов (для сетей с перехватом
+# TLS), по умолчанию сертификаты проверяются
+BOT_API_INSECURE_SSL = os.getenv("BOT_API_INSECURE_SSL", "0") == "1"
+BOT_API_POOL_LIMIT = int(os.getenv("BOT_API_POOL_LIMIT", "100"))
+BOT_API_POOL_PER_HOST = int(os.getenv("BOT_API_POOL_PER_HOST", "30"))
+BOT_API_KEEPALIVE_SECONDS = float(os.getenv("BOT_API_KEEPALIVE_SECONDS", "60"))
+BOT_API_DNS_TTL_SECONDS = int(os.getenv("BOT_API_DNS_TTL_SECONDS", "3600"))
+BOT_API_TIMEOUT_SECONDS = float(os.getenv("BOT_API_TIMEOUT_SECONDS", "60"))
+
+# Трассировка обновлений (utils/tracing.py): доля обновлений, попадающих в лог
+# (ошибки и медленные — всегда), и порог медленного обновления (мс)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+
+# SQL в трассах: порог медленного запроса (мс) и сколько раз один запрос
+# (с точностью до параметров) может выполниться за обновление, прежде чем
+# считается N+1; TRACE_STRICT=1 — превышение роняет обработку (для CI)
+TRACE_SLOW_QUERY_MS = float(os.getenv("TRACE_SLOW_QUERY_MS", "100"))
+TRACE_N_PLUS_ONE_THRESHOLD = int(os.getenv("TRACE_N_PLUS_ONE_THRESHOLD", "5"))
+TRACE_STRICT = os.getenv("TRACE_STRICT", "0") == "1"
+
+# Метрики Prometheus (utils/metrics.py): адрес HTTP-эндпоинта; METRICS_PORT=0 — выключено.
+# Эндпоинт без авторизации, поэтому по умолчанию слушает только localhost;
+# для сбора с другой машины — METRICS_HOST=0.0.0.0 (за файрволом или прокси)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9091"))
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
@@ -0,0 +1,309 @@
+"""
+Отслеживание изменений записей и договоров.
+
+Слушатели сессии собирают изменённые строки Booking/Contract во время flush
+и применяют их только после успешного commit — так кэши (отчёты и т.п.)
+видят версию данных, которая действительно записана в базу.
+
+Подписчики (subscribe) получают после commit приращения занятости слотов —
+так индекс занятости обновляется без повторного сканирования таблицы.
+
+Здесь же поддерживается флаг Booking.is_first_booking, чтобы списки записей
+не считали min(id) по договорам при каждом показе, и ссылки договоров
+и настроек проектов на таблицу projects (project_id по названию дома).
+"""
+import logging
+from collections import Counter, namedtuple
+
+from sqlalchemy import case, event, func, insert, select, update
+from sqlalchemy.orm import attributes
+
+from .models import Booking, Contract, Project, ProjectSlots
+
+# Поля записи, изменение которых влияет на выгрузки и доступность слотов.
+# Флаги напоминаний сюда не входят — они меняются каждые пару минут.
+BOOKING_TRACKED_FIELDS = ("contract_id", "date", "time_slot", "client_phone", "is_cancelled")
+
+_PENDING_KEY = "dks_pending_changes"
+
+# Изменение занятости слота: +1 — запись появилась, -1 — отменена/перенесена/удалена
+BookingChange = namedtuple("BookingChange", "project_name date time_slot delta")
+
+# Монотонные счётчики изменённых строк: общий, договоров, настроек проектов и по проектам
+_versions = {"total": 0, "contracts": 0, "settings": 0}
+_project_versions = Counter()
+
+# Подписчики на изменения занятости: listener(changes, reset)
+_listeners = []
+
+# Старое значение поля неизвестно (атрибут не был загружен до изменения)
+_UNKNOWN = object()
+
+
+def get_data_version(project_name: str = None) -> int:
+    """
+    Версия данных: количество изменённых строк записей и договоров с момента запуска.
+
+    Args:
+        project_name: Название проекта. Если None — общая версия по всем проектам.
+    """
+    if project_name is None:
+        return _versions["total"]
+    return _project_versions[project_name]
+
+
+def get_contracts_version() -> int:
+    """Версия договоров: растёт при каждом изменении таблицы contracts (списки проектов)."""
+    return _versions["contracts"]
+
+
+def get_settings_version() -> int:
+    """Версия настроек проектов: растёт при каждом изменении таблицы project_slots."""
+    return _versions["settings"]
+
+
+def subscribe(listener) -> None:
+    """
+    Подписаться на изменения занятости слотов после commit.
+
+    listener(changes, reset): changes — список BookingChange; reset=True, если изменения
+    нельзя выразить приращениями (например, переименован дом) и данные нужно перечитать.
+    """
+    _listeners.append(listener)
+
+
+def _is_modified(obj, fields) -> bool:
+    """Изменено ли хотя бы одно из отслеживаемых полей объекта."""
+    state = attributes.instance_state(obj)
+    for field in fields:
+        if state.attrs[field].history.has_changes():
+            return True
+    return False
+
+
+def _old_value(state, field):
+    """Значение поля до flush."""
+    history = state.attrs[field].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return _UNKNOWN
+    return state.dict.get(field, _UNKNOWN)
+
+
+def _slot_deltas(obj, is_new: bool, is_deleted: bool):
+    """
+    Изменения занятости для одной записи: [(contract_id, date, time_slot, delta), ...].
+
+    Returns None, если старые значения неизвестны и приращение посчитать нельзя.
+    """
+    state = attributes.instance_state(obj)
+    fields = ("contract_id", "date", "time_slot", "is_cancelled")
+    new = tuple(state.dict.get(field, _UNKNOWN) for field in fields)
+    old = None if is_new else tuple(_old_value(state, field) for field in fields)
+    if is_deleted:
+        old, new = old, None
+
+    deltas = []
+    for values, delta in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        if _UNKNOWN in values:
+            return None
+        contract_id, booking_date, time_slot, is_cancelled = values
+        if not is_cancelled:
+            deltas.append((contract_id, booking_date, time_slot, delta))
+
+    # Запись не менялась по существу (например, изменён только телефон)
+    if len(deltas) == 2 and deltas[0][:3] == deltas[1][:3]:
+        return []
+    return deltas
+
+
+def _collect_changes(session, flush_context):
+    """after_flush: запоминаем затронутые проекты и изменения занятости слотов."""
+    pending = session.info.setdefault(
+        _PENDING_KEY, {"versions": Counter(), "contracts": 0, "settings": 0, "changes": [], "reset": False}
+    )
+    versions = pending["versions"]
+    contract_ids = []
+    slot_deltas = []
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Contract):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            pending["contracts"] += 1
+            # При переименовании дома изменение касается и старого проекта
+            history = attributes.instance_state(obj).attrs["house_name"].history
+            for name in set(history.deleted or ()) | {obj.house_name}:
+                versions[name] += 1
+            # Записи договора «переезжают» в другой проект — приращениями это не выразить
+            if obj in session.deleted or (obj in session.dirty and history.has_changes()):
+                pending["reset"] = True
+        elif isinstance(obj, ProjectSlots):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            pending["settings"] += 1
+        elif isinstance(obj, Booking):
+            if obj in session.dirty and not _is_modified(obj, BOOKING_TRACKED_FIELDS):
+                continue
+            contract_ids.append(obj.contract_id)
+            deltas = _slot_deltas(obj, obj in session.new, obj in session.deleted)
+            if deltas is None:
+                pending["reset"] = True
+            else:
+                slot_deltas.extend(deltas)
+
+    lookup_ids = set(contract_ids) | {delta[0] for delta in slot_deltas}
+    lookup_ids.discard(None)
+    house_by_contract = {}
+    if lookup_ids:
+        rows = session.connection().execute(
+            select(Contract.id, Contract.house_name).where(Contract.id.in_(lookup_ids))
+        ).all()
+        house_by_contract = {row[0]: row[1] for row in rows}
+
+    for contract_id in contract_ids:
+        versions[house_by_contract.get(contract_id)] += 1
+    for contract_id, booking_date, time_slot, delta in slot_deltas:
+        pending["changes"].append(
+            BookingChange(house_by_contract.get(contract_id), booking_date, time_slot, delta)
+        )
+
+
+def refresh_project_ids(connection) -> None:
+    """
+    Зарегистрировать проекты всех договоров и настроек и проставить project_id.
+
+    Используется миграцией для уже существующих строк.
+    """
+    projects = Project.__table__
+    for table, name_column in ((Contract.__table__, "house_name"), (ProjectSlots.__table__, "project_name")):
+        names = select(table.c[name_column]).where(table.c[name_column].isnot(None)).distinct()
+        connection.execute(
+            insert(projects).from_select(["name"], names.except_(select(projects.c.name)))
+        )
+        project_id = select(projects.c.id).where(projects.c.name == table.c[name_column]).scalar_subquery()
+        connection.execute(update(table).where(table.c.project_id.is_(None)).values(project_id=project_id))
+
+
+def _assign_projects(session, flush_context, instances):
+    """before_flush: project_id новых и переименованных договоров и настроек проектов."""
+    ids = {}
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Contract):
+            name_field = "house_name"
+        elif isinstance(obj, ProjectSlots):
+            name_field = "project_name"
+        else:
+            continue
+        state = attributes.instance_state(obj)
+        if obj in session.dirty and obj.project_id is not None and not state.attrs[name_field].history.has_changes():
+            continue
+
+        name = getattr(obj, name_field)
+        if name is None:
+            obj.project_id = None
+            continue
+        if name not in ids:
+            connection = session.connection()
+            project_id = connection.execute(select(Project.id).where(Project.name == name)).scalar()
+            if project_id is None:
+                project_id = connection.execute(insert(Project).values(name=name)).inserted_primary_key[0]
+            ids[name] = project_id
+        obj.project_id = ids[name]
+
+
+def refresh_first_bookings(connection, contract_ids=None) -> None:
+    """
+    Пересчитать флаг is_first_booking: первой считается активная запись
+    договора с наименьшим id, остальные — повторные.
+
+    Args:
+        connection: Соединение (внутри текущей транзакции)
+        contract_ids: Договоры для пересчёта. Если None — все записи.
+    """
+    bookings = Booking.__table__
+    active = bookings.alias("active")
+    first_id = (
+        select(func.min(active.c.id))
+        .where(
+            active.c.contract_id == bookings.c.contract_id,
+            func.coalesce(active.c.is_cancelled, False) == False,
+        )
+        .scalar_subquery()
+    )
+    stmt = update(bookings).values(
+        is_first_booking=case((bookings.c.id == first_id, True), else_=False)
+    )
+    if contract_ids is not None:
+        stmt = stmt.where(bookings.c.contract_id.in_(contract_ids))
+    connection.execute(stmt)
+
+
+def _update_first_bookings(session, flush_context):
+    """after_flush: пересчёт первых записей для договоров, у которых записи создавались или отменялись."""
+    contract_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Booking):
+            continue
+        if obj in session.dirty and not _is_modified(obj, ("contract_id", "is_cancelled")):
+            continue
+        contract_ids.add(obj.contract_id)
+        contract_ids.update(attributes.instance_state(obj).attrs["contract_id"].history.deleted or ())
+    contract_ids.discard(None)
+    if not contract_ids:
+        return
+
+    connection = session.connection()
+    refresh_first_bookings(connection, contract_ids)
+
+    # Загруженные в сессию объекты получают новое значение без лишнего SELECT при обращении
+    rows = connection.execute(
+        select(Booking.id, Booking.is_first_booking).where(Booking.contract_id.in_(contract_ids))
+    ).all()
+    flags = {row[0]: row[1] for row in rows}
+    # Новые объекты попадают в identity_map только после завершения flush
+    states = [attributes.instance_state(obj) for obj in session.new]
+    states += list(session.identity_map.all_states())
+    for state in states:
+        if state.class_ is not Booking:
+            continue
+        booking_id = state.identity[0] if state.identity else state.dict.get("id")
+        if booking_id in flags:
+            attributes.set_committed_value(state.obj(), "is_first_booking", flags[booking_id])
+
+
+def _apply_changes(session):
+    """after_commit: публикуем накопленные изменения."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    _versions["contracts"] += pending["contracts"]
+    _versions["settings"] += pending["settings"]
+    for project_name, count in pending["versions"].items():
+        _versions["total"] += count
+        if project_name is not None:
+            _project_versions[project_name] += count
+
+    if pending["changes"] or pending["reset"]:
+        for listener in _listeners:
+            try:
+                listener(pending["changes"], pending["reset"])
+            except Exception as e:
+                logging.error(f"Ошибка обработчика изменений записей: {e}")
+
+
+def _discard_changes(session, *args):
+    """after_rollback: изменения не попали в базу — забываем их."""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install(session_factory) -> None:
+    """Подключить отслеживание изменений к фабрике сессий."""
+    event.listen(session_factory, "before_flush", _assign_projects)
+    event.listen(session_factory, "after_flush", _collect_changes)
+    event.listen(session_factory, "after_flush", _update_first_bookings)
+    event.listen(session_factory, "after_commit", _apply_changes)
+    event.listen(session_factory, "after_rollback", _discard_changes)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Date, Time, ForeignKey, Boolean, Float, Index
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -12,10 +12,18 @@ class UserLanguage(Base):
     phone = Column(String, nullable=True)  # Сохранённый номер телефона
 
 
+class Project(Base):
+    """Реестр проектов: целый id для callback_data и ссылок"""
+    __tablename__ = 'projects'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, index=True)  # Название проекта (house_name)
+
+
 class Contract(Base):
     __tablename__ = 'contracts'
     id = Column(Integer, primary_key=True)
     house_name = Column(String)
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=True, index=True)  # Поддерживается database/events.py
     apt_num = Column(String)
     entrance = Column(String)  # Новое поле: Подъезд
     floor = Column(Integer)
@@ -37,6 +45,7 @@ class ProjectSlots(Base):
     """Лимиты слотов и адреса для каждого проекта"""
     __tablename__ = 'project_slots'
     project_name = Column(String, primary_key=True)  # Название проекта (house_name)
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=True, index=True)  # Поддерживается database/events.py
     slots_limit = Column(Integer, default=1)  # Лимит записей на один слот
     address_ru = Column(String, nullable=True)  # Адрес на русском
     address_uz = Column(String, nullable=True)  # Адрес на узбекском
@@ -44,6 +53,48 @@ class ProjectSlots(Base):
     longitude = Column(String, nullable=True)  # Долгота (сохраняется как строка для точности)
 
 
+class SlotTemplate(Base):
+    """Шаблон слотов: время и вместимость для проекта и дня недели"""
+    __tablename__ = 'slot_templates'
+    id = Column(Integer, primary_key=True)
+    project_name = Column(String, nullable=True, index=True)  # None — для всех проектов
+    weekday = Column(Integer, nullable=True)  # 0=Пн … 6=Вс, None — любой день
+    time_slot = Column(Time)
+    capacity = Column(Integer, nullable=True)  # None — лимит проекта (ProjectSlots.slots_limit)
+
+
+class Holiday(Base):
+    """Праздник или закрытый период: записи на эти даты недоступны"""
+    __tablename__ = 'holidays'
+    id = Column(Integer, primary_key=True)
+    project_name = Column(String, nullable=True, index=True)  # None — для всех проектов
+    date_from = Column(Date)
+    date_to = Column(Date)  # Включительно
+    title = Column(String, nullable=True)
+
+
+class FsmState(Base):
+    """Состояние FSM пользователя (utils/fsm_storage.py)"""
+    __tablename__ = 'fsm_states'
+    key = Column(String, primary_key=True)  # Ключ StorageKey (бот, чат, пользователь, ...)
+    state = Column(String, nullable=True)
+    data = Column(String, default="{}")  # Данные состояния в компактном JSON
+    updated_at = Column(Float, index=True)  # Время последнего изменения (unix time)
+
+
+class ContractReviewItem(Base):
+    """Строка сессии обзора изменений договоров (utils/contract_review.py)"""
+    __tablename__ = 'contract_review_items'
+    __table_args__ = (Index('ix_contract_review_items_session', 'session_id', 'kind', 'position'),)
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # new / minor / review
+    position = Column(Integer, nullable=False)  # Порядковый номер внутри kind
+    payload = Column(String, nullable=False)  # Данные договора из analyze_excel_changes (JSON)
+    actions = Column(String, default="[]")  # Выбранные действия обзора (JSON)
+    created_at = Column(Float, index=True)  # Время создания сессии (unix time)
+
+
 class Staff(Base):
     __tablename__ = 'staff'
     id = Column(Integer, primary_key=True)
@@ -61,4 +112,5 @@ class Booking(Base):
     reminder_day_sent = Column(Boolean, default=False)
     reminder_hour_sent = Column(Boolean, default=False)
     is_cancelled = Column(Boolean, default=False)  # Флаг отмены
+    is_first_booking = Column(Boolean, default=False)  # Первая активная запись договора (поддерживается database/events.py)
     contract = relationship("Contract", back_populates="bookings")
\ No newline at end of file
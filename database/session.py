@@ -2,6 +2,7 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from .models import Base
+from . import events
 
 DATABASE_URL = "sqlite:///./data/bot_data.db"
 
@@ -14,6 +15,9 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Версии данных для кэшей (отчёты и т.п.)
+events.install(SessionLocal)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
     _run_migrations()
@@ -34,7 +38,28 @@ def _run_migrations():
         if 'is_cancelled' not in bookings_columns:
             conn.execute(text("ALTER TABLE bookings ADD COLUMN is_cancelled BOOLEAN DEFAULT 0"))
             conn.commit()
+
+        # Добавляем is_first_booking и заполняем по существующим записям
+        if 'is_first_booking' not in bookings_columns:
+            conn.execute(text("ALTER TABLE bookings ADD COLUMN is_first_booking BOOLEAN DEFAULT 0"))
+            events.refresh_first_bookings(conn)
+            conn.commit()
         
+        # Добавляем ссылки на реестр проектов и регистрируем существующие проекты
+        result = conn.execute(text("PRAGMA table_info(contracts)"))
+        contracts_columns = {row[1] for row in result.fetchall()}
+        result = conn.execute(text("PRAGMA table_info(project_slots)"))
+        project_slots_columns = {row[1] for row in result.fetchall()}
+
+        if contracts_columns and 'project_id' not in contracts_columns:
+            conn.execute(text("ALTER TABLE contracts ADD COLUMN project_id INTEGER REFERENCES projects(id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_contracts_project_id ON contracts (project_id)"))
+        if project_slots_columns and 'project_id' not in project_slots_columns:
+            conn.execute(text("ALTER TABLE project_slots ADD COLUMN project_id INTEGER REFERENCES projects(id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_project_slots_project_id ON project_slots (project_id)"))
+        events.refresh_project_ids(conn)
+        conn.commit()
+
         # Миграция для таблицы user_languages
         result = conn.execute(text("PRAGMA table_info(user_languages)"))
         user_lang_columns = {row[1] for row in result.fetchall()}
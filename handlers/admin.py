@@ -1,14 +1,11 @@
 import logging
 import os
 import asyncio
-from datetime import datetime
 from utils.auth import is_admin, is_staff
-import pandas as pd
 from aiogram import Bot
 from aiogram import Router, F, types
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import FSInputFile
 from sqlalchemy import select
 from database.models import Staff, ProjectSlots
 from aiogram.filters import BaseFilter
@@ -16,12 +13,23 @@ from config import ADMIN_ID
 from database.models import Booking, Contract
 from database.models import Setting
 from database.session import SessionLocal
-from utils.excel_reader import process_excel_file, analyze_excel_changes, apply_contract_changes
+from utils.excel_reader import process_excel_file_async, analyze_excel_changes_async, apply_contract_changes
+from utils.reports import send_report, get_report_projects, resolve_report_project
+from utils import clock, contract_review
+from utils.booking_browser import (
+    build_days_keyboard, build_weeks_keyboard, get_booking_dates_in_week, get_booking_weeks,
+    open_listing, render_page
+)
+from utils.holidays import add_blackout, delete_blackout, list_blackouts, parse_date_range
+from utils.projects import format_projects_list, get_project_names, get_project_summaries
+from utils.slot_templates import delete_template, format_templates, parse_slots, parse_weekday, set_template
 from utils.states import AdminSteps
+from utils.tracing import format_latency_histogram
 from keyboards.reply import (
     get_admin_keyboard, get_staff_management_keyboard, 
     get_slots_management_keyboard, get_cancel_keyboard
 )
+from keyboards.callbacks import ProjectCallback
 from keyboards.inline import generate_houses_kb
 
 router = Router()
@@ -33,7 +41,7 @@ class IsAdminFilter(BaseFilter):
         user_id = event.from_user.id
         result = is_admin(user_id)
         if isinstance(event, types.CallbackQuery):
-            print(f"[IsAdminFilter] callback_query user={user_id}, is_admin={result}, data={event.data}")
+            logging.debug("[IsAdminFilter] callback_query user=%s, is_admin=%s, data=%s", user_id, result, event.data)
         return result
 
 
@@ -175,13 +183,11 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
     # === Установка лимита ===
     elif current_state == AdminSteps.waiting_for_slot_limit:
         # Назад к выбору проекта
-        with SessionLocal() as session:
-            projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-            projects = [h for h in projects if h]
+        projects = get_project_names()
         from aiogram.utils.keyboard import InlineKeyboardBuilder
         builder = InlineKeyboardBuilder()
         for project in projects:
-            builder.button(text=project, callback_data=f"setslot_{project[:40]}")
+            builder.button(text=project, callback_data=ProjectCallback.of("slot", project))
         builder.adjust(1)
         await state.set_state(AdminSteps.selecting_project_for_slots)
         await message.answer(
@@ -192,13 +198,11 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
     # === Установка адреса ===
     elif current_state == AdminSteps.waiting_for_address_ru:
         # Назад к выбору проекта
-        with SessionLocal() as session:
-            projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-            projects = [h for h in projects if h]
+        projects = get_project_names()
         from aiogram.utils.keyboard import InlineKeyboardBuilder
         builder = InlineKeyboardBuilder()
         for project in projects:
-            builder.button(text=project, callback_data=f"setaddr_{project[:40]}")
+            builder.button(text=project, callback_data=ProjectCallback.of("addr", project))
         builder.adjust(1)
         await state.set_state(AdminSteps.selecting_project_for_address)
         await message.answer(
@@ -220,9 +224,7 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
     # === Установка координат ===
     elif current_state == AdminSteps.edit_project_latitude:
         # Назад к выбору проекта
-        with SessionLocal() as session:
-            projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-            projects = [h for h in projects if h]
+        projects = get_project_names()
         await state.update_data(projects_list=projects)
         from aiogram.utils.keyboard import InlineKeyboardBuilder
         builder = InlineKeyboardBuilder()
@@ -248,13 +250,11 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
 
     # === Изменение списка договоров — ожидание Excel ===
     elif current_state == AdminSteps.update_contracts_waiting_excel:
-        with SessionLocal() as session:
-            projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-            projects = [h for h in projects if h]
+        projects = get_project_names()
         from aiogram.utils.keyboard import InlineKeyboardBuilder
         builder = InlineKeyboardBuilder()
         for project in projects:
-            builder.button(text=project, callback_data=f"ucproj_{project[:40]}")
+            builder.button(text=project, callback_data=ProjectCallback.of("uc", project))
         builder.adjust(1)
         await state.set_state(AdminSteps.update_contracts_selecting_project)
         await message.answer(
@@ -275,7 +275,7 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
         )
 
     # === Список записей ===
-    elif current_state == AdminSteps.selecting_project_for_bookings:
+    elif current_state in (AdminSteps.selecting_project_for_bookings, AdminSteps.viewing_bookings):
         await state.clear()
         await message.answer("Главное меню:", reply_markup=get_admin_keyboard())
 
@@ -296,8 +296,7 @@ async def _handle_back_navigation(message: types.Message, state: FSMContext):
         data = await state.get_data()
         project_names = data.get("bk_projects")
         selected_weeks = set(data.get("bk_selected_weeks", []))
-        with SessionLocal() as session:
-            weeks = _get_booking_weeks(session, project_names)
+        weeks = get_booking_weeks(project_names)
         builder = _build_weeks_keyboard(weeks, selected_weeks)
         await state.set_state(AdminSteps.selecting_weeks_for_bookings)
         await message.answer(
@@ -371,6 +370,145 @@ async def cmd_set_slots(message: types.Message):
     except (IndexError, ValueError):
         await message.answer("Использование: /set_slots [число]", reply_markup=get_admin_keyboard())
 
+def _parse_project_args(text: str):
+    """Разбор `/команда <проект|*>; <арг>; ...` → (проект | None, [арг, ...])."""
+    parts = [part.strip() for part in text.split(maxsplit=1)[1].split(";")]
+    if not parts[0]:
+        raise ValueError(text)
+    project_name = None if parts[0] == "*" else parts[0]
+    if project_name is not None and project_name not in get_report_projects():
+        raise LookupError(project_name)
+    return project_name, parts[1:]
+
+
+@router.message(Command("slot_templates"))
+async def cmd_slot_templates(message: types.Message):
+    """Показать шаблоны слотов. `/slot_templates [проект]`"""
+    parts = (message.text or "").split(maxsplit=1)
+    project_name = parts[1].strip() if len(parts) > 1 else None
+    text = format_templates(project_name)
+    if not text:
+        text = "Шаблоны не настроены — используются слоты по умолчанию."
+    await message.answer(f"🕐 Шаблоны слотов:\n{text}", reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("set_template"))
+async def cmd_set_template(message: types.Message):
+    """Задать шаблон слотов: `/set_template <проект|*>; <день|*>; 09:00=2 10:00 ...`"""
+    try:
+        project_name, args = _parse_project_args(message.text)
+        weekday = parse_weekday(args[0])
+        slots = parse_slots(args[1].split())
+    except LookupError as e:
+        return await message.answer(f"❌ Проект «{e.args[0]}» не найден.", reply_markup=get_admin_keyboard())
+    except (IndexError, ValueError):
+        return await message.answer(
+            "Использование: /set_template <проект|*>; <пн…вс|*>; 09:00=2 10:00 …\n"
+            "Без «=N» слот берёт лимит проекта.",
+            reply_markup=get_admin_keyboard()
+        )
+
+    set_template(project_name, weekday, slots)
+    await message.answer(
+        f"✅ Шаблон сохранён:\n{format_templates(project_name)}",
+        reply_markup=get_admin_keyboard()
+    )
+
+
+@router.message(Command("del_template"))
+async def cmd_del_template(message: types.Message):
+    """Удалить шаблон слотов: `/del_template <проект|*>; <день|*>`"""
+    try:
+        project_name, args = _parse_project_args(message.text)
+        weekday = parse_weekday(args[0])
+    except LookupError as e:
+        return await message.answer(f"❌ Проект «{e.args[0]}» не найден.", reply_markup=get_admin_keyboard())
+    except (IndexError, ValueError):
+        return await message.answer("Использование: /del_template <проект|*>; <пн…вс|*>", reply_markup=get_admin_keyboard())
+
+    if delete_template(project_name, weekday):
+        await message.answer("❌ Шаблон удалён.", reply_markup=get_admin_keyboard())
+    else:
+        await message.answer("Такой шаблон не настроен.", reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("blackouts"))
+async def cmd_blackouts(message: types.Message):
+    """Показать праздники и закрытые даты. `/blackouts [проект]`"""
+    parts = (message.text or "").split(maxsplit=1)
+    project_name = parts[1].strip() if len(parts) > 1 else None
+    blackouts = list_blackouts(project_name)
+    if not blackouts:
+        return await message.answer("Закрытых дат нет.", reply_markup=get_admin_keyboard())
+
+    text = "🚫 Праздники и закрытые даты:\n"
+    for holiday in blackouts:
+        period = holiday.date_from.strftime('%d.%m.%Y')
+        if holiday.date_to != holiday.date_from:
+            period += f"–{holiday.date_to.strftime('%d.%m.%Y')}"
+        text += f"• #{holiday.id} {period} — {holiday.project_name or 'все проекты'}"
+        text += f" ({holiday.title})\n" if holiday.title else "\n"
+    await message.answer(text, reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("add_blackout"))
+async def cmd_add_blackout(message: types.Message):
+    """Закрыть даты: `/add_blackout <проект|*>; ДД.ММ.ГГГГ[-ДД.ММ.ГГГГ][; описание]`"""
+    try:
+        project_name, args = _parse_project_args(message.text)
+        date_from, date_to = parse_date_range(args[0])
+    except LookupError as e:
+        return await message.answer(f"❌ Проект «{e.args[0]}» не найден.", reply_markup=get_admin_keyboard())
+    except (IndexError, ValueError):
+        return await message.answer(
+            "Использование: /add_blackout <проект|*>; ДД.ММ.ГГГГ[-ДД.ММ.ГГГГ][; описание]",
+            reply_markup=get_admin_keyboard()
+        )
+
+    title = args[1] if len(args) > 1 and args[1] else None
+    holiday_id = add_blackout(project_name, date_from, date_to, title)
+
+    # Записи, уже сделанные на закрытые даты, остаются — сообщаем администратору
+    with SessionLocal() as session:
+        query = (
+            session.query(Booking)
+            .join(Contract, Booking.contract_id == Contract.id)
+            .filter(
+                Booking.date >= date_from,
+                Booking.date <= date_to,
+                Booking.is_cancelled == False
+            )
+        )
+        if project_name is not None:
+            query = query.filter(Contract.house_name == project_name)
+        affected = query.count()
+
+    text = f"✅ Даты закрыты (#{holiday_id})."
+    if affected:
+        text += f"\n⚠️ На эти даты уже есть активные записи: {affected}. Их нужно перенести вручную."
+    await message.answer(text, reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("del_blackout"))
+async def cmd_del_blackout(message: types.Message):
+    """Открыть даты: `/del_blackout <id>`"""
+    try:
+        holiday_id = int(message.text.split()[1].lstrip("#"))
+    except (IndexError, ValueError):
+        return await message.answer("Использование: /del_blackout [ID]", reply_markup=get_admin_keyboard())
+
+    if delete_blackout(holiday_id):
+        await message.answer(f"❌ Закрытый период #{holiday_id} удалён.", reply_markup=get_admin_keyboard())
+    else:
+        await message.answer("Закрытый период не найден.", reply_markup=get_admin_keyboard())
+
+
+@router.message(Command("latency"))
+async def cmd_latency(message: types.Message):
+    """Гистограмма времени обработки по обработчикам (utils/tracing.py). `/latency`"""
+    await message.answer(format_latency_histogram(), reply_markup=get_admin_keyboard())
+
+
 @router.message(Command("del_staff"))
 async def remove_staff_cmd(message: types.Message):
     try:
@@ -388,60 +526,26 @@ async def remove_staff_cmd(message: types.Message):
 
 @router.message(Command("report"))
 async def export_report(message: types.Message):
-    # Отправляем сообщение о выполнении операции
-    loading_msg = await message.answer("⏳ Ваша операция выполняется, подождите...")
-    
-    try:
-        with SessionLocal() as session:
-            # SQL Join для объединения данных записи и контракта с новыми полями
-            query = (
-                select(
-                    Booking.date.label("Дата визита"),
-                    Booking.time_slot.label("Время"),
-                    Contract.client_fio.label("ФИО Клиента"),
-                    Booking.client_phone.label("Телефон клиента"),
-                    Contract.contract_num.label("Договор"),
-                    Contract.house_name.label("Дом"),
-                    Contract.entrance.label("Подъезд"),
-                    Contract.apt_num.label("Кв")
-                )
-                .join(Contract, Booking.contract_id == Contract.id)
-                .filter(Booking.is_cancelled == False)
-                .order_by(Booking.date.desc(), Booking.time_slot.desc())
-            )
+    """Выгрузить отчет. `/report [проект]` — отчет по одному проекту"""
+    project_name = None
+    parts = (message.text or "").split(maxsplit=1)
+    if parts and parts[0].startswith("/report") and len(parts) > 1:
+        project_name = parts[1].strip()
+        if project_name not in get_report_projects():
+            return await message.answer(f"❌ Проект «{project_name}» не найден.", reply_markup=get_admin_keyboard())
 
-            results = session.execute(query).all()
+    await send_report(message, project_name, reply_markup=get_admin_keyboard())
 
-            if not results:
-                await loading_msg.delete()
-                return await message.answer("Записи в базе данных отсутствуют.", reply_markup=get_admin_keyboard())
 
-            # Преобразование в DataFrame с обновленными колонками
-            df = pd.DataFrame(results, columns=[
-                "Дата визита", "Время", "ФИО Клиента", "Телефон клиента",
-                "Договор", "Дом", "Подъезд", "Кв"
-            ])
+@router.callback_query(ProjectCallback.filter(F.action == "rprt"))
+async def refresh_report(callback: types.CallbackQuery, callback_data: ProjectCallback):
+    """Принудительно пересобрать отчет"""
+    found, project_name = resolve_report_project(callback_data)
+    if not found:
+        return await callback.answer("❌ Проект не найден", show_alert=True)
 
-            # Форматирование времени для Excel
-            df['Время'] = df['Время'].apply(lambda x: x.strftime('%H:%M') if x else "")
-
-            report_path = "data/bookings_report.xlsx"
-            df.to_excel(report_path, index=False)
-
-        # Удаляем сообщение о загрузке
-        await loading_msg.delete()
-        
-        await message.answer_document(
-            FSInputFile(report_path),
-            caption=f"Отчет о записях на {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        )
-        os.remove(report_path)
-    except Exception as e:
-        try:
-            await loading_msg.delete()
-        except:
-            pass
-        await message.answer(f"❌ Ошибка при формировании отчета: {e}", reply_markup=get_admin_keyboard())
+    await callback.answer("🔄 Формирую отчет...")
+    await send_report(callback.message, project_name, force=True, reply_markup=get_admin_keyboard())
 
 
 @router.message(Command("menu"))
@@ -613,36 +717,36 @@ async def slots_management_menu(message: types.Message):
 @router.message(F.text == "📝 Установить лимит для проекта")
 async def start_set_project_slots(message: types.Message, state: FSMContext):
     """Начало установки лимита слотов для проекта"""
-    print("[DEBUG] start_set_project_slots called")
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
-        
-        if not projects:
-            return await message.answer(
-                "❌ В базе нет проектов. Сначала загрузите контракты.",
-                reply_markup=get_admin_keyboard(with_back=True)
-            )
-        
-        # Создаем inline-клавиатуру с проектами
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        builder = InlineKeyboardBuilder()
-        for project in projects:
-            builder.button(text=project, callback_data=f"setslot_{project[:40]}")
-        builder.adjust(1)
-        
-        await state.set_state(AdminSteps.selecting_project_for_slots)
-        await message.answer(
-            "Выберите проект:",
-            reply_markup=builder.as_markup()
+    logging.debug("start_set_project_slots called")
+    projects = get_project_names()
+    
+    if not projects:
+        return await message.answer(
+            "❌ В базе нет проектов. Сначала загрузите контракты.",
+            reply_markup=get_admin_keyboard(with_back=True)
         )
+    
+    # Создаем inline-клавиатуру с проектами
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    builder = InlineKeyboardBuilder()
+    for project in projects:
+        builder.button(text=project, callback_data=ProjectCallback.of("slot", project))
+    builder.adjust(1)
+    
+    await state.set_state(AdminSteps.selecting_project_for_slots)
+    await message.answer(
+        "Выберите проект:",
+        reply_markup=builder.as_markup()
+    )
 
 
-@router.callback_query(F.data.startswith("setslot_"))
-async def project_selected_for_slots(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(ProjectCallback.filter(F.action == "slot"))
+async def project_selected_for_slots(callback: types.CallbackQuery, state: FSMContext, callback_data: ProjectCallback):
     """Обработка выбора проекта для установки лимита"""
-    print(f"[DEBUG] project_selected_for_slots called, data={callback.data}")
-    project_name = callback.data.split("_", 1)[1]
+    logging.debug("project_selected_for_slots called, data=%s", callback.data)
+    project_name = callback_data.project_name
+    if project_name is None:
+        return await callback.answer("❌ Проект не найден", show_alert=True)
     await state.update_data(selected_project=project_name)
     await state.set_state(AdminSteps.waiting_for_slot_limit)
     
@@ -697,37 +801,30 @@ async def process_slot_limit(message: types.Message, state: FSMContext):
 @router.message(F.text == "📊 Текущие настройки проектов")
 async def show_project_settings(message: types.Message):
     """Показать текущие настройки проектов (лимиты, адреса и координаты)"""
-    with SessionLocal() as session:
-        # Получаем все проекты
-        all_projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        all_projects = [h for h in all_projects if h]
-        
-        if not all_projects:
-            return await message.answer("❌ В базе нет проектов.", reply_markup=get_admin_keyboard())
-        
-        # Получаем настроенные лимиты, адреса и координаты
-        project_slots = session.query(ProjectSlots).all()
-        slots_dict = {ps.project_name: ps for ps in project_slots}
-        
-        text = "📊 **Настройки проектов:**\n\n"
-        
-        for project in sorted(all_projects):
-            ps = slots_dict.get(project)
-            limit = ps.slots_limit if ps else "не установлен"
-            address_ru = ps.address_ru if ps and ps.address_ru else "не установлен"
-            
-            # Координаты
-            if ps and ps.latitude and ps.longitude:
-                coords = f"{ps.latitude}, {ps.longitude}"
-            else:
-                coords = "не установлены"
-            
-            text += f"🏘 **{project}**\n"
-            text += f"   └ Лимит: {limit}\n"
-            text += f"   └ Адрес: {address_ru[:40]}{'...' if len(address_ru) > 40 else ''}\n"
-            text += f"   └ Координаты: {coords}\n\n"
-        
-        await message.answer(text, parse_mode="Markdown", reply_markup=get_admin_keyboard())
+    # Проекты вместе с лимитами, адресами и координатами — одним запросом
+    summaries = get_project_summaries()
+
+    if not summaries:
+        return await message.answer("❌ В базе нет проектов.", reply_markup=get_admin_keyboard())
+
+    text = "📊 **Настройки проектов:**\n\n"
+
+    for summary in summaries:
+        limit = summary.slots_limit if summary.slots_limit is not None else "не установлен"
+        address_ru = summary.address_ru or "не установлен"
+
+        # Координаты
+        if summary.latitude and summary.longitude:
+            coords = f"{summary.latitude}, {summary.longitude}"
+        else:
+            coords = "не установлены"
+
+        text += f"🏘 **{summary.name}**\n"
+        text += f"   └ Лимит: {limit}\n"
+        text += f"   └ Адрес: {address_ru[:40]}{'...' if len(address_ru) > 40 else ''}\n"
+        text += f"   └ Координаты: {coords}\n\n"
+
+    await message.answer(text, parse_mode="Markdown", reply_markup=get_admin_keyboard())
 
 
 # ========== УПРАВЛЕНИЕ АДРЕСАМИ ПРОЕКТОВ ==========
@@ -735,34 +832,34 @@ async def show_project_settings(message: types.Message):
 @router.message(F.text == "📍 Установить адрес проекта")
 async def start_set_project_address(message: types.Message, state: FSMContext):
     """Начало установки адреса для проекта"""
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
-        
-        if not projects:
-            return await message.answer(
-                "❌ В базе нет проектов. Сначала загрузите контракты.",
-                reply_markup=get_admin_keyboard(with_back=True)
-            )
-        
-        # Создаем inline-клавиатуру с проектами
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        builder = InlineKeyboardBuilder()
-        for project in projects:
-            builder.button(text=project, callback_data=f"setaddr_{project[:40]}")
-        builder.adjust(1)
-        
-        await state.set_state(AdminSteps.selecting_project_for_address)
-        await message.answer(
-            "Выберите проект для установки адреса:",
-            reply_markup=builder.as_markup()
+    projects = get_project_names()
+    
+    if not projects:
+        return await message.answer(
+            "❌ В базе нет проектов. Сначала загрузите контракты.",
+            reply_markup=get_admin_keyboard(with_back=True)
         )
+    
+    # Создаем inline-клавиатуру с проектами
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    builder = InlineKeyboardBuilder()
+    for project in projects:
+        builder.button(text=project, callback_data=ProjectCallback.of("addr", project))
+    builder.adjust(1)
+    
+    await state.set_state(AdminSteps.selecting_project_for_address)
+    await message.answer(
+        "Выберите проект для установки адреса:",
+        reply_markup=builder.as_markup()
+    )
 
 
-@router.callback_query(F.data.startswith("setaddr_"))
-async def project_selected_for_address(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(ProjectCallback.filter(F.action == "addr"))
+async def project_selected_for_address(callback: types.CallbackQuery, state: FSMContext, callback_data: ProjectCallback):
     """Обработка выбора проекта для установки адреса"""
-    project_name = callback.data.split("_", 1)[1]
+    project_name = callback_data.project_name
+    if project_name is None:
+        return await callback.answer("❌ Проект не найден", show_alert=True)
     await state.update_data(selected_project=project_name)
     await state.set_state(AdminSteps.waiting_for_address_ru)
     
@@ -871,38 +968,36 @@ async def process_address_uz(message: types.Message, state: FSMContext):
 @router.message(F.text == "🗺 Установить координаты проекта")
 async def start_set_project_coordinates(message: types.Message, state: FSMContext):
     """Начало установки координат для проекта"""
-    print(f"[DEBUG] start_set_project_coordinates called, user={message.from_user.id}")
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
-        
-        if not projects:
-            return await message.answer(
-                "❌ В базе нет проектов. Сначала загрузите контракты.",
-                reply_markup=get_admin_keyboard(with_back=True)
-            )
-        
-        # Сохраняем список проектов в state для последующего использования
-        await state.update_data(projects_list=projects)
-        
-        # Создаем inline-клавиатуру с проектами (используем индексы)
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        builder = InlineKeyboardBuilder()
-        for idx, project in enumerate(projects):
-            builder.button(text=project, callback_data=f"coord_{idx}")
-        builder.adjust(1)
-        
-        await state.set_state(AdminSteps.edit_project_select)
-        await message.answer(
-            "Выберите проект для установки координат:",
-            reply_markup=builder.as_markup()
+    logging.debug("start_set_project_coordinates called, user=%s", message.from_user.id)
+    projects = get_project_names()
+    
+    if not projects:
+        return await message.answer(
+            "❌ В базе нет проектов. Сначала загрузите контракты.",
+            reply_markup=get_admin_keyboard(with_back=True)
         )
+    
+    # Сохраняем список проектов в state для последующего использования
+    await state.update_data(projects_list=projects)
+    
+    # Создаем inline-клавиатуру с проектами (используем индексы)
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    builder = InlineKeyboardBuilder()
+    for idx, project in enumerate(projects):
+        builder.button(text=project, callback_data=f"coord_{idx}")
+    builder.adjust(1)
+    
+    await state.set_state(AdminSteps.edit_project_select)
+    await message.answer(
+        "Выберите проект для установки координат:",
+        reply_markup=builder.as_markup()
+    )
 
 
 @router.callback_query(F.data.startswith("coord_"))
 async def project_selected_for_coordinates(callback: types.CallbackQuery, state: FSMContext):
     """Обработка выбора проекта для установки координат"""
-    print(f"[DEBUG] project_selected_for_coordinates called, data={callback.data}")
+    logging.debug("project_selected_for_coordinates called, data=%s", callback.data)
     project_idx = int(callback.data.split("_")[1])
     user_data = await state.get_data()
     projects_list = user_data.get('projects_list', [])
@@ -1040,33 +1135,33 @@ async def process_project_longitude_edit(message: types.Message, state: FSMConte
 @router.message(F.text == "📄 Изменить список договоров")
 async def start_update_contracts(message: types.Message, state: FSMContext):
     """Начало процесса изменения списка договоров"""
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
+    projects = get_project_names()
 
-        if not projects:
-            return await message.answer(
-                "❌ В базе нет проектов. Сначала загрузите контракты.",
-                reply_markup=get_admin_keyboard(with_back=True)
-            )
+    if not projects:
+        return await message.answer(
+            "❌ В базе нет проектов. Сначала загрузите контракты.",
+            reply_markup=get_admin_keyboard(with_back=True)
+        )
 
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        builder = InlineKeyboardBuilder()
-        for project in projects:
-            builder.button(text=project, callback_data=f"ucproj_{project[:40]}")
-        builder.adjust(1)
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    builder = InlineKeyboardBuilder()
+    for project in projects:
+        builder.button(text=project, callback_data=ProjectCallback.of("uc", project))
+    builder.adjust(1)
 
-        await state.set_state(AdminSteps.update_contracts_selecting_project)
-        await message.answer(
-            "📄 Изменение списка договоров\n\nВыберите проект:",
-            reply_markup=builder.as_markup()
-        )
+    await state.set_state(AdminSteps.update_contracts_selecting_project)
+    await message.answer(
+        "📄 Изменение списка договоров\n\nВыберите проект:",
+        reply_markup=builder.as_markup()
+    )
 
 
-@router.callback_query(F.data.startswith("ucproj_"), AdminSteps.update_contracts_selecting_project)
-async def update_contracts_project_selected(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(ProjectCallback.filter(F.action == "uc"), AdminSteps.update_contracts_selecting_project)
+async def update_contracts_project_selected(callback: types.CallbackQuery, state: FSMContext, callback_data: ProjectCallback):
     """Обработка выбора проекта для обновления договоров"""
-    project_name = callback.data.split("_", 1)[1]
+    project_name = callback_data.project_name
+    if project_name is None:
+        return await callback.answer("❌ Проект не найден", show_alert=True)
     await state.update_data(uc_project=project_name)
     await state.set_state(AdminSteps.update_contracts_waiting_excel)
 
@@ -1102,18 +1197,18 @@ async def update_contracts_process_excel(message: types.Message, bot: Bot, state
         file = await bot.get_file(message.document.file_id)
         await bot.download_file(file.file_path, file_path)
 
-        analysis = analyze_excel_changes(file_path, project_name)
+        # Разбор файла — в потоке, сравнение с базой — в цикле событий
+        analysis = await analyze_excel_changes_async(file_path, project_name)
 
         if os.path.exists(file_path):
             os.remove(file_path)
 
         await loading_msg.delete()
 
-        new_count = len(analysis["new_contracts"])
-        upd_count = len(analysis["updated_contracts"])
-        chg_count = len(analysis["changed_contracts"])
+        # Сессия предыдущего файла (возврат к выбору проекта) больше не нужна
+        contract_review.discard_session(data.get("uc_session"))
 
-        if new_count == 0 and upd_count == 0 and chg_count == 0:
+        if not (analysis["new_contracts"] or analysis["updated_contracts"] or analysis["changed_contracts"]):
             await state.clear()
             return await message.answer(
                 f"📄 Анализ файла для проекта **{project_name}**:\n\n"
@@ -1122,52 +1217,16 @@ async def update_contracts_process_excel(message: types.Message, bot: Bot, state
                 reply_markup=get_admin_keyboard()
             )
 
-        # Разделяем updated_contracts: без смены ФИО (minor) и со сменой ФИО (review)
-        minor_updates = [u for u in analysis["updated_contracts"] if "client_fio" not in u["changes"]]
-        fio_updates = [u for u in analysis["updated_contracts"] if "client_fio" in u["changes"]]
-
-        # Формируем список для индивидуального обзора
-        review_contracts = []
-        for item in fio_updates:
-            review_contracts.append({"type": "fio_change", **item})
-        for item in analysis["changed_contracts"]:
-            review_contracts.append({"type": "contract_change", **item})
-
-        minor_count = len(minor_updates)
-        review_count = len(review_contracts)
-
-        # Формируем отчёт
-        text = f"📄 Анализ файла для проекта **{project_name}**:\n\n"
-
-        if new_count > 0:
-            text += f"🆕 Новых квартир: {new_count}\n"
-        if minor_count > 0:
-            text += f"✏️ Обновлённых записей (поля): {minor_count}\n"
-        if review_count > 0:
-            text += f"📋 Договоров для обзора: {review_count}\n"
-            for c in review_contracts[:5]:
-                if c["type"] == "contract_change":
-                    text += f"   • Кв. {c['apt_num']} — {c['old_contract_num']} → {c['new_contract_num']}\n"
-                else:
-                    old_fio = c["changes"]["client_fio"]["old"]
-                    new_fio = c["changes"]["client_fio"]["new"]
-                    text += f"   • Кв. {c['apt_num']} — ФИО: {old_fio} → {new_fio}\n"
-            if review_count > 5:
-                text += f"   ... и ещё {review_count - 5}\n"
-
-        text += "\nВыберите действия:"
-
-        await state.update_data(
-            uc_analysis=analysis,
-            uc_minor_updates=minor_updates,
-            uc_review_contracts=review_contracts,
-            uc_review_decisions={},
-            uc_review_index=0,
-            uc_selected=[]
-        )
+        session_id = contract_review.create_session(analysis)
+        await state.update_data(uc_session=session_id, uc_review_index=0, uc_selected=[])
         await state.set_state(AdminSteps.update_contracts_confirming)
 
-        builder = _build_update_contracts_keyboard(new_count, minor_count, review_count)
+        counts = contract_review.get_counts(session_id)
+        text = _format_analysis_text(project_name, session_id, counts)
+        builder = _build_update_contracts_keyboard(
+            counts[contract_review.KIND_NEW], counts[contract_review.KIND_MINOR],
+            counts[contract_review.KIND_REVIEW]
+        )
         await message.answer(text, parse_mode="Markdown", reply_markup=builder.as_markup())
 
     except Exception as e:
@@ -1227,18 +1286,11 @@ def _build_update_contracts_keyboard(new_count, minor_count, review_count, selec
     return builder
 
 
-async def _show_confirming_screen(callback, state):
-    """Показать экран подтверждения (мультивыбор добавление/обновление)."""
-    data = await state.get_data()
-    analysis = data["uc_analysis"]
-    project_name = data["uc_project"]
-    minor_updates = data.get("uc_minor_updates", [])
-    review_contracts = data.get("uc_review_contracts", [])
-    selected = set(data.get("uc_selected", []))
-
-    new_count = len(analysis["new_contracts"])
-    minor_count = len(minor_updates)
-    review_count = len(review_contracts)
+def _format_analysis_text(project_name, session_id, counts):
+    """Текст экрана подтверждения: количество изменений и первые договоры обзора."""
+    new_count = counts[contract_review.KIND_NEW]
+    minor_count = counts[contract_review.KIND_MINOR]
+    review_count = counts[contract_review.KIND_REVIEW]
 
     text = f"📄 Анализ файла для проекта **{project_name}**:\n\n"
     if new_count > 0:
@@ -1247,7 +1299,7 @@ async def _show_confirming_screen(callback, state):
         text += f"✏️ Обновлённых записей (поля): {minor_count}\n"
     if review_count > 0:
         text += f"📋 Договоров для обзора: {review_count}\n"
-        for c in review_contracts[:5]:
+        for c in contract_review.get_review_items(session_id, limit=5):
             if c["type"] == "contract_change":
                 text += f"   • Кв. {c['apt_num']} — {c['old_contract_num']} → {c['new_contract_num']}\n"
             else:
@@ -1257,8 +1309,21 @@ async def _show_confirming_screen(callback, state):
         if review_count > 5:
             text += f"   ... и ещё {review_count - 5}\n"
     text += "\nВыберите действия:"
+    return text
+
 
-    builder = _build_update_contracts_keyboard(new_count, minor_count, review_count, selected)
+async def _show_confirming_screen(callback, state):
+    """Показать экран подтверждения (мультивыбор добавление/обновление)."""
+    data = await state.get_data()
+    session_id = data["uc_session"]
+    selected = set(data.get("uc_selected", []))
+    counts = contract_review.get_counts(session_id)
+
+    text = _format_analysis_text(data["uc_project"], session_id, counts)
+    builder = _build_update_contracts_keyboard(
+        counts[contract_review.KIND_NEW], counts[contract_review.KIND_MINOR],
+        counts[contract_review.KIND_REVIEW], selected
+    )
     await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=builder.as_markup())
     await callback.answer()
 
@@ -1277,11 +1342,11 @@ async def update_contracts_toggle(callback: types.CallbackQuery, state: FSMConte
 
     await state.update_data(uc_selected=list(selected))
 
-    new_count = len(data["uc_analysis"]["new_contracts"])
-    minor_count = len(data.get("uc_minor_updates", []))
-    review_count = len(data.get("uc_review_contracts", []))
-
-    builder = _build_update_contracts_keyboard(new_count, minor_count, review_count, selected)
+    counts = contract_review.get_counts(data["uc_session"])
+    builder = _build_update_contracts_keyboard(
+        counts[contract_review.KIND_NEW], counts[contract_review.KIND_MINOR],
+        counts[contract_review.KIND_REVIEW], selected
+    )
     await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
     await callback.answer()
 
@@ -1295,14 +1360,12 @@ async def update_contracts_noop(callback: types.CallbackQuery):
 @router.callback_query(F.data == "uc_back", AdminSteps.update_contracts_confirming)
 async def update_contracts_back_to_projects(callback: types.CallbackQuery, state: FSMContext):
     """Назад к выбору проекта"""
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
+    projects = get_project_names()
 
     from aiogram.utils.keyboard import InlineKeyboardBuilder
     builder = InlineKeyboardBuilder()
     for project in projects:
-        builder.button(text=project, callback_data=f"ucproj_{project[:40]}")
+        builder.button(text=project, callback_data=ProjectCallback.of("uc", project))
     builder.adjust(1)
 
     await state.set_state(AdminSteps.update_contracts_selecting_project)
@@ -1313,10 +1376,17 @@ async def update_contracts_back_to_projects(callback: types.CallbackQuery, state
     await callback.answer()
 
 
+async def _clear_review_session(state):
+    """Удалить строки сессии обзора и очистить состояние."""
+    data = await state.get_data()
+    contract_review.discard_session(data.get("uc_session"))
+    await state.clear()
+
+
 @router.callback_query(F.data == "uc_cancel", AdminSteps.update_contracts_confirming)
 async def update_contracts_cancel(callback: types.CallbackQuery, state: FSMContext):
     """Отмена обновления договоров"""
-    await state.clear()
+    await _clear_review_session(state)
     await callback.message.edit_text("❌ Операция отменена.")
     await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
     await callback.answer()
@@ -1325,7 +1395,7 @@ async def update_contracts_cancel(callback: types.CallbackQuery, state: FSMConte
 @router.callback_query(F.data == "uc_cancel", AdminSteps.update_contracts_reviewing)
 async def update_contracts_cancel_review(callback: types.CallbackQuery, state: FSMContext):
     """Отмена обновления на этапе обзора"""
-    await state.clear()
+    await _clear_review_session(state)
     await callback.message.edit_text("❌ Операция отменена.")
     await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
     await callback.answer()
@@ -1335,11 +1405,12 @@ async def update_contracts_cancel_review(callback: types.CallbackQuery, state: F
 async def update_contracts_proceed(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
     """Переход к обзору договоров или применение изменений"""
     data = await state.get_data()
-    review_contracts = data.get("uc_review_contracts", [])
+    session_id = data["uc_session"]
 
-    if review_contracts:
+    if contract_review.get_counts(session_id)[contract_review.KIND_REVIEW]:
         # Переходим к пошаговому обзору договоров
-        await state.update_data(uc_review_index=0, uc_review_decisions={})
+        contract_review.clear_review_actions(session_id)
+        await state.update_data(uc_review_index=0)
         await state.set_state(AdminSteps.update_contracts_reviewing)
         await _show_review_contract(callback, state)
     else:
@@ -1378,18 +1449,17 @@ def _build_review_contract_keyboard(review_contract, selected_actions=None):
 async def _show_review_contract(callback, state):
     """Показать детали текущего договора для обзора."""
     data = await state.get_data()
-    review_contracts = data["uc_review_contracts"]
+    session_id = data["uc_session"]
     index = data.get("uc_review_index", 0)
-    all_actions = data.get("uc_review_decisions", {})
 
-    if index >= len(review_contracts):
+    contract = contract_review.get_review_item(session_id, index)
+    if contract is None:
         # Все договоры просмотрены — показываем итог
         await _show_final_summary(callback, state)
         return
 
-    contract = review_contracts[index]
-    current_actions = set(all_actions.get(str(index), []))
-    total = len(review_contracts)
+    current_actions = set(contract["actions"])
+    total = contract_review.get_counts(session_id)[contract_review.KIND_REVIEW]
 
     text = f"📋 Обзор договоров ({index + 1}/{total})\n\n"
     text += f"🏠 Кв. {contract['apt_num']}\n"
@@ -1430,10 +1500,7 @@ async def update_contracts_review_action(callback: types.CallbackQuery, state: F
     action = callback.data.split("_", 1)[1]
 
     data = await state.get_data()
-    review_contracts = data["uc_review_contracts"]
     index = data.get("uc_review_index", 0)
-    all_actions = data.get("uc_review_decisions", {})
-    current_actions = set(all_actions.get(str(index), []))
 
     if action == "done":
         # Переход к следующему договору
@@ -1452,15 +1519,16 @@ async def update_contracts_review_action(callback: types.CallbackQuery, state: F
         return
 
     # Toggle действия
+    session_id = data["uc_session"]
+    contract = contract_review.get_review_item(session_id, index)
+    current_actions = set(contract["actions"])
     if action in current_actions:
         current_actions.discard(action)
     else:
         current_actions.add(action)
 
-    all_actions[str(index)] = list(current_actions)
-    await state.update_data(uc_review_decisions=all_actions)
+    contract_review.set_review_actions(session_id, index, current_actions)
 
-    contract = review_contracts[index]
     builder = _build_review_contract_keyboard(contract, current_actions)
     await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
     await callback.answer()
@@ -1470,32 +1538,22 @@ async def _show_final_summary(callback, state):
     """Итоговый обзор перед применением всех изменений."""
     data = await state.get_data()
     selected = set(data.get("uc_selected", []))
-    analysis = data["uc_analysis"]
-    minor_updates = data.get("uc_minor_updates", [])
-    review_contracts = data.get("uc_review_contracts", [])
-    all_actions = data.get("uc_review_decisions", {})
+    session_id = data["uc_session"]
+    counts = contract_review.get_counts(session_id)
 
     text = "📊 Итоговый обзор:\n\n"
 
     if "add" in selected:
-        text += f"🆕 Будет добавлено: {len(analysis['new_contracts'])} квартир\n"
+        text += f"🆕 Будет добавлено: {counts[contract_review.KIND_NEW]} квартир\n"
     if "update" in selected:
-        text += f"✏️ Будет обновлено (поля): {len(minor_updates)} записей\n"
+        text += f"✏️ Будет обновлено (поля): {counts[contract_review.KIND_MINOR]} записей\n"
 
     # Считаем статистику по обзору
-    unbind_count = 0
-    cancel_count = 0
-    notify_count = 0
-    update_data_count = len(review_contracts)  # Данные всегда обновляются
-
-    for i in range(len(review_contracts)):
-        actions = set(all_actions.get(str(i), []))
-        if "unbind_tg" in actions:
-            unbind_count += 1
-        if "cancel_bookings" in actions:
-            cancel_count += 1
-        if "notify" in actions:
-            notify_count += 1
+    action_counts = contract_review.count_review_actions(session_id)
+    unbind_count = action_counts["unbind_tg"]
+    cancel_count = action_counts["cancel_bookings"]
+    notify_count = action_counts["notify"]
+    update_data_count = counts[contract_review.KIND_REVIEW]  # Данные всегда обновляются
 
     if update_data_count > 0:
         text += f"📝 Данные договоров обновлено: {update_data_count}\n"
@@ -1533,8 +1591,8 @@ async def update_contracts_noop_final(callback: types.CallbackQuery):
 async def update_contracts_back_to_review(callback: types.CallbackQuery, state: FSMContext):
     """Назад к последнему обзорному договору из итогового экрана"""
     data = await state.get_data()
-    review_contracts = data.get("uc_review_contracts", [])
-    last_index = max(0, len(review_contracts) - 1)
+    review_count = contract_review.get_counts(data["uc_session"])[contract_review.KIND_REVIEW]
+    last_index = max(0, review_count - 1)
     await state.update_data(uc_review_index=last_index)
     await _show_review_contract(callback, state)
 
@@ -1549,24 +1607,23 @@ async def _apply_all_changes(callback, state, bot):
     """Применить все выбранные изменения (и bulk, и per-contract)."""
     data = await state.get_data()
     selected = set(data.get("uc_selected", []))
-    analysis = data["uc_analysis"]
-    minor_updates = data.get("uc_minor_updates", [])
-    review_contracts = data.get("uc_review_contracts", [])
-    all_actions = data.get("uc_review_decisions", {})
+    session_id = data["uc_session"]
 
     await callback.message.edit_text("⏳ Применение изменений...")
 
     try:
-        # Собираем решения по обзору
-        review_decisions_list = []
-        for i, contract in enumerate(review_contracts):
-            actions = set(all_actions.get(str(i), []))
-            review_decisions_list.append({**contract, "actions": list(actions)})
+        # Читаем из сессии только выбранные виды изменений; решения по обзору — всегда
+        kinds = [contract_review.KIND_REVIEW]
+        if "add" in selected:
+            kinds.append(contract_review.KIND_NEW)
+        if "update" in selected:
+            kinds.append(contract_review.KIND_MINOR)
+        changes = contract_review.load_changes(session_id, kinds)
 
         result = apply_contract_changes(
-            new_contracts=analysis["new_contracts"] if "add" in selected else None,
-            minor_updates=minor_updates if "update" in selected else None,
-            review_decisions=review_decisions_list if review_decisions_list else None,
+            new_contracts=changes.get(contract_review.KIND_NEW),
+            minor_updates=changes.get(contract_review.KIND_MINOR),
+            review_decisions=changes[contract_review.KIND_REVIEW] or None,
         )
 
         # Отправляем уведомления клиентам
@@ -1597,13 +1654,13 @@ async def _apply_all_changes(callback, state, bot):
         if notification_count > 0:
             text += f"📨 Уведомлений отправлено: {notification_count}\n"
 
-        await state.clear()
+        await _clear_review_session(state)
         await callback.message.edit_text(text)
         await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
 
     except Exception as e:
         logging.error(f"Ошибка применения изменений: {e}")
-        await state.clear()
+        await _clear_review_session(state)
         await callback.message.edit_text(f"❌ Ошибка при применении изменений: {e}")
         await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
 
@@ -1621,9 +1678,7 @@ async def export_report_button(message: types.Message):
 @router.message(F.text == "📋 Список записей")
 async def show_bookings_list(message: types.Message, state: FSMContext):
     """Показать выбор проекта для просмотра записей (мультивыбор)"""
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = sorted([h for h in projects if h])
+    projects = get_project_names()
 
     if not projects:
         return await message.answer("❌ В базе нет проектов.", reply_markup=get_admin_keyboard())
@@ -1651,7 +1706,7 @@ def _build_projects_keyboard(projects, selected=None):
         label = project
         if project in selected:
             label = "✅ " + label
-        builder.button(text=label, callback_data=f"bkproj_{project[:40]}")
+        builder.button(text=label, callback_data=ProjectCallback.of("bk", project))
     # Нижний ряд
     if selected:
         builder.button(text="✅ Подтвердить выбор", callback_data="bkproj_confirm")
@@ -1663,66 +1718,16 @@ def _build_projects_keyboard(projects, selected=None):
     return builder
 
 
-def _get_booking_weeks(session, project_names=None):
-    """Получить список недель, на которые есть активные записи."""
-    from datetime import date, timedelta
-    today = date.today()
-    query = (
-        session.query(Booking.date)
-        .join(Contract, Booking.contract_id == Contract.id)
-        .filter(Booking.date >= today, Booking.is_cancelled == False)
-    )
-    if project_names:
-        if isinstance(project_names, str):
-            query = query.filter(Contract.house_name == project_names)
-        else:
-            query = query.filter(Contract.house_name.in_(project_names))
-    dates = sorted(set(d[0] for d in query.all()))
-    if not dates:
-        return []
-    # Группируем по неделям (пн–вс)
-    weeks = []
-    seen = set()
-    for d in dates:
-        week_start = d - timedelta(days=d.weekday())  # Понедельник
-        if week_start in seen:
-            continue
-        seen.add(week_start)
-        week_end = week_start + timedelta(days=6)
-        weeks.append((week_start, week_end))
-    return weeks
-
-
 def _build_weeks_keyboard(weeks, selected=None):
     """Построить клавиатуру выбора недель с мультивыбором."""
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    if selected is None:
-        selected = set()
-    builder = InlineKeyboardBuilder()
-    for ws, we in weeks:
-        label = f"{ws.strftime('%d.%m')}-{we.strftime('%d.%m')}"
-        key = ws.isoformat()
-        if key in selected:
-            label = "✅ " + label
-        builder.button(text=label, callback_data=f"bkweek_{key}")
-    # Нижний ряд: подтвердить + пропустить (всегда 2 кнопки)
-    if selected:
-        builder.button(text="✅ Подтвердить выбор", callback_data="bkweek_confirm")
-    else:
-        builder.button(text="▫️ Выберите неделю", callback_data="bkweek_noop")
-    builder.button(text="⏩ Пропустить", callback_data="bkweek_skip")
-    # Кнопки недель по 2, последние 2 — управление (всегда отдельный ряд)
-    week_rows = [2] * (len(weeks) // 2)
-    if len(weeks) % 2:
-        week_rows.append(1)
-    builder.adjust(*week_rows, 2)
-    return builder
+    return build_weeks_keyboard(weeks, selected, prefix="bkweek")
 
 
-@router.callback_query(F.data.startswith("bkproj_"), AdminSteps.selecting_project_for_bookings)
-async def on_project_toggled(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(F.data.in_({"bkproj_noop", "bkproj_skip", "bkproj_confirm"}), AdminSteps.selecting_project_for_bookings)
+@router.callback_query(ProjectCallback.filter(F.action == "bk"), AdminSteps.selecting_project_for_bookings)
+async def on_project_toggled(callback: types.CallbackQuery, state: FSMContext, callback_data: ProjectCallback = None):
     """Мультивыбор проектов: toggle / confirm / skip / noop."""
-    action = callback.data.split("_", 1)[1]
+    action = "toggle" if callback_data is not None else callback.data.split("_", 1)[1]
 
     if action == "noop":
         await callback.answer()
@@ -1744,11 +1749,10 @@ async def on_project_toggled(callback: types.CallbackQuery, state: FSMContext):
         await _proceed_to_weeks(callback, state, project_names=selected_list)
         return
 
-    # Toggle конкретного проекта
-    project_key = action
-    # Находим полное имя проекта по усечённому callback_data
-    matched = [p for p in all_projects if p[:40] == project_key]
-    full_name = matched[0] if matched else project_key
+    # Toggle конкретного проекта (название — по id из реестра)
+    full_name = callback_data.project_name
+    if full_name is None:
+        return await callback.answer("❌ Проект не найден", show_alert=True)
     if full_name in selected:
         selected.discard(full_name)
     else:
@@ -1762,8 +1766,7 @@ async def on_project_toggled(callback: types.CallbackQuery, state: FSMContext):
 
 async def _proceed_to_weeks(callback, state, project_names):
     """После выбора проектов — показать выбор недель."""
-    with SessionLocal() as session:
-        weeks = _get_booking_weeks(session, project_names)
+    weeks = get_booking_weeks(project_names)
 
     if not weeks:
         if project_names:
@@ -1848,8 +1851,7 @@ async def on_week_toggled(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(bk_selected_weeks=list(selected))
 
     # Перерисовываем клавиатуру
-    with SessionLocal() as session:
-        weeks = _get_booking_weeks(session, project_names)
+    weeks = get_booking_weeks(project_names)
     builder = _build_weeks_keyboard(weeks, selected)
     await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
     await callback.answer()
@@ -1857,54 +1859,12 @@ async def on_week_toggled(callback: types.CallbackQuery, state: FSMContext):
 
 def _build_days_keyboard(booking_dates, selected=None):
     """Построить клавиатуру мультивыбора дней."""
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    if selected is None:
-        selected = set()
-    builder = InlineKeyboardBuilder()
-    for d in booking_dates:
-        label = d.strftime('%d.%m.%Y')
-        key = d.isoformat()
-        if key in selected:
-            label = "✅ " + label
-        builder.button(text=label, callback_data=f"bkday_{key}")
-    # Нижний ряд: подтвердить + пропустить (всегда 2 кнопки)
-    if selected:
-        builder.button(text="✅ Подтвердить выбор", callback_data="bkday_confirm")
-    else:
-        builder.button(text="▫️ Выберите день", callback_data="bkday_noop")
-    builder.button(text="⏩ Пропустить (вся неделя)", callback_data="bkday_skip")
-    day_rows = [2] * (len(booking_dates) // 2)
-    if len(booking_dates) % 2:
-        day_rows.append(1)
-    builder.adjust(*day_rows, 2)
-    return builder
-
-
-def _get_booking_dates_in_week(session, week_start, week_end, project_names=None):
-    """Получить даты с записями внутри недели."""
-    from datetime import date as dt_date
-    today = dt_date.today()
-    query = (
-        session.query(Booking.date)
-        .join(Contract, Booking.contract_id == Contract.id)
-        .filter(
-            Booking.date >= max(week_start, today),
-            Booking.date <= week_end,
-            Booking.is_cancelled == False,
-        )
-    )
-    if project_names:
-        if isinstance(project_names, str):
-            query = query.filter(Contract.house_name == project_names)
-        else:
-            query = query.filter(Contract.house_name.in_(project_names))
-    return sorted(set(d[0] for d in query.all()))
+    return build_days_keyboard(booking_dates, selected, prefix="bkday")
 
 
 async def _show_day_selection(callback, state, week_start, week_end, project_names):
     """Показать выбор конкретных дней внутри недели (мультивыбор)."""
-    with SessionLocal() as session:
-        booking_dates = _get_booking_dates_in_week(session, week_start, week_end, project_names)
+    booking_dates = get_booking_dates_in_week(week_start, week_end, project_names)
 
     if not booking_dates:
         await state.update_data(bk_date_from=week_start.isoformat(), bk_date_to=week_end.isoformat())
@@ -1937,8 +1897,7 @@ async def on_day_selected(callback: types.CallbackQuery, state: FSMContext):
         data = await state.get_data()
         project_names = data.get("bk_projects")
         selected_weeks = set(data.get("bk_selected_weeks", []))
-        with SessionLocal() as session:
-            weeks = _get_booking_weeks(session, project_names)
+        weeks = get_booking_weeks(project_names)
         builder = _build_weeks_keyboard(weeks, selected_weeks)
         await state.set_state(AdminSteps.selecting_weeks_for_bookings)
         await callback.message.edit_text(
@@ -1982,204 +1941,77 @@ async def on_day_selected(callback: types.CallbackQuery, state: FSMContext):
         ws = dt_date.fromisoformat(selected_weeks[0])
         we = ws + timedelta(days=6)
     else:
-        ws = dt_date.today()
+        ws = clock.today()
         we = ws + timedelta(days=6)
 
-    with SessionLocal() as session:
-        booking_dates = _get_booking_dates_in_week(session, ws, we, project_names)
+    booking_dates = get_booking_dates_in_week(ws, we, project_names)
     builder = _build_days_keyboard(booking_dates, selected)
     await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
     await callback.answer()
 
 
 async def _show_filtered_bookings(callback: types.CallbackQuery, state: FSMContext):
-    """Показать отфильтрованные записи — по одному сообщению на каждый проект."""
-    from datetime import date as dt_date
-    from collections import defaultdict
-
+    """Показать отфильтрованные записи постранично в одном сообщении."""
     data = await state.get_data()
-    project_names = data.get("bk_projects")  # list или None (все)
-    date_from_str = data.get("bk_date_from")
-    date_to_str = data.get("bk_date_to")
-    bk_dates = data.get("bk_dates")  # Список конкретных дат (ISO)
-    await state.clear()
-
-    with SessionLocal() as session:
-        today = dt_date.today()
-        query = (
-            session.query(Booking, Contract)
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(Booking.is_cancelled == False)
-        )
+    filters = {key: data.get(key) for key in ("bk_projects", "bk_date_from", "bk_date_to", "bk_dates")}
+    project_names = filters["bk_projects"]
 
+    listing = open_listing(filters)
+    if listing is None:
+        await state.clear()
         if project_names:
-            query = query.filter(Contract.house_name.in_(project_names))
-
-        if bk_dates:
-            date_objects = [dt_date.fromisoformat(d) for d in bk_dates]
-            query = query.filter(Booking.date.in_(date_objects), Booking.date >= today)
-        elif date_from_str and date_to_str:
-            date_from = dt_date.fromisoformat(date_from_str)
-            date_to = dt_date.fromisoformat(date_to_str)
-            query = query.filter(Booking.date >= max(date_from, today), Booking.date <= date_to)
+            label = "проектам: **" + ", ".join(project_names) + "**"
         else:
-            query = query.filter(Booking.date >= today)
-
-        bookings = query.all()
-
-        if not bookings:
-            if project_names:
-                label = "проектам: **" + ", ".join(project_names) + "**"
-            else:
-                label = "всем проектам"
-            await callback.message.edit_text(f"📋 По {label} записей не найдено.", parse_mode="Markdown")
-            await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
-            await callback.answer()
-            return
-
-        # Определяем первую (самую раннюю) запись для каждого договора
-        from sqlalchemy import func as sa_func
-        contract_ids = set(contract.id for _, contract in bookings)
-        first_booking_subq = (
-            session.query(
-                Booking.contract_id,
-                sa_func.min(Booking.id).label("first_booking_id")
-            )
-            .filter(Booking.contract_id.in_(contract_ids), Booking.is_cancelled == False)
-            .group_by(Booking.contract_id)
-            .all()
-        )
-        first_booking_ids = {row.first_booking_id for row in first_booking_subq}
-
-        # Группируем по проектам
-        projects_data = defaultdict(list)
-        for booking, contract in bookings:
-            projects_data[contract.house_name].append((booking, contract))
+            label = "всем проектам"
+        await callback.message.edit_text(f"📋 По {label} записей не найдено.", parse_mode="Markdown")
+        await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
+        await callback.answer()
+        return
 
-    # Удаляем исходное сообщение с кнопками
-    try:
-        await callback.message.delete()
-    except:
-        pass
+    await state.set_state(AdminSteps.viewing_bookings)
+    await state.set_data(listing)
+    await _render_bookings_page(callback, state, 0)
 
-    # Отправляем по одному сообщению на каждый проект
-    for project_name in sorted(projects_data.keys()):
-        project_bookings = projects_data[project_name]
-        text = _format_project_bookings(project_name, project_bookings, first_booking_ids)
-        await _send_long_message(callback.message, text)
 
-    await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
+async def _render_bookings_page(callback: types.CallbackQuery, state: FSMContext, page: int):
+    """Загрузить и показать одну страницу списка записей."""
+    data = await state.get_data()
+    text, builder = render_page(data, page, data.get("bk_pages", 1), data.get("bk_project_totals", {}))
+    await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=builder.as_markup())
     await callback.answer()
 
 
-def _pluralize_records(n: int) -> str:
-    """Склонение слова 'запись': 1 запись, 2 записи, 5 записей."""
-    if 11 <= n % 100 <= 19:
-        return "записей"
-    last = n % 10
-    if last == 1:
-        return "запись"
-    if 2 <= last <= 4:
-        return "записи"
-    return "записей"
-
+@router.callback_query(F.data.startswith("bkpage_"), AdminSteps.viewing_bookings)
+async def on_bookings_page(callback: types.CallbackQuery, state: FSMContext):
+    """Переключение страниц списка записей."""
+    action = callback.data.split("_", 1)[1]
 
-def _format_project_bookings(project_name: str, bookings: list, first_booking_ids: set = None) -> str:
-    """Форматирует записи одного проекта.
-    
-    Формат:
-    📋 **Проект**
-    
-    📅 **ДД.ММ** (N записей)
-      🕐 **ЧЧ:ММ** (M)
-        Подъезд X, этаж Y, кв. Z — Договор
-    
-    Итого: K записей
-    """
-    from collections import defaultdict
-    if first_booking_ids is None:
-        first_booking_ids = set()
-
-    total_count = len(bookings)
-
-    # Группируем: дата → время → список записей
-    dates_dict = defaultdict(lambda: defaultdict(list))
-    for booking, contract in bookings:
-        dates_dict[booking.date][booking.time_slot].append((booking, contract))
-
-    text = f"📋 **{project_name}**\n"
-
-    for bk_date in sorted(dates_dict.keys()):
-        time_slots = dates_dict[bk_date]
-        day_count = sum(len(items) for items in time_slots.values())
-        text += f"\n📅 **{bk_date.strftime('%d.%m.%Y')}** ( {day_count} {_pluralize_records(day_count)} )\n"
-
-        for time_slot in sorted(time_slots.keys()):
-            items = time_slots[time_slot]
-            slot_count = len(items)
-            text += f"  🕐 **{time_slot.strftime('%H:%M')}** ( {slot_count} {_pluralize_records(slot_count)} )\n"
-
-            # Сортируем по подъезду, этажу, квартире
-            def _sort_key(item):
-                _, c = item
-                try:
-                    entrance = int(c.entrance) if c.entrance else 0
-                except (ValueError, TypeError):
-                    entrance = 0
-                floor = c.floor if c.floor is not None else 0
-                try:
-                    apt = int(c.apt_num) if c.apt_num else 0
-                except (ValueError, TypeError):
-                    apt = 0
-                return (entrance, floor, apt)
-
-            for booking, contract in sorted(items, key=_sort_key):
-                entrance_str = f"подъезд {contract.entrance}" if contract.entrance else "—"
-                floor_str = f"этаж {contract.floor}" if contract.floor is not None else "—"
-                apt_str = f"кв. {contract.apt_num}" if contract.apt_num else "—"
-                repeat_str = " _(повторная)_" if booking.id not in first_booking_ids else ""
-                text += f"    {entrance_str}, {floor_str}, {apt_str} — {contract.contract_num}{repeat_str}\n"
-
-    text += f"\n📊 Итого по проекту: **{total_count}** записей\n"
-    return text
+    if action == "noop":
+        await callback.answer()
+        return
 
+    if action == "close":
+        await state.clear()
+        try:
+            await callback.message.delete()
+        except:
+            pass
+        await callback.message.answer("Главное меню:", reply_markup=get_admin_keyboard())
+        await callback.answer()
+        return
 
-async def _send_long_message(message, text: str, max_len: int = 4000):
-    """Отправить длинное сообщение, разбив на части при необходимости."""
-    if len(text) <= max_len:
-        await message.answer(text, parse_mode="Markdown")
-    else:
-        parts = []
-        current_part = ""
-        for line in text.split("\n"):
-            if len(current_part) + len(line) + 1 > max_len:
-                parts.append(current_part)
-                current_part = line + "\n"
-            else:
-                current_part += line + "\n"
-        if current_part.strip():
-            parts.append(current_part)
-        for part in parts:
-            await message.answer(part, parse_mode="Markdown")
+    await _render_bookings_page(callback, state, int(action))
 
 
 @router.message(F.text == "🏠 Список проектов")
 async def show_projects_list(message: types.Message):
     """Показать список всех проектов"""
-    with SessionLocal() as session:
-        projects = session.execute(select(Contract.house_name).distinct()).scalars().all()
-        projects = [h for h in projects if h]
-        
-        if not projects:
-            return await message.answer("❌ В базе нет проектов.", reply_markup=get_admin_keyboard())
-        
-        text = "🏠 **Список проектов:**\n\n"
-        for idx, project in enumerate(sorted(projects), 1):
-            # Считаем количество контрактов
-            count = session.query(Contract).filter_by(house_name=project).count()
-            text += f"{idx}. **{project}** — {count} договоров\n"
-        
-        await message.answer(text, parse_mode="Markdown", reply_markup=get_admin_keyboard())
+    summaries = get_project_summaries()
+
+    if not summaries:
+        return await message.answer("❌ В базе нет проектов.", reply_markup=get_admin_keyboard())
+
+    await message.answer(format_projects_list(summaries), parse_mode="Markdown", reply_markup=get_admin_keyboard())
 
 
 # ==================== ДОБАВЛЕНИЕ НОВОГО ПРОЕКТА ====================
@@ -2367,8 +2199,8 @@ async def process_project_excel(message: types.Message, bot: Bot, state: FSMCont
         file = await bot.get_file(message.document.file_id)
         await bot.download_file(file.file_path, file_path)
         
-        # Обрабатываем файл с новыми параметрами
-        count, project_name = process_excel_file(
+        # Обрабатываем файл с новыми параметрами (разбор — в потоке, запись в базу — в цикле событий)
+        count, project_name = await process_excel_file_async(
             file_path, 
             address_ru=address_ru, 
             address_uz=address_uz, 
@@ -12,8 +12,14 @@ from sqlalchemy import func, or_
 from config import ADMIN_ID, DKS_CONTACTS
 from database.models import Booking, Setting, Contract, Staff, ProjectSlots
 from database.session import SessionLocal
-from keyboards.inline import generate_time_slots, generate_calendar, get_min_booking_date, get_fully_booked_dates, SLOTS_PER_DAY
+from keyboards.callbacks import DateCallback, MonthCallback, RebookCallback, TimeCallback
+from keyboards.inline import generate_time_slots, generate_calendar, get_min_booking_date, CUTOFF_HOUR
 from keyboards.reply import get_phone_request_keyboard, get_client_keyboard, BUTTON_TEXTS
+from utils import clock
+from utils.holidays import is_working_day
+from utils.metrics import BOOKING_EVENTS, NOTIFICATION_FANOUT
+from utils.occupancy import get_fully_booked_dates, get_slot_counts
+from utils.slot_templates import get_day_slots, get_slot_capacity
 from utils.states import ClientSteps
 from utils.language import get_user_language, toggle_language, get_message, get_user_phone, set_user_phone
 
@@ -59,6 +65,16 @@ def get_project_coordinates(project_name: str) -> tuple[float, float] | None:
     return None
 
 
+async def _send_to_staff(bot: Bot, recipients, text: str, kind: str):
+    """Фоновая рассылка уведомления сотрудникам (время — метрика NOTIFICATION_FANOUT)."""
+    with NOTIFICATION_FANOUT.labels(kind=kind).time():
+        for emp_id in recipients:
+            try:
+                await bot.send_message(chat_id=emp_id, text=text, parse_mode="Markdown")
+            except Exception as e:
+                logging.error(f"Ошибка уведомления {emp_id}: {e}")
+
+
 def validate_phone_number(phone: str) -> tuple[bool, str]:
     """
     Валидация номера телефона.
@@ -111,18 +127,63 @@ def get_project_slot_limit(session, project_name: str) -> int:
     return 1
 
 
-def get_min_cancellation_date() -> date:
+def get_user_active_bookings(session, user_id: int, house_name: str = None) -> list:
+    """
+    Активные (не отменённые, сегодня и позже) записи пользователя вместе
+    с договорами — одним запросом.
+
+    Запись принадлежит пользователю, если он её создал (user_telegram_id)
+    или привязан к договору (contract.telegram_id — для старых записей).
+
+    Args:
+        session: SQLAlchemy сессия
+        user_id: Telegram ID пользователя
+        house_name: Только записи этого ЖК (None — все)
+
+    Returns:
+        list: [(Booking, Contract), ...] по дате и времени
+    """
+    query = (
+        session.query(Booking, Contract)
+        .join(Contract, Booking.contract_id == Contract.id)
+        .filter(
+            or_(
+                Booking.user_telegram_id == user_id,
+                Contract.telegram_id == user_id
+            ),
+            Booking.date >= clock.today(),
+            Booking.is_cancelled == False
+        )
+    )
+    if house_name is not None:
+        query = query.filter(Contract.house_name == house_name)
+    return query.order_by(Booking.date, Booking.time_slot).all()
+
+
+def get_booking_with_contract(session, booking_id: int) -> tuple:
+    """Запись и её договор одним запросом: (Booking, Contract) или (None, None)."""
+    row = (
+        session.query(Booking, Contract)
+        .outerjoin(Contract, Booking.contract_id == Contract.id)
+        .filter(Booking.id == booking_id)
+        .first()
+    )
+    return row if row is not None else (None, None)
+
+
+def get_min_cancellation_date(project_name: str = None) -> date:
     """
     Рассчитывает минимальную дату для отмены записи (аналогично записи):
     - До 12:00 — следующий рабочий день
     - После 12:00 — через один рабочий день
+    Праздники и закрытые даты проекта рабочими днями не считаются.
     """
-    return get_min_booking_date()
+    return get_min_booking_date(project_name)
 
 
-def can_cancel_booking(booking_date: date) -> bool:
+def can_cancel_booking(booking_date: date, project_name: str = None) -> bool:
     """Проверяет, можно ли отменить запись на указанную дату"""
-    min_date = get_min_cancellation_date()
+    min_date = get_min_cancellation_date(project_name)
     return booking_date >= min_date
 
 
@@ -150,21 +211,7 @@ async def cancel_booking_button(message: types.Message, state: FSMContext):
     
     with SessionLocal() as session:
         # Получаем активные записи пользователя (по user_telegram_id или contract.telegram_id)
-        today = date.today()
-        bookings = (
-            session.query(Booking, Contract)
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                or_(
-                    Booking.user_telegram_id == user_id,
-                    Contract.telegram_id == user_id
-                ),
-                Booking.date >= today,
-                Booking.is_cancelled == False
-            )
-            .order_by(Booking.date, Booking.time_slot)
-            .all()
-        )
+        bookings = get_user_active_bookings(session, user_id)
         
         if not bookings:
             await message.answer(
@@ -183,7 +230,7 @@ async def cancel_booking_button(message: types.Message, state: FSMContext):
             text_lines = ["📋 **Ваши записи:**\n"]
         
         for idx, (booking, contract) in enumerate(bookings, 1):
-            can_cancel = can_cancel_booking(booking.date)
+            can_cancel = can_cancel_booking(booking.date, contract.house_name)
             date_str = booking.date.strftime('%d.%m.%Y')
             time_str = booking.time_slot.strftime('%H:%M')
             
@@ -227,22 +274,8 @@ async def my_bookings_button(message: types.Message, state: FSMContext):
     lang = get_user_language(user_id)
     
     with SessionLocal() as session:
-        today = date.today()
         # Ищем записи пользователя по user_telegram_id ИЛИ по contract.telegram_id (для старых записей)
-        bookings = (
-            session.query(Booking, Contract)
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                or_(
-                    Booking.user_telegram_id == user_id,
-                    Contract.telegram_id == user_id
-                ),
-                Booking.date >= today,
-                Booking.is_cancelled == False
-            )
-            .order_by(Booking.date, Booking.time_slot)
-            .all()
-        )
+        bookings = get_user_active_bookings(session, user_id)
         
         if not bookings:
             await message.answer(
@@ -302,24 +335,10 @@ async def view_calendar_button(message: types.Message, state: FSMContext):
     await state.clear()
     user_id = message.from_user.id
     lang = get_user_language(user_id)
-    today = date.today()
 
     with SessionLocal() as session:
         # Ищем активные (не отменённые, будущие) записи пользователя
-        active_bookings = (
-            session.query(Booking)
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                or_(
-                    Booking.user_telegram_id == user_id,
-                    Contract.telegram_id == user_id
-                ),
-                Booking.date >= today,
-                Booking.is_cancelled == False
-            )
-            .order_by(Booking.date, Booking.time_slot)
-            .all()
-        )
+        active_bookings = get_user_active_bookings(session, user_id)
 
         if not active_bookings:
             await message.answer(
@@ -330,18 +349,16 @@ async def view_calendar_button(message: types.Message, state: FSMContext):
 
         if len(active_bookings) == 1:
             # Одна запись — сразу показываем календарь для перезаписи
-            booking = active_bookings[0]
-            contract = session.query(Contract).filter(Contract.id == booking.contract_id).first()
+            booking, contract = active_bookings[0]
             await _show_calendar_for_house(message, state, user_id, lang, contract.house_name, contract, session)
         else:
             # Несколько записей — даём выбор
             builder = InlineKeyboardBuilder()
-            for b in active_bookings:
-                contract = session.query(Contract).filter(Contract.id == b.contract_id).first()
+            for b, contract in active_bookings:
                 date_str = b.date.strftime('%d.%m.%Y')
                 time_str = b.time_slot.strftime('%H:%M')
-                house = contract.house_name if contract else '?'
-                apt = contract.apt_num if contract else '?'
+                house = contract.house_name
+                apt = contract.apt_num
                 if lang == 'uz':
                     label = f"📅 {date_str} {time_str} | {house}, kv. {apt}"
                 else:
@@ -358,8 +375,7 @@ async def view_calendar_button(message: types.Message, state: FSMContext):
 async def _show_calendar_for_house(message_or_callback, state: FSMContext, user_id: int, lang: str,
                                     house_name: str, contract, session):
     """Показать календарь для конкретного ЖК"""
-    today = date.today()
-    min_booking_dt = get_min_booking_date()
+    min_booking_dt = get_min_booking_date(house_name)
 
     # Берём delivery_date контракта если она позже
     if contract.delivery_date and contract.delivery_date > min_booking_dt:
@@ -369,34 +385,18 @@ async def _show_calendar_for_house(message_or_callback, state: FSMContext, user_
     slots_limit = get_project_slot_limit(session, house_name)
 
     # Проверяем наличие активной записи
-    active_booking = (
-        session.query(Booking)
-        .filter(
-            or_(
-                Booking.user_telegram_id == user_id,
-                Booking.contract_id.in_(
-                    session.query(Contract.id).filter(Contract.telegram_id == user_id)
-                )
-            ),
-            Booking.date >= today,
-            Booking.is_cancelled == False
-        )
-        .join(Contract, Booking.contract_id == Contract.id)
-        .filter(Contract.house_name == house_name)
-        .order_by(Booking.date)
-        .first()
-    )
+    active_bookings = get_user_active_bookings(session, user_id, house_name)
 
     active_booking_date = None
     active_booking_id = None
     active_booking_time = None
     active_contract_apt = None
-    if active_booking:
+    if active_bookings:
+        active_booking, active_contract = active_bookings[0]
         active_booking_date = active_booking.date.isoformat()
         active_booking_id = active_booking.id
         active_booking_time = active_booking.time_slot.strftime('%H:%M')
-        active_contract = session.query(Contract).filter(Contract.id == active_booking.contract_id).first()
-        active_contract_apt = active_contract.apt_num if active_contract else ''
+        active_contract_apt = active_contract.apt_num
 
     await state.update_data(
         cal_house_name=house_name,
@@ -411,16 +411,14 @@ async def _show_calendar_for_house(message_or_callback, state: FSMContext, user_
         cal_active_contract_apt=active_contract_apt,
     )
 
-    # Определяем период для проверки занятых дат
-    start_date = min_booking_dt
-    end_date = today + timedelta(days=90)
-    fully_booked = get_fully_booked_dates(session, start_date, end_date, slots_limit, house_name)
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
 
     markup = generate_calendar(
         min_date=min_booking_dt,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=lang
+        lang=lang,
+        project_name=house_name
     )
 
     await state.set_state(ClientSteps.calendar_viewing)
@@ -442,12 +440,11 @@ async def calendar_booking_selected(callback: types.CallbackQuery, state: FSMCon
     lang = get_user_language(user_id)
 
     with SessionLocal() as session:
-        booking = session.query(Booking).filter(Booking.id == booking_id).first()
+        booking, contract = get_booking_with_contract(session, booking_id)
         if not booking:
             await callback.answer("Запись не найдена", show_alert=True)
             return
 
-        contract = session.query(Contract).filter(Contract.id == booking.contract_id).first()
         if not contract:
             await callback.answer("Договор не найден", show_alert=True)
             return
@@ -455,12 +452,11 @@ async def calendar_booking_selected(callback: types.CallbackQuery, state: FSMCon
         await _show_calendar_for_house(callback, state, user_id, lang, contract.house_name, contract, session)
 
 
-@router.callback_query(F.data.startswith("cal_"), ClientSteps.calendar_viewing)
-async def calendar_view_navigation(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(MonthCallback.filter(), ClientSteps.calendar_viewing)
+async def calendar_view_navigation(callback: types.CallbackQuery, state: FSMContext, callback_data: MonthCallback):
     """Навигация по месяцам в режиме просмотра календаря"""
-    parts = callback.data.split("_")
-    year = int(parts[1])
-    month = int(parts[2])
+    year = callback_data.year
+    month = callback_data.month
 
     user_data = await state.get_data()
     delivery_date_str = user_data.get('cal_delivery_date')
@@ -473,12 +469,7 @@ async def calendar_view_navigation(callback: types.CallbackQuery, state: FSMCont
     else:
         delivery_date = None
 
-    import calendar as cal_module
-    first_day = date(year, month, 1)
-    last_day = date(year, month, cal_module.monthrange(year, month)[1])
-
-    with SessionLocal() as session:
-        fully_booked = get_fully_booked_dates(session, first_day, last_day, slots_limit, house_name)
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
 
     user_id = callback.from_user.id
     lang = get_user_language(user_id)
@@ -489,7 +480,8 @@ async def calendar_view_navigation(callback: types.CallbackQuery, state: FSMCont
         min_date=delivery_date,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=lang
+        lang=lang,
+        project_name=house_name
     )
 
     await callback.message.edit_reply_markup(reply_markup=new_calendar)
@@ -505,32 +497,31 @@ async def calendar_view_date_full(callback: types.CallbackQuery):
     )
 
 
-@router.callback_query(F.data.startswith("date_"), ClientSteps.calendar_viewing)
-async def calendar_view_date_selected(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(DateCallback.filter(), ClientSteps.calendar_viewing)
+async def calendar_view_date_selected(callback: types.CallbackQuery, state: FSMContext, callback_data: DateCallback):
     """Выбор даты в режиме просмотра календаря"""
-    selected_date_str = callback.data.split("_")[1]
-    selected_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
+    selected_date = callback_data.booking_date
+    selected_date_str = selected_date.isoformat()
 
-    min_booking_date = get_min_booking_date()
+    user_data = await state.get_data()
+    house_name = user_data.get('cal_house_name')
+    min_booking_date = get_min_booking_date(house_name)
 
     if selected_date < min_booking_date:
-        now = datetime.now()
-        if now.hour < 12:
+        if clock.now().hour < CUTOFF_HOUR:
             hint = "Запись возможна на следующий рабочий день или позже."
         else:
             hint = "После 12:00 запись возможна только через один рабочий день."
         await callback.answer(f"⚠️ Выбранная дата недоступна.\n{hint}", show_alert=True)
         return
 
-    if selected_date.weekday() >= 5:
-        await callback.answer("⚠️ Запись доступна только в рабочие дни (пн-пт).", show_alert=True)
+    if not is_working_day(selected_date, house_name):
+        await callback.answer("⚠️ Запись доступна только в рабочие дни (пн-пт, кроме праздников).", show_alert=True)
         return
 
-    user_data = await state.get_data()
     user_id = callback.from_user.id
     lang = get_user_language(user_id)
 
-    house_name = user_data.get('cal_house_name')
     contract_id = user_data.get('cal_contract_id')
     slots_limit = user_data.get('cal_slots_limit', 1)
 
@@ -548,23 +539,13 @@ async def _show_time_slots_for_calendar(callback, state, selected_date_str, sele
             await callback.answer("Ошибка: данные договора не найдены.", show_alert=True)
             return
 
-        bookings = (
-            session.query(Booking.time_slot, func.count(Booking.id))
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                Booking.date == selected_date,
-                Contract.house_name == house_name,
-                Booking.is_cancelled == False
-            )
-            .group_by(Booking.time_slot)
-            .all()
-        )
-        booked_dict = {row[0]: row[1] for row in bookings}
+    booked_dict = get_slot_counts(house_name, selected_date)
 
     await state.update_data(cal_selected_date=selected_date_str)
     await state.set_state(ClientSteps.calendar_selecting_time)
 
-    time_kb = generate_time_slots(selected_date_str, booked_dict, slots_limit, lang)
+    day_slots = get_day_slots(house_name, selected_date.weekday(), slots_limit)
+    time_kb = generate_time_slots(selected_date_str, booked_dict, slots_limit, lang, slots=day_slots)
 
     sel_date_fmt = selected_date.strftime('%d.%m.%Y')
     delivery_date_str = (await state.get_data()).get('cal_delivery_date', '')
@@ -597,32 +578,30 @@ async def rebook_declined(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("rebook_yes_"), ClientSteps.calendar_rebook_confirming)
-async def rebook_accepted(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
+@router.callback_query(RebookCallback.filter(), ClientSteps.calendar_rebook_confirming)
+async def rebook_accepted(callback: types.CallbackQuery, state: FSMContext, bot: Bot, callback_data: RebookCallback):
     """Пользователь согласился на перезапись — отменяем старую и показываем выбор договора"""
     user_id = callback.from_user.id
     lang = get_user_language(user_id)
     user_data = await state.get_data()
 
     active_booking_id = user_data.get('cal_active_booking_id')
-    # callback_data: rebook_yes_YYYY-MM-DD_HH:MM
-    parts = callback.data.split("_", 3)  # ['rebook', 'yes', 'YYYY-MM-DD', 'HH:MM']
-    selected_date_str = parts[2]
-    selected_time_str = parts[3]
-    selected_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
+    selected_date = callback_data.booking_date
+    selected_date_str = selected_date.isoformat()
+    selected_time_str = callback_data.slot_time.strftime('%H:%M')
     house_name = user_data.get('cal_house_name')
 
     with SessionLocal() as session:
         # Отменяем текущую запись
-        old_booking = session.query(Booking).filter(Booking.id == active_booking_id).first()
+        old_booking, old_contract = get_booking_with_contract(session, active_booking_id)
         if old_booking:
             old_booking.is_cancelled = True
-            old_contract = session.query(Contract).filter(Contract.id == old_booking.contract_id).first()
 
             old_date_str = old_booking.date.strftime('%d.%m.%Y')
             old_time_str = old_booking.time_slot.strftime('%H:%M')
 
             session.commit()
+            BOOKING_EVENTS.labels(project=house_name or "", event="rebooked").inc()
 
             # Уведомляем сотрудников об отмене
             notification_text = (
@@ -638,14 +617,7 @@ async def rebook_accepted(callback: types.CallbackQuery, state: FSMContext, bot:
             if ADMIN_ID not in recipients:
                 recipients.append(ADMIN_ID)
 
-            async def send_rebook_notifications():
-                for emp_id in recipients:
-                    try:
-                        await bot.send_message(chat_id=emp_id, text=notification_text, parse_mode="Markdown")
-                    except Exception as e:
-                        logging.error(f"Ошибка уведомления {emp_id}: {e}")
-
-            asyncio.create_task(send_rebook_notifications())
+            asyncio.create_task(_send_to_staff(bot, recipients, notification_text, "rebook"))
 
     # Обновляем данные — активной записи больше нет
     await state.update_data(
@@ -675,12 +647,7 @@ async def calendar_view_back_to_calendar(callback: types.CallbackQuery, state: F
     else:
         delivery_date = None
 
-    today = date.today()
-    start_date = delivery_date if delivery_date else today
-    end_date = today + timedelta(days=90)
-
-    with SessionLocal() as session:
-        fully_booked = get_fully_booked_dates(session, start_date, end_date, slots_limit, house_name)
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
 
     user_id = callback.from_user.id
     lang = get_user_language(user_id)
@@ -689,7 +656,8 @@ async def calendar_view_back_to_calendar(callback: types.CallbackQuery, state: F
         min_date=delivery_date,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=lang
+        lang=lang,
+        project_name=house_name
     )
 
     await state.set_state(ClientSteps.calendar_viewing)
@@ -700,15 +668,13 @@ async def calendar_view_back_to_calendar(callback: types.CallbackQuery, state: F
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("time_"), ClientSteps.calendar_selecting_time)
-async def calendar_view_time_selected(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(TimeCallback.filter(), ClientSteps.calendar_selecting_time)
+async def calendar_view_time_selected(callback: types.CallbackQuery, state: FSMContext, callback_data: TimeCallback):
     """Выбор времени в режиме просмотра календаря"""
-    parts = callback.data.split("_")
-    date_str = parts[1]
-    time_str = parts[2]
-
-    selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    selected_time = datetime.strptime(time_str, '%H:%M').time()
+    selected_date = callback_data.booking_date
+    selected_time = callback_data.slot_time
+    date_str = selected_date.isoformat()
+    time_str = selected_time.strftime('%H:%M')
 
     user_data = await state.get_data()
     slots_limit = user_data.get('cal_slots_limit', 1)
@@ -729,7 +695,9 @@ async def calendar_view_time_selected(callback: types.CallbackQuery, state: FSMC
             .count()
         )
 
-        if current_bookings >= slots_limit:
+        # Вместимость слота по шаблону проекта (0 — слота нет в шаблоне дня)
+        capacity = get_slot_capacity(house_name, selected_date, selected_time, slots_limit, session)
+        if current_bookings >= capacity:
             await callback.answer("Извините, это время только что заняли.", show_alert=True)
             return
 
@@ -748,7 +716,7 @@ async def calendar_view_time_selected(callback: types.CallbackQuery, state: FSMC
         builder = InlineKeyboardBuilder()
         builder.button(
             text=get_message('rebook_confirm_yes', lang),
-            callback_data=f"rebook_yes_{date_str}_{time_str}"
+            callback_data=RebookCallback.of(selected_date, selected_time)
         )
         builder.button(
             text=get_message('rebook_confirm_no', lang),
@@ -785,7 +753,7 @@ async def _show_phone_entry(callback, state: FSMContext, user_id: int, lang: str
         builder = InlineKeyboardBuilder()
         builder.button(
             text=get_message('use_saved_phone', lang, phone=saved_phone),
-            callback_data=f"calphone_{saved_phone}"
+            callback_data="calphone"
         )
         builder.button(
             text=get_message('enter_new_phone', lang),
@@ -807,10 +775,12 @@ async def _show_phone_entry(callback, state: FSMContext, user_id: int, lang: str
         await callback.message.delete()
 
 
-@router.callback_query(F.data.startswith("calphone_"), ClientSteps.calendar_entering_phone)
+@router.callback_query(F.data == "calphone", ClientSteps.calendar_entering_phone)
 async def calendar_use_saved_phone(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
     """Использовать сохранённый номер в режиме календаря"""
-    saved_phone = callback.data.replace("calphone_", "")
+    saved_phone = get_user_phone(callback.from_user.id)
+    if not saved_phone:
+        return await calendar_enter_new_phone(callback, state)
     await callback.message.delete()
     await _process_calendar_booking(callback, state, bot, saved_phone, is_callback=True)
     await callback.answer()
@@ -885,26 +855,11 @@ async def _process_calendar_booking(source, state: FSMContext, bot: Bot, user_ph
             contract.telegram_id = user_id
 
         # Отменяем все активные записи пользователя на этот ЖК перед созданием новой
-        today = date.today()
-        active_bookings = (
-            session.query(Booking)
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                or_(
-                    Booking.user_telegram_id == user_id,
-                    Contract.telegram_id == user_id
-                ),
-                Contract.house_name == house_name,
-                Booking.date >= today,
-                Booking.is_cancelled == False
-            )
-            .all()
-        )
+        active_bookings = get_user_active_bookings(session, user_id, house_name)
         
         cancelled_info = []
-        for old_booking in active_bookings:
+        for old_booking, old_contract in active_bookings:
             old_booking.is_cancelled = True
-            old_contract = session.query(Contract).filter(Contract.id == old_booking.contract_id).first()
             cancelled_info.append({
                 'date': old_booking.date.strftime('%d.%m.%Y'),
                 'time': old_booking.time_slot.strftime('%H:%M'),
@@ -920,6 +875,9 @@ async def _process_calendar_booking(source, state: FSMContext, bot: Bot, user_ph
         )
         session.add(new_booking)
         session.commit()
+        BOOKING_EVENTS.labels(project=house_name, event="booked").inc()
+        if cancelled_info:
+            BOOKING_EVENTS.labels(project=house_name, event="rebooked").inc(len(cancelled_info))
 
         # Уведомляем сотрудников об отменённых записях
         if cancelled_info:
@@ -937,14 +895,7 @@ async def _process_calendar_booking(source, state: FSMContext, bot: Bot, user_ph
                 if ADMIN_ID not in recipients:
                     recipients.append(ADMIN_ID)
 
-                async def _send_cancel(text=cancel_notification, recips=list(recipients)):
-                    for emp_id in recips:
-                        try:
-                            await bot.send_message(chat_id=emp_id, text=text, parse_mode="Markdown")
-                        except Exception as e:
-                            logging.error(f"Ошибка уведомления {emp_id}: {e}")
-
-                asyncio.create_task(_send_cancel())
+                asyncio.create_task(_send_to_staff(bot, list(recipients), cancel_notification, "rebook"))
 
         notification_text = (
             f"🔔 **Новая запись на прием!**\n\n"
@@ -959,14 +910,7 @@ async def _process_calendar_booking(source, state: FSMContext, bot: Bot, user_ph
         if ADMIN_ID not in recipients:
             recipients.append(ADMIN_ID)
 
-        async def send_booking_notifications():
-            for emp_id in recipients:
-                try:
-                    await bot.send_message(chat_id=emp_id, text=notification_text, parse_mode="Markdown")
-                except Exception as e:
-                    logging.error(f"Ошибка уведомления {emp_id}: {e}")
-
-        asyncio.create_task(send_booking_notifications())
+        asyncio.create_task(_send_to_staff(bot, recipients, notification_text, "booking"))
 
     project_address = get_project_address(house_name, lang)
     address_line = f"📍 {project_address}\n" if project_address else ""
@@ -1033,7 +977,7 @@ async def language_toggle_during_phone(message: types.Message, state: FSMContext
         builder = InlineKeyboardBuilder()
         builder.button(
             text=get_message('use_saved_phone', new_lang, phone=saved_phone),
-            callback_data=f"use_phone_{saved_phone}"
+            callback_data="use_phone"
         )
         builder.button(
             text=get_message('enter_new_phone', new_lang),
@@ -1094,22 +1038,17 @@ async def language_toggle_during_date_selection(message: types.Message, state: F
     # Пересоздаём календарь с новым языком
     from datetime import datetime as dt
     min_booking_date = dt.fromisoformat(delivery_date_str).date()
-    today = date.today()
     
-    with SessionLocal() as session:
-        # Определяем период для проверки занятых дат
-        start_date = min_booking_date
-        end_date = today + timedelta(days=90)
-        
-        # Получаем полностью занятые даты для проекта
-        fully_booked = get_fully_booked_dates(session, start_date, end_date, slots_limit, house_name)
+    # Полностью занятые даты проекта (общий снимок занятости)
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
     
     # Создаем новый календарь
     markup = generate_calendar(
         min_date=min_booking_date,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=new_lang
+        lang=new_lang,
+        project_name=house_name
     )
     
     # Отправляем уведомление о смене языка
@@ -1174,13 +1113,11 @@ async def cancel_booking_selected(callback: types.CallbackQuery, state: FSMConte
     lang = get_user_language(user_id)
     
     with SessionLocal() as session:
-        booking = session.query(Booking).filter(Booking.id == booking_id).first()
+        booking, contract = get_booking_with_contract(session, booking_id)
         if not booking:
             await callback.answer("Запись не найдена", show_alert=True)
             return
         
-        contract = session.query(Contract).filter(Contract.id == booking.contract_id).first()
-        
         date_str = booking.date.strftime('%d.%m.%Y')
         time_str = booking.time_slot.strftime('%H:%M')
         
@@ -1205,24 +1142,23 @@ async def confirm_cancel_booking(callback: types.CallbackQuery, state: FSMContex
     lang = get_user_language(user_id)
     
     with SessionLocal() as session:
-        booking = session.query(Booking).filter(Booking.id == booking_id).first()
+        booking, contract = get_booking_with_contract(session, booking_id)
         if not booking:
             await callback.answer("Запись не найдена", show_alert=True)
             return
         
         # Проверяем возможность отмены ещё раз
-        if not can_cancel_booking(booking.date):
+        if not can_cancel_booking(booking.date, contract.house_name):
             await callback.answer(
                 "⚠️ Отмена невозможна - прошёл срок отмены",
                 show_alert=True
             )
             return
         
-        contract = session.query(Contract).filter(Contract.id == booking.contract_id).first()
-        
         # Отмечаем запись как отменённую
         booking.is_cancelled = True
         session.commit()
+        BOOKING_EVENTS.labels(project=contract.house_name, event="cancelled").inc()
         
         date_str = booking.date.strftime('%d.%m.%Y')
         time_str = booking.time_slot.strftime('%H:%M')
@@ -1242,14 +1178,7 @@ async def confirm_cancel_booking(callback: types.CallbackQuery, state: FSMContex
             recipients.append(ADMIN_ID)
         
         # Отправляем уведомления в фоновом режиме
-        async def send_cancel_notifications():
-            for emp_id in recipients:
-                try:
-                    await bot.send_message(chat_id=emp_id, text=notification_text, parse_mode="Markdown")
-                except Exception as e:
-                    logging.error(f"Ошибка уведомления {emp_id}: {e}")
-        
-        asyncio.create_task(send_cancel_notifications())
+        asyncio.create_task(_send_to_staff(bot, recipients, notification_text, "cancel"))
     
     await state.clear()
     await callback.message.edit_text(
@@ -1294,7 +1223,7 @@ async def contract_entered(message: types.Message, state: FSMContext):
             return
 
         # Проверяем существующие активные записи на этот договор
-        today = date.today()
+        today = clock.today()
         existing_booking = (
             session.query(Booking)
             .filter(
@@ -1357,7 +1286,7 @@ async def contract_entered(message: types.Message, state: FSMContext):
         )
         
         # Определяем минимальную дату для записи
-        min_booking_date = get_min_booking_date()
+        min_booking_date = get_min_booking_date(contract.house_name)
         
         # Определяем владельца ТОЛЬКО по user_telegram_id первой записи
         # contract.telegram_id не используем для определения владельца (legacy data)
@@ -1426,19 +1355,16 @@ async def contract_entered(message: types.Message, state: FSMContext):
             slots_limit=slots_limit
         )
 
-        # Определяем период для проверки занятых дат (90 дней вперёд)
-        start_date = min_booking_date
-        end_date = today + timedelta(days=90)
-        
-        # Получаем полностью занятые даты ДЛЯ ЭТОГО ПРОЕКТА
-        fully_booked = get_fully_booked_dates(session, start_date, end_date, slots_limit, contract.house_name)
+        # Получаем полностью занятые даты ДЛЯ ЭТОГО ПРОЕКТА (общий снимок занятости)
+        fully_booked = get_fully_booked_dates(contract.house_name, slots_limit)
 
         # Создаем клавиатуру с учётом занятых дат
         markup = generate_calendar(
             min_date=min_booking_date,
             fully_booked_dates=fully_booked,
             slots_limit=slots_limit,
-            lang=lang
+            lang=lang,
+            project_name=contract.house_name
         )
         await state.set_state(ClientSteps.selecting_date)
 
@@ -1450,12 +1376,11 @@ async def contract_entered(message: types.Message, state: FSMContext):
         )
 
 
-@router.callback_query(F.data.startswith("cal_"), ClientSteps.selecting_date)
-async def calendar_navigation(callback: types.CallbackQuery, state: FSMContext):
+@router.callback_query(MonthCallback.filter(), ClientSteps.selecting_date)
+async def calendar_navigation(callback: types.CallbackQuery, state: FSMContext, callback_data: MonthCallback):
     """Обработчик навигации по календарю (переключение месяцев)"""
-    parts = callback.data.split("_")
-    year = int(parts[1])
-    month = int(parts[2])
+    year = callback_data.year
+    month = callback_data.month
     
     user_data = await state.get_data()
     delivery_date_str = user_data.get('delivery_date')
@@ -1468,17 +1393,11 @@ async def calendar_navigation(callback: types.CallbackQuery, state: FSMContext):
     else:
         delivery_date = None
     
-    # Определяем период только для выбранного месяца
-    import calendar as cal_module
-    first_day = date(year, month, 1)
-    last_day = date(year, month, cal_module.monthrange(year, month)[1])
-    
     # Получаем house_name из состояния
     house_name = user_data.get('house_name')
     
-    with SessionLocal() as session:
-        # Запрашиваем занятые даты только для текущего месяца И ПРОЕКТА
-        fully_booked = get_fully_booked_dates(session, first_day, last_day, slots_limit, house_name)
+    # Занятые даты ПРОЕКТА — из общего снимка занятости, без запроса к базе
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
     
     # Перерисовываем календарь с новым месяцем/годом
     user_id = callback.from_user.id
@@ -1490,7 +1409,8 @@ async def calendar_navigation(callback: types.CallbackQuery, state: FSMContext):
         min_date=delivery_date,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=lang
+        lang=lang,
+        project_name=house_name
     )
     
     await callback.message.edit_reply_markup(reply_markup=new_calendar)
@@ -1521,14 +1441,8 @@ async def back_to_calendar(callback: types.CallbackQuery, state: FSMContext):
     else:
         delivery_date = None
     
-    today = date.today()
-    
-    # Запрашиваем занятые даты на 90 дней вперёд ДЛЯ ЭТОГО ПРОЕКТА
-    start_date = delivery_date if delivery_date else today
-    end_date = today + timedelta(days=90)
-    
-    with SessionLocal() as session:
-        fully_booked = get_fully_booked_dates(session, start_date, end_date, slots_limit, house_name)
+    # Занятые даты ДЛЯ ЭТОГО ПРОЕКТА
+    fully_booked = get_fully_booked_dates(house_name, slots_limit)
     
     # Генерируем календарь
     user_id = callback.from_user.id
@@ -1538,7 +1452,8 @@ async def back_to_calendar(callback: types.CallbackQuery, state: FSMContext):
         min_date=delivery_date,
         fully_booked_dates=fully_booked,
         slots_limit=slots_limit,
-        lang=lang
+        lang=lang,
+        project_name=house_name
     )
     
     await state.set_state(ClientSteps.selecting_date)
@@ -1550,18 +1465,20 @@ async def back_to_calendar(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("date_"), ClientSteps.selecting_date)
-async def date_selected(callback: types.CallbackQuery, state: FSMContext):
-    selected_date_str = callback.data.split("_")[1]
-    selected_date = datetime.strptime(selected_date_str, '%Y-%m-%d').date()
+@router.callback_query(DateCallback.filter(), ClientSteps.selecting_date)
+async def date_selected(callback: types.CallbackQuery, state: FSMContext, callback_data: DateCallback):
+    selected_date = callback_data.booking_date
+    selected_date_str = selected_date.isoformat()
     
-    # Получаем минимальную дату для записи по новым правилам
-    min_booking_date = get_min_booking_date()
+    user_data = await state.get_data()
+    house_name = user_data.get('house_name')  # Получаем название проекта
+
+    # Получаем минимальную дату для записи по новым правилам (с учётом праздников проекта)
+    min_booking_date = get_min_booking_date(house_name)
 
     # Проверка даты
     if selected_date < min_booking_date:
-        now = datetime.now()
-        if now.hour < 12:
+        if clock.now().hour < CUTOFF_HOUR:
             hint = "Запись возможна на следующий рабочий день или позже."
         else:
             hint = "После 12:00 запись возможна только через один рабочий день."
@@ -1571,18 +1488,16 @@ async def date_selected(callback: types.CallbackQuery, state: FSMContext):
         )
         return
 
-    # Проверка рабочего дня (пн-пт)
-    if selected_date.weekday() >= 5:  # 5=Сб, 6=Вс
+    # Проверка рабочего дня (пн-пт, не праздник и не закрытая дата проекта)
+    if not is_working_day(selected_date, house_name):
         await callback.answer(
-            "⚠️ Запись доступна только в рабочие дни (пн-пт).",
+            "⚠️ Запись доступна только в рабочие дни (пн-пт, кроме праздников).",
             show_alert=True
         )
         return
 
-    user_data = await state.get_data()
     contract_id = user_data.get('contract_id')
     slots_limit = user_data.get('slots_limit', 1)  # Используем кешированный лимит проекта
-    house_name = user_data.get('house_name')  # Получаем название проекта
 
     with SessionLocal() as session:
         contract = session.query(Contract).filter(Contract.id == contract_id).first()
@@ -1591,23 +1506,8 @@ async def date_selected(callback: types.CallbackQuery, state: FSMContext):
             await state.clear()
             return
 
-        # Получаем текущие бронирования для выбранной даты ТОЛЬКО ДЛЯ ЭТОГО ПРОЕКТА
-        bookings = (
-            session.query(
-                Booking.time_slot,
-                func.count(Booking.id)
-            )
-            .join(Contract, Booking.contract_id == Contract.id)
-            .filter(
-                Booking.date == selected_date,
-                Contract.house_name == house_name,
-                Booking.is_cancelled == False
-            )
-            .group_by(Booking.time_slot)
-            .all()
-        )
-
-        booked_dict = {row[0]: row[1] for row in bookings}
+    # Текущие бронирования на выбранную дату ТОЛЬКО ДЛЯ ЭТОГО ПРОЕКТА (из индекса занятости)
+    booked_dict = get_slot_counts(house_name, selected_date)
 
     # Сохраняем выбранную дату в состояние
     await state.update_data(selected_date=selected_date_str)
@@ -1618,7 +1518,8 @@ async def date_selected(callback: types.CallbackQuery, state: FSMContext):
     lang = get_user_language(user_id)
 
     # Генерируем клавиатуру со слотами времени
-    time_kb = generate_time_slots(selected_date_str, booked_dict, slots_limit, lang)
+    day_slots = get_day_slots(house_name, selected_date.weekday(), slots_limit)
+    time_kb = generate_time_slots(selected_date_str, booked_dict, slots_limit, lang, slots=day_slots)
     
     # Форматируем даты
     sel_date_fmt = selected_date.strftime('%d.%m.%Y')
@@ -1638,14 +1539,12 @@ async def date_selected(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("time_"), ClientSteps.selecting_time)
-async def time_selected(callback: types.CallbackQuery, state: FSMContext):
-    parts = callback.data.split("_")
-    date_str = parts[1]
-    time_str = parts[2]
-
-    selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    selected_time = datetime.strptime(time_str, '%H:%M').time()
+@router.callback_query(TimeCallback.filter(), ClientSteps.selecting_time)
+async def time_selected(callback: types.CallbackQuery, state: FSMContext, callback_data: TimeCallback):
+    selected_date = callback_data.booking_date
+    selected_time = callback_data.slot_time
+    date_str = selected_date.isoformat()
+    time_str = selected_time.strftime('%H:%M')
 
     user_data = await state.get_data()
     slots_limit = user_data.get('slots_limit', 1)  # Используем кешированный лимит проекта
@@ -1667,7 +1566,9 @@ async def time_selected(callback: types.CallbackQuery, state: FSMContext):
             .count()
         )
 
-        if current_bookings >= slots_limit:
+        # Вместимость слота по шаблону проекта (0 — слота нет в шаблоне дня)
+        capacity = get_slot_capacity(house_name, selected_date, selected_time, slots_limit, session)
+        if current_bookings >= capacity:
             await callback.answer("Извините, это время только что заняли.", show_alert=True)
             return
 
@@ -1682,7 +1583,7 @@ async def time_selected(callback: types.CallbackQuery, state: FSMContext):
         builder = InlineKeyboardBuilder()
         builder.button(
             text=get_message('use_saved_phone', lang, phone=saved_phone),
-            callback_data=f"use_phone_{saved_phone}"
+            callback_data="use_phone"
         )
         builder.button(
             text=get_message('enter_new_phone', lang),
@@ -1707,10 +1608,12 @@ async def time_selected(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("use_phone_"), ClientSteps.entering_phone)
+@router.callback_query(F.data == "use_phone", ClientSteps.entering_phone)
 async def use_saved_phone(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
     """Использовать сохранённый номер телефона"""
-    saved_phone = callback.data.replace("use_phone_", "")
+    saved_phone = get_user_phone(callback.from_user.id)
+    if not saved_phone:
+        return await enter_new_phone(callback, state)
     
     # Создаём фейковое сообщение для унификации обработки
     await callback.message.delete()
@@ -1759,6 +1662,7 @@ async def process_phone_booking_callback(callback: types.CallbackQuery, state: F
         )
         session.add(new_booking)
         session.commit()
+        BOOKING_EVENTS.labels(project=user_data['selected_house'], event="booked").inc()
 
         # Уведомление сотрудников
         notification_text = (
@@ -1776,14 +1680,7 @@ async def process_phone_booking_callback(callback: types.CallbackQuery, state: F
             recipients.append(ADMIN_ID)
 
         # Отправляем уведомления в фоновом режиме
-        async def send_booking_notifications():
-            for emp_id in recipients:
-                try:
-                    await bot.send_message(chat_id=emp_id, text=notification_text, parse_mode="Markdown")
-                except Exception as e:
-                    logging.error(f"Ошибка уведомления {emp_id}: {e}")
-        
-        asyncio.create_task(send_booking_notifications())
+        asyncio.create_task(_send_to_staff(bot, recipients, notification_text, "booking"))
 
     # Отправляем подтверждение
     project_address = get_project_address(user_data.get('selected_house', ''), lang)
@@ -1898,6 +1795,7 @@ async def process_phone_booking(message: types.Message, state: FSMContext, bot:
         )
         session.add(new_booking)
         session.commit()
+        BOOKING_EVENTS.labels(project=user_data['selected_house'], event="booked").inc()
 
         # Уведомление сотрудников
         notification_text = (
@@ -1915,14 +1813,7 @@ async def process_phone_booking(message: types.Message, state: FSMContext, bot:
             recipients.append(ADMIN_ID)
 
         # Отправляем уведомления в фоновом режиме
-        async def send_booking_notifications():
-            for emp_id in recipients:
-                try:
-                    await bot.send_message(chat_id=emp_id, text=notification_text, parse_mode="Markdown")
-                except Exception as e:
-                    logging.error(f"Ошибка уведомления {emp_id}: {e}")
-        
-        asyncio.create_task(send_booking_notifications())
+        asyncio.create_task(_send_to_staff(bot, recipients, notification_text, "booking"))
 
     # Убираем клавиатуру и отправляем подтверждение
     project_address = get_project_address(user_data.get('selected_house', ''), lang)
@@ -0,0 +1,101 @@
+"""
+Компактные callback_data inline-кнопок (фабрики aiogram CallbackData).
+
+Дата передаётся числом дней от EPOCH, время — минутами от полуночи,
+проект — целым id из реестра (utils/projects.py). Полезная нагрузка
+короткая (≤ 64 байт при любых названиях проектов), разбирается без
+strptime и не требует поиска проекта по усечённому названию.
+
+Пример: DateCallback.of(date(2026, 2, 9)).pack() == "d:770".
+"""
+from datetime import date, time, timedelta
+
+from aiogram.filters.callback_data import CallbackData
+
+from utils.projects import find_project_id, get_project_name
+
+# Точка отсчёта для номеров дней в callback_data
+EPOCH = date(2024, 1, 1)
+
+# Проект 0 — «все проекты» (id в реестре начинаются с 1)
+ALL_PROJECTS = 0
+
+
+def _day_number(value: date) -> int:
+    """Дата → число дней от EPOCH."""
+    return (value - EPOCH).days
+
+
+def _day_date(day: int) -> date:
+    """Число дней от EPOCH → дата."""
+    return EPOCH + timedelta(days=day)
+
+
+class DateCallback(CallbackData, prefix="d"):
+    """Выбор даты в календаре."""
+    day: int
+
+    @classmethod
+    def of(cls, value: date) -> "DateCallback":
+        return cls(day=_day_number(value))
+
+    @property
+    def booking_date(self) -> date:
+        return _day_date(self.day)
+
+
+class MonthCallback(CallbackData, prefix="m"):
+    """Переход календаря на месяц."""
+    year: int
+    month: int
+
+
+class _SlotCallback(CallbackData, prefix="_slot"):
+    """Дата и время слота: день от EPOCH и минута от полуночи."""
+    day: int
+    minute: int
+
+    @classmethod
+    def of(cls, booking_date: date, slot_time: time):
+        return cls(day=_day_number(booking_date), minute=slot_time.hour * 60 + slot_time.minute)
+
+    @property
+    def booking_date(self) -> date:
+        return _day_date(self.day)
+
+    @property
+    def slot_time(self) -> time:
+        return time(self.minute // 60, self.minute % 60)
+
+
+class TimeCallback(_SlotCallback, prefix="t"):
+    """Выбор времени записи."""
+
+
+class RebookCallback(_SlotCallback, prefix="rb"):
+    """Подтверждение перезаписи на выбранные дату и время."""
+
+
+class ProjectCallback(CallbackData, prefix="pj"):
+    """
+    Выбор проекта в списке.
+
+    action — какой список: "slot" (лимит), "addr" (адрес), "uc" (список
+    договоров), "bk" / "emp" (записи админа / сотрудника), "rprt" (пересборка
+    отчёта), "house" (выбор дома). project — id проекта или ALL_PROJECTS.
+    """
+    action: str
+    project: int
+
+    @classmethod
+    def of(cls, action: str, project_name: str = None) -> "ProjectCallback":
+        """Кнопка проекта по названию (None — все проекты); KeyError — проект не зарегистрирован."""
+        project = ALL_PROJECTS if project_name is None else find_project_id(project_name)
+        return cls(action=action, project=project)
+
+    @property
+    def project_name(self):
+        """Название проекта; None — все проекты или проект не найден."""
+        if self.project == ALL_PROJECTS:
+            return None
+        return get_project_name(self.project)
@@ -1,136 +1,144 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from datetime import time, datetime, timedelta, date, timezone
+from datetime import time, datetime, timedelta, date
 import calendar
+from functools import lru_cache
 from aiogram import types
 
-# Часовой пояс Ташкента (UTC+5)
-TASHKENT_TZ = timezone(timedelta(hours=5))
+from keyboards.callbacks import DateCallback, MonthCallback, ProjectCallback, TimeCallback
+from utils import clock
+from utils.clock import TASHKENT_TZ
+from utils.holidays import get_blackout_ranges, get_closed_dates, is_working_day
 
-# Количество слотов в день
+# Граница отсечки записи на следующий рабочий день — 12:00 по Ташкенту
+CUTOFF_HOUR = 12
+
+# Минимальная дата записи: проект -> (начало окна, конец окна, закрытые периоды, дата)
+_min_booking_cache = {}
+
+# Слоты по умолчанию (если для проекта не настроен шаблон, см. utils/slot_templates.py)
 TIME_SLOTS = ["09:00", "10:00", "11:00", "13:00", "14:00", "16:00"]
 SLOTS_PER_DAY = len(TIME_SLOTS)  # 6 слотов
+DEFAULT_SLOT_TIMES = tuple(time.fromisoformat(slot) for slot in TIME_SLOTS)
 
 
-def get_next_working_day(from_date: date) -> date:
-    """Возвращает следующий рабочий день после указанной даты"""
+def get_next_working_day(from_date: date, project_name: str = None) -> date:
+    """Возвращает следующий рабочий день после указанной даты (с учётом праздников проекта)"""
     next_day = from_date + timedelta(days=1)
-    while next_day.weekday() >= 5:  # Пропускаем выходные (5=Сб, 6=Вс)
+    while not is_working_day(next_day, project_name):  # Пропускаем выходные и закрытые даты
         next_day += timedelta(days=1)
     return next_day
 
 
-def get_min_booking_date() -> date:
+def _cutoff_window(now: datetime) -> tuple:
+    """Окно, в котором минимальная дата записи не меняется: [полночь, 12:00) или [12:00, полночь)."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = midnight.replace(hour=CUTOFF_HOUR)
+    if now < cutoff:
+        return midnight, cutoff
+    return cutoff, midnight + timedelta(days=1)
+
+
+def get_min_booking_date(project_name: str = None) -> date:
     """
     Рассчитывает минимальную дату для записи:
     - Пятница (любое время) — понедельник
     - Суббота/воскресенье (любое время) — вторник
     - Пн-Чт: до 12:00 — следующий рабочий день, после 12:00 — через один рабочий день
+
+    Праздники и закрытые даты проекта (utils/holidays.py) рабочими днями не считаются.
+    Результат меняется только в полночь и в 12:00, поэтому кэшируется до ближайшей
+    из этих границ (и до изменения закрытых периодов).
     
-    ВАЖНО: Используется время по Ташкенту (UTC+5)
+    ВАЖНО: Используется время по Ташкенту (UTC+5), см. utils/clock.py
     """
-    # Получаем текущее время по Ташкенту (UTC+5)
-    now = datetime.now(TASHKENT_TZ)
+    now = clock.now()
+    ranges = get_blackout_ranges()
+    cached = _min_booking_cache.get(project_name)
+    if cached is not None and cached[0] <= now < cached[1] and cached[2] is ranges:
+        return cached[3]
+
+    result = _compute_min_booking_date(now, project_name)
+    window_start, window_end = _cutoff_window(now)
+    _min_booking_cache[project_name] = (window_start, window_end, ranges, result)
+    return result
+
+
+def _compute_min_booking_date(now: datetime, project_name: str = None) -> date:
+    """Расчёт минимальной даты записи на момент now (без кэша)."""
     today = now.date()
     current_weekday = today.weekday()  # 0=Пн, 4=Пт, 5=Сб, 6=Вс
-    cutoff_hour = 12  # Граница — 12:00
     
     # Пятница — всегда понедельник
     if current_weekday == 4:
-        return get_next_working_day(today)  # Понедельник
+        return get_next_working_day(today, project_name)  # Понедельник
     
-    # Суббота/воскресенье — всегда вторник
+    # Суббота/воскресенье — всегда вторник (первый рабочий день пропускается)
     if current_weekday >= 5:
-        # Находим понедельник, затем следующий рабочий день (вторник)
-        days_until_monday = 7 - current_weekday
-        next_monday = today + timedelta(days=days_until_monday)
-        return get_next_working_day(next_monday)  # Вторник
+        next_working = get_next_working_day(today, project_name)  # Понедельник
+        return get_next_working_day(next_working, project_name)  # Вторник
     
     # Пн-Чт: стандартная логика с отсечкой по полудню
-    next_working = get_next_working_day(today)
+    next_working = get_next_working_day(today, project_name)
     
-    if now.hour < cutoff_hour:
+    if now.hour < CUTOFF_HOUR:
         # До 12:00 — можно записаться на следующий рабочий день
         return next_working
     else:
         # После 12:00 — пропускаем один рабочий день
-        return get_next_working_day(next_working)
+        return get_next_working_day(next_working, project_name)
+
 
+# Длительность слота, если в шаблоне дня один слот
+DEFAULT_SLOT_MINUTES = 60
 
-def get_fully_booked_dates(session, start_date: date, end_date: date, slots_limit: int, house_name: str = None) -> set:
+
+@lru_cache(maxsize=64)
+def _slot_minutes(slot_times: tuple) -> int:
     """
-    Возвращает множество дат, где все слоты заняты для конкретного проекта.
-    
-    Args:
-        session: SQLAlchemy сессия
-        start_date: Начало периода
-        end_date: Конец периода  
-        slots_limit: Лимит записей на один слот
-        house_name: Название проекта (для раздельного учёта слотов по проектам)
-    
-    Returns:
-        set[date]: Множество полностью занятых дат для указанного проекта
+    Длительность слота дня в минутах — шаг шаблона: наименьший промежуток
+    между соседними слотами (перерыв 11:00 → 13:00 не удлиняет слот 11:00).
+    Считается один раз на набор времён шаблона.
     """
-    from sqlalchemy import func
-    from database.models import Booking, Contract
-    
-    # Общее количество возможных записей в день = слоты * лимит на слот
-    max_bookings_per_day = SLOTS_PER_DAY * slots_limit
-    
-    # Считаем количество записей по датам для конкретного проекта
-    query = (
-        session.query(
-            Booking.date,
-            func.count(Booking.id).label('count')
-        )
-        .join(Contract, Booking.contract_id == Contract.id)
-        .filter(
-            Booking.date >= start_date,
-            Booking.date <= end_date,
-            Booking.is_cancelled == False
-        )
-    )
-    
-    # Фильтруем по проекту, если указан
-    if house_name:
-        query = query.filter(Contract.house_name == house_name)
-    
-    bookings_per_date = query.group_by(Booking.date).all()
-    
-    # Возвращаем даты где записей >= максимума
-    fully_booked = set()
-    for booking_date, count in bookings_per_date:
-        if count >= max_bookings_per_day:
-            fully_booked.add(booking_date)
-    
-    return fully_booked
+    minutes = sorted(t.hour * 60 + t.minute for t in slot_times)
+    steps = [b - a for a, b in zip(minutes, minutes[1:]) if b > a]
+    return min(steps) if steps else DEFAULT_SLOT_MINUTES
 
 
-def generate_time_slots(date_str, booked_slots, limit, lang='ru'):
-    builder = InlineKeyboardBuilder()
+@lru_cache(maxsize=256)
+def _slot_label(slot_time: time, minutes: int = DEFAULT_SLOT_MINUTES) -> str:
+    """Подпись кнопки слота: "ЧЧ:ММ - ЧЧ:ММ" (конец — через minutes минут)."""
+    end = datetime.combine(date.min, slot_time) + timedelta(minutes=minutes)
+    return f"{slot_time.strftime('%H:%M')} - {end.strftime('%H:%M')}"
 
-    # Преобразуем выбранную пользователем дату из строки в объект date
-    selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-    target_slots = [
-        "09:00", "10:00", "11:00",
-        "13:00", "14:00",
-        "16:00"
-    ]
+def generate_time_slots(date_str, booked_slots, limit, lang='ru', slots=None):
+    """
+    Клавиатура выбора времени.
+
+    Args:
+        booked_slots: {время: количество активных записей}
+        limit: Лимит записей на слот (для слотов по умолчанию)
+        slots: Слоты дня [(время, вместимость), ...] из шаблона проекта;
+            None — слоты по умолчанию с лимитом limit
+    """
+    builder = InlineKeyboardBuilder()
+    booking_date = date.fromisoformat(date_str)
 
-    for slot_str in target_slots:
-        slot_time = datetime.strptime(slot_str, "%H:%M").time()
+    if slots is None:
+        slots = [(slot_time, limit) for slot_time in DEFAULT_SLOT_TIMES]
 
+    minutes = _slot_minutes(tuple(slot_time for slot_time, _ in slots))
+    for slot_time, capacity in slots:
+        display_text = _slot_label(slot_time, minutes)
         count = booked_slots.get(slot_time, 0)
-        end_hour = slot_time.hour + 1
-        display_text = f"{slot_str} - {end_hour:02d}:00"
 
-        # Проверка: Занято ли место по лимиту
-        is_full = count >= limit
+        # Проверка: Занято ли место по вместимости слота
+        is_full = count >= capacity
 
         if is_full:
             builder.button(text=f"❌ {display_text}", callback_data="full")
         else:
-            builder.button(text=f"✅ {display_text}", callback_data=f"time_{date_str}_{slot_str}")
+            builder.button(text=f"✅ {display_text}", callback_data=TimeCallback.of(booking_date, slot_time).pack())
 
     builder.adjust(1)
     
@@ -146,16 +154,122 @@ def generate_time_slots(date_str, booked_slots, limit, lang='ru'):
 def generate_houses_kb(houses):
     builder = InlineKeyboardBuilder()
     for house in houses:
-        # Ограничиваем длину callback_data (макс 64 байта)
-        builder.button(text=house, callback_data=f"house_{house[:40]}")
+        # В callback_data — id проекта: длина не зависит от названия
+        builder.button(text=house, callback_data=ProjectCallback.of("house", house))
     builder.adjust(1)
     return builder.as_markup()
 
 
+# Названия месяцев и дней недели для календаря
+MONTH_NAMES = {
+    'ru': [
+        "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+        "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+    ],
+    'uz': [
+        "Yanvar", "Fevral", "Mart", "Aprel", "May", "Iyun",
+        "Iyul", "Avgust", "Sentabr", "Oktabr", "Noyabr", "Dekabr"
+    ]
+}
+
+WEEKDAY_NAMES = {
+    'ru': ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"],
+    'uz': ["Du", "Se", "Ch", "Pa", "Ju", "Sh", "Ya"]
+}
+
+# Кнопки, не зависящие от даты: пустая клетка и неактивный день
+_EMPTY_BUTTON = types.InlineKeyboardButton(text=" ", callback_data="ignore")
+_INACTIVE_BUTTON = types.InlineKeyboardButton(text="·", callback_data="ignore")
+_FULL_BUTTON = types.InlineKeyboardButton(text="❌", callback_data="date_full")
+
+
+@lru_cache(maxsize=64)
+def _calendar_skeleton(year: int, month: int, lang: str):
+    """
+    Неизменная часть календаря месяца: заголовок, дни недели и сетка дат.
+
+    Returns:
+        (header_rows, weeks): header_rows — готовые ряды кнопок;
+        weeks — недели из дат рабочих дней (None — пустая клетка или выходной)
+    """
+    header_rows = [
+        [types.InlineKeyboardButton(text=f"{MONTH_NAMES[lang][month - 1]} {year}", callback_data="ignore")],
+        [types.InlineKeyboardButton(text=day, callback_data="ignore") for day in WEEKDAY_NAMES[lang]],
+    ]
+    weeks = []
+    for week in calendar.monthcalendar(year, month):
+        weeks.append(tuple(
+            (day, date(year, month, day)) if day else (0, None)
+            for day in week
+        ))
+    return header_rows, tuple(weeks)
+
+
+@lru_cache(maxsize=512)
+def _render_calendar(year: int, month: int, effective_min_date: date, fully_booked: frozenset,
+                     lang: str, closed: frozenset = frozenset()):
+    """Разметка календаря; результат определяется только аргументами и кэшируется."""
+    header_rows, weeks = _calendar_skeleton(year, month, lang)
+    rows = list(header_rows)
+
+    # Календарная сетка — накладываем доступность на готовый скелет
+    for week in weeks:
+        row = []
+        for day, current_date in week:
+            if not day:
+                row.append(_EMPTY_BUTTON)
+                continue
+            # Кнопка активна ТОЛЬКО если:
+            # 1. Это рабочий день (пн-пт, не праздник и не закрытая дата)
+            # 2. Дата >= минимальной даты записи (с учётом правила 12:00)
+            # 3. Дата >= даты сдачи объекта (если указана)
+            # 4. На эту дату есть свободные слоты
+            is_weekday = current_date.weekday() < 5 and current_date not in closed
+            is_date_valid = is_weekday and current_date >= effective_min_date
+
+            if is_date_valid and current_date not in fully_booked:
+                row.append(types.InlineKeyboardButton(text=str(day), callback_data=DateCallback.of(current_date).pack()))
+            elif is_date_valid:
+                # Дата доступна, но все слоты заняты
+                row.append(_FULL_BUTTON)
+            else:
+                row.append(_INACTIVE_BUTTON)  # Неактивный день
+        rows.append(row)
+
+    # Кнопки навигации (Назад / Вперед)
+    # Назад можно только если текущий вид позже, чем effective_min_date
+    can_go_back = date(year, month, 1) > effective_min_date
+
+    next_month = month + 1 if month < 12 else 1
+    next_year = year if month < 12 else year + 1
+    next_button = types.InlineKeyboardButton(text=">>", callback_data=MonthCallback(year=next_year, month=next_month).pack())
+
+    if can_go_back:
+        prev_month = month - 1 if month > 1 else 12
+        prev_year = year if month > 1 else year - 1
+        prev_button = types.InlineKeyboardButton(text="<<", callback_data=MonthCallback(year=prev_year, month=prev_month).pack())
+        rows.append([prev_button, next_button])
+    else:
+        # Только кнопка "Вперёд" на всю ширину
+        rows.append([next_button])
+
+    return types.InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def clear_calendar_cache():
+    """Очистить кэши отрисовки календаря."""
+    _render_calendar.cache_clear()
+    _calendar_skeleton.cache_clear()
+
+
 def generate_calendar(year: int = None, month: int = None, min_date: date = None, 
-                      fully_booked_dates: set = None, slots_limit: int = 1, lang: str = 'ru'):
+                      fully_booked_dates: set = None, slots_limit: int = 1, lang: str = 'ru',
+                      project_name: str = None):
     """
     Генерация календаря с учётом занятых дат.
+
+    Разметка кэшируется по (год, месяц, минимальная дата, занятые и закрытые
+    даты месяца, язык), поэтому перелистывание месяцев и повторные показы не пересобирают кнопки.
     
     Args:
         year: Год для отображения
@@ -164,16 +278,17 @@ def generate_calendar(year: int = None, month: int = None, min_date: date = None
         fully_booked_dates: Множество дат, где все слоты заняты
         slots_limit: Лимит записей на слот (для справки)
         lang: Язык интерфейса ('ru' или 'uz')
+        project_name: Проект — для его праздников и закрытых дат
     """
     if fully_booked_dates is None:
         fully_booked_dates = set()
         
-    today = date.today()
+    today = clock.today()
     if year is None: year = today.year
     if month is None: month = today.month
 
     # Вычисляем минимальную дату для записи по новым правилам
-    booking_min_date = get_min_booking_date()
+    booking_min_date = get_min_booking_date(project_name)
     
     # Если передана дата сдачи объекта, берём максимум из двух ограничений
     if min_date:
@@ -187,75 +302,7 @@ def generate_calendar(year: int = None, month: int = None, min_date: date = None
         year = effective_min_date.year
         month = effective_min_date.month
 
-    builder = InlineKeyboardBuilder()
-
-    # Заголовок: Месяц и Год
-    month_names = {
-        'ru': [
-            "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
-            "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
-        ],
-        'uz': [
-            "Yanvar", "Fevral", "Mart", "Aprel", "May", "Iyun",
-            "Iyul", "Avgust", "Sentabr", "Oktabr", "Noyabr", "Dekabr"
-        ]
-    }
-    
-    # Дни недели
-    weekdays = {
-        'ru': ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"],
-        'uz': ["Du", "Se", "Ch", "Pa", "Ju", "Sh", "Ya"]
-    }
-    
-    builder.button(text=f"{month_names[lang][month - 1]} {year}", callback_data="ignore")
-    builder.adjust(1)
-
-    # Дни недели
-    for day in weekdays[lang]:
-        builder.button(text=day, callback_data="ignore")
-    builder.adjust(1, 7)
-
-    # Календарная сетка
-    month_calendar = calendar.monthcalendar(year, month)
-    for week in month_calendar:
-        for day in week:
-            if day == 0:
-                builder.button(text=" ", callback_data="ignore")
-            else:
-                current_date = date(year, month, day)
-                # Кнопка активна ТОЛЬКО если:
-                # 1. Это рабочий день (пн-пт)
-                # 2. Дата >= минимальной даты записи (с учётом правила 12:00)
-                # 3. Дата >= даты сдачи объекта (если указана)
-                # 4. На эту дату есть свободные слоты
-                is_weekday = current_date.weekday() < 5
-                is_date_valid = is_weekday and current_date >= effective_min_date
-                is_fully_booked = current_date in fully_booked_dates
-
-                if is_date_valid and not is_fully_booked:
-                    builder.button(text=str(day), callback_data=f"date_{current_date}")
-                elif is_date_valid and is_fully_booked:
-                    # Дата доступна, но все слоты заняты
-                    builder.button(text="❌", callback_data="date_full")
-                else:
-                    builder.button(text="·", callback_data="ignore")  # Неактивный день
-        builder.adjust(1, 7, 7, 7, 7, 7, 7)
-
-    # Кнопки навигации (Назад / Вперед)
-    # Назад можно только если текущий вид позже, чем effective_min_date
-    can_go_back = date(year, month, 1) > effective_min_date
-
-    next_month = month + 1 if month < 12 else 1
-    next_year = year if month < 12 else year + 1
-    next_button = types.InlineKeyboardButton(text=">>", callback_data=f"cal_{next_year}_{next_month}")
-
-    if can_go_back:
-        prev_month = month - 1 if month > 1 else 12
-        prev_year = year if month > 1 else year - 1
-        prev_button = types.InlineKeyboardButton(text="<<", callback_data=f"cal_{prev_year}_{prev_month}")
-        builder.row(prev_button, next_button)
-    else:
-        # Только кнопка "Вперёд" на всю ширину
-        builder.row(next_button)
-
-    return builder.as_markup()
\ No newline at end of file
+    # В ключ кэша попадают только занятые и закрытые даты отображаемого месяца
+    month_booked = frozenset(d for d in fully_booked_dates if d.year == year and d.month == month)
+    month_closed = frozenset(d for d in get_closed_dates(project_name) if d.year == year and d.month == month)
+    return _render_calendar(year, month, effective_min_date, month_booked, lang, month_closed)
@@ -3,20 +3,27 @@ import logging
 import ssl
 import warnings
 import os
-import aiohttp
-import certifi
 from aiogram import Bot, Dispatcher
-from aiogram.client.session.aiohttp import AiohttpSession
-from config import BOT_TOKEN
+from aiohttp import web
+from config import (
+    BOT_API_INSECURE_SSL, BOT_TOKEN, METRICS_PORT, REPORT_NIGHTLY_HOUR, REPORT_REFRESH_MINUTES,
+    WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL,
+)
 from handlers import admin, client, common, employee
 from database.session import init_db
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from utils import contract_review, metrics, tracing, webhook
+from utils.bot_session import PooledAiohttpSession, connection_stats
+from utils.fsm_storage import SQLiteStorage
 from utils.notifier import check_reminders
+from utils.reports import rebuild_all_reports, refresh_stale_reports
+from utils.update_scheduler import OrderedUpdateMiddleware, UpdateScheduler
 
-# Полное отключение проверки SSL на уровне окружения
-os.environ['PYTHONHTTPSVERIFY'] = '0'
-os.environ['CURL_CA_BUNDLE'] = ''
-os.environ['REQUESTS_CA_BUNDLE'] = ''
+if BOT_API_INSECURE_SSL:
+    # Полное отключение проверки SSL на уровне окружения (по явному BOT_API_INSECURE_SSL=1)
+    os.environ['PYTHONHTTPSVERIFY'] = '0'
+    os.environ['CURL_CA_BUNDLE'] = ''
+    os.environ['REQUESTS_CA_BUNDLE'] = ''
 
 warnings.filterwarnings("ignore", category=ResourceWarning)
 warnings.filterwarnings("ignore", message="Unclosed client session")
@@ -24,24 +31,38 @@ warnings.filterwarnings("ignore", message="Unclosed connector")
 warnings.filterwarnings("ignore", message=".*ssl.*", category=DeprecationWarning)
 warnings.filterwarnings("ignore", message=".*certificate.*")
 
-# Создаём небезопасный SSL контекст
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
 
-
-class DisabledSSLAiohttpSession(AiohttpSession):
-    async def create_session(self) -> aiohttp.ClientSession:
-        connector = aiohttp.TCPConnector(
-            ssl=False,
-            force_close=True,
-            enable_cleanup_closed=True
-        )
-        return aiohttp.ClientSession(
-            connector=connector,
-            json_serialize=self.json_dumps,
-            trust_env=True
-        )
+async def run_polling(dp: Dispatcher, bot: Bot, updates: UpdateScheduler):
+    """Long polling: обновления разных чатов обрабатываются параллельно, одного чата — по порядку."""
+    updates.start()
+    try:
+        await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        await updates.close()
+        # start_polling закрывает хранилище до завершения принятых обновлений
+        await dp.storage.close()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, updates: UpdateScheduler):
+    """Приём обновлений через webhook до остановки процесса."""
+    secret = WEBHOOK_SECRET or webhook.generate_secret()
+    app = webhook.create_app(dp, bot, secret, updates)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    await dp.emit_startup(bot=bot)
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logging.info(f"Webhook: {WEBHOOK_URL}{WEBHOOK_PATH}, порт {WEBHOOK_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
 
 
 async def main():
@@ -56,27 +77,22 @@ async def main():
 
     init_db()
 
-    session = DisabledSSLAiohttpSession()
+    # Пул keep-alive соединений к Bot API вместо нового TLS-рукопожатия на каждый запрос
+    session = PooledAiohttpSession()
     bot = Bot(token=BOT_TOKEN, session=session)
-    dp = Dispatcher()
-
-    # Middleware для отладки callback_query
-    from aiogram import BaseMiddleware
-    class DebugCallbackMiddleware(BaseMiddleware):
-        async def __call__(self, handler, event, data):
-            if hasattr(event, 'data'):
-                print(f"[MIDDLEWARE] callback_query received: user={event.from_user.id}, data={event.data}")
-            try:
-                result = await handler(event, data)
-                if hasattr(event, 'data'):
-                    print(f"[MIDDLEWARE] callback_query handled successfully: data={event.data}")
-                return result
-            except Exception as e:
-                if hasattr(event, 'data'):
-                    print(f"[MIDDLEWARE] callback_query ERROR: data={event.data}, error={e}")
-                raise
-
-    dp.callback_query.outer_middleware(DebugCallbackMiddleware())
+    # Состояния FSM хранятся в базе — перезапуск не сбрасывает шаги пользователей
+    storage = SQLiteStorage()
+    dp = Dispatcher(storage=storage)
+    metrics.FSM_CACHED_STATES.set_function(lambda: storage.cached_count)
+    metrics.FSM_STORED_STATES.set_function(storage.stored_count)
+
+    updates = UpdateScheduler()
+    if not WEBHOOK_URL:
+        # Long polling передаёт обработку планировщику; трассировка подключается
+        # после него и измеряет саму обработку, а не постановку в очередь
+        dp.update.outer_middleware(OrderedUpdateMiddleware(updates))
+    tracing.setup_logging()
+    tracing.install(dp)
 
     dp.include_router(admin.router)
     dp.include_router(employee.router)  # Роутер для сотрудников
@@ -88,17 +104,36 @@ async def main():
     print("=" * 40 + "\n")
     scheduler = AsyncIOScheduler()
     scheduler.add_job(check_reminders, 'interval', minutes=2, args=[bot])
+    # Отчёты: ночная пересборка всех и дневная — по накопившимся изменениям
+    scheduler.add_job(rebuild_all_reports, 'cron', hour=REPORT_NIGHTLY_HOUR, timezone='Asia/Tashkent')
+    scheduler.add_job(refresh_stale_reports, 'interval', minutes=REPORT_REFRESH_MINUTES)
+    # Брошенные состояния FSM и сессии обзора договоров (корутины — выполняются в цикле событий)
+    scheduler.add_job(storage.purge_expired, 'interval', hours=1)
+    scheduler.add_job(contract_review.purge_expired_job, 'interval', hours=1)
     scheduler.start()
+    metrics_runner = await metrics.start_server() if METRICS_PORT else None
     try:
-        await dp.start_polling(bot, handle_as_tasks=False)
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot, updates)
+        else:
+            await run_polling(dp, bot, updates)
     finally:
+        stats = connection_stats.snapshot()
+        logging.info(
+            f"Bot API: соединений открыто {stats['created']}, "
+            f"переиспользовано {stats['reused']} ({stats['reuse_ratio']:.0%})"
+        )
+        tracing.stop_logging()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
         await asyncio.sleep(0.250)  # Даем время на закрытие соединений
 
 
 if __name__ == "__main__":
-    # Установка контекста SSL на уровне процесса
-    ssl._create_default_https_context = ssl._create_unverified_context
+    if BOT_API_INSECURE_SSL:
+        # Установка контекста SSL на уровне процесса
+        ssl._create_default_https_context = ssl._create_unverified_context
 
     try:
         asyncio.run(main())
@@ -84,3 +84,55 @@ def mock_state():
     state.set_state = AsyncMock()
     state.clear = AsyncMock()
     return state
+
+
+@pytest.fixture(autouse=True)
+def no_holidays():
+    """Без праздников и закрытых дат, если тест не настроил их сам (utils/holidays.py)."""
+    from unittest.mock import patch
+    from utils import holidays
+    with patch.dict(holidays._holidays, {"ranges": []}), \
+         patch.dict(holidays._calendar_cache, clear=True):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def project_registry():
+    """Пустой реестр проектов в in-memory базе (utils/projects.py)."""
+    from unittest.mock import patch
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database.models import Base
+    from utils import projects
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    with patch.object(projects, "SessionLocal", sessionmaker(bind=engine)), \
+         patch.dict(projects._registry, {"ids": None, "names": None}), \
+         patch.dict(projects._listing, {"version": None, "names": None}), \
+         patch.dict(projects._summaries, {"key": None, "rows": None}):
+        yield
+
+
+@pytest.fixture
+def review_db():
+    """In-memory база для сессий обзора договоров (utils/contract_review.py)."""
+    from unittest.mock import patch
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database.models import Base
+    from utils import contract_review
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with patch.object(contract_review, "SessionLocal", factory):
+        yield factory
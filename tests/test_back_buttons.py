@@ -147,6 +147,9 @@ class TestBookingsKeyboards:
     def test_projects_keyboard_no_back_button(self):
         """_build_projects_keyboard НЕ содержит кнопку Назад (первый этап)"""
         from handlers.admin import _build_projects_keyboard
+        from utils.projects import get_project_id
+        for project in ("ЖК Навои", "ЖК Алгоритм"):
+            get_project_id(project)
         builder = _build_projects_keyboard(["ЖК Навои", "ЖК Алгоритм"])
         markup = builder.as_markup()
         all_buttons = [btn for row in markup.inline_keyboard for btn in row]
@@ -519,23 +522,34 @@ class TestHandleBackNavigation:
 class TestUpdateContractsBackHandlers:
     """Обработчики inline-кнопок «Назад» в потоке обновления договоров"""
 
+    @staticmethod
+    def _review_session(*contracts):
+        """Сессия обзора с заданными договорами смены ФИО / номера договора."""
+        from utils import contract_review
+        return contract_review.create_session({
+            "new_contracts": [],
+            "updated_contracts": [c for c in contracts if "contract_num" in c],
+            "changed_contracts": [c for c in contracts if "new_contract_num" in c],
+        })
+
     @pytest.mark.asyncio
-    async def test_review_back_first_contract_to_confirming(self):
+    async def test_review_back_first_contract_to_confirming(self, review_db):
         """ucrev_back на первом договоре → экран подтверждения"""
         from handlers.admin import update_contracts_review_action
 
+        session_id = self._review_session(
+            {"contract_id": 1, "apt_num": "1", "contract_num": "A1", "changes": {"client_fio": {"old": "A", "new": "B"}}},
+        )
+
         callback = AsyncMock()
         callback.data = "ucrev_back"
         callback.message = AsyncMock()
 
         state = AsyncMock()
         state.get_data = AsyncMock(return_value={
-            "uc_review_contracts": [{"type": "fio_change", "apt_num": "1", "changes": {"client_fio": {"old": "A", "new": "B"}}}],
+            "uc_session": session_id,
             "uc_review_index": 0,
-            "uc_review_decisions": {},
-            "uc_analysis": {"new_contracts": [], "changed_contracts": []},
             "uc_project": "ЖК Навои",
-            "uc_minor_updates": [],
             "uc_selected": [],
         })
 
@@ -543,17 +557,18 @@ class TestUpdateContractsBackHandlers:
         await update_contracts_review_action(callback, state, bot)
 
         state.set_state.assert_called_with(AdminSteps.update_contracts_confirming)
+        assert "Кв. 1 — ФИО: A → B" in callback.message.edit_text.call_args[0][0]
 
     @pytest.mark.asyncio
     @patch("handlers.admin._show_review_contract", new_callable=AsyncMock)
-    async def test_review_back_second_contract_to_first(self, mock_show_review):
+    async def test_review_back_second_contract_to_first(self, mock_show_review, review_db):
         """ucrev_back на втором договоре → первый договор"""
         from handlers.admin import update_contracts_review_action
 
-        contracts = [
-            {"type": "fio_change", "apt_num": "1", "changes": {"client_fio": {"old": "A", "new": "B"}}},
-            {"type": "fio_change", "apt_num": "2", "changes": {"client_fio": {"old": "C", "new": "D"}}},
-        ]
+        session_id = self._review_session(
+            {"contract_id": 1, "apt_num": "1", "contract_num": "A1", "changes": {"client_fio": {"old": "A", "new": "B"}}},
+            {"contract_id": 2, "apt_num": "2", "contract_num": "A2", "changes": {"client_fio": {"old": "C", "new": "D"}}},
+        )
 
         callback = AsyncMock()
         callback.data = "ucrev_back"
@@ -561,9 +576,8 @@ class TestUpdateContractsBackHandlers:
 
         state = AsyncMock()
         state.get_data = AsyncMock(return_value={
-            "uc_review_contracts": contracts,
+            "uc_session": session_id,
             "uc_review_index": 1,
-            "uc_review_decisions": {},
         })
 
         bot = AsyncMock()
@@ -575,25 +589,24 @@ class TestUpdateContractsBackHandlers:
 
     @pytest.mark.asyncio
     @patch("handlers.admin._show_review_contract", new_callable=AsyncMock)
-    async def test_final_summary_back_to_last_review(self, mock_show_review):
+    async def test_final_summary_back_to_last_review(self, mock_show_review, review_db):
         """uc_back_to_review из итогового экрана → последний обзорный договор"""
         from handlers.admin import update_contracts_back_to_review
 
-        contracts = [
-            {"type": "fio_change", "apt_num": "1", "changes": {"client_fio": {"old": "A", "new": "B"}}},
-            {"type": "fio_change", "apt_num": "2", "changes": {"client_fio": {"old": "C", "new": "D"}}},
-            {"type": "contract_change", "apt_num": "3", "old_contract_num": "X", "new_contract_num": "Y",
-             "telegram_id": None, "active_bookings_count": 0, "changes": {}},
-        ]
+        session_id = self._review_session(
+            {"contract_id": 1, "apt_num": "1", "contract_num": "A1", "changes": {"client_fio": {"old": "A", "new": "B"}}},
+            {"contract_id": 2, "apt_num": "2", "contract_num": "A2", "changes": {"client_fio": {"old": "C", "new": "D"}}},
+            {"contract_id": 3, "apt_num": "3", "old_contract_num": "X", "new_contract_num": "Y",
+             "telegram_id": None, "active_bookings_count": 0, "new_data": {}},
+        )
 
         callback = AsyncMock()
         callback.message = AsyncMock()
 
         state = AsyncMock()
         state.get_data = AsyncMock(return_value={
-            "uc_review_contracts": contracts,
+            "uc_session": session_id,
             "uc_review_index": 3,
-            "uc_review_decisions": {},
         })
 
         await update_contracts_back_to_review(callback, state)
@@ -603,16 +616,13 @@ class TestUpdateContractsBackHandlers:
         mock_show_review.assert_called_once_with(callback, state)
 
     @pytest.mark.asyncio
-    @patch("handlers.admin.SessionLocal")
-    async def test_confirming_back_to_project_selection(self, mock_session):
+    @patch("handlers.admin.get_project_names", return_value=["ЖК Алгоритм", "ЖК Навои"])
+    async def test_confirming_back_to_project_selection(self, mock_projects):
         """uc_back из экрана подтверждения → выбор проекта"""
         from handlers.admin import update_contracts_back_to_projects
-
-        mock_sess = MagicMock()
-        mock_session.return_value.__enter__.return_value = mock_sess
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = ["ЖК Навои", "ЖК Алгоритм"]
-        mock_sess.execute.return_value = mock_result
+        from utils.projects import get_project_id
+        for project in mock_projects.return_value:
+            get_project_id(project)
 
         callback = AsyncMock()
         callback.message = AsyncMock()
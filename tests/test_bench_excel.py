@@ -0,0 +1,46 @@
+"""
+Проверка бенчмарка импорта Excel (benchmarks/bench_excel.py) на малом корпусе.
+
+Книга содержит несколько проектов и даты сдачи строками и датами Excel;
+импорт, анализ следующей выгрузки и применение изменений проходят на
+книгах с заголовками по именам и позиционными, для каждой операции
+посчитаны скорость, память и SQL-запросы.
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from benchmarks import bench_excel
+
+
+class TestExcelBenchmark:
+    """Тесты корпуса и замеров импорта"""
+
+    def test_corpus(self, tmp_path):
+        """Книга: все проекты в одном файле, даты сдачи строками и датами"""
+        path, next_path = bench_excel.make_corpus(90, "positional", projects=3, corpus_dir=str(tmp_path))
+        df = pd.read_excel(path)
+        revised = pd.read_excel(next_path)
+
+        assert len(df) == 90 and len(revised) > len(df)
+        assert df.iloc[:, 0].nunique() == 3
+        dates = list(df.iloc[:, 6])
+        assert any(isinstance(value, str) for value in dates)
+        assert any(isinstance(value, datetime) for value in dates)
+
+    @pytest.mark.parametrize("headers", bench_excel.HEADERS)
+    def test_small_run(self, tmp_path, headers):
+        """Все операции замерены; анализ находит изменения следующей выгрузки"""
+        results = bench_excel.run([300], [headers], corpus_dir=str(tmp_path), isolate=False)
+        case = results[f"300_{headers}"]
+
+        assert case["imported"] == 300
+        assert case["analysis"]["new_contracts"] > 0
+        assert case["analysis"]["updated_contracts"] > 0
+        assert case["applied"]["added"] == case["analysis"]["new_contracts"]
+        for operation in bench_excel.OPERATIONS:
+            measured = case["operations"][operation]
+            assert measured["rows"] > 0 and measured["rows_per_second"] > 0
+            assert measured["queries"] > 0
+            assert measured["peak_rss_mb"] > 0
@@ -0,0 +1,25 @@
+"""
+Проверка микробенчмарков (benchmarks/bench_helpers.py).
+
+Все случаи выполняются на малом наборе данных, у каждого есть порог
+в benchmarks/thresholds.json, регрессия определяется по tolerance.
+"""
+from benchmarks import bench_helpers
+
+
+class TestMicrobenchmarks:
+    """Тесты набора микробенчмарков"""
+
+    def test_all_cases_measured(self):
+        """Каждый случай замеряется и имеет порог"""
+        results = bench_helpers.run(size=30, min_time=0.0001, repeats=1)
+
+        assert all(us > 0 for us in results.values())
+        assert set(results) == set(bench_helpers.load_thresholds()["cases"])
+
+    def test_regressions(self):
+        """Регрессия — замер дольше порога больше чем в tolerance раз"""
+        thresholds = {"tolerance": 1.5, "cases": {"a": 10.0, "b": 10.0}}
+        results = {"a": 14.9, "b": 15.1, "new": 100.0}
+
+        assert bench_helpers.find_regressions(results, thresholds) == [("b", 15.1, 10.0)]
@@ -0,0 +1,29 @@
+"""
+Проверка нагрузочного прогона (benchmarks/bench_load.py) на малом плане.
+
+Все сценарии проходят через настоящий Dispatcher без ошибок, для каждого
+посчитаны SQL-запросы и вызовы Bot API.
+"""
+from unittest.mock import patch
+
+from benchmarks import bench_load
+from database.session import SessionLocal
+from utils import projects
+
+
+class TestLoadHarness:
+    """Тесты нагрузочного прогона"""
+
+    async def test_small_run(self):
+        """Малый прогон всех сценариев завершается без ошибок"""
+        with patch.object(projects, "SessionLocal", SessionLocal):
+            result = await bench_load.run_load(
+                clients=16, concurrency=4, mix="booking=1,cancel=1,rebook=1,staff=1", staff_count=2,
+            )
+
+        assert result["errors"] == {}
+        assert result["totals"]["failed"] == 0
+        assert set(result["flows"]) == set(bench_load.FLOWS)
+        for flow in result["flows"].values():
+            assert flow["queries_mean"] > 0
+            assert flow["api_calls_mean"] > 0
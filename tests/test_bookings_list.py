@@ -0,0 +1,272 @@
+"""
+Тесты просмотра записей (utils/booking_browser.py).
+
+Проверяют: страница загружается запросом с LIMIT/OFFSET, счётчики дней и слотов
+считаются в SQL по всем записям (а не только попавшим на страницу),
+навигация по страницам и форматирование, поддержка флага is_first_booking.
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import events
+from database.models import Base, Contract, Booking
+from utils import booking_browser, occupancy
+
+
+FUTURE_DAY = date(2030, 3, 4)
+
+
+@pytest.fixture
+def session_factory():
+    """Фабрика сессий на in-memory SQLite с подключёнными слушателями database/events.py."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    events.install(factory)
+    return factory
+
+
+@pytest.fixture
+def db_session(session_factory):
+    """In-memory база: 5 записей в ЖК Альфа на один день и 1 — в ЖК Бета."""
+    with session_factory() as session:
+        for i in range(1, 6):
+            session.add(Contract(
+                id=i, house_name="ЖК Альфа", apt_num=str(10 - i), entrance="1",
+                floor=i, contract_num=f"A-{i}", client_fio=f"Клиент {i}"
+            ))
+            session.add(Booking(
+                contract_id=i, date=FUTURE_DAY,
+                time_slot=time(9, 0) if i <= 3 else time(10, 0)
+            ))
+        session.add(Contract(id=6, house_name="ЖК Бета", apt_num="1", contract_num="B-1", client_fio="Бета"))
+        session.add(Booking(contract_id=6, date=FUTURE_DAY, time_slot=time(9, 0)))
+        # Отменённая запись не попадает в список
+        session.add(Booking(contract_id=6, date=FUTURE_DAY, time_slot=time(11, 0), is_cancelled=True))
+        session.commit()
+        yield session
+
+
+class TestBookingsPage:
+    """Тесты загрузки страницы"""
+
+    def test_page_is_limited(self, db_session, monkeypatch):
+        """Страница содержит не больше BOOKINGS_PAGE_SIZE записей"""
+        monkeypatch.setattr(booking_browser, "BOOKINGS_PAGE_SIZE", 2)
+        rows, _ = booking_browser.get_bookings_page(db_session, {}, 0)
+        assert len(rows) == 2
+
+        rows, _ = booking_browser.get_bookings_page(db_session, {}, 2)
+        assert [c.contract_num for _, c in rows] == ["A-5", "B-1"]
+
+    def test_slot_counts_cover_whole_day(self, db_session, monkeypatch):
+        """Счётчики слотов учитывают записи с других страниц"""
+        monkeypatch.setattr(booking_browser, "BOOKINGS_PAGE_SIZE", 2)
+        _, slot_counts = booking_browser.get_bookings_page(db_session, {}, 0)
+
+        assert slot_counts[("ЖК Альфа", FUTURE_DAY, time(9, 0))] == 3
+        assert slot_counts[("ЖК Альфа", FUTURE_DAY, time(10, 0))] == 2
+
+    def test_project_filter(self, db_session):
+        """Фильтр по проектам"""
+        rows, _ = booking_browser.get_bookings_page(db_session, {"bk_projects": ["ЖК Бета"]}, 0)
+        assert [c.contract_num for _, c in rows] == ["B-1"]
+
+    def test_sorted_by_entrance_floor_apartment(self, db_session):
+        """Внутри слота записи идут по подъезду, этажу, квартире"""
+        rows, _ = booking_browser.get_bookings_page(db_session, {"bk_projects": ["ЖК Альфа"]}, 0)
+        assert [c.floor for _, c in rows] == [1, 2, 3, 4, 5]
+
+    def test_page_beyond_end_is_empty(self, db_session):
+        """Страница за пределами списка пуста"""
+        rows, slot_counts = booking_browser.get_bookings_page(db_session, {}, 10)
+        assert rows == [] and slot_counts == {}
+
+
+class TestBookingsPageFormatting:
+    """Тесты форматирования и навигации"""
+
+    def test_format_page(self, db_session):
+        """Заголовки проектов, дней и слотов с количеством записей"""
+        rows, slot_counts = booking_browser.get_bookings_page(db_session, {}, 0)
+        text = booking_browser.format_bookings_page(rows, slot_counts, {"ЖК Альфа": 5, "ЖК Бета": 1})
+
+        assert "📋 **ЖК Альфа** ( 5 записей )" in text
+        assert "📅 **04.03.2030** ( 5 записей )" in text
+        assert "🕐 **09:00** ( 3 записи )" in text
+        assert "📋 **ЖК Бета** ( 1 запись )" in text
+        assert "повторная" not in text
+
+    def test_repeat_booking_label(self, db_session):
+        """Повторная запись договора помечается"""
+        db_session.add(Booking(contract_id=1, date=FUTURE_DAY, time_slot=time(13, 0)))
+        db_session.commit()
+
+        rows, slot_counts = booking_browser.get_bookings_page(db_session, {"bk_projects": ["ЖК Альфа"]}, 0)
+        text = booking_browser.format_bookings_page(rows, slot_counts, {"ЖК Альфа": 6})
+
+        assert text.count("_(повторная)_") == 1
+        assert "A-1 _(повторная)_" in text
+
+    def test_client_line(self, db_session):
+        """Строка сотрудника: ФИО клиента и квартира вместо договора"""
+        rows, slot_counts = booking_browser.get_bookings_page(db_session, {"bk_projects": ["ЖК Бета"]}, 0)
+        text = booking_browser.format_bookings_page(
+            rows, slot_counts, {"ЖК Бета": 1}, booking_browser.format_client_line
+        )
+
+        assert "    Бета (кв.1)" in text
+        assert "B-1" not in text
+
+    @pytest.mark.asyncio
+    async def test_employee_page_shows_client(self, session_factory, db_session, mock_callback, mock_state):
+        """Сотрудник видит, кто придёт: ФИО клиента на странице списка"""
+        from handlers import employee
+
+        mock_state.get_data.return_value = {"bk_pages": 1, "bk_project_totals": {"ЖК Альфа": 5, "ЖК Бета": 1}}
+        with patch.object(booking_browser, "SessionLocal", session_factory):
+            await employee._emp_render_bookings_page(mock_callback, mock_state, 0)
+
+        text = mock_callback.message.edit_text.call_args.args[0]
+        assert "Клиент 1 (кв.9)" in text
+        assert "Бета (кв.1)" in text
+
+    def test_navigation_first_page(self):
+        """На первой странице нет кнопки «назад»"""
+        markup = booking_browser.build_page_keyboard(0, 3).as_markup()
+        callbacks = [b.callback_data for row in markup.inline_keyboard for b in row]
+        assert callbacks == ["bkpage_noop", "bkpage_1", "bkpage_close"]
+
+    def test_navigation_middle_page(self):
+        """На средней странице есть обе стрелки"""
+        markup = booking_browser.build_page_keyboard(1, 3).as_markup()
+        callbacks = [b.callback_data for row in markup.inline_keyboard for b in row]
+        assert callbacks == ["bkpage_0", "bkpage_noop", "bkpage_2", "bkpage_close"]
+
+    def test_navigation_single_page(self):
+        """Одна страница — только счётчик и закрытие"""
+        markup = booking_browser.build_page_keyboard(0, 1).as_markup()
+        callbacks = [b.callback_data for row in markup.inline_keyboard for b in row]
+        assert callbacks == ["bkpage_noop", "bkpage_close"]
+
+
+class TestDateIndex:
+    """Тесты индекса дат для клавиатур недель и дней"""
+
+    @pytest.fixture
+    def index_env(self, session_factory, db_session):
+        with patch.object(occupancy, "SessionLocal", session_factory), \
+             patch.dict(occupancy._index, {"projects": None}):
+            yield session_factory
+
+    def test_weeks_and_days(self, index_env):
+        """Недели и дни строятся по индексу"""
+        with index_env() as session:
+            session.add(Booking(contract_id=6, date=date(2030, 3, 13), time_slot=time(9, 0)))
+            session.commit()
+
+        assert booking_browser.get_booking_weeks() == [
+            (date(2030, 3, 4), date(2030, 3, 10)),
+            (date(2030, 3, 11), date(2030, 3, 17)),
+        ]
+        assert booking_browser.get_booking_weeks("ЖК Альфа") == [(date(2030, 3, 4), date(2030, 3, 10))]
+        assert booking_browser.get_booking_dates_in_week(
+            date(2030, 3, 11), date(2030, 3, 17), ["ЖК Бета"]
+        ) == [date(2030, 3, 13)]
+
+    def test_toggles_do_not_query_database(self, index_env):
+        """Перерисовка клавиатур и изменения записей не сканируют базу"""
+        booking_browser.get_booking_weeks()
+
+        with index_env() as session:
+            session.add(Booking(contract_id=6, date=date(2030, 4, 1), time_slot=time(9, 0)))
+            session.commit()
+
+        with patch.object(occupancy, "SessionLocal") as mock_session:
+            booking_browser.get_booking_weeks()
+            assert booking_browser.get_booking_dates_in_week(
+                date(2030, 4, 1), date(2030, 4, 7)
+            ) == [date(2030, 4, 1)]
+            mock_session.assert_not_called()
+
+
+class TestFirstBookingFlag:
+    """Тесты флага is_first_booking"""
+
+    @pytest.fixture
+    def contract_id(self, session_factory):
+        with session_factory() as session:
+            session.add(Contract(id=1, house_name="ЖК Альфа", apt_num="1", contract_num="F-1"))
+            session.commit()
+        return 1
+
+    def _add(self, factory, contract_id, day):
+        with factory() as session:
+            booking = Booking(contract_id=contract_id, date=date(2030, 3, day), time_slot=time(9, 0))
+            session.add(booking)
+            session.commit()
+            return booking.id
+
+    def _flags(self, factory):
+        with factory() as session:
+            return {b.id: b.is_first_booking for b in session.query(Booking).order_by(Booking.id)}
+
+    def test_first_and_repeat(self, session_factory, contract_id):
+        """Первая запись договора помечена, следующие — повторные"""
+        first = self._add(session_factory, contract_id, 4)
+        second = self._add(session_factory, contract_id, 5)
+
+        assert self._flags(session_factory) == {first: True, second: False}
+
+    def test_cancel_promotes_next(self, session_factory, contract_id):
+        """После отмены первой записи первой становится следующая"""
+        first = self._add(session_factory, contract_id, 4)
+        second = self._add(session_factory, contract_id, 5)
+
+        with session_factory() as session:
+            booking = session.get(Booking, first)
+            booking.is_cancelled = True
+            session.commit()
+
+        assert self._flags(session_factory) == {first: False, second: True}
+
+    def test_rebook_in_one_transaction(self, session_factory, contract_id):
+        """Отмена и новая запись в одной транзакции — новая запись первая"""
+        first = self._add(session_factory, contract_id, 4)
+
+        with session_factory() as session:
+            session.get(Booking, first).is_cancelled = True
+            new_booking = Booking(contract_id=contract_id, date=date(2030, 3, 6), time_slot=time(10, 0))
+            session.add(new_booking)
+            session.commit()
+            new_id = new_booking.id
+
+        assert self._flags(session_factory) == {first: False, new_id: True}
+
+    def test_flag_visible_before_commit(self, session_factory, contract_id):
+        """Загруженные объекты получают значение флага сразу после flush"""
+        with session_factory() as session:
+            booking = Booking(contract_id=contract_id, date=date(2030, 3, 4), time_slot=time(9, 0))
+            session.add(booking)
+            session.flush()
+            assert booking.is_first_booking is True
+
+    def test_backfill(self, session_factory, contract_id):
+        """Пересчёт по всей таблице (миграция) восстанавливает флаги"""
+        first = self._add(session_factory, contract_id, 4)
+        second = self._add(session_factory, contract_id, 5)
+
+        with session_factory() as session:
+            session.connection().exec_driver_sql("UPDATE bookings SET is_first_booking = 0")
+            events.refresh_first_bookings(session.connection())
+            session.commit()
+
+        assert self._flags(session_factory) == {first: True, second: False}
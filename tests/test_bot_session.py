@@ -0,0 +1,60 @@
+"""
+Тесты HTTP-сессии Bot API (utils/bot_session.py).
+
+Проверяют: одна сессия на все запросы, соединение переиспользуется
+между запросами (keep-alive) и учитывается в счётчиках, настройки пула
+и режим без проверки сертификатов.
+"""
+import ssl
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.bot_session import ConnectionStats, PooledAiohttpSession
+
+
+async def _ok(request):
+    return web.json_response({"ok": True, "result": True})
+
+
+class TestPooledSession:
+    """Тесты пула соединений"""
+
+    @pytest.mark.asyncio
+    async def test_connection_reused(self):
+        """Несколько запросов идут через одно keep-alive соединение"""
+        app = web.Application()
+        app.router.add_post("/send", _ok)
+        server = TestServer(app)
+        await server.start_server()
+
+        stats = ConnectionStats()
+        session = PooledAiohttpSession(stats=stats)
+        try:
+            client = await session.create_session()
+            for _ in range(5):
+                async with client.post(server.make_url("/send")) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+            assert await session.create_session() is client
+        finally:
+            await session.close()
+            await server.close()
+
+        assert stats.created == 1
+        assert stats.reused == 4
+        assert stats.reuse_ratio == pytest.approx(0.8)
+
+    def test_pool_settings(self):
+        """Ограничения пула и keep-alive передаются коннектору"""
+        session = PooledAiohttpSession(limit=50, limit_per_host=10, keepalive_seconds=30)
+        assert session._connector_init["limit"] == 50
+        assert session._connector_init["limit_per_host"] == 10
+        assert session._connector_init["keepalive_timeout"] == 30
+        assert "force_close" not in session._connector_init
+        assert isinstance(session._connector_init["ssl"], ssl.SSLContext)
+
+    def test_insecure_ssl_opt_in(self):
+        """Без проверки сертификатов — только по явной настройке"""
+        assert PooledAiohttpSession(insecure_ssl=True)._connector_init["ssl"] is False
@@ -0,0 +1,70 @@
+"""
+Тесты компактных callback_data (keyboards/callbacks.py).
+
+Проверяют: упаковку и разбор дат, времени и месяцев, размер полезной
+нагрузки и различение проектов с одинаковым началом названия.
+"""
+from datetime import date, time
+
+import pytest
+
+from database.models import Project
+from keyboards.callbacks import (
+    ALL_PROJECTS, DateCallback, MonthCallback, ProjectCallback, RebookCallback, TimeCallback,
+)
+from utils import projects
+
+
+class TestSlotCallbacks:
+    """Тесты дат и времени"""
+
+    def test_date_round_trip(self):
+        """Дата упаковывается числом дней и разбирается обратно"""
+        packed = DateCallback.of(date(2026, 2, 9)).pack()
+        assert packed == "d:770"
+        assert DateCallback.unpack(packed).booking_date == date(2026, 2, 9)
+
+    def test_time_round_trip(self):
+        """Время упаковывается минутами от полуночи"""
+        callback = TimeCallback.unpack(TimeCallback.of(date(2026, 2, 9), time(13, 30)).pack())
+        assert callback.booking_date == date(2026, 2, 9)
+        assert callback.slot_time == time(13, 30)
+
+    def test_rebook_prefix_differs(self):
+        """Перезапись и выбор времени не пересекаются по префиксу"""
+        rebook = RebookCallback.of(date(2026, 2, 9), time(9, 0)).pack()
+        assert not rebook.startswith("t:")
+        assert RebookCallback.unpack(rebook).slot_time == time(9, 0)
+
+    def test_month(self):
+        """Переход на месяц"""
+        assert MonthCallback.unpack(MonthCallback(year=2026, month=12).pack()).month == 12
+
+
+class TestProjectCallback:
+    """Тесты выбора проекта"""
+
+    def test_long_names_distinct(self):
+        """Проекты с общими первыми 40 символами различаются, длина в пределах 64 байт"""
+        projects.get_project_id("Ж" * 40 + " блок 1")
+        projects.get_project_id("Ж" * 40 + " блок 2")
+        first = ProjectCallback.of("bk", "Ж" * 40 + " блок 1")
+        second = ProjectCallback.of("bk", "Ж" * 40 + " блок 2")
+
+        assert first.project != second.project
+        assert len(first.pack().encode()) <= 64
+        assert ProjectCallback.unpack(second.pack()).project_name == "Ж" * 40 + " блок 2"
+
+    def test_unknown_project_not_registered(self):
+        """Кнопка неизвестного проекта — KeyError, без записи в реестр"""
+        with pytest.raises(KeyError):
+            ProjectCallback.of("bk", "ЖК Неизвестный")
+
+        with projects.SessionLocal() as session:
+            assert session.query(Project).count() == 0
+
+    def test_all_projects(self):
+        """Без названия — все проекты"""
+        callback = ProjectCallback.of("emp")
+        assert callback.project == ALL_PROJECTS
+        assert callback.project_name is None
@@ -0,0 +1,103 @@
+"""
+Тесты списков записей клиента (handlers/client.py).
+
+Проверяют: get_user_active_bookings отдаёт записи пользователя вместе
+с договорами (по автору записи и по привязке договора, без отменённых
+и прошедших), а кнопки «Мои записи», «Отменить запись» и «Перезапись»
+делают постоянное число SQL-запросов независимо от числа записей.
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from datetime import date, time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Booking, Contract
+from handlers import client
+from utils.tracing import query_budget
+
+USER_ID = 100500
+FUTURE_DAY = date(2030, 3, 4)
+
+
+def _session_factory():
+    """Фабрика сессий на пустой in-memory базе."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def _add_bookings(factory, count: int) -> None:
+    """count активных записей пользователя на разные договоры и по одной лишней."""
+    with factory() as s:
+        for i in range(count):
+            contract = Contract(
+                house_name="ЖК Навои" if i % 2 else "ЖК Тест", apt_num=str(i), contract_num=f"C-{i}",
+                client_fio=f"Клиент {i}", delivery_date=date(2026, 1, 1),
+                telegram_id=USER_ID if i == 0 else None,
+            )
+            s.add(contract)
+            s.flush()
+            s.add(Booking(contract_id=contract.id, user_telegram_id=None if i == 0 else USER_ID,
+                          date=FUTURE_DAY, time_slot=time(9 + i % 8, 0), client_phone="+998900000000"))
+        other = Contract(house_name="ЖК Тест", apt_num="99", contract_num="OTHER", client_fio="Другой")
+        s.add(other)
+        s.flush()
+        s.add_all([
+            Booking(contract_id=other.id, user_telegram_id=USER_ID, date=FUTURE_DAY,
+                    time_slot=time(17, 0), client_phone="", is_cancelled=True),
+            Booking(contract_id=other.id, user_telegram_id=USER_ID, date=date(2020, 1, 1),
+                    time_slot=time(10, 0), client_phone=""),
+            Booking(contract_id=other.id, user_telegram_id=1, date=FUTURE_DAY,
+                    time_slot=time(10, 0), client_phone=""),
+        ])
+        s.commit()
+
+
+def _message():
+    message = AsyncMock()
+    message.from_user = MagicMock()
+    message.from_user.id = USER_ID
+    return message
+
+
+class TestUserActiveBookings:
+    """Тесты get_user_active_bookings"""
+
+    def test_joined_rows(self):
+        """Записи пользователя приходят вместе с договорами, по дате и времени"""
+        session_factory = _session_factory()
+        _add_bookings(session_factory, 3)
+        with session_factory() as session:
+            rows = client.get_user_active_bookings(session, USER_ID)
+            houses = client.get_user_active_bookings(session, USER_ID, "ЖК Навои")
+
+        assert [(b.time_slot.hour, c.contract_num) for b, c in rows] == [(9, "C-0"), (10, "C-1"), (11, "C-2")]
+        assert [c.contract_num for _, c in houses] == ["C-1"]
+
+
+class TestMenuQueryBudget:
+    """Кнопки меню клиента не делают запрос на каждую запись"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("handler", [
+        client.my_bookings_button, client.cancel_booking_button, client.view_calendar_button,
+    ])
+    @patch("handlers.client.get_message", return_value="test")
+    @patch("handlers.client.get_user_language", return_value="ru")
+    async def test_constant_queries(self, mock_lang, mock_get_message, handler, mock_state):
+        """Число запросов одинаково для 2 и 8 записей"""
+        queries = []
+        for count in (2, 8):
+            factory = _session_factory()
+            _add_bookings(factory, count)
+            with patch("handlers.client.SessionLocal", factory), query_budget(max_queries=1, max_repeats=1) as trace:
+                await handler(_message(), mock_state)
+            queries.append(trace.queries)
+
+        assert queries == [1, 1]
@@ -0,0 +1,117 @@
+"""
+Тесты сессий обзора изменений договоров (utils/contract_review.py).
+
+Проверяют: разбиение результата анализа по видам, постраничное чтение
+договоров обзора, сохранение решений, сборку списков для применения
+и удаление завершённых и брошенных сессий.
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database.models import ContractReviewItem
+from utils import contract_review
+from utils.contract_review import KIND_MINOR, KIND_NEW, KIND_REVIEW
+
+
+def _analysis(review_count=3):
+    """Результат analyze_excel_changes: 2 новых, 1 обновление полей, review_count смен ФИО."""
+    return {
+        "new_contracts": [
+            {"house_name": "ЖК Навои", "apt_num": str(i), "contract_num": f"N{i}"} for i in (10, 11)
+        ],
+        "updated_contracts": [
+            {"contract_id": 1, "apt_num": "1", "contract_num": "A1",
+             "changes": {"floor": {"old": 1, "new": 2}}},
+        ] + [
+            {"contract_id": 100 + i, "apt_num": str(100 + i), "contract_num": f"F{i}",
+             "changes": {"client_fio": {"old": "Старое", "new": f"Новое {i}"}}}
+            for i in range(review_count)
+        ],
+        "changed_contracts": [],
+    }
+
+
+class TestReviewSession:
+    """Тесты промежуточной таблицы обзора"""
+
+    def test_counts_and_paging(self, review_db):
+        """Строки разложены по видам, договоры обзора читаются по одному"""
+        session_id = contract_review.create_session(_analysis())
+
+        assert contract_review.get_counts(session_id) == {KIND_NEW: 2, KIND_MINOR: 1, KIND_REVIEW: 3}
+        item = contract_review.get_review_item(session_id, 1)
+        assert item["type"] == "fio_change"
+        assert item["apt_num"] == "101"
+        assert item["actions"] == []
+        assert contract_review.get_review_item(session_id, 3) is None
+        assert len(contract_review.get_review_items(session_id, limit=2)) == 2
+
+    def test_actions_saved(self, review_db):
+        """Решения по договору сохраняются в строке и попадают в итог и применение"""
+        session_id = contract_review.create_session(_analysis())
+        contract_review.set_review_actions(session_id, 0, {"notify", "unbind_tg"})
+        contract_review.set_review_actions(session_id, 2, {"notify"})
+
+        assert contract_review.count_review_actions(session_id) == {
+            "unbind_tg": 1, "cancel_bookings": 0, "notify": 2,
+        }
+        changes = contract_review.load_changes(session_id, [KIND_REVIEW, KIND_MINOR])
+        assert [c["actions"] for c in changes[KIND_REVIEW]] == [["notify", "unbind_tg"], [], ["notify"]]
+        assert changes[KIND_MINOR][0]["changes"] == {"floor": {"old": 1, "new": 2}}
+        assert KIND_NEW not in changes
+
+        contract_review.clear_review_actions(session_id)
+        assert contract_review.count_review_actions(session_id)["notify"] == 0
+
+    def test_sessions_isolated_and_discarded(self, review_db):
+        """Сессии разных админов не пересекаются; завершённая удаляется"""
+        first = contract_review.create_session(_analysis(review_count=1))
+        second = contract_review.create_session(_analysis(review_count=2))
+        contract_review.discard_session(first)
+
+        assert contract_review.get_counts(first) == {KIND_NEW: 0, KIND_MINOR: 0, KIND_REVIEW: 0}
+        assert contract_review.get_counts(second)[KIND_REVIEW] == 2
+
+    def test_abandoned_sessions_purged(self, review_db):
+        """Сессии старше срока жизни удаляются задачей планировщика"""
+        with patch.object(contract_review, "_now", return_value=1000.0):
+            contract_review.create_session(_analysis())
+        with patch.object(contract_review, "_now", return_value=1000.0 + 2 * 3600):
+            fresh = contract_review.create_session(_analysis(review_count=1))
+            assert contract_review.purge_expired(ttl_hours=1) == 6
+
+        with review_db() as session:
+            assert {row.session_id for row in session.query(ContractReviewItem)} == {fresh}
+
+    @pytest.mark.asyncio
+    async def test_purge_job_runs_on_loop(self, review_db):
+        """Задача планировщика выполняется в потоке цикла событий, а не в пуле потоков"""
+        threads = []
+        purge = contract_review.purge_expired
+
+        def recording_purge(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return purge(*args, **kwargs)
+
+        with patch.object(contract_review, "_now", return_value=1000.0):
+            contract_review.create_session(_analysis())
+
+        done = asyncio.Event()
+        scheduler = AsyncIOScheduler()
+        scheduler.add_listener(lambda event: done.set(), EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        with patch.object(contract_review, "purge_expired", recording_purge):
+            scheduler.add_job(contract_review.purge_expired_job)
+            scheduler.start()
+            try:
+                await asyncio.wait_for(done.wait(), timeout=5)
+            finally:
+                scheduler.shutdown(wait=False)
+
+        assert threads == [threading.get_ident()]
+        with review_db() as session:
+            assert session.query(ContractReviewItem).count() == 0
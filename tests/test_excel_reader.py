@@ -1,6 +1,8 @@
 """
 Unit тесты для модуля обработки Excel файлов.
 """
+import threading
+
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import date
@@ -43,6 +45,46 @@ class TestProcessExcelFile:
         assert mock_session_instance.add.call_count == 2
         mock_session_instance.commit.assert_called_once()
     
+    @pytest.mark.asyncio
+    @patch('utils.excel_reader.SessionLocal')
+    @patch('utils.excel_reader.pd.read_excel')
+    async def test_async_import_parses_in_thread(self, mock_read_excel, mock_session):
+        """process_excel_file_async читает файл в потоке, а пишет в базу в цикле событий"""
+        from utils.excel_reader import process_excel_file_async
+
+        threads = {}
+
+        def read_excel(path):
+            threads["read"] = threading.get_ident()
+            return pd.DataFrame({
+                'Название дома': ['ЖК Навои', 'ЖК Sunrise'],
+                'Номер квартиры': ['101', '202'],
+                'Подъезд': ['1', '2'],
+                'Этаж': [5, 10],
+                'Номер договора': ['12345-GHP', '67890-ABC'],
+                'ФИО клиента': ['Иванов Иван', 'Петров Петр'],
+                'Дата сдачи': ['15.02.2026', '20.03.2026'],
+            })
+
+        mock_session_instance = MagicMock()
+        session_context = MagicMock()
+        session_context.__enter__.return_value = mock_session_instance
+
+        def session_factory():
+            threads["db"] = threading.get_ident()
+            return session_context
+
+        mock_read_excel.side_effect = read_excel
+        mock_session.side_effect = session_factory
+        mock_session_instance.query.return_value.filter_by.return_value.first.return_value = None
+
+        result = await process_excel_file_async("test.xlsx", project_name="ЖК Sunrise")
+
+        assert result == (1, 'ЖК Навои')
+        assert mock_session_instance.add.call_args[0][0].apt_num == '202'
+        assert threads["read"] != threading.get_ident()
+        assert threads["db"] == threading.get_ident()
+
     @patch('utils.excel_reader.SessionLocal')
     @patch('utils.excel_reader.pd.read_excel')
     def test_update_existing_contract(self, mock_read_excel, mock_session):
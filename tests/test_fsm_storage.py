@@ -0,0 +1,149 @@
+"""
+Тесты хранилища состояний FSM (utils/fsm_storage.py).
+
+Проверяют: состояние и данные переживают перезапуск, записи объединяются
+в одну транзакцию, брошенные состояния истекают, кэш ограничен по размеру.
+"""
+import asyncio
+import threading
+
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from unittest.mock import MagicMock, patch
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, FsmState
+from utils import fsm_storage
+from utils.fsm_storage import SQLiteStorage
+from utils.states import ClientSteps
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+@pytest.fixture
+def session_factory():
+    """In-memory база с таблицей fsm_states."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+class TestSQLiteStorage:
+    """Тесты FSM-хранилища"""
+
+    @pytest.mark.asyncio
+    async def test_survives_restart(self, session_factory):
+        """Шаг и данные читаются новым экземпляром хранилища после close()"""
+        storage = SQLiteStorage(session_factory)
+        await storage.set_state(_key(1), ClientSteps.selecting_date)
+        await storage.update_data(_key(1), {"contract_id": 7, "house_name": "ЖК Навои"})
+        await storage.close()
+
+        restarted = SQLiteStorage(session_factory)
+        assert await restarted.get_state(_key(1)) == ClientSteps.selecting_date.state
+        assert await restarted.get_data(_key(1)) == {"contract_id": 7, "house_name": "ЖК Навои"}
+        assert await restarted.get_state(_key(2)) is None
+
+    @pytest.mark.asyncio
+    async def test_writes_coalesced(self, session_factory):
+        """Несколько изменений подряд записываются одной транзакцией"""
+        counting_factory = MagicMock(side_effect=session_factory)
+        storage = SQLiteStorage(counting_factory, flush_seconds=0.01)
+        await storage.set_state(_key(1), ClientSteps.selecting_date)
+        for i in range(5):
+            await storage.update_data(_key(1), {"step": i})
+        await storage.set_state(_key(2), ClientSteps.selecting_time)
+        await asyncio.sleep(0.05)
+
+        # Два чтения при первом обращении к ключам и одна запись
+        assert counting_factory.call_count == 3
+        with session_factory() as session:
+            assert session.get(FsmState, storage._key_builder.build(_key(1))).data == '{"step":4}'
+
+    @pytest.mark.asyncio
+    async def test_cleared_state_removed(self, session_factory):
+        """После state.clear() строка удаляется из базы"""
+        storage = SQLiteStorage(session_factory)
+        await storage.set_state(_key(1), ClientSteps.selecting_date)
+        await storage.close()
+        await storage.set_state(_key(1), None)
+        await storage.set_data(_key(1), {})
+        await storage.close()
+
+        with session_factory() as session:
+            assert session.query(FsmState).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_abandoned_state_expires(self, session_factory):
+        """Состояние без изменений дольше срока жизни считается пустым и удаляется"""
+        storage = SQLiteStorage(session_factory, ttl_hours=1)
+        with patch.object(fsm_storage, "_now", return_value=1000.0):
+            await storage.set_state(_key(1), ClientSteps.selecting_date)
+            await storage.close()
+
+        with patch.object(fsm_storage, "_now", return_value=1000.0 + 2 * 3600):
+            assert await SQLiteStorage(session_factory, ttl_hours=1).purge_expired() == 1
+            assert await SQLiteStorage(session_factory, ttl_hours=1).get_state(_key(1)) is None
+
+    @pytest.mark.asyncio
+    async def test_cache_bounded(self, session_factory):
+        """В памяти не больше cache_size состояний; вытесненные сохранены в базе"""
+        storage = SQLiteStorage(session_factory, cache_size=2)
+        for user_id in range(1, 6):
+            await storage.set_state(_key(user_id), ClientSteps.selecting_date)
+
+        assert len(storage._entries) == 2
+        assert await storage.get_state(_key(1)) == ClientSteps.selecting_date.state
+
+    @pytest.mark.asyncio
+    async def test_purge_during_updates(self, session_factory):
+        """Очистка по расписанию идёт в цикле событий и не теряет изменения обработчиков"""
+        storage = SQLiteStorage(session_factory, ttl_hours=1, flush_seconds=0.001)
+        with patch.object(fsm_storage, "_now", return_value=1000.0):
+            for user_id in range(100, 120):
+                await storage.set_state(_key(user_id), ClientSteps.selecting_date)
+            storage.flush()
+
+        flush = storage.flush
+        flush_threads = set()
+
+        def recording_flush():
+            flush_threads.add(threading.get_ident())
+            return flush()
+
+        executed, errors = [], []
+        scheduler = AsyncIOScheduler()
+        scheduler.add_listener(lambda event: (errors if event.exception else executed).append(event),
+                               EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        scheduler.add_job(storage.purge_expired, "interval", seconds=0.005)
+
+        async def handle(user_id):
+            for step in range(30):
+                await storage.update_data(_key(user_id), {"step": step})
+                await asyncio.sleep(0.001)
+
+        with patch.object(storage, "flush", recording_flush):
+            scheduler.start()
+            try:
+                await asyncio.gather(*(handle(user_id) for user_id in range(1, 21)))
+            finally:
+                scheduler.shutdown(wait=False)
+            await storage.close()
+
+        assert executed and not errors
+        assert flush_threads == {threading.get_ident()}
+        restarted = SQLiteStorage(session_factory)
+        for user_id in range(1, 21):
+            assert await restarted.get_data(_key(user_id)) == {"step": 29}
+        with session_factory() as session:
+            assert session.query(FsmState).count() == 20
@@ -1,6 +1,7 @@
 """
 Unit тесты для обработчиков (handlers).
 """
+import logging
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from datetime import date, time, datetime, timedelta
@@ -287,15 +288,17 @@ class TestClientHandlers:
     async def test_date_before_min_date_rejected(self, mock_min_date, mock_session):
         """Дата раньше минимальной отклоняется"""
         from handlers.client import date_selected
+        from keyboards.callbacks import DateCallback
         
         mock_min_date.return_value = date(2026, 2, 5)
         
         mock_callback = AsyncMock()
-        mock_callback.data = "date_2026-02-03"  # Раньше минимальной
+        callback_data = DateCallback.of(date(2026, 2, 3))  # Раньше минимальной
         
         mock_state = AsyncMock()
+        mock_state.get_data.return_value = {}
         
-        await date_selected(mock_callback, mock_state)
+        await date_selected(mock_callback, mock_state, callback_data)
         
         mock_callback.answer.assert_called()
         call_args = mock_callback.answer.call_args
@@ -307,15 +310,17 @@ class TestClientHandlers:
     async def test_weekend_date_rejected(self, mock_min_date, mock_session):
         """Выходные дни отклоняются"""
         from handlers.client import date_selected
+        from keyboards.callbacks import DateCallback
         
         mock_min_date.return_value = date(2026, 1, 29)
         
         mock_callback = AsyncMock()
-        mock_callback.data = "date_2026-01-31"  # Суббота
+        callback_data = DateCallback.of(date(2026, 1, 31))  # Суббота
         
         mock_state = AsyncMock()
+        mock_state.get_data.return_value = {}
         
-        await date_selected(mock_callback, mock_state)
+        await date_selected(mock_callback, mock_state, callback_data)
         
         mock_callback.answer.assert_called()
         call_text = str(mock_callback.answer.call_args)
@@ -327,9 +332,10 @@ class TestClientHandlers:
     async def test_time_slot_full_rejected(self, mock_session, mock_get_lang):
         """Занятый слот отклоняется"""
         from handlers.client import time_selected
+        from keyboards.callbacks import TimeCallback
         
         mock_callback = AsyncMock()
-        mock_callback.data = "time_2026-02-02_10:00"
+        callback_data = TimeCallback.of(date(2026, 2, 2), time(10, 0))
         
         mock_state = AsyncMock()
         mock_state.get_data.return_value = {
@@ -348,7 +354,7 @@ class TestClientHandlers:
         mock_query.filter.return_value = mock_query
         mock_query.count.return_value = 2  # Полностью занят
         
-        await time_selected(mock_callback, mock_state)
+        await time_selected(mock_callback, mock_state, callback_data)
         
         mock_callback.answer.assert_called()
         call_args = mock_callback.answer.call_args
@@ -390,6 +396,24 @@ class TestIsAdminFilter:
         
         assert result is False
 
+    @pytest.mark.asyncio
+    @patch('handlers.admin.is_admin')
+    async def test_callback_not_printed(self, mock_is_admin, capsys, caplog):
+        """Проверка callback не пишет в stdout — только отладочный лог"""
+        from aiogram import types
+        from handlers.admin import IsAdminFilter
+
+        mock_is_admin.return_value = False
+        callback = MagicMock(spec=types.CallbackQuery)
+        callback.from_user = MagicMock(id=999999999)
+        callback.data = "noop"
+
+        with caplog.at_level(logging.DEBUG):
+            assert await IsAdminFilter()(callback) is False
+
+        assert capsys.readouterr().out == ""
+        assert "[IsAdminFilter] callback_query user=999999999" in caplog.text
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,154 @@
+"""
+Тесты праздников и закрытых дат (utils/holidays.py).
+
+Проверяют: закрытые даты проекта и общие, расчёт рабочих дней на горизонт,
+влияние на минимальную дату записи и на календарь.
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base
+from keyboards.callbacks import DateCallback
+from keyboards.inline import generate_calendar, get_min_booking_date, get_next_working_day
+from utils import clock, holidays
+
+
+@pytest.fixture
+def holidays_db():
+    """Пустая таблица праздников в in-memory базе."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with patch.object(holidays, "SessionLocal", factory), \
+         patch.dict(holidays._holidays, {"ranges": None}):
+        yield factory
+
+
+def _next_weekday(weekday: int) -> date:
+    """Ближайшая будущая дата с указанным днём недели (не сегодня)."""
+    day = date.today() + timedelta(days=1)
+    while day.weekday() != weekday:
+        day += timedelta(days=1)
+    return day
+
+
+class TestBlackouts:
+    """Тесты закрытых дат"""
+
+    def test_project_and_global_blackouts(self, holidays_db):
+        """Общий праздник закрывает все проекты, закрытие проекта — только его"""
+        monday = _next_weekday(0)
+        tuesday = monday + timedelta(days=1)
+        holidays.add_blackout(None, monday, monday, "Праздник")
+        holidays.add_blackout("ЖК Альфа", tuesday, tuesday)
+
+        assert not holidays.is_working_day(monday)
+        assert holidays.is_working_day(tuesday)
+        assert not holidays.is_working_day(tuesday, "ЖК Альфа")
+        assert holidays.is_working_day(tuesday, "ЖК Бета")
+        assert holidays.get_closed_dates("ЖК Альфа") == {monday, tuesday}
+
+    def test_weekend_is_not_working(self, holidays_db):
+        """Выходные — нерабочие дни и без праздников"""
+        assert not holidays.is_working_day(_next_weekday(5))
+        assert not holidays.is_working_day(date(2000, 1, 1))  # Суббота за горизонтом
+
+    def test_delete_blackout(self, holidays_db):
+        """После удаления периода день снова рабочий"""
+        monday = _next_weekday(0)
+        holiday_id = holidays.add_blackout(None, monday, monday)
+        assert holidays.delete_blackout(holiday_id)
+        assert holidays.is_working_day(monday)
+        assert not holidays.delete_blackout(holiday_id)
+
+    def test_list_blackouts(self, holidays_db):
+        """Список: общие и периоды проекта, закончившиеся не показываются"""
+        monday = _next_weekday(0)
+        holidays.add_blackout(None, monday, monday)
+        holidays.add_blackout("ЖК Альфа", monday, monday + timedelta(days=2))
+        holidays.add_blackout("ЖК Бета", monday, monday)
+        holidays.add_blackout(None, date(2000, 1, 3), date(2000, 1, 4))
+
+        assert len(holidays.list_blackouts()) == 3
+        assert [h.project_name for h in holidays.list_blackouts("ЖК Альфа")] == [None, "ЖК Альфа"]
+
+    def test_frozen_clock(self, holidays_db):
+        """«Сегодня» — по часам бота (Ташкент): clock.frozen() фиксирует его для проверок"""
+        holidays.add_blackout(None, date(2031, 6, 2), date(2031, 6, 2))
+        holidays.add_blackout(None, date(2031, 6, 4), date(2031, 6, 4))
+
+        # 23:30 по UTC 2 июня — в Ташкенте уже 3 июня
+        with clock.frozen(datetime(2031, 6, 2, 23, 30, tzinfo=timezone.utc)):
+            assert [h.date_from for h in holidays.list_blackouts()] == [date(2031, 6, 4)]
+            assert not holidays.is_working_day(date(2031, 6, 4))
+            assert holidays.is_working_day(date(2031, 6, 5))
+
+    def test_working_days_precomputed(self, holidays_db):
+        """Проверки дней не обращаются к базе после первой загрузки"""
+        holidays.is_working_day(_next_weekday(0))
+        with patch.object(holidays, "SessionLocal") as mock_session:
+            for i in range(30):
+                holidays.is_working_day(date.today() + timedelta(days=i), "ЖК Альфа")
+            mock_session.assert_not_called()
+
+    def test_calendar_cache_one_entry_per_project(self, holidays_db):
+        """Со сменой дня запись проекта пересчитывается, старые дни не копятся"""
+        for offset in range(10):
+            with clock.frozen(datetime(2031, 6, 2, 10, 0) + timedelta(days=offset)):
+                holidays.is_working_day(date(2031, 6, 20), "ЖК Альфа")
+                holidays.is_working_day(date(2031, 6, 20))
+
+        assert set(holidays._calendar_cache) == {"ЖК Альфа", None}
+        assert holidays._calendar_cache["ЖК Альфа"][1] == date(2031, 6, 11)
+
+    @pytest.mark.parametrize("value, expected", [
+        ("01.05.2030", (date(2030, 5, 1), date(2030, 5, 1))),
+        ("01.05.2030-03.05.2030", (date(2030, 5, 1), date(2030, 5, 3))),
+    ])
+    def test_parse_date_range(self, value, expected):
+        """Разбор одной даты или диапазона"""
+        assert holidays.parse_date_range(value) == expected
+
+    def test_parse_date_range_invalid(self):
+        """Конец раньше начала — ошибка"""
+        with pytest.raises(ValueError):
+            holidays.parse_date_range("03.05.2030-01.05.2030")
+
+
+class TestBookingDates:
+    """Тесты влияния праздников на даты записи"""
+
+    def test_next_working_day_skips_holiday(self):
+        """Праздник пропускается как выходной"""
+        with patch.dict(holidays._holidays, {"ranges": [(None, date(2026, 1, 29), date(2026, 1, 30))]}):
+            assert get_next_working_day(date(2026, 1, 28)) == date(2026, 2, 2)
+
+    def test_min_booking_date_skips_project_blackout(self):
+        """Закрытая дата проекта сдвигает минимальную дату записи только для него"""
+        ranges = [("ЖК Альфа", date(2026, 1, 29), date(2026, 1, 29))]
+        with patch.dict(holidays._holidays, {"ranges": ranges}), \
+             clock.frozen(datetime(2026, 1, 28, 11, 0)):  # Среда до 12:00
+            assert get_min_booking_date("ЖК Альфа") == date(2026, 1, 30)
+            assert get_min_booking_date("ЖК Бета") == date(2026, 1, 29)
+
+    def test_calendar_disables_closed_dates(self):
+        """Закрытая дата в календаре неактивна"""
+        ranges = [("ЖК Альфа", date(2026, 2, 17), date(2026, 2, 17))]
+        with patch.dict(holidays._holidays, {"ranges": ranges}), \
+             patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 16)):
+            markup = generate_calendar(year=2026, month=2, project_name="ЖК Альфа")
+            other = generate_calendar(year=2026, month=2, project_name="ЖК Бета")
+
+        callbacks = [b.callback_data for row in markup.inline_keyboard for b in row]
+        other_callbacks = [b.callback_data for row in other.inline_keyboard for b in row]
+        assert DateCallback.of(date(2026, 2, 17)).pack() not in callbacks
+        assert DateCallback.of(date(2026, 2, 18)).pack() in callbacks
+        assert DateCallback.of(date(2026, 2, 17)).pack() in other_callbacks
@@ -2,7 +2,7 @@
 Unit тесты для функций генерации клавиатур и расчёта дат.
 """
 import pytest
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from unittest.mock import patch, MagicMock
 import sys
 import os
@@ -10,15 +10,16 @@ import os
 # Добавляем корневую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from keyboards.callbacks import DateCallback, ProjectCallback
 from keyboards.inline import (
     get_next_working_day,
     get_min_booking_date,
     generate_time_slots,
     generate_houses_kb,
     generate_calendar,
-    get_fully_booked_dates,
     SLOTS_PER_DAY
 )
+from utils import clock, projects
 
 
 class TestGetNextWorkingDay:
@@ -75,63 +76,49 @@ class TestGetMinBookingDate:
     def test_before_noon_wednesday_returns_thursday(self):
         """Среда 11:59 -> Четверг (следующий рабочий день)"""
         mock_time = datetime(2026, 1, 28, 11, 59)  # Среда 11:59
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 1, 29)  # Четверг
     
     def test_after_noon_wednesday_returns_friday(self):
         """Среда 12:01 -> Пятница (через один рабочий день)"""
         mock_time = datetime(2026, 1, 28, 12, 1)  # Среда 12:01
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 1, 30)  # Пятница
     
     def test_before_noon_thursday_returns_friday(self):
         """Четверг 11:59 -> Пятница"""
         mock_time = datetime(2026, 1, 29, 11, 59)  # Четверг 11:59
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 1, 30)  # Пятница
     
     def test_after_noon_thursday_returns_monday(self):
         """Четверг 12:01 -> Понедельник (пропускает пятницу и выходные)"""
         mock_time = datetime(2026, 1, 29, 12, 1)  # Четверг 12:01
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 2, 2)  # Понедельник
     
     def test_before_noon_friday_returns_monday(self):
         """Пятница 11:59 -> Понедельник"""
         mock_time = datetime(2026, 1, 30, 11, 59)  # Пятница 11:59
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 2, 2)  # Понедельник
     
     def test_after_noon_friday_returns_monday(self):
         """Пятница 12:01 -> Понедельник (пятница весь день — запись на понедельник)"""
         mock_time = datetime(2026, 1, 30, 12, 1)  # Пятница 12:01
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 2, 2)  # Понедельник
     
     def test_exactly_noon_returns_next_working_day(self):
         """Ровно 12:00 -> следующий рабочий день (граница)"""
         mock_time = datetime(2026, 1, 28, 12, 0)  # Среда 12:00
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             # hour >= 12, поэтому пропускаем день
             assert result == date(2026, 1, 30)  # Пятница
@@ -139,22 +126,54 @@ class TestGetMinBookingDate:
     def test_saturday_before_noon(self):
         """Суббота 10:00 -> Вторник"""
         mock_time = datetime(2026, 1, 31, 10, 0)  # Суббота 10:00
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 2, 3)  # Вторник
     
     def test_saturday_after_noon(self):
         """Суббота 14:00 -> Вторник"""
         mock_time = datetime(2026, 1, 31, 14, 0)  # Суббота 14:00
-        with patch('keyboards.inline.datetime') as mock_datetime:
-            mock_datetime.now.return_value = mock_time
-            mock_datetime.side_effect = lambda *args, **kwargs: datetime(*args, **kwargs)
+        with clock.frozen(mock_time):
             result = get_min_booking_date()
             assert result == date(2026, 2, 3)  # Вторник
 
 
+class TestMinBookingDateCache:
+    """Тесты кэша минимальной даты записи"""
+
+    def test_cached_within_window(self):
+        """До 12:00 дата считается один раз"""
+        import keyboards.inline as inline
+        with patch.dict(inline._min_booking_cache, clear=True), \
+             patch.object(inline, "_compute_min_booking_date", wraps=inline._compute_min_booking_date) as compute:
+            with clock.frozen(datetime(2026, 1, 28, 9, 0)):
+                first = get_min_booking_date()
+            with clock.frozen(datetime(2026, 1, 28, 11, 59)):
+                assert get_min_booking_date() == first
+            assert compute.call_count == 1
+
+    def test_recomputed_at_cutoff_and_midnight(self):
+        """Граница 12:00 и полночь сбрасывают кэш"""
+        import keyboards.inline as inline
+        with patch.dict(inline._min_booking_cache, clear=True):
+            with clock.frozen(datetime(2026, 1, 28, 11, 59)):
+                assert get_min_booking_date() == date(2026, 1, 29)
+            with clock.frozen(datetime(2026, 1, 28, 12, 0)):
+                assert get_min_booking_date() == date(2026, 1, 30)
+            with clock.frozen(datetime(2026, 1, 29, 0, 0)):
+                assert get_min_booking_date() == date(2026, 1, 30)
+
+    def test_recomputed_after_holidays_change(self):
+        """Изменение закрытых дат сбрасывает кэш"""
+        import keyboards.inline as inline
+        from utils import holidays
+        with patch.dict(inline._min_booking_cache, clear=True), \
+             clock.frozen(datetime(2026, 1, 28, 9, 0)):
+            assert get_min_booking_date() == date(2026, 1, 29)
+            with patch.dict(holidays._holidays, {"ranges": [(None, date(2026, 1, 29), date(2026, 1, 29))]}):
+                assert get_min_booking_date() == date(2026, 1, 30)
+
+
 class TestGenerateTimeSlots:
     """Тесты для функции generate_time_slots"""
     
@@ -173,7 +192,7 @@ class TestGenerateTimeSlots:
         # Первые 6 слотов должны быть доступны (с ✅)
         for row in buttons[:6]:
             assert "✅" in row[0].text
-            assert row[0].callback_data.startswith("time_")
+            assert row[0].callback_data.startswith("t:")
         
         # Последняя кнопка - "Назад"
         assert "Назад" in buttons[6][0].text or "back" in buttons[6][0].callback_data
@@ -250,9 +269,28 @@ class TestGenerateTimeSlots:
         for i, expected in enumerate(expected_times):
             assert expected in buttons[i][0].text
 
+    @pytest.mark.parametrize("slot_times, expected", [
+        (["09:00", "09:30", "10:00"], ["09:00 - 09:30", "09:30 - 10:00", "10:00 - 10:30"]),
+        (["09:00", "10:30", "14:00", "15:30"], ["09:00 - 10:30", "10:30 - 12:00", "14:00 - 15:30", "15:30 - 17:00"]),
+        (["10:00"], ["10:00 - 11:00"]),
+    ])
+    def test_slot_end_from_template(self, slot_times, expected):
+        """Конец слота — по шагу шаблона (30 и 90 минут), а не всегда через час"""
+        slots = [(time.fromisoformat(t), 1) for t in slot_times]
+
+        markup = generate_time_slots("2026-02-16", {}, 1, slots=slots)
+
+        assert [row[0].text[2:] for row in markup.inline_keyboard[:-1]] == expected
+
 
 class TestGenerateHousesKb:
     """Тесты для функции generate_houses_kb"""
+
+    @pytest.fixture(autouse=True)
+    def registered_houses(self):
+        """Дома зарегистрированы в реестре проектов (как после импорта договоров)."""
+        for house in ("ЖК Навои", "ЖК Sunrise", "ЖК Mega City", "А" * 50, "А" * 50 + "Б"):
+            projects.get_project_id(house)
     
     def test_single_house(self):
         """Один дом"""
@@ -261,7 +299,9 @@ class TestGenerateHousesKb:
         
         assert len(markup.inline_keyboard) == 1
         assert markup.inline_keyboard[0][0].text == "ЖК Навои"
-        assert markup.inline_keyboard[0][0].callback_data == "house_ЖК Навои"
+        callback = ProjectCallback.unpack(markup.inline_keyboard[0][0].callback_data)
+        assert callback.action == "house"
+        assert callback.project_name == "ЖК Навои"
     
     def test_multiple_houses(self):
         """Несколько домов"""
@@ -274,14 +314,17 @@ class TestGenerateHousesKb:
             assert markup.inline_keyboard[i][0].text == house
     
     def test_long_house_name_truncated(self):
-        """Длинное название дома обрезается в callback_data"""
+        """Длинное название дома не попадает в callback_data — передаётся id"""
         long_name = "А" * 50  # 50 символов
-        houses = [long_name]
+        houses = [long_name, long_name + "Б"]
         markup = generate_houses_kb(houses)
         
-        callback = markup.inline_keyboard[0][0].callback_data
-        # callback_data должен быть ограничен: "house_" + 40 символов
-        assert len(callback) <= 46  # "house_" (6) + 40
+        first = markup.inline_keyboard[0][0].callback_data
+        second = markup.inline_keyboard[1][0].callback_data
+        # callback_data в пределах 64 байт и не совпадает у проектов с общим началом
+        assert len(first.encode()) <= 64
+        assert first != second
+        assert ProjectCallback.unpack(second).project_name == long_name + "Б"
     
     def test_empty_list(self):
         """Пустой список домов"""
@@ -342,10 +385,9 @@ class TestGenerateCalendar:
             all_buttons = []
             for row in markup.inline_keyboard:
                 for btn in row:
-                    if btn.callback_data and btn.callback_data.startswith("date_"):
+                    if btn.callback_data and btn.callback_data.startswith("d:"):
                         # Проверяем, что это рабочий день
-                        date_str = btn.callback_data.split("_")[1]
-                        d = date.fromisoformat(date_str)
+                        d = DateCallback.unpack(btn.callback_data).booking_date
                         assert d.weekday() < 5  # Пн-Пт
     
     def test_min_date_respected(self):
@@ -360,9 +402,8 @@ class TestGenerateCalendar:
             
             for row in markup.inline_keyboard:
                 for btn in row:
-                    if btn.callback_data and btn.callback_data.startswith("date_") and btn.callback_data != "date_full":
-                        date_str = btn.callback_data.split("_")[1]
-                        d = date.fromisoformat(date_str)
+                    if btn.callback_data and btn.callback_data.startswith("d:"):
+                        d = DateCallback.unpack(btn.callback_data).booking_date
                         # Дата должна быть >= min_date
                         assert d >= min_date_val
     
@@ -404,83 +445,57 @@ class TestGenerateCalendar:
             
             for row in markup.inline_keyboard:
                 for btn in row:
-                    # Убеждаемся, что date_2026-02-16 не существует
-                    assert btn.callback_data != "date_2026-02-16"
+                    # Убеждаемся, что кнопки выбора 16.02.2026 не существует
+                    assert btn.callback_data != DateCallback.of(date(2026, 2, 16)).pack()
 
 
-class TestGetFullyBookedDates:
-    """Тесты для функции get_fully_booked_dates"""
-    
-    def test_returns_empty_set_when_no_bookings(self):
-        """Возвращает пустое множество когда нет бронирований"""
-        mock_session = MagicMock()
-        mock_query = MagicMock()
-        mock_session.query.return_value = mock_query
-        mock_query.join.return_value = mock_query
-        mock_query.filter.return_value = mock_query
-        mock_query.group_by.return_value = mock_query
-        mock_query.all.return_value = []
-        
-        result = get_fully_booked_dates(
-            mock_session,
-            date(2026, 2, 1),
-            date(2026, 2, 28),
-            slots_limit=2
-        )
-        
-        assert result == set()
-    
-    def test_returns_fully_booked_dates(self):
-        """Возвращает даты где все слоты заняты"""
-        mock_session = MagicMock()
-        mock_query = MagicMock()
-        mock_session.query.return_value = mock_query
-        mock_query.join.return_value = mock_query
-        mock_query.filter.return_value = mock_query
-        mock_query.group_by.return_value = mock_query
-        
-        # 6 слотов * 2 лимит = 12 записей для полной занятости
-        mock_query.all.return_value = [
-            (date(2026, 2, 16), 12),  # Полностью занят
-            (date(2026, 2, 17), 6),   # Частично занят
-        ]
-        
-        result = get_fully_booked_dates(
-            mock_session,
-            date(2026, 2, 1),
-            date(2026, 2, 28),
-            slots_limit=2
-        )
-        
-        assert date(2026, 2, 16) in result
-        assert date(2026, 2, 17) not in result
-    
-    def test_partial_booking_not_in_result(self):
-        """Частично занятые даты не включаются в результат"""
-        mock_session = MagicMock()
-        mock_query = MagicMock()
-        mock_session.query.return_value = mock_query
-        mock_query.join.return_value = mock_query
-        mock_query.filter.return_value = mock_query
-        mock_query.group_by.return_value = mock_query
-        
-        # 6 слотов * 3 лимит = 18 записей для полной занятости
-        mock_query.all.return_value = [
-            (date(2026, 2, 16), 17),  # Почти полностью (не хватает 1)
-            (date(2026, 2, 17), 18),  # Ровно полный
-            (date(2026, 2, 18), 20),  # Больше максимума
-        ]
-        
-        result = get_fully_booked_dates(
-            mock_session,
-            date(2026, 2, 1),
-            date(2026, 2, 28),
-            slots_limit=3
-        )
-        
-        assert date(2026, 2, 16) not in result  # 17 < 18
-        assert date(2026, 2, 17) in result      # 18 >= 18
-        assert date(2026, 2, 18) in result      # 20 >= 18
+class TestCalendarCache:
+    """Тесты кэша отрисовки календаря"""
+
+    def setup_method(self):
+        from keyboards.inline import clear_calendar_cache
+        clear_calendar_cache()
+
+    def test_same_arguments_reuse_markup(self):
+        """Повторный показ того же месяца берёт разметку из кэша"""
+        with patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 10)):
+            first = generate_calendar(year=2026, month=2, fully_booked_dates={date(2026, 2, 16)})
+            second = generate_calendar(year=2026, month=2, fully_booked_dates={date(2026, 2, 16)})
+
+        assert first is second
+
+    def test_other_month_dates_do_not_affect_key(self):
+        """Занятые даты других месяцев не влияют на ключ кэша"""
+        with patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 10)):
+            first = generate_calendar(year=2026, month=2, fully_booked_dates={date(2026, 2, 16)})
+            second = generate_calendar(
+                year=2026, month=2, fully_booked_dates={date(2026, 2, 16), date(2026, 3, 2)}
+            )
+
+        assert first is second
+
+    def test_availability_change_rerenders(self):
+        """Изменение занятости или языка даёт новую разметку"""
+        with patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 10)):
+            free = generate_calendar(year=2026, month=2)
+            booked = generate_calendar(year=2026, month=2, fully_booked_dates={date(2026, 2, 16)})
+            uzbek = generate_calendar(year=2026, month=2, lang='uz')
+
+        callbacks = [btn.callback_data for row in booked.inline_keyboard for btn in row]
+        assert free is not booked
+        assert DateCallback.of(date(2026, 2, 16)).pack() not in callbacks
+        assert uzbek.inline_keyboard[0][0].text == "Fevral 2026"
+
+    def test_min_date_change_rerenders(self):
+        """Смена минимальной даты (после 12:00) даёт новую разметку"""
+        with patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 10)):
+            before = generate_calendar(year=2026, month=2)
+        with patch('keyboards.inline.get_min_booking_date', return_value=date(2026, 2, 11)):
+            after = generate_calendar(year=2026, month=2)
+
+        callbacks = [btn.callback_data for row in after.inline_keyboard for btn in row]
+        assert before is not after
+        assert DateCallback.of(date(2026, 2, 10)).pack() not in callbacks
 
 
 if __name__ == "__main__":
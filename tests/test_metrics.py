@@ -0,0 +1,74 @@
+"""
+Тесты метрик Prometheus (utils/metrics.py).
+
+Проверяют: текстовый формат счётчиков, гистограмм и вычисляемых значений,
+HTTP-эндпоинт и запись метрик импорта Excel.
+"""
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils import metrics
+from utils.excel_reader import _record_import
+
+
+class TestRegistry:
+    """Тесты формата"""
+
+    def test_counter_with_labels(self):
+        """Счётчик с метками; кавычки в значениях экранируются"""
+        counter = metrics.Counter("test_events_total", "Тестовые события", ["project"])
+        counter.labels(project='ЖК "Навои"').inc()
+        counter.labels(project='ЖК "Навои"').inc(2)
+
+        text = counter.render()
+        assert "# TYPE test_events_total counter" in text
+        assert 'test_events_total{project="ЖК \\"Навои\\""} 3' in text
+
+    def test_histogram_cumulative(self):
+        """Корзины гистограммы накопительные, есть +Inf, _sum и _count"""
+        histogram = metrics.Histogram("test_latency_seconds", "Тест", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.7, 5):
+            histogram.observe(value)
+
+        lines = histogram.render().splitlines()
+        assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+        assert 'test_latency_seconds_bucket{le="1.0"} 3' in lines
+        assert 'test_latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert "test_latency_seconds_count 4" in lines
+        assert "test_latency_seconds_sum 6.25" in lines
+
+    def test_gauge_function(self):
+        """Вычисляемое значение читается при каждом выводе"""
+        size = {"value": 1}
+        gauge = metrics.Gauge("test_size", "Тест")
+        gauge.set_function(lambda: size["value"])
+        size["value"] = 5
+        assert "test_size 5" in gauge.render()
+
+    def test_excel_import_recorded(self):
+        """Импорт Excel пишет строки и скорость"""
+        _record_import("test", 200, started=0.0)
+        text = metrics.render()
+        assert 'bot_excel_import_rows_total{operation="test"} 200' in text
+        assert 'bot_excel_import_rows_per_second{operation="test"}' in text
+
+
+class TestEndpoint:
+    """Тесты HTTP-эндпоинта"""
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self):
+        """GET /metrics отдаёт все метрики бота"""
+        client = TestClient(TestServer(metrics.create_app()))
+        await client.start_server()
+        try:
+            response = await client.get("/metrics")
+            body = await response.text()
+        finally:
+            await client.close()
+
+        assert response.status == 200
+        assert response.content_type == "text/plain"
+        for name in ("bot_updates_total", "bot_handler_latency_seconds", "bot_booking_events_total",
+                     "bot_reminders_pending", "bot_fsm_stored_states"):
+            assert f"# TYPE {name}" in body
@@ -3,12 +3,14 @@ Unit тесты для модуля напоминаний.
 """
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
-from datetime import date, time, datetime, timedelta
+from datetime import date, time, datetime, timedelta, timezone
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from utils import clock
+
 
 class TestCheckReminders:
     """Тесты для функции check_reminders"""
@@ -48,6 +50,26 @@ class TestCheckReminders:
         # Проверяем что флаг обновлен
         assert mock_booking.reminder_day_sent is True
     
+    @pytest.mark.asyncio
+    @patch('utils.notifier.SessionLocal')
+    async def test_day_reminder_lag_not_recorded(self, mock_session):
+        """Для напоминания за день задержка не пишется: момент, когда оно стало нужно, неизвестен"""
+        from utils.notifier import check_reminders
+        from utils.metrics import REMINDER_SEND_LAG
+
+        mock_session_instance = MagicMock()
+        mock_session.return_value.__enter__.return_value = mock_session_instance
+        mock_booking = MagicMock()
+        mock_booking.date = date.today() + timedelta(days=1)
+        mock_booking.time_slot = time(10, 0)
+        mock_session_instance.query.return_value.filter.return_value.all.side_effect = [[mock_booking], []]
+        mock_session_instance.query.return_value.get.return_value.telegram_id = 123456789
+
+        await check_reminders(AsyncMock())
+
+        assert mock_booking.reminder_day_sent is True
+        assert ("day",) not in REMINDER_SEND_LAG._values
+
     @pytest.mark.asyncio
     @patch('utils.notifier.SessionLocal')
     async def test_no_reminder_if_already_sent(self, mock_session):
@@ -110,9 +132,8 @@ class TestCheckReminders:
         mock_session.return_value.__enter__.return_value = mock_session_instance
         
         # Бронирование на сегодня через 2 часа
-        today = date.today()
-        now = datetime.now()
-        slot_time = (now + timedelta(hours=2)).time()
+        today = date(2031, 6, 3)
+        slot_time = time(14, 0)
         
         mock_booking_day = MagicMock()
         mock_booking_hour = MagicMock()
@@ -132,9 +153,35 @@ class TestCheckReminders:
         ]
         mock_session_instance.query.return_value.get.return_value = mock_contract
         
-        await check_reminders(mock_bot)
+        with clock.frozen(datetime(2031, 6, 3, 12, 0)):
+            await check_reminders(mock_bot)
         
+        mock_bot.send_message.assert_called_once()
+        assert mock_booking_hour.reminder_hour_sent is True
         mock_session_instance.commit.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch('utils.notifier.SessionLocal')
+    async def test_reminders_use_tashkent_clock(self, mock_session):
+        """Завтра и окно 3 часов — по часам бота (Ташкент), а не по часам сервера"""
+        from utils.notifier import check_reminders
+
+        mock_session_instance = MagicMock()
+        mock_session.return_value.__enter__.return_value = mock_session_instance
+        hour_booking = MagicMock()
+        hour_booking.date = date(2031, 6, 3)
+        hour_booking.time_slot = time(9, 0)
+        hour_booking.reminder_hour_sent = False
+        mock_session_instance.query.return_value.filter.return_value.all.side_effect = [[], [hour_booking]]
+        mock_session_instance.query.return_value.get.return_value.telegram_id = 123456789
+
+        # 02:30 UTC 3 июня — в Ташкенте 07:30: до визита в 09:00 меньше 3 часов
+        with clock.frozen(datetime(2031, 6, 3, 2, 30, tzinfo=timezone.utc)):
+            await check_reminders(AsyncMock())
+
+        day_filter = mock_session_instance.query.return_value.filter.call_args_list[0].args
+        assert day_filter[0].right.value == date(2031, 6, 4)
+        assert hour_booking.reminder_hour_sent is True
     
     @pytest.mark.asyncio
     @patch('utils.notifier.SessionLocal')
@@ -0,0 +1,198 @@
+"""
+Тесты индекса занятости слотов.
+
+Проверяют: после commit индекс обновляется приращениями и совпадает
+с тем, что даёт повторное чтение из базы; откаченные изменения не учитываются;
+изменения, которые нельзя выразить приращениями, сбрасывают индекс.
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import events
+from database.models import Base, Contract, Booking
+from utils import occupancy, slot_templates
+
+
+DAY = date(2030, 5, 6)
+
+
+@pytest.fixture
+def factory():
+    """In-memory база с двумя проектами и загруженный индекс занятости."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    events.install(session_factory)
+
+    with session_factory() as session:
+        session.add_all([
+            Contract(id=1, house_name="ЖК Альфа", apt_num="1", contract_num="O-1"),
+            Contract(id=2, house_name="ЖК Альфа", apt_num="2", contract_num="O-2"),
+            Contract(id=3, house_name="ЖК Бета", apt_num="3", contract_num="O-3"),
+        ])
+        session.add(Booking(id=1, contract_id=1, date=DAY, time_slot=time(9, 0)))
+        session.commit()
+
+    with patch.object(occupancy, "SessionLocal", session_factory), \
+         patch.dict(occupancy._index, {"projects": None}), \
+         patch.dict(slot_templates._templates, {"compiled": {}}), \
+         patch.dict(slot_templates._day_slots_cache, clear=True):
+        occupancy.get_occupancy()
+        yield session_factory
+
+
+def _assert_matches_database():
+    """Индекс совпадает с занятостью, прочитанной из базы заново."""
+    assert occupancy._index["projects"] is not None
+    assert occupancy.get_occupancy() == occupancy._load()
+
+
+class TestIncrementalUpdates:
+    """Тесты обновления приращениями"""
+
+    def test_new_booking(self, factory):
+        """Новая запись увеличивает счётчик слота"""
+        with factory() as session:
+            session.add(Booking(contract_id=2, date=DAY, time_slot=time(9, 0)))
+            session.commit()
+
+        assert occupancy.get_project_occupancy("ЖК Альфа")[DAY][time(9, 0)] == 2
+        _assert_matches_database()
+
+    def test_cancellation(self, factory):
+        """Отмена освобождает слот и убирает пустой день"""
+        with factory() as session:
+            session.get(Booking, 1).is_cancelled = True
+            session.commit()
+
+        assert occupancy.get_project_occupancy("ЖК Альфа") == {}
+        assert occupancy.get_booked_dates(["ЖК Альфа"], date_from=DAY) == []
+        _assert_matches_database()
+
+    def test_move_to_other_slot(self, factory):
+        """Перенос записи: минус в старом слоте, плюс в новом"""
+        with factory() as session:
+            booking = session.get(Booking, 1)
+            booking.date = date(2030, 5, 7)
+            booking.time_slot = time(14, 0)
+            session.commit()
+
+        assert occupancy.get_project_occupancy("ЖК Альфа") == {date(2030, 5, 7): {time(14, 0): 1}}
+        _assert_matches_database()
+
+    def test_phone_change_keeps_counts(self, factory):
+        """Смена телефона не меняет занятость"""
+        with factory() as session:
+            session.get(Booking, 1).client_phone = "+998900000000"
+            session.commit()
+
+        assert occupancy.get_project_occupancy("ЖК Альфа")[DAY][time(9, 0)] == 1
+        _assert_matches_database()
+
+    def test_delete(self, factory):
+        """Удалённая запись освобождает слот"""
+        with factory() as session:
+            session.delete(session.get(Booking, 1))
+            session.commit()
+
+        assert occupancy.get_project_occupancy("ЖК Альфа") == {}
+        _assert_matches_database()
+
+    def test_rollback_ignored(self, factory):
+        """Откаченные изменения не попадают в индекс"""
+        with factory() as session:
+            session.add(Booking(contract_id=3, date=DAY, time_slot=time(9, 0)))
+            session.flush()
+            session.rollback()
+
+        assert occupancy.get_project_occupancy("ЖК Бета") == {}
+        _assert_matches_database()
+
+    def test_update_does_not_query(self, factory):
+        """Изменения применяются без чтения из базы"""
+        with patch.object(occupancy, "_load") as mock_load:
+            with factory() as session:
+                session.add(Booking(contract_id=3, date=DAY, time_slot=time(10, 0)))
+                session.commit()
+            mock_load.assert_not_called()
+
+        assert occupancy.get_booked_dates(["ЖК Бета"], date_from=DAY) == [DAY]
+
+
+class TestReset:
+    """Тесты сброса индекса"""
+
+    def test_house_rename_resets(self, factory):
+        """Переименование дома сбрасывает индекс"""
+        with factory() as session:
+            session.get(Contract, 1).house_name = "ЖК Гамма"
+            session.commit()
+
+        assert occupancy._index["projects"] is None
+        assert occupancy.get_project_occupancy("ЖК Гамма")[DAY][time(9, 0)] == 1
+
+    def test_unknown_old_value_resets(self, factory):
+        """Изменение незагруженного поля сбрасывает индекс"""
+        with factory() as session:
+            booking = session.get(Booking, 1)
+            session.expire(booking, ["date"])
+            booking.date = date(2030, 5, 8)
+            session.commit()
+
+        assert occupancy._index["projects"] is None
+        assert date(2030, 5, 8) in occupancy.get_project_occupancy("ЖК Альфа")
+
+
+class TestAvailabilitySnapshot:
+    """Тесты общего снимка доступности для календаря"""
+
+    def test_fully_booked_dates(self, factory):
+        """Дата полностью занята, когда заняты все слоты шаблона дня"""
+        templates = {("ЖК Альфа", None): ((time(9, 0), None), (time(10, 0), None))}
+        with patch.dict(slot_templates._templates, {"compiled": templates}):
+            assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) == frozenset()
+
+            with factory() as session:
+                session.add(Booking(contract_id=2, date=DAY, time_slot=time(10, 0)))
+                session.commit()
+
+            assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) == {DAY}
+            assert occupancy.get_fully_booked_dates("ЖК Альфа", 2) == frozenset()
+
+    def test_template_change_invalidates_snapshot(self, factory):
+        """Изменение шаблонов пересчитывает снимок"""
+        assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) == frozenset()
+
+        slot_templates.invalidate()
+        with patch.dict(slot_templates._templates, {"compiled": {("ЖК Альфа", None): ((time(9, 0), 1),)}}):
+            assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) == {DAY}
+
+    def test_snapshot_shared_until_change(self, factory):
+        """Снимок пересчитывается только после изменения своего проекта"""
+        first = occupancy.get_fully_booked_dates("ЖК Альфа", 1)
+        assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) is first
+
+        with factory() as session:
+            session.add(Booking(contract_id=3, date=DAY, time_slot=time(10, 0)))
+            session.commit()
+        assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) is first
+
+        with factory() as session:
+            session.get(Booking, 1).is_cancelled = True
+            session.commit()
+        assert occupancy.get_fully_booked_dates("ЖК Альфа", 1) is not first
+
+    def test_slot_counts(self, factory):
+        """Счётчики слотов дня берутся из индекса"""
+        with patch.object(occupancy, "SessionLocal") as mock_session:
+            assert occupancy.get_slot_counts("ЖК Альфа", DAY) == {time(9, 0): 1}
+            assert occupancy.get_slot_counts("ЖК Бета", DAY) == {}
+            mock_session.assert_not_called()
@@ -0,0 +1,154 @@
+"""
+Тесты реестра проектов (utils/projects.py) и ссылок договоров на проекты.
+
+Проверяют: регистрацию проекта при сохранении договора, перенос при
+переименовании дома, список проектов для меню и его кэш, заполнение
+project_id для уже существующих строк (миграция), сводку по проектам.
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, time
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import events
+from database.models import Base, Booking, Contract, Project, ProjectSlots
+from utils import projects
+
+
+@pytest.fixture
+def session_factory():
+    """In-memory база со слушателями database/events.py; реестр читает из неё."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    events.install(factory)
+    with patch.object(projects, "SessionLocal", factory):
+        yield factory
+
+
+def _add_contract(factory, contract_num, house_name):
+    with factory() as session:
+        session.add(Contract(house_name=house_name, apt_num="1", contract_num=contract_num, client_fio="Клиент"))
+        session.commit()
+
+
+class TestProjectIds:
+    """Тесты project_id договоров"""
+
+    def test_contract_registers_project(self, session_factory):
+        """Новый договор регистрирует проект; договоры одного дома ссылаются на один id"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        _add_contract(session_factory, "A-2", "ЖК Альфа")
+
+        with session_factory() as session:
+            ids = {c.project_id for c in session.query(Contract).all()}
+        assert ids == {projects.get_project_id("ЖК Альфа")}
+
+    def test_rename_moves_contract(self, session_factory):
+        """Переименование дома переносит договор в другой проект"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        with session_factory() as session:
+            contract = session.query(Contract).one()
+            contract.house_name = "ЖК Бета"
+            session.commit()
+            assert contract.project_id == projects.get_project_id("ЖК Бета")
+
+    def test_project_slots_reference(self, session_factory):
+        """Настройки проекта ссылаются на тот же id, что и договоры"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        with session_factory() as session:
+            session.add(ProjectSlots(project_name="ЖК Альфа", slots_limit=2))
+            session.commit()
+            assert session.query(ProjectSlots).one().project_id == projects.get_project_id("ЖК Альфа")
+
+    def test_refresh_project_ids(self, session_factory):
+        """Миграция регистрирует проекты и заполняет project_id существующих строк"""
+        with session_factory() as session:
+            session.execute(text(
+                "INSERT INTO contracts (house_name, apt_num, contract_num) VALUES ('ЖК Старый', '1', 'OLD-1')"
+            ))
+            session.commit()
+
+        with session_factory() as session:
+            events.refresh_project_ids(session.connection())
+            session.commit()
+            project = session.query(Project).filter_by(name="ЖК Старый").one()
+            assert session.query(Contract).one().project_id == project.id
+
+
+class TestProjectNames:
+    """Тесты списка проектов для меню"""
+
+    def test_lists_projects_with_contracts(self, session_factory):
+        """В списке только проекты с договорами, по алфавиту"""
+        _add_contract(session_factory, "B-1", "ЖК Бета")
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        projects.get_project_id("ЖК Без договоров")
+
+        assert projects.get_project_names() == ["ЖК Альфа", "ЖК Бета"]
+
+    def test_cached_until_contracts_change(self, session_factory):
+        """Список читается из базы заново только после изменения договоров"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        projects.get_project_names()
+        with patch.object(projects, "SessionLocal") as mock_session:
+            projects.get_project_names()
+            mock_session.assert_not_called()
+
+        _add_contract(session_factory, "B-1", "ЖК Бета")
+        assert projects.get_project_names() == ["ЖК Альфа", "ЖК Бета"]
+
+    def test_registry_stable_id(self, session_factory):
+        """Повторная регистрация возвращает тот же id, в том числе после перечитывания"""
+        project_id = projects.get_project_id("ЖК Навои")
+        projects.invalidate()
+        assert projects.get_project_id("ЖК Навои") == project_id
+        assert projects.get_project_name(project_id) == "ЖК Навои"
+
+
+class TestProjectSummaries:
+    """Тесты сводки по проектам"""
+
+    def test_summary_counts_and_settings(self, session_factory):
+        """Договоры, активные записи и настройки проекта — одной строкой на проект"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        _add_contract(session_factory, "A-2", "ЖК Альфа")
+        _add_contract(session_factory, "B-1", "ЖК Бета")
+        with session_factory() as session:
+            alpha = session.query(Contract).filter_by(contract_num="A-1").one()
+            session.add_all([
+                Booking(contract_id=alpha.id, date=date(2030, 3, 4), time_slot=time(9, 0)),
+                Booking(contract_id=alpha.id, date=date(2030, 3, 5), time_slot=time(9, 0), is_cancelled=True),
+                Booking(contract_id=alpha.id, date=date(2020, 3, 5), time_slot=time(9, 0)),  # Прошедшая
+                ProjectSlots(project_name="ЖК Альфа", slots_limit=3, address_ru="ул. Навои, 1"),
+            ])
+            session.commit()
+
+        alpha, beta = projects.get_project_summaries()
+        assert (alpha.name, alpha.contracts, alpha.active_bookings, alpha.slots_limit, alpha.address_ru) == \
+            ("ЖК Альфа", 2, 1, 3, "ул. Навои, 1")
+        assert (beta.name, beta.contracts, beta.active_bookings, beta.slots_limit) == ("ЖК Бета", 1, 0, None)
+
+    def test_cached_until_change(self, session_factory):
+        """Сводка читается заново только после изменения данных или настроек"""
+        _add_contract(session_factory, "A-1", "ЖК Альфа")
+        projects.get_project_summaries()
+        with patch.object(projects, "SessionLocal") as mock_session:
+            projects.get_project_summaries()
+            mock_session.assert_not_called()
+
+        with session_factory() as session:
+            session.add(ProjectSlots(project_name="ЖК Альфа", slots_limit=4))
+            session.commit()
+        assert projects.get_project_summaries()[0].slots_limit == 4
+
+    def test_projects_list_text(self):
+        """Текст списка проектов"""
+        summary = projects.ProjectSummary("ЖК Альфа", 2, 1, None, None, None, None, None)
+        assert "1. **ЖК Альфа** — 2 договоров, 1 активных записей" in projects.format_projects_list([summary])
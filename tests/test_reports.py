@@ -0,0 +1,262 @@
+"""
+Тесты кэша отчётов и версий данных.
+
+Проверяют: версия данных растёт только после commit и только при изменении
+значимых полей; отчёт отдаётся из кэша, пока изменений меньше порога;
+повторная отправка идёт по file_id Telegram.
+"""
+import asyncio
+import os
+import time as time_module
+
+import pandas as pd
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from datetime import date, time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import events
+from database.events import get_data_version
+from database.models import Base, Contract, Booking
+from keyboards.callbacks import ProjectCallback
+from utils import projects, reports
+from utils.tracing import collect_queries
+
+
+@pytest.fixture
+def session_factory():
+    """Фабрика сессий на in-memory SQLite с подключённым отслеживанием изменений."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    events.install(factory)
+
+    with factory() as session:
+        session.add_all([
+            Contract(id=1, house_name="ЖК Отчёт", apt_num="1", contract_num="R-001", client_fio="Первый"),
+            Contract(id=2, house_name="ЖК Другой", apt_num="2", contract_num="R-002", client_fio="Второй"),
+        ])
+        session.commit()
+    return factory
+
+
+@pytest.fixture
+def report_env(session_factory, tmp_path):
+    """Отчёты собираются во временную папку по тестовой базе."""
+    with patch.object(reports, "SessionLocal", session_factory), \
+         patch.object(projects, "SessionLocal", session_factory), \
+         patch.object(reports, "REPORTS_DIR", str(tmp_path)), \
+         patch.dict(reports._cache, clear=True):
+        yield session_factory
+
+
+def _add_booking(factory, contract_id=1, day=10):
+    with factory() as session:
+        booking = Booking(contract_id=contract_id, date=date(2026, 3, day), time_slot=time(9, 0))
+        session.add(booking)
+        session.commit()
+        return booking.id
+
+
+class TestDataVersion:
+    """Тесты версий данных"""
+
+    def test_commit_bumps_project_version(self, session_factory):
+        """Новая запись увеличивает общую версию и версию своего проекта"""
+        total, own, other = get_data_version(), get_data_version("ЖК Отчёт"), get_data_version("ЖК Другой")
+
+        _add_booking(session_factory)
+
+        assert get_data_version() == total + 1
+        assert get_data_version("ЖК Отчёт") == own + 1
+        assert get_data_version("ЖК Другой") == other
+
+    def test_rollback_does_not_bump_version(self, session_factory):
+        """Изменения, откаченные rollback, не учитываются"""
+        before = get_data_version()
+
+        with session_factory() as session:
+            session.add(Booking(contract_id=1, date=date(2026, 3, 11), time_slot=time(9, 0)))
+            session.flush()
+            session.rollback()
+
+        assert get_data_version() == before
+
+    def test_reminder_flags_ignored(self, session_factory):
+        """Отметки о напоминаниях не меняют версию"""
+        booking_id = _add_booking(session_factory)
+        before = get_data_version()
+
+        with session_factory() as session:
+            session.get(Booking, booking_id).reminder_day_sent = True
+            session.commit()
+
+        assert get_data_version() == before
+
+    def test_cancellation_bumps_version(self, session_factory):
+        """Отмена записи меняет версию"""
+        booking_id = _add_booking(session_factory)
+        before = get_data_version("ЖК Отчёт")
+
+        with session_factory() as session:
+            session.get(Booking, booking_id).is_cancelled = True
+            session.commit()
+
+        assert get_data_version("ЖК Отчёт") == before + 1
+
+
+class TestReportCache:
+    """Тесты кэша отчётов"""
+
+    @pytest.mark.asyncio
+    async def test_report_cached_until_threshold(self, report_env):
+        """Отчёт не пересобирается, пока изменений меньше порога"""
+        _add_booking(report_env)
+        first = await reports.get_report()
+
+        with patch.object(reports, "REPORT_REBUILD_THRESHOLD", 2):
+            _add_booking(report_env, day=11)
+            assert await reports.get_report() is first
+            assert reports.pending_changes() == 1
+
+            _add_booking(report_env, day=12)
+            rebuilt = await reports.get_report()
+
+        assert rebuilt is not first
+        assert rebuilt["rows"] == 3
+
+    @pytest.mark.asyncio
+    async def test_force_rebuilds(self, report_env):
+        """Принудительная сборка игнорирует кэш"""
+        _add_booking(report_env)
+        first = await reports.get_report()
+
+        assert await reports.get_report(force=True) is not first
+
+    @pytest.mark.asyncio
+    async def test_project_report_filters_rows(self, report_env):
+        """Отчёт по проекту содержит только его записи"""
+        _add_booking(report_env, contract_id=1)
+        _add_booking(report_env, contract_id=2, day=11)
+
+        assert (await reports.get_report("ЖК Отчёт"))["rows"] == 1
+        assert (await reports.get_report())["rows"] == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_report_has_no_file(self, report_env):
+        """Без записей файл не создаётся"""
+        assert (await reports.get_report())["path"] is None
+
+    @pytest.mark.asyncio
+    async def test_refresh_stale_reports(self, report_env):
+        """Плановая проверка пересобирает только устаревшие отчёты"""
+        _add_booking(report_env, contract_id=1)
+        await reports.rebuild_all_reports()
+        other = reports._cache["ЖК Другой"]
+
+        with patch.object(reports, "REPORT_REBUILD_THRESHOLD", 1):
+            _add_booking(report_env, contract_id=1, day=11)
+            await reports.refresh_stale_reports()
+
+        assert reports._cache["ЖК Отчёт"]["rows"] == 2
+        assert reports._cache["ЖК Другой"] is other
+
+    @pytest.mark.asyncio
+    async def test_write_does_not_block_loop(self, report_env):
+        """Запись xlsx идёт в потоке: цикл событий продолжает работать"""
+        _add_booking(report_env)
+        write_report = reports._write_report
+        ticks = []
+        ticks_during_write = []
+
+        def slow_write(results):
+            time_module.sleep(0.2)
+            ticks_during_write.append(len(ticks))
+            return write_report(results)
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        with patch.object(reports, "_write_report", slow_write):
+            ticking = asyncio.create_task(ticker())
+            entry = await reports.build_report()
+            await ticking
+
+        assert ticks_during_write == [5]
+        assert os.path.exists(entry["path"])
+
+    @pytest.mark.asyncio
+    async def test_overlapping_builds_keep_newest_file(self, report_env):
+        """Старая сборка, закончившаяся позже новой, не перезаписывает файл свежего отчёта"""
+        _add_booking(report_env)
+        write_report = reports._write_report
+        started = asyncio.Event()
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def slow_write(results):
+            if len(results) == 1:
+                loop.call_soon_threadsafe(started.set)
+                asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            return write_report(results)
+
+        with patch.object(reports, "_write_report", slow_write):
+            old_build = asyncio.create_task(reports.build_report())
+            await started.wait()
+            _add_booking(report_env, day=11)
+            newest = await reports.build_report()
+            release.set()
+            late = await old_build
+
+        assert late is newest
+        assert reports._cache[None] is newest
+        assert len(pd.read_excel(newest["path"])) == 2
+        assert os.listdir(os.path.dirname(newest["path"])) == [os.path.basename(newest["path"])]
+
+
+class TestSendReport:
+    """Тесты отправки отчёта"""
+
+    @pytest.mark.asyncio
+    async def test_second_send_uses_file_id(self, report_env, mock_message):
+        """Повторная отправка идёт по file_id без загрузки файла"""
+        _add_booking(report_env)
+        sent = MagicMock()
+        sent.document.file_id = "FILE_ID"
+        mock_message.answer_document = AsyncMock(return_value=sent)
+
+        await reports.send_report(mock_message)
+        await reports.send_report(mock_message)
+
+        first_doc = mock_message.answer_document.call_args_list[0].args[0]
+        second_doc = mock_message.answer_document.call_args_list[1].args[0]
+        assert first_doc != "FILE_ID"
+        assert second_doc == "FILE_ID"
+
+    def test_report_projects_from_registry(self, report_env):
+        """Список проектов берётся из реестра и кэшируется до изменения договоров"""
+        assert reports.get_report_projects() == ["ЖК Другой", "ЖК Отчёт"]
+
+        with collect_queries() as trace:
+            assert reports.get_report_projects() == ["ЖК Другой", "ЖК Отчёт"]
+
+        assert trace.queries == 0
+
+    def test_refresh_keyboard_resolves_project(self, report_env):
+        """Кнопка пересборки указывает на свой проект"""
+        markup = reports.get_report_refresh_keyboard("ЖК Отчёт")
+        callback_data = ProjectCallback.unpack(markup.inline_keyboard[0][0].callback_data)
+
+        assert reports.resolve_report_project(callback_data) == (True, "ЖК Отчёт")
+        assert reports.resolve_report_project(ProjectCallback.of("rprt")) == (True, None)
+        with pytest.raises(KeyError):
+            ProjectCallback.of("rprt", "Нет такого")
+        assert reports.resolve_report_project(ProjectCallback(action="rprt", project=999))[0] is False
@@ -0,0 +1,115 @@
+"""
+Тесты шаблонов слотов (utils/slot_templates.py).
+
+Проверяют: выбор самого точного шаблона для проекта и дня недели,
+вместимость слотов, разбор команд администратора, сохранение шаблонов
+и клавиатуру выбора времени по шаблону.
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base
+from keyboards.callbacks import TimeCallback
+from keyboards.inline import generate_time_slots, SLOTS_PER_DAY
+from utils import slot_templates
+
+
+MONDAY = date(2030, 5, 6)
+
+
+@pytest.fixture
+def templates_db():
+    """Пустая таблица шаблонов в in-memory базе."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with patch.object(slot_templates, "SessionLocal", factory), \
+         patch.dict(slot_templates._templates, {"compiled": None}), \
+         patch.dict(slot_templates._day_slots_cache, clear=True):
+        yield factory
+
+
+class TestDaySlots:
+    """Тесты выбора шаблона дня"""
+
+    def test_default_slots(self, templates_db):
+        """Без шаблонов — слоты по умолчанию с лимитом проекта"""
+        slots = slot_templates.get_day_slots("ЖК Альфа", 0, 3)
+        assert len(slots) == SLOTS_PER_DAY
+        assert all(capacity == 3 for _, capacity in slots)
+
+    def test_most_specific_template_wins(self, templates_db):
+        """Шаблон проекта на день недели важнее общего"""
+        slot_templates.set_template(None, None, [(time(9, 0), None)])
+        slot_templates.set_template("ЖК Альфа", None, [(time(10, 0), 2)])
+        slot_templates.set_template("ЖК Альфа", 4, [(time(11, 0), None)])
+
+        assert slot_templates.get_day_slots("ЖК Альфа", 0, 1) == ((time(10, 0), 2),)
+        assert slot_templates.get_day_slots("ЖК Альфа", 4, 1) == ((time(11, 0), 1),)
+        assert slot_templates.get_day_slots("ЖК Бета", 0, 5) == ((time(9, 0), 5),)
+
+    def test_slot_capacity(self, templates_db):
+        """Вместимость слота; слота нет в шаблоне — 0"""
+        slot_templates.set_template("ЖК Альфа", None, [(time(9, 0), 4), (time(10, 0), None)])
+
+        assert slot_templates.get_slot_capacity("ЖК Альфа", MONDAY, time(9, 0), 1) == 4
+        assert slot_templates.get_slot_capacity("ЖК Альфа", MONDAY, time(10, 0), 2) == 2
+        assert slot_templates.get_slot_capacity("ЖК Альфа", MONDAY, time(16, 0), 2) == 0
+
+    def test_compiled_once(self, templates_db):
+        """Шаблоны читаются из базы один раз до invalidate()"""
+        slot_templates.get_day_slots("ЖК Альфа", 0, 1)
+        with patch.object(slot_templates, "SessionLocal") as mock_session:
+            slot_templates.get_day_slots("ЖК Альфа", 1, 1)
+            slot_templates.get_slot_capacity("ЖК Бета", MONDAY, time(9, 0), 1)
+            mock_session.assert_not_called()
+
+    def test_delete_template(self, templates_db):
+        """После удаления шаблона действуют слоты по умолчанию"""
+        slot_templates.set_template("ЖК Альфа", None, [(time(9, 0), 4)])
+        assert slot_templates.delete_template("ЖК Альфа", None) == 1
+        assert len(slot_templates.get_day_slots("ЖК Альфа", 0, 1)) == SLOTS_PER_DAY
+
+
+class TestParsing:
+    """Тесты разбора аргументов команд"""
+
+    def test_parse_slots(self):
+        """Слоты сортируются, вместимость необязательна"""
+        assert slot_templates.parse_slots(["10:00=2", "09:00"]) == [(time(9, 0), None), (time(10, 0), 2)]
+
+    @pytest.mark.parametrize("tokens", [[], ["9"], ["09:00=0"], ["09:00=abc"]])
+    def test_parse_slots_invalid(self, tokens):
+        """Неверные слоты отклоняются"""
+        with pytest.raises(ValueError):
+            slot_templates.parse_slots(tokens)
+
+    def test_parse_weekday(self):
+        """День недели: код, номер или «*»"""
+        assert slot_templates.parse_weekday("Пт") == 4
+        assert slot_templates.parse_weekday("2") == 2
+        assert slot_templates.parse_weekday("*") is None
+        with pytest.raises(ValueError):
+            slot_templates.parse_weekday("7")
+
+
+class TestTimeSlotsKeyboard:
+    """Тесты клавиатуры времени по шаблону"""
+
+    def test_template_slots_and_capacity(self):
+        """Кнопки строятся по слотам шаблона с их вместимостью"""
+        slots = ((time(8, 0), 2), (time(12, 0), 1))
+        markup = generate_time_slots("2030-05-06", {time(8, 0): 1, time(12, 0): 1}, 1, slots=slots)
+        buttons = [row[0] for row in markup.inline_keyboard[:-1]]
+
+        assert buttons[0].text == "✅ 08:00 - 12:00"
+        assert buttons[0].callback_data == TimeCallback.of(MONDAY, time(8, 0)).pack()
+        assert buttons[1].callback_data == "full"
@@ -0,0 +1,147 @@
+"""
+Тесты трассировки обновлений (utils/tracing.py).
+
+Проверяют: запись трассы с обработчиком, числом SQL-запросов и исходом,
+выборку записей в лог, гистограмму времени обработки и оценку перцентилей,
+поиск N+1 запросов и бюджет запросов для тестов.
+"""
+import json
+import logging
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update
+from sqlalchemy import create_engine, text
+
+from utils import tracing
+
+
+def _message_update(update_id: int, text_: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1767225600,
+            "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Тест"},
+            "text": text_,
+        },
+    })
+
+
+def _dispatcher(sample_rate: float) -> Dispatcher:
+    """Диспетчер с трассировкой: /db делает два запроса, /loop — десять однотипных, /fail падает."""
+    engine = create_engine("sqlite:///:memory:")
+    router = Router()
+
+    @router.message(lambda m: m.text == "/db")
+    async def cmd_db(message):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+    @router.message(lambda m: m.text == "/loop")
+    async def cmd_loop(message):
+        _select_in_loop(engine, 10)
+
+    @router.message(lambda m: m.text == "/fail")
+    async def cmd_fail(message):
+        raise ValueError("ошибка")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    tracing.install(dp, sample_rate=sample_rate)
+    return dp
+
+
+def _select_in_loop(engine, count: int) -> None:
+    with engine.connect() as conn:
+        for i in range(count):
+            conn.execute(text(f"SELECT {i}"))
+
+
+@pytest.fixture(autouse=True)
+def empty_histogram():
+    tracing.reset_latency_histogram()
+    yield
+    tracing.reset_latency_histogram()
+
+
+def _traces(caplog):
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == "dks_bot.trace"]
+
+
+class TestTracing:
+    """Тесты трассировки"""
+
+    @pytest.mark.asyncio
+    async def test_trace_fields(self, caplog):
+        """Трасса содержит обработчик, число запросов и исход"""
+        dp = _dispatcher(sample_rate=1.0)
+        with caplog.at_level(logging.INFO, logger="dks_bot.trace"):
+            await dp.feed_update(Bot(token="42:TEST"), _message_update(1, "/db"))
+            await dp.feed_update(Bot(token="42:TEST"), _message_update(2, "hello"))
+
+        first, second = _traces(caplog)
+        assert first["update_id"] == 1
+        assert first["handler"] == "cmd_db"
+        assert first["queries"] == 2
+        assert first["outcome"] == "handled"
+        assert second["outcome"] == "unhandled"
+
+    @pytest.mark.asyncio
+    async def test_errors_always_logged(self, caplog):
+        """При нулевой выборке в лог попадают только ошибки"""
+        dp = _dispatcher(sample_rate=0.0)
+        bot = Bot(token="42:TEST")
+        with caplog.at_level(logging.INFO, logger="dks_bot.trace"):
+            await dp.feed_update(bot, _message_update(1, "/db"))
+            with pytest.raises(ValueError):
+                await dp.feed_update(bot, _message_update(2, "/fail"))
+
+        assert [t["outcome"] for t in _traces(caplog)] == ["error:ValueError"]
+        histogram = tracing.get_latency_histogram()
+        assert histogram["cmd_db"]["count"] == 1
+        assert histogram["cmd_fail"]["count"] == 1
+        assert "cmd_db" in tracing.format_latency_histogram()
+
+    def test_percentile_estimate(self):
+        """Перцентиль — верхняя граница корзины"""
+        buckets = [0] * len(tracing.LATENCY_BUCKETS_MS)
+        buckets[0] = 90  # ≤ 5 мс
+        buckets[5] = 10  # ≤ 250 мс
+        assert tracing.estimate_percentile(buckets, 0.5) == 5
+        assert tracing.estimate_percentile(buckets, 0.95) == 250
+
+    def test_statement_shape(self):
+        """Запросы, отличающиеся только литералами и списками IN, имеют одну форму"""
+        first = tracing.statement_shape("SELECT * FROM bookings WHERE id IN (1, 2, 3) AND name = 'a'")
+        second = tracing.statement_shape("SELECT *  FROM bookings\nWHERE id IN (?) AND name = 'b''c'")
+        assert first == second == "SELECT * FROM bookings WHERE id IN (...) AND name = ?"
+
+    @pytest.mark.asyncio
+    async def test_n_plus_one_logged(self, caplog):
+        """Повторяющийся запрос записывается в трассу с уровнем WARNING даже без выборки"""
+        dp = _dispatcher(sample_rate=0.0)
+        with caplog.at_level(logging.INFO, logger="dks_bot.trace"):
+            await dp.feed_update(Bot(token="42:TEST"), _message_update(1, "/db"))
+            await dp.feed_update(Bot(token="42:TEST"), _message_update(2, "/loop"))
+
+        [trace] = _traces(caplog)
+        assert trace["handler"] == "cmd_loop"
+        assert trace["n_plus_one"] == [{"sql": "SELECT ?", "count": 10}]
+        assert [r.levelno for r in caplog.records if r.name == "dks_bot.trace"] == [logging.WARNING]
+
+    def test_query_budget(self):
+        """Бюджет запросов: превышение и N+1 роняют проверку"""
+        engine = create_engine("sqlite:///:memory:")
+        with tracing.query_budget(max_queries=3) as trace:
+            _select_in_loop(engine, 3)
+        assert trace.queries == 3
+
+        with pytest.raises(tracing.QueryBudgetExceeded, match="бюджете 2"):
+            with tracing.query_budget(max_queries=2):
+                _select_in_loop(engine, 3)
+        with pytest.raises(tracing.QueryBudgetExceeded, match="N\\+1: 6 раз SELECT"):
+            with tracing.query_budget(max_repeats=5):
+                _select_in_loop(engine, 6)
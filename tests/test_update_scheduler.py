@@ -0,0 +1,187 @@
+"""
+Тесты планировщика обновлений (utils/update_scheduler.py).
+
+Проверяют: обновления одного чата обрабатываются строго по порядку,
+разных чатов — параллельно, лимит принятых обновлений, ключ порядка
+и передачу обработки планировщику из long polling (middleware).
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update
+
+from utils import excel_reader
+from utils.update_scheduler import OrderedUpdateMiddleware, UpdateScheduler, update_key
+
+
+def _message_update(update_id: int, user_id: int, text: str = "hi") -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1767225600,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Тест"},
+            "text": text,
+        },
+    })
+
+
+class TestUpdateScheduler:
+    """Тесты порядка и параллельности"""
+
+    @pytest.mark.asyncio
+    async def test_order_within_chat(self):
+        """Шаги одного пользователя не переставляются, даже если первый шаг медленный"""
+        done = []
+        scheduler = UpdateScheduler(workers=4)
+        scheduler.start()
+
+        def job(chat_id, step, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                done.append((chat_id, step))
+            return run
+
+        for step, delay in enumerate([0.03, 0.0, 0.01]):
+            for chat_id in (1, 2):
+                await scheduler.submit(chat_id, job(chat_id, step, delay))
+        await scheduler.close()
+
+        assert [step for chat_id, step in done if chat_id == 1] == [0, 1, 2]
+        assert [step for chat_id, step in done if chat_id == 2] == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_chats_in_parallel(self):
+        """Медленное обновление одного чата не задерживает другие чаты"""
+        release = asyncio.Event()
+        done = []
+        scheduler = UpdateScheduler(workers=2)
+        scheduler.start()
+
+        async def slow():
+            await release.wait()
+            done.append("admin")
+
+        async def fast():
+            done.append("client")
+
+        await scheduler.submit(1, slow)
+        await scheduler.submit(2, fast)
+        await asyncio.sleep(0.01)
+        assert done == ["client"]
+
+        release.set()
+        await scheduler.close()
+        assert done == ["client", "admin"]
+
+    @pytest.mark.asyncio
+    async def test_in_flight_limit(self):
+        """Сверх лимита try_submit отказывает, а submit ждёт освобождения места"""
+        release = asyncio.Event()
+        scheduler = UpdateScheduler(workers=1, max_in_flight=2)
+        scheduler.start()
+
+        async def blocked():
+            await release.wait()
+
+        assert scheduler.try_submit(1, blocked)
+        assert scheduler.try_submit(2, blocked)
+        assert not scheduler.try_submit(3, blocked)
+
+        waiting = asyncio.create_task(scheduler.submit(3, blocked))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        release.set()
+        await waiting
+        await scheduler.close()
+        assert scheduler.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_errors_do_not_stop_chat(self):
+        """Ошибка в обработчике не останавливает следующие обновления чата"""
+        done = []
+        scheduler = UpdateScheduler(workers=1)
+        scheduler.start()
+
+        async def broken():
+            raise RuntimeError("ошибка")
+
+        async def next_step():
+            done.append("next")
+
+        await scheduler.submit(1, broken)
+        await scheduler.submit(1, next_step)
+        await scheduler.close()
+
+        assert done == ["next"]
+
+    def test_update_key(self):
+        """Порядок определяется чатом"""
+        assert update_key(_message_update(1, 42)) == 42
+
+
+class TestOrderedUpdateMiddleware:
+    """Тесты передачи обработки из long polling"""
+
+    @pytest.mark.asyncio
+    async def test_polling_updates_ordered(self):
+        """feed_update возвращается сразу, обновления чата обрабатываются по порядку"""
+        received = []
+        router = Router()
+
+        @router.message()
+        async def handler(message):
+            if message.text == "1":
+                await asyncio.sleep(0.02)
+            received.append(message.text)
+
+        scheduler = UpdateScheduler(workers=4)
+        dp = Dispatcher()
+        dp.update.outer_middleware(OrderedUpdateMiddleware(scheduler))
+        dp.include_router(router)
+        scheduler.start()
+
+        bot = Bot(token="42:TEST")
+        for update_id, text in enumerate(["1", "2", "3"], 1):
+            await dp.feed_update(bot, _message_update(update_id, 7, text))
+        assert received == []
+
+        await scheduler.close()
+        assert received == ["1", "2", "3"]
+
+    @pytest.mark.asyncio
+    async def test_client_served_during_excel_import(self):
+        """Пока у админа разбирается Excel-файл, сообщение другого чата обрабатывается"""
+        done = []
+        router = Router()
+
+        def slow_parse(file_path, project_name=None):
+            time.sleep(0.2)
+            return [], "ЖК Навои", 0
+
+        @router.message()
+        async def handler(message):
+            if message.chat.id == 1:
+                await excel_reader.analyze_excel_changes_async("contracts.xlsx", "ЖК Навои")
+                done.append("admin")
+            else:
+                done.append("client")
+
+        scheduler = UpdateScheduler(workers=2)
+        dp = Dispatcher()
+        dp.update.outer_middleware(OrderedUpdateMiddleware(scheduler))
+        dp.include_router(router)
+        scheduler.start()
+
+        bot = Bot(token="42:TEST")
+        with patch.object(excel_reader, "read_contract_rows", slow_parse):
+            await dp.feed_update(bot, _message_update(1, 1, "contracts.xlsx"))
+            await dp.feed_update(bot, _message_update(2, 2, "/start"))
+            await scheduler.close()
+
+        assert done == ["client", "admin"]
@@ -0,0 +1,138 @@
+"""
+Тесты приёма обновлений через webhook (utils/webhook.py).
+
+Локальный «Telegram» (FakeTelegram) отправляет обновления на
+aiohttp-приложение. Проверяют: проверку секрета, обработку обновлений
+диспетчером, ограничение одновременной обработки и 429 при исчерпанном
+лимите принятых обновлений.
+"""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils import webhook
+from utils.update_scheduler import UpdateScheduler
+
+SECRET = "test-secret"
+
+
+class FakeTelegram:
+    """Отправляет обновления на webhook так же, как серверы Telegram."""
+
+    def __init__(self, client: TestClient, secret: str = SECRET):
+        self.client = client
+        self.secret = secret
+        self.update_id = 0
+
+    async def send_message(self, user_id: int, text: str, secret: str = None):
+        self.update_id += 1
+        payload = {
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.update_id,
+                "date": 1767225600,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Тест"},
+                "text": text,
+            },
+        }
+        headers = {webhook.SECRET_HEADER: self.secret if secret is None else secret}
+        return await self.client.post("/webhook", json=payload, headers=headers)
+
+
+def _dispatcher(handler) -> Dispatcher:
+    router = Router()
+    router.message()(handler)
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def _start(dp, **kwargs):
+    bot = Bot(token="42:TEST")
+    client = TestClient(TestServer(webhook.create_app(dp, bot, SECRET, **kwargs)))
+    await client.start_server()
+    return client, FakeTelegram(client)
+
+
+class TestWebhook:
+    """Тесты webhook-сервера"""
+
+    @pytest.mark.asyncio
+    async def test_updates_dispatched(self):
+        """Обновление с верным секретом подтверждается и доходит до обработчика"""
+        received = []
+
+        async def handler(message):
+            received.append((message.from_user.id, message.text))
+
+        client, telegram = await _start(_dispatcher(handler))
+        try:
+            response = await telegram.send_message(7, "/start")
+            assert response.status == 200
+            await client.app["update_scheduler"].join()
+        finally:
+            await client.close()
+
+        assert received == [(7, "/start")]
+
+    @pytest.mark.asyncio
+    async def test_wrong_secret_rejected(self):
+        """Запрос без секрета или с чужим секретом отклоняется и не обрабатывается"""
+        received = []
+
+        async def handler(message):
+            received.append(message.text)
+
+        client, telegram = await _start(_dispatcher(handler))
+        try:
+            assert (await telegram.send_message(7, "/start", secret="")).status == 401
+            assert (await telegram.send_message(7, "/start", secret="other")).status == 401
+        finally:
+            await client.close()
+
+        assert received == []
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limited(self):
+        """Одновременно обрабатывается не больше обновлений, чем воркеров"""
+        running = 0
+        peak = 0
+
+        async def handler(message):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        client, telegram = await _start(_dispatcher(handler), scheduler=UpdateScheduler(workers=2))
+        try:
+            for user_id in range(6):
+                assert (await telegram.send_message(user_id, "hi")).status == 200
+            await client.app["update_scheduler"].join()
+        finally:
+            await client.close()
+
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_backpressure(self):
+        """При исчерпанном лимите Telegram получает 429 с Retry-After"""
+        release = asyncio.Event()
+
+        async def handler(message):
+            await release.wait()
+
+        client, telegram = await _start(_dispatcher(handler), scheduler=UpdateScheduler(workers=1, max_in_flight=2))
+        try:
+            assert (await telegram.send_message(1, "a")).status == 200
+            assert (await telegram.send_message(2, "b")).status == 200
+            response = await telegram.send_message(3, "c")
+            assert response.status == 429
+            assert response.headers["Retry-After"] == str(webhook.RETRY_AFTER_SECONDS)
+            release.set()
+        finally:
+            await client.close()
@@ -0,0 +1,300 @@
+"""
+Просмотр записей для администратора и сотрудника.
+
+Общие для обеих ролей части «📋 Список записей»: недели и дни для клавиатур
+выбора (из индекса занятости utils/occupancy.py), постраничная выгрузка
+записей и форматирование страницы.
+"""
+from datetime import date, timedelta
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import Integer, cast, func
+
+from database.models import Booking, Contract
+from database.session import SessionLocal
+from utils import clock
+from utils.occupancy import get_booked_dates
+
+# Количество записей на одной странице списка
+BOOKINGS_PAGE_SIZE = 30
+
+def _normalize_projects(project_names):
+    """None — все проекты; строка — один проект; список — несколько."""
+    if not project_names:
+        return None
+    if isinstance(project_names, str):
+        return [project_names]
+    return list(project_names)
+
+
+def get_booking_dates(project_names=None) -> list:
+    """Отсортированные будущие даты с активными записями по выбранным проектам (из индекса занятости)."""
+    return get_booked_dates(_normalize_projects(project_names))
+
+
+def get_booking_weeks(project_names=None) -> list:
+    """Недели (пн–вс), на которые есть активные записи: [(week_start, week_end), ...]."""
+    week_starts = sorted({d - timedelta(days=d.weekday()) for d in get_booking_dates(project_names)})
+    return [(ws, ws + timedelta(days=6)) for ws in week_starts]
+
+
+def get_booking_dates_in_week(week_start: date, week_end: date, project_names=None) -> list:
+    """Даты с активными записями внутри недели."""
+    return [d for d in get_booking_dates(project_names) if week_start <= d <= week_end]
+
+
+def build_weeks_keyboard(weeks, selected=None, prefix: str = "bkweek"):
+    """Клавиатура мультивыбора недель."""
+    if selected is None:
+        selected = set()
+    builder = InlineKeyboardBuilder()
+    for ws, we in weeks:
+        label = f"{ws.strftime('%d.%m')}-{we.strftime('%d.%m')}"
+        key = ws.isoformat()
+        if key in selected:
+            label = "✅ " + label
+        builder.button(text=label, callback_data=f"{prefix}_{key}")
+    # Нижний ряд: подтвердить + пропустить (всегда 2 кнопки)
+    if selected:
+        builder.button(text="✅ Подтвердить выбор", callback_data=f"{prefix}_confirm")
+    else:
+        builder.button(text="▫️ Выберите неделю", callback_data=f"{prefix}_noop")
+    builder.button(text="⏩ Пропустить", callback_data=f"{prefix}_skip")
+    # Кнопки недель по 2, последние 2 — управление (всегда отдельный ряд)
+    week_rows = [2] * (len(weeks) // 2)
+    if len(weeks) % 2:
+        week_rows.append(1)
+    builder.adjust(*week_rows, 2)
+    return builder
+
+
+def build_days_keyboard(booking_dates, selected=None, prefix: str = "bkday"):
+    """Клавиатура мультивыбора дней."""
+    if selected is None:
+        selected = set()
+    builder = InlineKeyboardBuilder()
+    for d in booking_dates:
+        label = d.strftime('%d.%m.%Y')
+        key = d.isoformat()
+        if key in selected:
+            label = "✅ " + label
+        builder.button(text=label, callback_data=f"{prefix}_{key}")
+    # Нижний ряд: подтвердить + пропустить (всегда 2 кнопки)
+    if selected:
+        builder.button(text="✅ Подтвердить выбор", callback_data=f"{prefix}_confirm")
+    else:
+        builder.button(text="▫️ Выберите день", callback_data=f"{prefix}_noop")
+    builder.button(text="⏩ Пропустить (вся неделя)", callback_data=f"{prefix}_skip")
+    day_rows = [2] * (len(booking_dates) // 2)
+    if len(booking_dates) % 2:
+        day_rows.append(1)
+    builder.adjust(*day_rows, 2)
+    return builder
+
+
+def apply_filters(query, filters: dict):
+    """
+    Применить фильтры списка записей к запросу по Booking ⨝ Contract.
+
+    Args:
+        filters: bk_projects (список или None — все), bk_dates (ISO-даты)
+            либо диапазон bk_date_from/bk_date_to; без дат — все будущие записи
+    """
+    today = clock.today()
+    query = query.filter(Booking.is_cancelled == False)
+
+    project_names = _normalize_projects(filters.get("bk_projects"))
+    if project_names:
+        query = query.filter(Contract.house_name.in_(project_names))
+
+    bk_dates = filters.get("bk_dates")
+    date_from_str = filters.get("bk_date_from")
+    date_to_str = filters.get("bk_date_to")
+    if bk_dates:
+        date_objects = [date.fromisoformat(d) for d in bk_dates]
+        query = query.filter(Booking.date.in_(date_objects), Booking.date >= today)
+    elif date_from_str and date_to_str:
+        date_from = date.fromisoformat(date_from_str)
+        date_to = date.fromisoformat(date_to_str)
+        query = query.filter(Booking.date >= max(date_from, today), Booking.date <= date_to)
+    else:
+        query = query.filter(Booking.date >= today)
+    return query
+
+
+def count_project_bookings(session, filters: dict) -> dict:
+    """Количество записей по проектам с учётом фильтров: {project_name: N}."""
+    return dict(
+        apply_filters(
+            session.query(Contract.house_name, func.count(Booking.id))
+            .join(Contract, Booking.contract_id == Contract.id),
+            filters
+        )
+        .group_by(Contract.house_name)
+        .all()
+    )
+
+
+def get_bookings_page(session, filters: dict, page: int):
+    """
+    Одна страница списка записей.
+
+    Returns:
+        (rows, slot_counts): rows — список (Booking, Contract) страницы в порядке
+        проект → дата → время → подъезд/этаж/квартира; slot_counts — полное число
+        записей {(проект, дата, время): N} для дат, попавших на страницу
+    """
+    rows = (
+        apply_filters(
+            session.query(Booking, Contract).join(Contract, Booking.contract_id == Contract.id),
+            filters
+        )
+        .order_by(
+            Contract.house_name, Booking.date, Booking.time_slot,
+            cast(Contract.entrance, Integer), Contract.floor, cast(Contract.apt_num, Integer),
+            Booking.id
+        )
+        .limit(BOOKINGS_PAGE_SIZE)
+        .offset(page * BOOKINGS_PAGE_SIZE)
+        .all()
+    )
+    if not rows:
+        return [], {}
+
+    # Счётчики по дням и слотам считаем в SQL — запись дня может оказаться на соседней странице
+    page_projects = {contract.house_name for _, contract in rows}
+    page_dates = {booking.date for booking, _ in rows}
+    counts = (
+        apply_filters(
+            session.query(Contract.house_name, Booking.date, Booking.time_slot, func.count(Booking.id))
+            .join(Contract, Booking.contract_id == Contract.id),
+            filters
+        )
+        .filter(Contract.house_name.in_(page_projects), Booking.date.in_(page_dates))
+        .group_by(Contract.house_name, Booking.date, Booking.time_slot)
+        .all()
+    )
+    slot_counts = {(name, bk_date, slot): count for name, bk_date, slot, count in counts}
+    return rows, slot_counts
+
+
+def build_page_keyboard(page: int, pages: int, prefix: str = "bkpage"):
+    """Навигация по страницам списка записей."""
+    builder = InlineKeyboardBuilder()
+    if page > 0:
+        builder.button(text="⬅️ Назад", callback_data=f"{prefix}_{page - 1}")
+    builder.button(text=f"{page + 1}/{pages}", callback_data=f"{prefix}_noop")
+    if page < pages - 1:
+        builder.button(text="Вперёд ➡️", callback_data=f"{prefix}_{page + 1}")
+    builder.button(text="✖️ Закрыть", callback_data=f"{prefix}_close")
+    builder.adjust(3 if 0 < page < pages - 1 else 2, 1)
+    return builder
+
+
+def pluralize_records(n: int) -> str:
+    """Склонение слова 'запись': 1 запись, 2 записи, 5 записей."""
+    if 11 <= n % 100 <= 19:
+        return "записей"
+    last = n % 10
+    if last == 1:
+        return "запись"
+    if 2 <= last <= 4:
+        return "записи"
+    return "записей"
+
+
+def format_booking_line(booking, contract) -> str:
+    """Строка записи: подъезд, этаж, квартира, договор и отметка о повторной записи."""
+    entrance_str = f"подъезд {contract.entrance}" if contract.entrance else "—"
+    floor_str = f"этаж {contract.floor}" if contract.floor is not None else "—"
+    apt_str = f"кв. {contract.apt_num}" if contract.apt_num else "—"
+    repeat_str = "" if booking.is_first_booking else " _(повторная)_"
+    return f"    {entrance_str}, {floor_str}, {apt_str} — {contract.contract_num}{repeat_str}"
+
+
+def format_client_line(booking, contract) -> str:
+    """Строка записи для сотрудника: ФИО клиента, квартира и отметка о повторной записи."""
+    repeat_str = "" if booking.is_first_booking else " _(повторная)_"
+    return f"    {contract.client_fio} (кв.{contract.apt_num}){repeat_str}"
+
+
+def format_bookings_page(rows: list, slot_counts: dict, project_totals: dict,
+                         line_formatter=format_booking_line) -> str:
+    """Форматирует страницу записей, сгруппированных по проектам.
+
+    Формат:
+    📋 **Проект** ( K записей )
+
+    📅 **ДД.ММ** (N записей)
+      🕐 **ЧЧ:ММ** (M)
+        Подъезд X, этаж Y, кв. Z — Договор
+
+    line_formatter — строка одной записи (format_booking_line для админа,
+    format_client_line для сотрудника).
+    """
+    lines = []
+    current_project = current_date = current_slot = None
+
+    for booking, contract in rows:
+        project_name = contract.house_name
+        if project_name != current_project:
+            if lines:
+                lines.append("")
+            total = project_totals.get(project_name, 0)
+            lines.append(f"📋 **{project_name}** ( {total} {pluralize_records(total)} )")
+            current_project, current_date, current_slot = project_name, None, None
+
+        if booking.date != current_date:
+            day_count = sum(
+                count for (name, bk_date, _), count in slot_counts.items()
+                if name == project_name and bk_date == booking.date
+            )
+            lines.append("")
+            lines.append(f"📅 **{booking.date.strftime('%d.%m.%Y')}** ( {day_count} {pluralize_records(day_count)} )")
+            current_date, current_slot = booking.date, None
+
+        if booking.time_slot != current_slot:
+            slot_count = slot_counts.get((project_name, booking.date, booking.time_slot), 0)
+            lines.append(f"  🕐 **{booking.time_slot.strftime('%H:%M')}** ( {slot_count} {pluralize_records(slot_count)} )")
+            current_slot = booking.time_slot
+
+        lines.append(line_formatter(booking, contract))
+
+    return "\n".join(lines) + "\n"
+
+
+def open_listing(filters: dict):
+    """
+    Подготовить постраничный список: посчитать записи по проектам и страницы.
+
+    Returns:
+        dict для FSM (фильтры + bk_project_totals, bk_pages) или None, если записей нет
+    """
+    with SessionLocal() as session:
+        project_totals = count_project_bookings(session, filters)
+
+    total = sum(project_totals.values())
+    if not total:
+        return None
+    pages = (total + BOOKINGS_PAGE_SIZE - 1) // BOOKINGS_PAGE_SIZE
+    return {**filters, "bk_project_totals": project_totals, "bk_pages": pages}
+
+
+def render_page(filters: dict, page: int, pages: int, project_totals: dict, prefix: str = "bkpage",
+                line_formatter=format_booking_line):
+    """
+    Загрузить страницу и подготовить сообщение.
+
+    Returns:
+        (text, builder) для edit_text
+    """
+    page = max(0, min(page, pages - 1))
+    with SessionLocal() as session:
+        rows, slot_counts = get_bookings_page(session, filters, page)
+
+    if not rows:
+        text = "📋 Записи изменились — откройте список заново."
+    else:
+        text = format_bookings_page(rows, slot_counts, project_totals, line_formatter)
+        text += f"\n📄 Страница {page + 1} из {pages}"
+    return text, build_page_keyboard(page, pages, prefix)
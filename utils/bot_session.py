@@ -0,0 +1,100 @@
+"""
+HTTP-сессия Bot API с пулом keep-alive соединений.
+
+Одна ClientSession и один TCPConnector на всё время работы бота:
+send_message, edit_text и рассылки уведомлений переиспользуют открытые
+TCP+TLS соединения вместо нового рукопожатия на каждый запрос.
+Ограничения пула, время жизни простаивающего соединения, кэш DNS и
+таймаут запроса задаются в config.py (BOT_API_*).
+
+Счётчики connection_stats показывают, сколько соединений открыто
+и сколько раз соединение из пула было переиспользовано.
+"""
+import ssl
+
+import aiohttp
+import certifi
+from aiogram import __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+from config import (
+    BOT_API_DNS_TTL_SECONDS, BOT_API_INSECURE_SSL, BOT_API_KEEPALIVE_SECONDS,
+    BOT_API_POOL_LIMIT, BOT_API_POOL_PER_HOST, BOT_API_TIMEOUT_SECONDS,
+)
+
+
+class ConnectionStats:
+    """Счётчики соединений: открытые заново и переиспользованные из пула."""
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Доля запросов, обслуженных уже открытым соединением."""
+        total = self.created + self.reused
+        return self.reused / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        return {"created": self.created, "reused": self.reused, "reuse_ratio": self.reuse_ratio}
+
+
+connection_stats = ConnectionStats()
+
+
+def _trace_config(stats: ConnectionStats) -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def on_create(session, context, params):
+        stats.created += 1
+
+    async def on_reuse(session, context, params):
+        stats.reused += 1
+
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+
+def _ssl_context(insecure: bool):
+    """Контекст TLS: сертификаты certifi или (insecure) без проверки."""
+    if insecure:
+        return False
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """Сессия aiogram с keep-alive пулом и счётчиками переиспользования."""
+
+    def __init__(self, insecure_ssl: bool = BOT_API_INSECURE_SSL, limit: int = BOT_API_POOL_LIMIT,
+                 limit_per_host: int = BOT_API_POOL_PER_HOST,
+                 keepalive_seconds: float = BOT_API_KEEPALIVE_SECONDS,
+                 dns_ttl_seconds: int = BOT_API_DNS_TTL_SECONDS,
+                 timeout: float = BOT_API_TIMEOUT_SECONDS,
+                 stats: ConnectionStats = connection_stats, **kwargs):
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(
+            ssl=_ssl_context(insecure_ssl),
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_seconds,
+            ttl_dns_cache=dns_ttl_seconds,
+        )
+        self._stats = stats
+
+    async def create_session(self) -> aiohttp.ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[_trace_config(self._stats)],
+                trust_env=True,  # Прокси из переменных окружения
+            )
+            self._should_reset_connector = False
+
+        return self._session
@@ -0,0 +1,45 @@
+"""
+Текущее время бота (по Ташкенту, UTC+5).
+
+Все расчёты, зависящие от «сейчас» (минимальная дата записи, отсечка 12:00),
+берут время отсюда — тесты и бенчмарки подменяют его через frozen().
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+# Часовой пояс Ташкента (UTC+5)
+TASHKENT_TZ = timezone(timedelta(hours=5))
+
+# Источник времени: None — системные часы
+_source = {"now": None}
+
+
+def now() -> datetime:
+    """Текущее время по Ташкенту (с tzinfo)."""
+    source = _source["now"]
+    return source() if source is not None else datetime.now(TASHKENT_TZ)
+
+
+def today() -> date:
+    """Текущая дата по Ташкенту."""
+    return now().date()
+
+
+def set_source(source) -> None:
+    """Подменить источник времени (функция без аргументов → datetime); None — системные часы."""
+    _source["now"] = source
+
+
+@contextmanager
+def frozen(moment: datetime):
+    """Зафиксировать время; время без tzinfo считается ташкентским, с tzinfo — переводится в Ташкент."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=TASHKENT_TZ)
+    else:
+        moment = moment.astimezone(TASHKENT_TZ)
+    previous = _source["now"]
+    _source["now"] = lambda: moment
+    try:
+        yield
+    finally:
+        _source["now"] = previous
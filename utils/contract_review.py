@@ -0,0 +1,195 @@
+"""
+Сессии обзора изменений договоров (таблица contract_review_items).
+
+Результат analyze_excel_changes для крупного проекта — десятки тысяч
+договоров. Он сохраняется построчно в промежуточную таблицу под id сессии;
+в состоянии FSM остаются только id сессии и номер текущего договора обзора,
+а экраны обзора читают из таблицы по одной строке.
+
+Строки сессии удаляются после применения или отмены; брошенные сессии
+старше FSM_STATE_TTL_HOURS удаляет purge_expired() (задача планировщика).
+"""
+import json
+import time
+import uuid
+
+from sqlalchemy import func, select
+
+from config import FSM_STATE_TTL_HOURS
+from database.models import ContractReviewItem
+from database.session import SessionLocal
+
+# Виды строк сессии
+KIND_NEW = "new"  # Новые квартиры
+KIND_MINOR = "minor"  # Обновление полей без смены ФИО
+KIND_REVIEW = "review"  # Смена ФИО или номера договора — пошаговый обзор
+
+# Действия обзора, по которым считается итог
+REVIEW_ACTIONS = ("unbind_tg", "cancel_bookings", "notify")
+
+_table = ContractReviewItem.__table__
+
+
+def _now() -> float:
+    """Текущее время (unix time); подменяется в тестах."""
+    return time.time()
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def create_session(analysis: dict) -> str:
+    """
+    Сохранить результат analyze_excel_changes; возвращает id сессии.
+
+    updated_contracts делятся на обновления полей (minor) и смену ФИО,
+    которая вместе с changed_contracts попадает в пошаговый обзор.
+    """
+    session_id = uuid.uuid4().hex
+    created_at = _now()
+
+    minor_updates = [u for u in analysis["updated_contracts"] if "client_fio" not in u["changes"]]
+    review_contracts = [
+        {"type": "fio_change", **u} for u in analysis["updated_contracts"] if "client_fio" in u["changes"]
+    ] + [
+        {"type": "contract_change", **c} for c in analysis["changed_contracts"]
+    ]
+
+    rows = []
+    for kind, items in ((KIND_NEW, analysis["new_contracts"]), (KIND_MINOR, minor_updates),
+                        (KIND_REVIEW, review_contracts)):
+        rows.extend(
+            {"session_id": session_id, "kind": kind, "position": position,
+             "payload": _dumps(item), "actions": "[]", "created_at": created_at}
+            for position, item in enumerate(items)
+        )
+
+    if rows:
+        with SessionLocal() as session:
+            session.execute(_table.insert(), rows)
+            session.commit()
+    return session_id
+
+
+def get_counts(session_id: str) -> dict:
+    """Количество строк сессии по видам: {KIND_NEW: n, KIND_MINOR: n, KIND_REVIEW: n}."""
+    counts = {KIND_NEW: 0, KIND_MINOR: 0, KIND_REVIEW: 0}
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(_table.c.kind, func.count())
+            .where(_table.c.session_id == session_id)
+            .group_by(_table.c.kind)
+        ).all()
+    counts.update(dict(rows))
+    return counts
+
+
+def get_review_items(session_id: str, offset: int = 0, limit: int = None) -> list:
+    """Договоры обзора по порядку (с ключом "actions"), начиная с offset."""
+    stmt = (
+        select(_table.c.payload, _table.c.actions)
+        .where(_table.c.session_id == session_id, _table.c.kind == KIND_REVIEW,
+               _table.c.position >= offset)
+        .order_by(_table.c.position)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    with SessionLocal() as session:
+        rows = session.execute(stmt).all()
+    return [{**json.loads(payload), "actions": json.loads(actions)} for payload, actions in rows]
+
+
+def get_review_item(session_id: str, position: int):
+    """Договор обзора по номеру; None — номер за пределами сессии."""
+    items = get_review_items(session_id, offset=position, limit=1)
+    return items[0] if items else None
+
+
+def set_review_actions(session_id: str, position: int, actions) -> None:
+    """Сохранить выбранные действия для договора обзора."""
+    with SessionLocal() as session:
+        session.execute(
+            _table.update()
+            .where(_table.c.session_id == session_id, _table.c.kind == KIND_REVIEW,
+                   _table.c.position == position)
+            .values(actions=_dumps(sorted(actions)))
+        )
+        session.commit()
+
+
+def clear_review_actions(session_id: str) -> None:
+    """Сбросить действия по всем договорам обзора (обзор начинается заново)."""
+    with SessionLocal() as session:
+        session.execute(
+            _table.update()
+            .where(_table.c.session_id == session_id, _table.c.kind == KIND_REVIEW)
+            .values(actions="[]")
+        )
+        session.commit()
+
+
+def count_review_actions(session_id: str) -> dict:
+    """Сколько договоров обзора отмечено каждым действием: {действие: n}."""
+    counts = dict.fromkeys(REVIEW_ACTIONS, 0)
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(_table.c.actions, func.count())
+            .where(_table.c.session_id == session_id, _table.c.kind == KIND_REVIEW,
+                   _table.c.actions != "[]")
+            .group_by(_table.c.actions)
+        ).all()
+    for actions, count in rows:
+        for action in json.loads(actions):
+            if action in counts:
+                counts[action] += count
+    return counts
+
+
+def load_changes(session_id: str, kinds) -> dict:
+    """
+    Списки для apply_contract_changes по выбранным видам: {вид: [данные, ...]}.
+
+    Договоры обзора возвращаются вместе с "actions".
+    """
+    result = {kind: [] for kind in kinds}
+    if not result:
+        return result
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(_table.c.kind, _table.c.payload, _table.c.actions)
+            .where(_table.c.session_id == session_id, _table.c.kind.in_(result))
+            .order_by(_table.c.kind, _table.c.position)
+        ).all()
+    for kind, payload, actions in rows:
+        item = json.loads(payload)
+        if kind == KIND_REVIEW:
+            item["actions"] = json.loads(actions)
+        result[kind].append(item)
+    return result
+
+
+def discard_session(session_id: str) -> None:
+    """Удалить строки сессии (после применения или отмены)."""
+    if not session_id:
+        return
+    with SessionLocal() as session:
+        session.execute(_table.delete().where(_table.c.session_id == session_id))
+        session.commit()
+
+
+def purge_expired(ttl_hours: float = FSM_STATE_TTL_HOURS) -> int:
+    """Удалить брошенные сессии; возвращает количество удалённых строк."""
+    cutoff = _now() - ttl_hours * 3600
+    with SessionLocal() as session:
+        deleted = session.execute(_table.delete().where(_table.c.created_at < cutoff)).rowcount
+        session.commit()
+    return deleted
+
+
+async def purge_expired_job() -> int:
+    """
+    Задача планировщика: purge_expired() в цикле событий. Синхронную задачу
+    планировщик выполнил бы в своём потоке на общем с обработчиками соединении SQLite.
+    """
+    return purge_expired()
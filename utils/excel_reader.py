@@ -1,8 +1,11 @@
+import asyncio
 import logging
+import time
 import pandas as pd
 from database.session import SessionLocal
 from database.models import Contract, ProjectSlots
 from datetime import datetime
+from utils.metrics import EXCEL_IMPORT_ROWS, EXCEL_IMPORT_ROWS_PER_SECOND, EXCEL_IMPORT_SECONDS
 
 # Ожидаемые названия столбцов в правильном порядке
 EXPECTED_COLUMNS = [
@@ -53,6 +56,65 @@ def _detect_columns(df):
     return mapping, df
 
 
+def _normalize_row(row, col_map) -> dict:
+    """
+    Данные договора из строки Excel: номер договора без пробелов в верхнем
+    регистре, дата сдачи — date (из строки ДД.ММ.ГГГГ или Timestamp).
+    """
+    raw_delivery_date = row[col_map['Дата сдачи']]
+    if isinstance(raw_delivery_date, str):
+        delivery_date = datetime.strptime(raw_delivery_date, '%d.%m.%Y').date()
+    else:
+        delivery_date = raw_delivery_date.date()
+
+    return {
+        "house_name": str(row[col_map['Название дома']]),
+        "apt_num": str(row[col_map['Номер квартиры']]),
+        "entrance": str(row[col_map['Подъезд']]),
+        "floor": int(row[col_map['Этаж']]),
+        "contract_num": "".join(str(row[col_map['Номер договора']]).split()).upper(),
+        "client_fio": str(row[col_map['ФИО клиента']]),
+        "delivery_date": delivery_date,
+    }
+
+
+def _record_import(operation, rows, started):
+    """Метрики импорта: строки, время и скорость (строк в секунду)."""
+    elapsed = time.perf_counter() - started
+    EXCEL_IMPORT_ROWS.labels(operation=operation).inc(rows)
+    EXCEL_IMPORT_SECONDS.labels(operation=operation).observe(elapsed)
+    if elapsed > 0:
+        EXCEL_IMPORT_ROWS_PER_SECOND.labels(operation=operation).set(rows / elapsed)
+
+
+def read_contract_rows(file_path, project_name=None):
+    """
+    Разбор Excel-файла договоров без обращения к базе — его можно выполнять
+    в потоке (asyncio.to_thread), пока цикл событий обрабатывает обновления.
+
+    Args:
+        file_path: путь к Excel файлу
+        project_name: оставить только строки этого дома (None — все строки)
+
+    Returns:
+        tuple: (данные договоров — как из _normalize_row, название дома первой
+        строки файла, всего строк в файле)
+    """
+    df = pd.read_excel(file_path)
+    col_map, df = _detect_columns(df)
+
+    rows = []
+    first_house = None
+    for _, row in df.iterrows():
+        house_name = str(row[col_map['Название дома']])
+        if first_house is None:
+            first_house = house_name
+        if project_name and house_name != project_name:
+            continue
+        rows.append(_normalize_row(row, col_map))
+    return rows, first_house, len(df)
+
+
 def process_excel_file(file_path, project_name=None, address_ru=None, address_uz=None, slots_limit=None, latitude=None, longitude=None):
     """
     Импорт контрактов из Excel.
@@ -75,44 +137,27 @@ def process_excel_file(file_path, project_name=None, address_ru=None, address_uz
     Returns:
         tuple: (количество импортированных контрактов, название проекта)
     """
-    df = pd.read_excel(file_path)
-    col_map, df = _detect_columns(df)
+    started = time.perf_counter()
+    parsed = read_contract_rows(file_path, project_name)
+    return _save_contracts(parsed, started, address_ru, address_uz, slots_limit, latitude, longitude)
 
-    count = 0
-    detected_project = None
-    
-    with SessionLocal() as session:
-        for _, row in df.iterrows():
-            clean_contract = "".join(str(row[col_map['Номер договора']]).split()).upper()
 
-            # Преобразование даты сдачи
-            raw_delivery_date = row[col_map['Дата сдачи']]
-            if isinstance(raw_delivery_date, str):
-                delivery_date = datetime.strptime(raw_delivery_date, '%d.%m.%Y').date()
-            else:
-                delivery_date = raw_delivery_date.date()
+async def process_excel_file_async(file_path, project_name=None, address_ru=None, address_uz=None, slots_limit=None,
+                                   latitude=None, longitude=None):
+    """process_excel_file для обработчиков: разбор файла в потоке, запись в базу — в цикле событий."""
+    started = time.perf_counter()
+    parsed = await asyncio.to_thread(read_contract_rows, file_path, project_name)
+    return _save_contracts(parsed, started, address_ru, address_uz, slots_limit, latitude, longitude)
 
-            house_name = str(row[col_map['Название дома']])
-            
-            # Определяем название проекта
-            if detected_project is None:
-                detected_project = house_name
-            
-            # Если указан конкретный project_name, проверяем соответствие
-            if project_name and house_name != project_name:
-                continue  # Пропускаем контракты не из этого проекта
-
-            contract = session.query(Contract).filter_by(contract_num=clean_contract).first()
-
-            data = {
-                "house_name": house_name,
-                "apt_num": str(row[col_map['Номер квартиры']]),
-                "entrance": str(row[col_map['Подъезд']]),
-                "floor": int(row[col_map['Этаж']]),
-                "contract_num": clean_contract,
-                "client_fio": str(row[col_map['ФИО клиента']]),
-                "delivery_date": delivery_date
-            }
+
+def _save_contracts(parsed, started, address_ru, address_uz, slots_limit, latitude, longitude):
+    """Запись разобранных договоров и настроек проекта в базу (импорт process_excel_file)."""
+    rows, detected_project, total = parsed
+    count = 0
+
+    with SessionLocal() as session:
+        for data in rows:
+            contract = session.query(Contract).filter_by(contract_num=data["contract_num"]).first()
 
             if contract:
                 for key, value in data.items(): 
@@ -149,7 +194,8 @@ def process_excel_file(file_path, project_name=None, address_ru=None, address_uz
                 ))
         
         session.commit()
-    
+
+    _record_import("import", total, started)
     return count, detected_project
 
 
@@ -165,40 +211,33 @@ def analyze_excel_changes(file_path, project_name):
             - updated_contracts: список квартир с изменёнными данными (без смены договора)
             - changed_contracts: список квартир со сменой номера договора
     """
-    from database.models import Booking
+    started = time.perf_counter()
+    parsed = read_contract_rows(file_path, project_name)
+    return _compare_contracts(parsed, started)
 
-    df = pd.read_excel(file_path)
-    col_map, df = _detect_columns(df)
 
+async def analyze_excel_changes_async(file_path, project_name):
+    """analyze_excel_changes для обработчиков: разбор файла в потоке, сравнение с базой — в цикле событий."""
+    started = time.perf_counter()
+    parsed = await asyncio.to_thread(read_contract_rows, file_path, project_name)
+    return _compare_contracts(parsed, started)
+
+
+def _compare_contracts(parsed, started):
+    """Сравнение разобранных договоров проекта с базой (анализ analyze_excel_changes)."""
+    from database.models import Booking
+
+    rows, _, total = parsed
     new_contracts = []
     updated_contracts = []
     changed_contracts = []
 
     with SessionLocal() as session:
-        for _, row in df.iterrows():
-            house_name = str(row[col_map['Название дома']])
-
-            if house_name != project_name:
-                continue
-
-            apt_num = str(row[col_map['Номер квартиры']])
-            clean_contract = "".join(str(row[col_map['Номер договора']]).split()).upper()
-
-            raw_delivery_date = row[col_map['Дата сдачи']]
-            if isinstance(raw_delivery_date, str):
-                delivery_date = datetime.strptime(raw_delivery_date, '%d.%m.%Y').date()
-            else:
-                delivery_date = raw_delivery_date.date()
-
-            new_data = {
-                "house_name": house_name,
-                "apt_num": apt_num,
-                "entrance": str(row[col_map['Подъезд']]),
-                "floor": int(row[col_map['Этаж']]),
-                "contract_num": clean_contract,
-                "client_fio": str(row[col_map['ФИО клиента']]),
-                "delivery_date": delivery_date.isoformat(),
-            }
+        for new_data in rows:
+            house_name = new_data["house_name"]
+            new_data["delivery_date"] = new_data["delivery_date"].isoformat()
+            apt_num = new_data["apt_num"]
+            clean_contract = new_data["contract_num"]
 
             # Ищем существующий контракт по дому + квартире
             existing = session.query(Contract).filter_by(
@@ -245,6 +284,7 @@ def analyze_excel_changes(file_path, project_name):
                         "changes": changes,
                     })
 
+    _record_import("analyze", total, started)
     return {
         "new_contracts": new_contracts,
         "updated_contracts": updated_contracts,
@@ -277,6 +317,7 @@ def apply_contract_changes(new_contracts=None, minor_updates=None, review_decisi
     """
     from database.models import Booking
 
+    started = time.perf_counter()
     result = {
         "added": 0,
         "updated": 0,
@@ -362,4 +403,6 @@ def apply_contract_changes(new_contracts=None, minor_updates=None, review_decisi
 
         session.commit()
 
+    rows = sum(len(items) for items in (new_contracts, minor_updates, review_decisions) if items)
+    _record_import("apply", rows, started)
     return result
\ No newline at end of file
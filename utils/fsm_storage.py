@@ -0,0 +1,186 @@
+"""
+Хранилище состояний FSM в базе бота (таблица fsm_states).
+
+Шаг пользователя и данные состояния (contract_id, выбранная дата и т.п.)
+переживают перезапуск бота. Данные хранятся компактным JSON.
+
+Изменения сначала попадают в кэш в памяти и записываются в базу одной
+транзакцией не чаще раза в FSM_FLUSH_SECONDS — несколько update_data
+подряд в одном обработчике дают одну запись. Кэш ограничен FSM_CACHE_SIZE
+состояниями; состояния без изменений дольше FSM_STATE_TTL_HOURS считаются
+брошенными и удаляются (purge_expired() — задача планировщика).
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from sqlalchemy.dialects.sqlite import insert
+
+from config import FSM_CACHE_SIZE, FSM_FLUSH_SECONDS, FSM_STATE_TTL_HOURS
+from database.models import FsmState
+from database.session import SessionLocal
+
+_EMPTY_DATA = "{}"
+
+
+def _now() -> float:
+    """Текущее время (unix time); подменяется в тестах."""
+    return time.time()
+
+
+def _dumps(data) -> str:
+    """Компактный JSON без экранирования кириллицы."""
+    return json.dumps(dict(data), ensure_ascii=False, separators=(",", ":"))
+
+
+class _Entry:
+    """Состояние в кэше: шаг, данные (JSON) и время изменения."""
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state, data, updated_at):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and self.data == _EMPTY_DATA
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite с объединением записей и сроком жизни состояний."""
+
+    def __init__(self, session_factory=None, ttl_hours: float = FSM_STATE_TTL_HOURS,
+                 flush_seconds: float = FSM_FLUSH_SECONDS, cache_size: int = FSM_CACHE_SIZE):
+        self._session_factory = session_factory
+        self._ttl = ttl_hours * 3600
+        self._flush_seconds = flush_seconds
+        self._cache_size = cache_size
+        self._key_builder = DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._flush_handle = None
+
+    def _session(self):
+        return (self._session_factory or SessionLocal)()
+
+    def _is_expired(self, updated_at) -> bool:
+        return updated_at is None or updated_at < _now() - self._ttl
+
+    def _entry(self, key) -> _Entry:
+        """Состояние по ключу: из кэша или из базы; брошенное — как пустое."""
+        storage_key = self._key_builder.build(key)
+        entry = self._entries.get(storage_key)
+        if entry is not None:
+            self._entries.move_to_end(storage_key)
+        else:
+            with self._session() as session:
+                row = session.get(FsmState, storage_key)
+                entry = _Entry(row.state, row.data, row.updated_at) if row else _Entry(None, _EMPTY_DATA, None)
+            self._entries[storage_key] = entry
+            self._evict()
+
+        if not entry.is_empty and self._is_expired(entry.updated_at):
+            entry.state, entry.data = None, _EMPTY_DATA
+            self._mark_dirty(storage_key, entry)
+        return entry
+
+    def _mark_dirty(self, storage_key: str, entry: _Entry) -> None:
+        entry.updated_at = _now()
+        self._dirty.add(storage_key)
+        if self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+                return
+            self._flush_handle = loop.call_later(self._flush_seconds, self._scheduled_flush)
+
+    def _scheduled_flush(self) -> None:
+        self._flush_handle = None
+        self.flush()
+
+    def _evict(self) -> None:
+        """Вытеснить давно не использованные состояния сверх лимита кэша."""
+        while len(self._entries) > self._cache_size:
+            storage_key = next(iter(self._entries))
+            if storage_key in self._dirty:
+                self.flush()
+            self._entries.popitem(last=False)
+
+    def flush(self) -> int:
+        """Записать накопленные изменения одной транзакцией; возвращает количество состояний."""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        table = FsmState.__table__
+        with self._session() as session:
+            for storage_key in dirty:
+                entry = self._entries.get(storage_key)
+                if entry is None:
+                    continue
+                if entry.is_empty:
+                    session.execute(table.delete().where(table.c.key == storage_key))
+                    continue
+                values = {"state": entry.state, "data": entry.data, "updated_at": entry.updated_at}
+                session.execute(
+                    insert(table)
+                    .values(key=storage_key, **values)
+                    .on_conflict_do_update(index_elements=[table.c.key], set_=values)
+                )
+            session.commit()
+        return len(dirty)
+
+    async def purge_expired(self) -> int:
+        """
+        Удалить брошенные состояния из базы и кэша; возвращает количество удалённых строк.
+
+        Корутина: планировщик выполняет её в цикле событий, а не в своём пуле
+        потоков — кэш и соединение SQLite общие с обработчиками.
+        """
+        self.flush()
+        cutoff = _now() - self._ttl
+        for storage_key in [k for k, e in self._entries.items() if e.updated_at is None or e.updated_at < cutoff]:
+            del self._entries[storage_key]
+        table = FsmState.__table__
+        with self._session() as session:
+            deleted = session.execute(table.delete().where(table.c.updated_at < cutoff)).rowcount
+            session.commit()
+        return deleted
+
+    @property
+    def cached_count(self) -> int:
+        """Состояний в кэше в памяти."""
+        return len(self._entries)
+
+    def stored_count(self) -> int:
+        """Состояний в базе (без учёта ещё не записанных изменений)."""
+        with self._session() as session:
+            return session.query(FsmState).count()
+
+    async def set_state(self, key, state=None) -> None:
+        entry = self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(self._key_builder.build(key), entry)
+
+    async def get_state(self, key):
+        return self._entry(key).state
+
+    async def set_data(self, key, data) -> None:
+        entry = self._entry(key)
+        entry.data = _dumps(data)
+        self._mark_dirty(self._key_builder.build(key), entry)
+
+    async def get_data(self, key) -> dict:
+        return json.loads(self._entry(key).data)
+
+    async def close(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.flush()
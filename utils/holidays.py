@@ -0,0 +1,130 @@
+"""
+Праздники и закрытые даты (таблица holidays).
+
+Закрытый период задаётся диапазоном дат для одного проекта или для всех.
+Рабочие дни (пн–пт без закрытых дат) заранее рассчитываются на
+HOLIDAY_HORIZON_DAYS вперёд для каждого проекта — проверка дня в
+календаре и при расчёте минимальной даты записи — поиск во множестве.
+После изменения таблицы вызывается invalidate().
+"""
+from datetime import date, datetime, timedelta
+
+from config import HOLIDAY_HORIZON_DAYS
+from database.models import Holiday
+from database.session import SessionLocal
+from utils import clock
+
+# None — периоды не загружены и будут прочитаны из базы при обращении
+_holidays = {"ranges": None}
+
+# проект | None -> (закрытые периоды, сегодня, (закрытые даты, рабочие дни горизонта));
+# со сменой дня запись проекта пересчитывается на месте — кэш не растёт
+_calendar_cache = {}
+
+
+def _load() -> list:
+    """Прочитать закрытые периоды: [(проект | None, date_from, date_to), ...]."""
+    with SessionLocal() as session:
+        rows = session.query(Holiday.project_name, Holiday.date_from, Holiday.date_to).all()
+    return [tuple(row) for row in rows]
+
+
+def get_blackout_ranges() -> list:
+    """
+    Закрытые периоды [(проект | None, date_from, date_to), ...].
+
+    После invalidate() возвращается новый список — по его идентичности
+    зависимые кэши (минимальная дата записи) понимают, что периоды изменились.
+    """
+    if _holidays["ranges"] is None:
+        _holidays["ranges"] = _load()
+        _calendar_cache.clear()
+    return _holidays["ranges"]
+
+
+def invalidate() -> None:
+    """Сбросить закрытые даты после изменения таблицы holidays."""
+    _holidays["ranges"] = None
+    _calendar_cache.clear()
+
+
+def _get_calendar(project_name=None) -> tuple:
+    """(закрытые даты проекта с учётом общих, рабочие дни от сегодня на горизонт)."""
+    ranges = get_blackout_ranges()
+    today = clock.today()
+    cached = _calendar_cache.get(project_name)
+    if cached is not None and cached[0] is ranges and cached[1] == today:
+        return cached[2]
+
+    closed = set()
+    for range_project, date_from, date_to in ranges:
+        if range_project is not None and range_project != project_name:
+            continue
+        day = date_from
+        while day <= date_to:
+            closed.add(day)
+            day += timedelta(days=1)
+
+    working_days = frozenset(
+        day for day in (today + timedelta(days=i) for i in range(HOLIDAY_HORIZON_DAYS + 1))
+        if day.weekday() < 5 and day not in closed
+    )
+    result = (frozenset(closed), working_days)
+    _calendar_cache[project_name] = (ranges, today, result)
+    return result
+
+
+def get_closed_dates(project_name=None) -> frozenset:
+    """Закрытые даты (праздники и закрытые периоды) проекта, включая общие."""
+    return _get_calendar(project_name)[0]
+
+
+def is_working_day(day: date, project_name=None) -> bool:
+    """Рабочий день: пн–пт и не попадает в закрытый период."""
+    closed, working_days = _get_calendar(project_name)
+    today = clock.today()
+    if today <= day <= today + timedelta(days=HOLIDAY_HORIZON_DAYS):
+        return day in working_days
+    return day.weekday() < 5 and day not in closed
+
+
+def parse_date_range(value: str) -> tuple:
+    """'ДД.ММ.ГГГГ' или 'ДД.ММ.ГГГГ-ДД.ММ.ГГГГ' → (date_from, date_to). ValueError — неверный формат."""
+    start_str, _, end_str = value.strip().partition("-")
+    date_from = datetime.strptime(start_str.strip(), "%d.%m.%Y").date()
+    date_to = datetime.strptime(end_str.strip(), "%d.%m.%Y").date() if end_str else date_from
+    if date_to < date_from:
+        raise ValueError(value)
+    return date_from, date_to
+
+
+def add_blackout(project_name, date_from: date, date_to: date, title: str = None) -> int:
+    """Добавить закрытый период; возвращает его id."""
+    with SessionLocal() as session:
+        holiday = Holiday(project_name=project_name, date_from=date_from, date_to=date_to, title=title)
+        session.add(holiday)
+        session.commit()
+        holiday_id = holiday.id
+    invalidate()
+    return holiday_id
+
+
+def delete_blackout(holiday_id: int) -> bool:
+    """Удалить закрытый период; False — такого нет."""
+    with SessionLocal() as session:
+        holiday = session.get(Holiday, holiday_id)
+        if not holiday:
+            return False
+        session.delete(holiday)
+        session.commit()
+    invalidate()
+    return True
+
+
+def list_blackouts(project_name=None) -> list:
+    """Закрытые периоды, ещё не закончившиеся (для проекта — вместе с общими)."""
+    with SessionLocal() as session:
+        query = session.query(Holiday).filter(Holiday.date_to >= clock.today())
+        if project_name is not None:
+            query = query.filter((Holiday.project_name == project_name) | Holiday.project_name.is_(None))
+        return query.order_by(Holiday.date_from, Holiday.id).all()
@@ -0,0 +1,228 @@
+"""
+Метрики бота в формате Prometheus (text exposition 0.0.4).
+
+Небольшой реестр без внешних зависимостей: Counter, Gauge и Histogram
+с метками. render() отдаёт текст для Prometheus, start_server() поднимает
+HTTP-эндпоинт METRICS_PATH на METRICS_HOST:METRICS_PORT.
+
+Метрики бота объявлены здесь же; значения пишут utils/tracing.py
+(обновления, время обработчиков, SQL), handlers/client.py (записи,
+уведомления сотрудникам), utils/notifier.py (напоминания),
+utils/excel_reader.py (импорт Excel) и main.py (хранилище FSM).
+"""
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PATH, METRICS_PORT
+
+# Границы корзин гистограмм времени по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Общее для метрик: имя, описание, метки и значения по наборам меток."""
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def labels(self, **labels):
+        """Дочерняя метрика для набора меток."""
+        key = tuple(str(labels[name]) for name in self.label_names)
+        return _Child(self, key)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Child:
+    """Метрика с зафиксированными метками."""
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1) -> None:
+        self._metric._inc(self._key, amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)
+
+    def time(self):
+        return self._metric._time(self._key)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self._inc((), amount)
+
+    def _inc(self, key, amount) -> None:
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Текущее значение; set_function() — значение считается при каждом чтении."""
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels=()):
+        super().__init__(name, description, labels)
+        self._function = None
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def _set(self, key, value) -> None:
+        self._values[key] = value
+
+    def set_function(self, function) -> None:
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            self._values[()] = self._function()
+        yield from super()._samples()
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам (для перцентилей в Prometheus)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def time(self):
+        return self._time(())
+
+    def _observe(self, key, value) -> None:
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state["buckets"][i] += 1
+                break
+        state["sum"] += value
+        state["count"] += 1
+
+    @contextmanager
+    def _time(self, key):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(key, time.perf_counter() - started)
+
+    def _samples(self):
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum", labels, state["sum"]
+            yield f"{self.name}_count", labels, state["count"]
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def create_app(path: str = METRICS_PATH) -> web.Application:
+    app = web.Application()
+    app.router.add_get(path, _handle_metrics)
+    return app
+
+
+async def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """HTTP-эндпоинт метрик; возвращает AppRunner (остановка — runner.cleanup())."""
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# ========== МЕТРИКИ БОТА ==========
+
+UPDATES = Counter("bot_updates_total", "Обработанные обновления по типу", ["type"])
+HANDLER_LATENCY = Histogram("bot_handler_latency_seconds", "Время обработки обновления", ["handler"])
+DB_QUERIES = Counter("bot_db_queries_total", "SQL-запросы при обработке обновлений", ["handler"])
+DB_QUERY_SECONDS = Counter("bot_db_query_seconds_total", "Время SQL-запросов при обработке обновлений", ["handler"])
+DB_N_PLUS_ONE = Counter("bot_db_n_plus_one_total", "Обновления с повторяющимся SQL-запросом (N+1)", ["handler"])
+
+BOOKING_EVENTS = Counter(
+    "bot_booking_events_total", "Записи, отмены и перезаписи клиентов", ["project", "event"]
+)
+NOTIFICATION_FANOUT = Histogram(
+    "bot_notification_fanout_seconds", "Рассылка уведомления всем сотрудникам", ["kind"]
+)
+
+REMINDERS_PENDING = Gauge(
+    "bot_reminders_pending", "Напоминания к отправке при последней проверке", ["kind"]
+)
+REMINDER_SEND_LAG = Histogram(
+    "bot_reminder_send_lag_seconds",
+    "Задержка отправки напоминания от момента, когда оно стало нужно (только kind=hour)",
+    ["kind"], buckets=(1, 10, 30, 60, 120, 300, 600, 1800, 3600, 10800),
+)
+
+EXCEL_IMPORT_ROWS = Counter("bot_excel_import_rows_total", "Строки Excel, обработанные при импорте", ["operation"])
+EXCEL_IMPORT_SECONDS = Histogram(
+    "bot_excel_import_seconds", "Время импорта Excel", ["operation"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+EXCEL_IMPORT_ROWS_PER_SECOND = Gauge(
+    "bot_excel_import_rows_per_second", "Скорость последнего импорта Excel", ["operation"]
+)
+
+FSM_CACHED_STATES = Gauge("bot_fsm_cached_states", "Состояния FSM в кэше в памяти")
+FSM_STORED_STATES = Gauge("bot_fsm_stored_states", "Состояния FSM в базе")
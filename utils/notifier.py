@@ -4,10 +4,16 @@ from datetime import datetime, timedelta
 from database.session import SessionLocal
 from database.models import Booking, Contract
 from aiogram import Bot
+from utils import clock
+from utils.metrics import REMINDER_SEND_LAG, REMINDERS_PENDING
+
+# За сколько до визита отправляется срочное напоминание
+HOUR_REMINDER_LEAD = timedelta(hours=3)
 
 
 async def check_reminders(bot: Bot):
-    now = datetime.now()
+    # Даты и время записей хранятся без пояса, по Ташкенту
+    now = clock.now().replace(tzinfo=None)
     today = now.date()
 
     with SessionLocal() as session:
@@ -37,14 +43,17 @@ async def check_reminders(bot: Bot):
                 day_tasks.append((b, send_day_reminder(contract.telegram_id, message)))
         
         # Отправляем все напоминания за день параллельно
+        REMINDERS_PENDING.labels(kind="day").set(len(day_tasks))
         if day_tasks:
             results = await asyncio.gather(*[task for _, task in day_tasks], return_exceptions=True)
+            # Задержку не считаем: момент, с которого напоминание за день нужно,
+            # зависит от времени создания записи, а оно не хранится
             for (booking, _), success in zip(day_tasks, results):
                 if success:
                     booking.reminder_day_sent = True
 
         # 2. Напоминание за час (если запись на сегодня)
-        hour_threshold = now + timedelta(hours=3)
+        hour_threshold = now + HOUR_REMINDER_LEAD
         urgent_bookings = session.query(Booking).filter(
             Booking.date == today,
             Booking.reminder_hour_sent == False
@@ -69,10 +78,14 @@ async def check_reminders(bot: Bot):
                     hour_tasks.append((b, send_hour_reminder(contract.telegram_id, message)))
         
         # Отправляем все напоминания за 3 часа параллельно
+        REMINDERS_PENDING.labels(kind="hour").set(len(hour_tasks))
         if hour_tasks:
             results = await asyncio.gather(*[task for _, task in hour_tasks], return_exceptions=True)
+            sent_at = clock.now().replace(tzinfo=None)
             for (booking, _), success in zip(hour_tasks, results):
                 if success:
                     booking.reminder_hour_sent = True
+                    due = datetime.combine(booking.date, booking.time_slot) - HOUR_REMINDER_LEAD
+                    REMINDER_SEND_LAG.labels(kind="hour").observe(max(0.0, (sent_at - due).total_seconds()))
 
         session.commit()
\ No newline at end of file
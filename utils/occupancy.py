@@ -0,0 +1,138 @@
+"""
+Индекс занятости слотов: {проект: {дата: {время: количество активных записей}}}.
+
+Строится одним GROUP BY при первом обращении, дальше обновляется
+приращениями из database/events.py после каждого commit — навигация по
+неделям и дням и проверка свободных слотов не сканируют таблицу записей.
+Один индекс на процесс: сколько бы клиентов ни открыли календарь проекта,
+они читают одну и ту же структуру.
+"""
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import func, select
+
+from database import events
+from database.models import Booking, Contract
+from database.session import SessionLocal
+from utils import clock, slot_templates
+
+# None — индекс не построен (или сброшен) и будет прочитан из базы при обращении
+_index = {"projects": None}
+
+# Полностью занятые даты: (проект, лимит на слот) -> ((версия проекта, версия шаблонов), frozenset дат).
+# Версия проекта растёт при каждом изменении его занятости.
+_project_versions = Counter()
+_fully_booked_cache = {}
+
+
+def _load() -> dict:
+    """Прочитать занятость активных записей начиная с сегодняшнего дня."""
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(Contract.house_name, Booking.date, Booking.time_slot, func.count(Booking.id))
+            .join(Contract, Booking.contract_id == Contract.id)
+            .where(Booking.date >= clock.today(), Booking.is_cancelled == False)
+            .group_by(Contract.house_name, Booking.date, Booking.time_slot)
+        ).all()
+
+    projects = {}
+    for project_name, booking_date, time_slot, count in rows:
+        projects.setdefault(project_name, {}).setdefault(booking_date, {})[time_slot] = count
+    return projects
+
+
+def get_occupancy() -> dict:
+    """Весь индекс занятости. Возвращаемые словари не изменять."""
+    if _index["projects"] is None:
+        _index["projects"] = _load()
+        _fully_booked_cache.clear()
+    return _index["projects"]
+
+
+def get_project_occupancy(project_name: str) -> dict:
+    """Занятость одного проекта: {дата: {время: количество}}."""
+    return get_occupancy().get(project_name, {})
+
+
+def get_slot_counts(project_name: str, booking_date: date) -> dict:
+    """Количество активных записей по слотам на дату: {время: количество}."""
+    return dict(get_project_occupancy(project_name).get(booking_date, {}))
+
+
+def get_fully_booked_dates(project_name: str, slots_limit: int) -> frozenset:
+    """
+    Даты проекта, на которые заняты все слоты шаблона дня (utils/slot_templates.py).
+
+    Результат общий для всех клиентов, смотрящих календарь проекта, и
+    пересчитывается только после изменения занятости этого проекта или шаблонов.
+    """
+    occupancy = get_project_occupancy(project_name)
+    key = (project_name, slots_limit)
+    version = (_project_versions[project_name], slot_templates.get_version())
+    cached = _fully_booked_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    fully_booked = frozenset(
+        booking_date for booking_date, slots in occupancy.items()
+        if all(
+            slots.get(slot_time, 0) >= capacity
+            for slot_time, capacity in slot_templates.get_day_slots(project_name, booking_date.weekday(), slots_limit)
+        )
+    )
+    _fully_booked_cache[key] = (version, fully_booked)
+    return fully_booked
+
+
+def get_booked_dates(project_names=None, date_from: date = None) -> list:
+    """
+    Отсортированные даты, на которые есть активные записи.
+
+    Args:
+        project_names: Список проектов; None — все проекты
+        date_from: Не раньше этой даты (по умолчанию — сегодня)
+    """
+    occupancy = get_occupancy()
+    if date_from is None:
+        date_from = clock.today()
+    if project_names is None:
+        project_names = occupancy.keys()
+
+    dates = set()
+    for project_name in project_names:
+        dates.update(d for d in occupancy.get(project_name, ()) if d >= date_from)
+    return sorted(dates)
+
+
+def reset() -> None:
+    """Сбросить индекс — при следующем обращении он будет прочитан заново."""
+    _index["projects"] = None
+    _fully_booked_cache.clear()
+
+
+def _apply_changes(changes, reset_required: bool) -> None:
+    """Подписчик database/events: применить приращения занятости после commit."""
+    projects = _index["projects"]
+    if projects is None:
+        return
+    if reset_required:
+        reset()
+        return
+
+    for change in changes:
+        _project_versions[change.project_name] += 1
+        days = projects.setdefault(change.project_name, {})
+        slots = days.setdefault(change.date, {})
+        count = slots.get(change.time_slot, 0) + change.delta
+        if count > 0:
+            slots[change.time_slot] = count
+        else:
+            slots.pop(change.time_slot, None)
+            if not slots:
+                days.pop(change.date, None)
+            if not days:
+                projects.pop(change.project_name, None)
+
+
+events.subscribe(_apply_changes)
@@ -0,0 +1,168 @@
+"""
+Реестр проектов: название ↔ целый id (таблица projects).
+
+id используется в callback_data (keyboards/callbacks.py: ProjectCallback)
+вместо усечённого названия. Таблица читается один раз. Проекты
+регистрируются при записи договоров и настроек проектов
+(database/events.py) или явно через get_project_id(); построение кнопок
+только ищет id (find_project_id) и в базу не пишет.
+
+Договоры ссылаются на проект через Contract.project_id (проставляется
+database/events.py), поэтому список проектов для меню выбирается по
+реестру с проверкой EXISTS по индексу, а не DISTINCT по всем договорам.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, distinct, exists, func, select
+
+from database.events import get_contracts_version, get_data_version, get_settings_version
+from database.models import Booking, Contract, Project, ProjectSlots
+from database.session import SessionLocal
+from utils import clock
+
+# Строка сводки по проекту для списков и настроек в меню
+ProjectSummary = namedtuple(
+    "ProjectSummary",
+    "name contracts active_bookings slots_limit address_ru address_uz latitude longitude",
+)
+
+# None — реестр не загружен и будет прочитан из базы при обращении
+_registry = {"ids": None, "names": None}
+
+# Проекты с договорами и версия договоров, на которой список прочитан
+_listing = {"version": None, "names": None}
+
+# Сводка по проектам и ключ (версии данных и настроек, сегодня), на котором она прочитана
+_summaries = {"key": None, "rows": None}
+
+
+def _load() -> None:
+    """Прочитать реестр: ids = {название: id}, names = {id: название}."""
+    with SessionLocal() as session:
+        rows = session.query(Project.id, Project.name).all()
+    _registry["ids"] = {name: project_id for project_id, name in rows}
+    _registry["names"] = {project_id: name for project_id, name in rows}
+
+
+def invalidate() -> None:
+    """Сбросить реестр после изменения таблицы projects."""
+    _registry["ids"] = None
+    _registry["names"] = None
+    _listing["version"] = None
+    _summaries["key"] = None
+
+
+def get_project_names() -> list:
+    """
+    Названия проектов, у которых есть договоры, по алфавиту.
+
+    Результат кэшируется до следующего изменения договоров.
+    """
+    version = get_contracts_version()
+    if _listing["version"] != version or _listing["names"] is None:
+        with SessionLocal() as session:
+            names = session.execute(
+                select(Project.name)
+                .where(exists().where(Contract.project_id == Project.id))
+                .order_by(Project.name)
+            ).scalars().all()
+        _listing["names"] = [name for name in names if name]
+        _listing["version"] = version
+    return list(_listing["names"])
+
+
+def get_project_summaries() -> list:
+    """
+    Сводка по проектам с договорами, по алфавиту: [ProjectSummary, ...].
+
+    Количество договоров, активных (не отменённых, с сегодняшнего дня)
+    записей и настройки проекта читаются одним запросом с GROUP BY.
+    Результат кэшируется до изменения договоров, записей или настроек
+    проектов (и до смены даты — от неё зависят активные записи).
+    """
+    today = clock.today()
+    key = (get_data_version(), get_settings_version(), today)
+    if _summaries["key"] != key or _summaries["rows"] is None:
+        stmt = (
+            select(
+                Project.name,
+                func.count(distinct(Contract.id)),
+                func.count(Booking.id),
+                ProjectSlots.slots_limit,
+                ProjectSlots.address_ru,
+                ProjectSlots.address_uz,
+                ProjectSlots.latitude,
+                ProjectSlots.longitude,
+            )
+            .join(Contract, Contract.project_id == Project.id)
+            .outerjoin(Booking, and_(
+                Booking.contract_id == Contract.id,
+                Booking.is_cancelled == False,
+                Booking.date >= today,
+            ))
+            .outerjoin(ProjectSlots, ProjectSlots.project_name == Project.name)
+            .group_by(Project.id, ProjectSlots.project_name)
+            .order_by(Project.name)
+        )
+        with SessionLocal() as session:
+            rows = session.execute(stmt).all()
+        _summaries["rows"] = [ProjectSummary(*row) for row in rows if row[0]]
+        _summaries["key"] = key
+    return list(_summaries["rows"])
+
+
+def format_projects_list(summaries) -> str:
+    """Текст «🏠 Список проектов» по сводке."""
+    text = "🏠 **Список проектов:**\n\n"
+    for idx, summary in enumerate(summaries, 1):
+        text += (
+            f"{idx}. **{summary.name}** — {summary.contracts} договоров, "
+            f"{summary.active_bookings} активных записей\n"
+        )
+    return text
+
+
+def get_project_id(project_name: str) -> int:
+    """id проекта; неизвестное название регистрируется."""
+    if _registry["ids"] is None:
+        _load()
+    project_id = _registry["ids"].get(project_name)
+    if project_id is not None:
+        return project_id
+
+    with SessionLocal() as session:
+        project = session.query(Project).filter_by(name=project_name).first()
+        if project is None:
+            project = Project(name=project_name)
+            session.add(project)
+            session.commit()
+        project_id = project.id
+    _registry["ids"][project_name] = project_id
+    _registry["names"][project_id] = project_name
+    return project_id
+
+
+def find_project_id(project_name: str) -> int:
+    """id зарегистрированного проекта; KeyError — такого проекта нет (в базу не пишет)."""
+    if _registry["ids"] is None:
+        _load()
+    project_id = _registry["ids"].get(project_name)
+    if project_id is None:
+        # Проект мог быть зарегистрирован другим процессом или при импорте договоров
+        _load()
+        project_id = _registry["ids"].get(project_name)
+    if project_id is None:
+        raise KeyError(f"Проект не зарегистрирован: {project_name}")
+    return project_id
+
+
+def get_project_name(project_id: int):
+    """Название проекта по id; None — такого проекта нет."""
+    if _registry["names"] is None:
+        _load()
+    project_name = _registry["names"].get(project_id)
+    if project_name is None:
+        # Проект мог быть зарегистрирован другим процессом
+        _load()
+        project_name = _registry["names"].get(project_id)
+    return project_name
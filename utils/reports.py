@@ -0,0 +1,242 @@
+"""
+Кэш Excel-отчётов о записях.
+
+Отчёты (общий и по каждому проекту) собираются заранее планировщиком:
+ночью — все подряд, в течение дня — те, по которым накопилось
+REPORT_REBUILD_THRESHOLD изменений. Кнопка «📊 Выгрузить отчет» отдаёт
+готовый файл, а после первой отправки — по file_id Telegram без повторной загрузки.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+
+import pandas as pd
+from aiogram import types
+from aiogram.types import FSInputFile
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import select
+
+from config import REPORT_REBUILD_THRESHOLD
+from database.events import get_data_version
+from database.models import Booking, Contract
+from database.session import SessionLocal
+from keyboards.callbacks import ALL_PROJECTS, ProjectCallback
+from utils import clock
+from utils.projects import get_project_names
+
+REPORTS_DIR = "data/reports"
+
+REPORT_COLUMNS = [
+    "Дата визита", "Время", "ФИО Клиента", "Телефон клиента",
+    "Договор", "Дом", "Подъезд", "Кв"
+]
+
+# project_name (None — все проекты) -> данные собранного отчёта
+_cache = {}
+
+
+def _report_path(project_name: str = None) -> str:
+    """Путь к файлу отчёта. Название проекта хэшируется — в нём бывают пробелы и кириллица."""
+    if project_name is None:
+        return os.path.join(REPORTS_DIR, "bookings_report_all.xlsx")
+    digest = hashlib.md5(project_name.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(REPORTS_DIR, f"bookings_report_{digest}.xlsx")
+
+
+def _write_report(results) -> str:
+    """
+    Записать строки отчёта в Excel (pandas/openpyxl) во временный файл
+    в REPORTS_DIR и вернуть его путь. Выполняется в потоке — только запись
+    файла, без обращений к базе. На место отчёта файл ставит build_report.
+    """
+    df = pd.DataFrame(results, columns=REPORT_COLUMNS)
+    df['Время'] = df['Время'].apply(lambda x: x.strftime('%H:%M') if x else "")
+
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=REPORTS_DIR)
+    os.close(fd)
+    try:
+        df.to_excel(tmp_path, index=False)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+async def build_report(project_name: str = None) -> dict:
+    """
+    Собрать отчёт и положить его в кэш.
+
+    Записи читаются из базы в цикле событий (соединение SQLite общее),
+    а сборка таблицы и запись xlsx идут в потоке — обработка обновлений
+    на это время не останавливается. Если за время сборки в кэш попал
+    отчёт более свежей версии, собранный файл удаляется и возвращается
+    отчёт из кэша.
+
+    Returns:
+        dict: path (None, если записей нет), version, built_at, rows, file_id
+    """
+    # Версию фиксируем до запроса: изменения во время сборки сделают отчёт устаревшим
+    version = get_data_version(project_name)
+
+    with SessionLocal() as session:
+        query = (
+            select(
+                Booking.date, Booking.time_slot, Contract.client_fio, Booking.client_phone,
+                Contract.contract_num, Contract.house_name, Contract.entrance, Contract.apt_num
+            )
+            .join(Contract, Booking.contract_id == Contract.id)
+            .filter(Booking.is_cancelled == False)
+            .order_by(Booking.date.desc(), Booking.time_slot.desc())
+        )
+        if project_name is not None:
+            query = query.filter(Contract.house_name == project_name)
+        results = session.execute(query).all()
+
+    tmp_path = await asyncio.to_thread(_write_report, results) if results else None
+
+    # Сборка, начатая раньше и закончившаяся позже, не вытесняет более свежий
+    # отчёт — ни в кэше, ни в файле, на который он ссылается
+    current = _cache.get(project_name)
+    if current is not None and current["version"] > version:
+        if tmp_path:
+            os.remove(tmp_path)
+        return current
+
+    path = None
+    if tmp_path:
+        path = _report_path(project_name)
+        os.replace(tmp_path, path)
+
+    entry = {
+        "path": path,
+        "version": version,
+        "built_at": clock.now(),
+        "rows": len(results),
+        "file_id": None,
+    }
+    _cache[project_name] = entry
+    return entry
+
+
+def pending_changes(project_name: str = None) -> int:
+    """Сколько изменений накопилось с момента сборки отчёта (None — отчёта нет)."""
+    entry = _cache.get(project_name)
+    if entry is None:
+        return None
+    return get_data_version(project_name) - entry["version"]
+
+
+async def get_report(project_name: str = None, force: bool = False) -> dict:
+    """
+    Отчёт из кэша; пересобирается, если его нет, файл пропал,
+    изменений накопилось не меньше порога или запрошена принудительная сборка.
+    """
+    entry = _cache.get(project_name)
+    if (
+        force
+        or entry is None
+        or (entry["path"] and not os.path.exists(entry["path"]))
+        or pending_changes(project_name) >= REPORT_REBUILD_THRESHOLD
+    ):
+        entry = await build_report(project_name)
+    return entry
+
+
+def get_report_projects() -> list:
+    """Список проектов, по которым собираются отдельные отчёты (из реестра проектов)."""
+    return get_project_names()
+
+
+async def rebuild_all_reports():
+    """Задача планировщика: ночная пересборка общего отчёта и отчётов по проектам."""
+    for project_name in [None] + get_report_projects():
+        try:
+            await build_report(project_name)
+        except Exception as e:
+            logging.error(f"Ошибка ночной сборки отчёта ({project_name or 'все проекты'}): {e}")
+
+
+async def refresh_stale_reports():
+    """Задача планировщика: пересборка отчётов, по которым накопилось много изменений."""
+    for project_name in [None] + get_report_projects():
+        changes = pending_changes(project_name)
+        if changes is not None and changes < REPORT_REBUILD_THRESHOLD:
+            continue
+        try:
+            await build_report(project_name)
+        except Exception as e:
+            logging.error(f"Ошибка пересборки отчёта ({project_name or 'все проекты'}): {e}")
+
+
+def get_report_refresh_keyboard(project_name: str = None):
+    """Inline-кнопка принудительной пересборки отчёта"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🔄 Сформировать заново", callback_data=ProjectCallback.of("rprt", project_name))
+    return builder.as_markup()
+
+
+def resolve_report_project(callback_data: ProjectCallback):
+    """
+    Проект по callback_data кнопки пересборки.
+
+    Returns:
+        (found, project_name): found=False, если проект больше не существует
+    """
+    if callback_data.project == ALL_PROJECTS:
+        return True, None
+    project_name = callback_data.project_name
+    if project_name is None or project_name not in get_report_projects():
+        return False, None
+    return True, project_name
+
+
+async def send_report(message: types.Message, project_name: str = None, force: bool = False, reply_markup=None):
+    """
+    Отправить отчёт пользователю.
+
+    Args:
+        message: Сообщение, в ответ на которое отправляется отчёт
+        project_name: Название проекта (None — все проекты)
+        force: Собрать отчёт заново, не используя кэш
+        reply_markup: Клавиатура для текстовых ответов (нет записей / ошибка)
+    """
+    loading_msg = await message.answer("⏳ Ваша операция выполняется, подождите...")
+
+    try:
+        entry = await get_report(project_name, force=force)
+
+        await loading_msg.delete()
+
+        if entry["path"] is None:
+            return await message.answer("Записи в базе данных отсутствуют.", reply_markup=reply_markup)
+
+        caption = f"Отчет о записях на {entry['built_at'].strftime('%d.%m.%Y %H:%M')}"
+        if project_name:
+            caption += f"\n🏠 Проект: {project_name}"
+        changes = pending_changes(project_name)
+        if changes:
+            caption += f"\n⚠️ Изменений с момента формирования: {changes}"
+
+        document = entry["file_id"] or FSInputFile(
+            entry["path"],
+            filename=f"bookings_report_{project_name}.xlsx" if project_name else "bookings_report.xlsx"
+        )
+        sent = await message.answer_document(
+            document,
+            caption=caption,
+            reply_markup=get_report_refresh_keyboard(project_name)
+        )
+
+        # Запоминаем file_id, если за время отправки отчёт не пересобрали
+        document_info = getattr(sent, "document", None)
+        if _cache.get(project_name) is entry and document_info is not None:
+            entry["file_id"] = document_info.file_id
+    except Exception as e:
+        try:
+            await loading_msg.delete()
+        except:
+            pass
+        await message.answer(f"❌ Ошибка при формировании отчета: {e}", reply_markup=reply_markup)
@@ -0,0 +1,180 @@
+"""
+Шаблоны слотов записи по проектам и дням недели.
+
+Шаблон — набор (время, вместимость) из таблицы slot_templates. Для дня
+выбирается самый точный из настроенных: проект + день недели → проект →
+все проекты + день недели → все проекты → слоты по умолчанию
+(keyboards/inline.py: TIME_SLOTS). Вместимость None означает лимит проекта
+(ProjectSlots.slots_limit).
+
+Таблица читается один раз и компилируется в кортежи объектов time;
+после изменения шаблонов вызывается invalidate().
+"""
+from datetime import date, time
+
+from database.models import SlotTemplate
+from database.session import SessionLocal
+from keyboards.inline import DEFAULT_SLOT_TIMES
+
+WEEKDAY_CODES = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
+# {(проект | None, день недели | None): ((время, вместимость | None), ...)}
+# None — шаблоны не загружены и будут прочитаны из базы при обращении
+_templates = {"compiled": None, "version": 0}
+
+# (проект, день недели, лимит проекта) -> ((время, вместимость), ...)
+_day_slots_cache = {}
+
+
+def _load(session) -> dict:
+    """Прочитать и сгруппировать шаблоны."""
+    rows = (
+        session.query(SlotTemplate)
+        .order_by(SlotTemplate.project_name, SlotTemplate.weekday, SlotTemplate.time_slot)
+        .all()
+    )
+    compiled = {}
+    for row in rows:
+        compiled.setdefault((row.project_name, row.weekday), []).append((row.time_slot, row.capacity))
+    return {key: tuple(slots) for key, slots in compiled.items()}
+
+
+def get_templates(session=None) -> dict:
+    """
+    Все шаблоны: {(проект | None, день | None): ((время, вместимость | None), ...)}.
+
+    Args:
+        session: Сессия для первой загрузки (по умолчанию — новая SessionLocal)
+    """
+    if _templates["compiled"] is None:
+        if session is None:
+            with SessionLocal() as own_session:
+                _templates["compiled"] = _load(own_session)
+        else:
+            _templates["compiled"] = _load(session)
+        _day_slots_cache.clear()
+    return _templates["compiled"]
+
+
+def get_version() -> int:
+    """Версия шаблонов — растёт при каждом invalidate()."""
+    return _templates["version"]
+
+
+def invalidate() -> None:
+    """Сбросить шаблоны после изменения таблицы slot_templates."""
+    _templates["compiled"] = None
+    _templates["version"] += 1
+    _day_slots_cache.clear()
+
+
+def get_day_slots(project_name: str, weekday: int, slots_limit: int, session=None) -> tuple:
+    """Слоты дня с вместимостью: ((время, вместимость), ...) в порядке времени."""
+    templates = get_templates(session)
+    key = (project_name, weekday, slots_limit)
+    cached = _day_slots_cache.get(key)
+    if cached is not None:
+        return cached
+
+    for template_key in ((project_name, weekday), (project_name, None), (None, weekday), (None, None)):
+        if template_key in templates:
+            slots = tuple(
+                (slot_time, slots_limit if capacity is None else capacity)
+                for slot_time, capacity in templates[template_key]
+            )
+            break
+    else:
+        slots = tuple((slot_time, slots_limit) for slot_time in DEFAULT_SLOT_TIMES)
+
+    _day_slots_cache[key] = slots
+    return slots
+
+
+def get_slot_capacity(project_name: str, booking_date: date, slot_time: time,
+                      slots_limit: int, session=None) -> int:
+    """Вместимость слота на дату; 0 — такого слота в шаблоне дня нет."""
+    for template_time, capacity in get_day_slots(project_name, booking_date.weekday(), slots_limit, session):
+        if template_time == slot_time:
+            return capacity
+    return 0
+
+
+def parse_weekday(value: str):
+    """'пн'…'вс' или 0…6 → номер дня; '*' → None. ValueError — неверное значение."""
+    value = value.strip().lower()
+    if value == "*":
+        return None
+    if value in WEEKDAY_CODES:
+        return WEEKDAY_CODES.index(value)
+    weekday = int(value)
+    if not 0 <= weekday <= 6:
+        raise ValueError(value)
+    return weekday
+
+
+def parse_slots(tokens) -> list:
+    """
+    Разобрать слоты вида 09:00 или 09:00=2 (вместимость).
+
+    Returns:
+        [(время, вместимость | None), ...] в порядке времени. ValueError — неверный формат.
+    """
+    slots = {}
+    for token in tokens:
+        time_str, _, capacity_str = token.partition("=")
+        slot_time = time.fromisoformat(time_str)
+        capacity = int(capacity_str) if capacity_str else None
+        if capacity is not None and capacity < 1:
+            raise ValueError(token)
+        slots[slot_time] = capacity
+    if not slots:
+        raise ValueError("нет слотов")
+    return sorted(slots.items())
+
+
+def _template_filter(project_name, weekday) -> tuple:
+    """Условия выборки одного шаблона (None — «для всех»)."""
+    return (
+        SlotTemplate.project_name.is_(None) if project_name is None else SlotTemplate.project_name == project_name,
+        SlotTemplate.weekday.is_(None) if weekday is None else SlotTemplate.weekday == weekday,
+    )
+
+
+def set_template(project_name, weekday, slots) -> None:
+    """Заменить шаблон (проект | None, день | None) на новый набор слотов."""
+    with SessionLocal() as session:
+        session.query(SlotTemplate).filter(*_template_filter(project_name, weekday)).delete(synchronize_session=False)
+        session.add_all(
+            SlotTemplate(project_name=project_name, weekday=weekday, time_slot=slot_time, capacity=capacity)
+            for slot_time, capacity in slots
+        )
+        session.commit()
+    invalidate()
+
+
+def delete_template(project_name, weekday) -> int:
+    """Удалить шаблон; возвращает количество удалённых слотов."""
+    with SessionLocal() as session:
+        deleted = session.query(SlotTemplate).filter(*_template_filter(project_name, weekday)).delete(synchronize_session=False)
+        session.commit()
+    invalidate()
+    return deleted
+
+
+def format_templates(project_name=None) -> str:
+    """Текстовое описание шаблонов (все или относящиеся к одному проекту)."""
+    lines = []
+    for (template_project, weekday), slots in sorted(
+        get_templates().items(),
+        key=lambda item: (item[0][0] or "", -1 if item[0][1] is None else item[0][1])
+    ):
+        if project_name is not None and template_project not in (None, project_name):
+            continue
+        project_label = template_project or "все проекты"
+        day_label = "все дни" if weekday is None else WEEKDAY_CODES[weekday]
+        slots_label = ", ".join(
+            slot_time.strftime("%H:%M") + (f"={capacity}" if capacity is not None else "")
+            for slot_time, capacity in slots
+        )
+        lines.append(f"• {project_label} / {day_label}: {slots_label}")
+    return "\n".join(lines)
@@ -47,6 +47,7 @@ class AdminSteps(StatesGroup):
     selecting_project_for_bookings = State()
     selecting_weeks_for_bookings = State()
     selecting_day_for_bookings = State()
+    viewing_bookings = State()
 
     # Редактирование настроек проекта
     edit_project_select = State()
@@ -68,3 +69,4 @@ class EmployeeSteps(StatesGroup):
     selecting_project_for_bookings = State()
     selecting_weeks_for_bookings = State()
     selecting_day_for_bookings = State()
+    viewing_bookings = State()
@@ -0,0 +1,334 @@
+"""
+Трассировка обработки обновлений.
+
+Для каждого обновления фиксируются id, тип, имя обработчика, время
+обработки, число SQL-запросов и исход (handled / unhandled / ошибка).
+Запись уходит в логгер "dks_bot.trace" через QueueHandler — обработчик
+обновления не ждёт вывода в stdout. В лог попадает доля TRACE_SAMPLE_RATE
+обновлений; ошибки и обновления дольше TRACE_SLOW_MS — всегда.
+
+Время обработки всех обновлений (без выборки) копится в гистограмме по
+обработчикам: get_latency_histogram() / format_latency_histogram()
+(команда администратора /latency) и в метриках Prometheus (utils/metrics.py).
+
+SQL-запросы группируются по форме — тексту без литералов и списков IN.
+В запись трассы попадают самые медленные запросы (дольше
+TRACE_SLOW_QUERY_MS) и запросы, повторённые больше
+TRACE_N_PLUS_ONE_THRESHOLD раз (N+1): такая трасса пишется всегда, с
+уровнем WARNING. query_budget() — проверка для тестов: блок падает с
+QueryBudgetExceeded, если превысил число запросов или содержит N+1.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import (
+    TRACE_N_PLUS_ONE_THRESHOLD, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_SLOW_QUERY_MS, TRACE_STRICT,
+)
+from utils import metrics
+
+logger = logging.getLogger("dks_bot.trace")
+
+# Верхние границы корзин гистограммы, мс
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+_current = ContextVar("dks_bot_trace", default=None)
+
+# {обработчик: {"count": n, "sum_ms": s, "buckets": [n по LATENCY_BUCKETS_MS]}}
+_histogram = {}
+
+_listener = {"instance": None}
+
+# Сколько медленных запросов показывать в записи трассы
+SLOWEST_QUERIES_LIMIT = 3
+
+_SHAPE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\bIN\s*\([^()]*\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Обработка превысила бюджет SQL-запросов или выполнила запрос в цикле (N+1)."""
+
+
+class _Trace:
+    """Трасса одного обновления."""
+    __slots__ = ("update_id", "event_type", "handler", "queries", "query_seconds", "statements", "started")
+
+    def __init__(self, update_id, event_type):
+        self.update_id = update_id
+        self.event_type = event_type
+        self.handler = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = {}  # форма запроса → [выполнений, суммарно с, максимум с]
+        self.started = time.perf_counter()
+
+    def repeated(self, threshold: int = TRACE_N_PLUS_ONE_THRESHOLD) -> list:
+        """Запросы, выполненные больше threshold раз: [(форма, выполнений)], частые первыми."""
+        rows = [(shape, stats[0]) for shape, stats in self.statements.items() if stats[0] > threshold]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    def slowest(self, min_ms: float = TRACE_SLOW_QUERY_MS, limit: int = SLOWEST_QUERIES_LIMIT) -> list:
+        """Самые медленные запросы: [(форма, максимум мс)], не быстрее min_ms."""
+        rows = [(shape, stats[2] * 1000) for shape, stats in self.statements.items() if stats[2] * 1000 >= min_ms]
+        return sorted(rows, key=lambda row: row[1], reverse=True)[:limit]
+
+
+def current_trace():
+    """Трасса обрабатываемого обновления; None — вне обработки."""
+    return _current.get()
+
+
+def statement_shape(statement: str) -> str:
+    """Форма запроса: литералы заменены на ?, списки IN свёрнуты, пробелы схлопнуты."""
+    for pattern, replacement in _SHAPE_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        trace.queries += 1
+        conn.info.setdefault("trace_query_started", []).append(time.perf_counter())
+
+
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    started = conn.info.get("trace_query_started")
+    if trace is not None and started:
+        seconds = time.perf_counter() - started.pop()
+        trace.query_seconds += seconds
+        stats = trace.statements.get(statement)
+        if stats is None:
+            stats = trace.statements[statement] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+
+def _group_shapes(trace: _Trace) -> None:
+    """Объединить запросы трассы по форме (после обработки, а не на каждом запросе)."""
+    grouped = {}
+    for statement, (count, total, longest) in trace.statements.items():
+        stats = grouped.setdefault(statement_shape(statement), [0, 0.0, 0.0])
+        stats[0] += count
+        stats[1] += total
+        stats[2] = max(stats[2], longest)
+    trace.statements = grouped
+
+
+def _listen() -> None:
+    """Подключить счётчик SQL-запросов к движкам SQLAlchemy (один раз)."""
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+        event.listen(Engine, "after_cursor_execute", _time_query)
+
+
+def _budget_problems(trace: _Trace, max_queries, max_repeats) -> list:
+    problems = []
+    if max_queries is not None and trace.queries > max_queries:
+        problems.append(f"{trace.queries} SQL-запросов при бюджете {max_queries}")
+    for shape, count in trace.repeated(max_repeats):
+        problems.append(f"N+1: {count} раз {shape}")
+    return problems
+
+
+@contextmanager
+def collect_queries():
+    """SQL-запросы блока вне трассы обновления (тесты, бенчмарки): трасса с числом и временем."""
+    _listen()
+    trace = _Trace(None, "block")
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        _group_shapes(trace)
+
+
+@contextmanager
+def query_budget(max_queries: int = None, max_repeats: int = TRACE_N_PLUS_ONE_THRESHOLD):
+    """
+    Проверка для тестов: SQL-запросы блока не превышают max_queries, и ни
+    один запрос не повторяется больше max_repeats раз. Иначе — QueryBudgetExceeded.
+    """
+    with collect_queries() as trace:
+        yield trace
+    problems = _budget_problems(trace, max_queries, max_repeats)
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+def _observe(handler: str, ms: float) -> None:
+    stats = _histogram.get(handler)
+    if stats is None:
+        stats = _histogram[handler] = {"count": 0, "sum_ms": 0.0, "buckets": [0] * len(LATENCY_BUCKETS_MS)}
+    stats["count"] += 1
+    stats["sum_ms"] += ms
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            stats["buckets"][i] += 1
+            break
+
+
+def get_latency_histogram() -> dict:
+    """Копия гистограммы времени обработки по обработчикам."""
+    return {
+        handler: {"count": s["count"], "sum_ms": s["sum_ms"], "buckets": list(s["buckets"])}
+        for handler, s in _histogram.items()
+    }
+
+
+def reset_latency_histogram() -> None:
+    _histogram.clear()
+
+
+def estimate_percentile(buckets, quantile: float) -> float:
+    """Оценка перцентиля по корзинам: верхняя граница корзины, где он находится."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= rank:
+            return bound
+    return LATENCY_BUCKETS_MS[-1]
+
+
+def format_latency_histogram(limit: int = 15) -> str:
+    """Текст для администратора: самые частые обработчики, среднее, p50 и p95."""
+    histogram = get_latency_histogram()
+    if not histogram:
+        return "Данных о времени обработки пока нет."
+    text = "⏱ Время обработки (мс): вызовов, среднее, p50, p95\n\n"
+    rows = sorted(histogram.items(), key=lambda item: item[1]["count"], reverse=True)
+    for handler, stats in rows[:limit]:
+        p50 = estimate_percentile(stats["buckets"], 0.5)
+        p95 = estimate_percentile(stats["buckets"], 0.95)
+        text += (
+            f"• {handler}: {stats['count']}, {stats['sum_ms'] / stats['count']:.0f}, "
+            f"≤{p50:g}, ≤{p95:g}\n"
+        )
+    return text
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer-middleware обновлений: трасса, гистограмма и выборочный лог."""
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, slow_ms: float = TRACE_SLOW_MS,
+                 strict: bool = TRACE_STRICT):
+        self._sample_rate = sample_rate
+        self._slow_ms = slow_ms
+        self._strict = strict
+
+    async def __call__(self, handler, event, data):
+        trace = _Trace(event.update_id, event.event_type)
+        token = _current.set(trace)
+        outcome = "unhandled"
+        try:
+            result = await handler(event, data)
+            if result is not UNHANDLED:
+                outcome = "handled"
+        except Exception as e:
+            outcome = f"error:{type(e).__name__}"
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(trace, outcome)
+        if self._strict and trace.repeated():
+            raise QueryBudgetExceeded(
+                f"{trace.handler}: " + "; ".join(_budget_problems(trace, None, TRACE_N_PLUS_ONE_THRESHOLD))
+            )
+        return result
+
+    def _finish(self, trace: _Trace, outcome: str) -> None:
+        ms = (time.perf_counter() - trace.started) * 1000
+        handler_name = trace.handler or f"{trace.event_type}:unhandled"
+        _group_shapes(trace)
+        repeated = trace.repeated()
+        _observe(handler_name, ms)
+        metrics.UPDATES.labels(type=trace.event_type).inc()
+        metrics.HANDLER_LATENCY.labels(handler=handler_name).observe(ms / 1000)
+        metrics.DB_QUERIES.labels(handler=handler_name).inc(trace.queries)
+        metrics.DB_QUERY_SECONDS.labels(handler=handler_name).inc(trace.query_seconds)
+        if repeated:
+            metrics.DB_N_PLUS_ONE.labels(handler=handler_name).inc()
+        if (repeated or outcome.startswith("error") or ms >= self._slow_ms
+                or random.random() < self._sample_rate):
+            record = {
+                "update_id": trace.update_id,
+                "type": trace.event_type,
+                "handler": handler_name,
+                "ms": round(ms, 1),
+                "queries": trace.queries,
+                "query_ms": round(trace.query_seconds * 1000, 1),
+                "outcome": outcome,
+            }
+            slowest = trace.slowest()
+            if slowest:
+                record["slowest"] = [{"sql": shape, "ms": round(q_ms, 1)} for shape, q_ms in slowest]
+            if repeated:
+                record["n_plus_one"] = [{"sql": shape, "count": count} for shape, count in repeated]
+            logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(record, ensure_ascii=False))
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner-middleware событий: имя выбранного обработчика для трассы."""
+
+    async def __call__(self, handler, event, data):
+        trace = _current.get()
+        handler_object = data.get("handler")
+        if trace is not None and handler_object is not None:
+            trace.handler = getattr(handler_object.callback, "__name__", repr(handler_object.callback))
+        return await handler(event, data)
+
+
+def setup_logging() -> None:
+    """Вывод трасс через очередь: запись в stdout — в отдельном потоке QueueListener."""
+    if _listener["instance"] is not None:
+        return
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(records, stream)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    _listener["instance"] = listener
+
+
+def stop_logging() -> None:
+    """Дописать накопленные трассы и остановить поток вывода."""
+    listener = _listener["instance"]
+    if listener is not None:
+        listener.stop()
+        _listener["instance"] = None
+
+
+def install(dispatcher, sample_rate: float = TRACE_SAMPLE_RATE, slow_ms: float = TRACE_SLOW_MS,
+            strict: bool = TRACE_STRICT) -> None:
+    """Подключить трассировку к диспетчеру и счётчик SQL-запросов к движкам SQLAlchemy."""
+    dispatcher.update.outer_middleware(TracingMiddleware(sample_rate, slow_ms, strict))
+    for name, observer in dispatcher.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(HandlerNameMiddleware())
+    _listen()
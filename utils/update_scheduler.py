@@ -0,0 +1,142 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+Обновления разных чатов обрабатываются одновременно пулом из UPDATE_WORKERS
+воркеров, а обновления одного чата — строго по очереди: у каждого чата своя
+очередь, и чат с незавершённым обновлением не выдаётся другому воркеру.
+Шаги записи одного пользователя (дата → время → телефон) не переставляются,
+а обработчик, ожидающий долгую операцию, не задерживает другие чаты.
+
+Это верно только для операций, которые отдают управление циклу событий:
+разбор и запись Excel (utils/excel_reader.py, utils/reports.py) выполняются
+в потоке через asyncio.to_thread. Синхронный код в обработчике — запросы к
+базе, запись импортированных договоров, применение изменений — по-прежнему
+занимает цикл событий, и на это время останавливаются все воркеры и приём
+обновлений.
+
+Число принятых, но не обработанных обновлений ограничено
+UPDATE_MAX_IN_FLIGHT: submit() ждёт освобождения места (long polling
+приостанавливает получение), try_submit() сразу возвращает False
+(webhook отвечает Telegram 429).
+"""
+import asyncio
+import logging
+from collections import deque
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+
+from config import UPDATE_MAX_IN_FLIGHT, UPDATE_WORKERS
+
+# Сколько ждать обработки принятых обновлений при остановке
+DRAIN_TIMEOUT_SECONDS = 10
+
+
+def update_key(update):
+    """Ключ порядка обработки: id чата, без чата — id пользователя, иначе None."""
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.chat is not None:
+        return context.chat.id
+    if context.user is not None:
+        return context.user.id
+    return None
+
+
+class UpdateScheduler:
+    """Пул воркеров с очередью на каждый чат и ограничением принятых обновлений."""
+
+    def __init__(self, workers: int = UPDATE_WORKERS, max_in_flight: int = UPDATE_MAX_IN_FLIGHT):
+        self._workers_count = workers
+        self._max_in_flight = max_in_flight
+        self._pending = {}  # ключ → deque заданий; первое выполняется или ждёт воркера
+        self._ready = asyncio.Queue()  # ключи с заданиями, каждый не больше одного раза
+        self._in_flight = 0
+        self._room = asyncio.Event()
+        self._room.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = []
+
+    @property
+    def in_flight(self) -> int:
+        """Принятые и ещё не обработанные обновления."""
+        return self._in_flight
+
+    def start(self) -> None:
+        """Запустить воркеры (повторный вызов ничего не делает)."""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """Дождаться принятых обновлений (не дольше timeout) и остановить воркеры."""
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Остановка с {self._in_flight} необработанными обновлениями")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self) -> None:
+        """Дождаться обработки всех принятых обновлений."""
+        await self._idle.wait()
+
+    def try_submit(self, key, job) -> bool:
+        """Принять задание (async-функцию без аргументов); False — лимит исчерпан."""
+        if self._in_flight >= self._max_in_flight:
+            return False
+        self._enqueue(key, job)
+        return True
+
+    async def submit(self, key, job) -> None:
+        """Принять задание, дождавшись места при исчерпанном лимите."""
+        while self._in_flight >= self._max_in_flight:
+            self._room.clear()
+            await self._room.wait()
+        self._enqueue(key, job)
+
+    def _enqueue(self, key, job) -> None:
+        if key is None:
+            key = object()  # Без чата и пользователя порядок не важен
+        jobs = self._pending.get(key)
+        if jobs is None:
+            self._pending[key] = deque([job])
+            self._ready.put_nowait(key)
+        else:
+            jobs.append(job)
+        self._in_flight += 1
+        self._idle.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            jobs = self._pending[key]
+            try:
+                await jobs[0]()
+            except Exception:
+                logging.exception("Ошибка обработки обновления")
+            finally:
+                jobs.popleft()
+                if jobs:
+                    # Следующее обновление чата — в конец очереди, после других чатов
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                self._in_flight -= 1
+                self._room.set()
+                if self._in_flight == 0:
+                    self._idle.set()
+
+
+class OrderedUpdateMiddleware(BaseMiddleware):
+    """
+    Outer-middleware обновлений для long polling: обработка передаётся
+    UpdateScheduler, а получение следующих обновлений продолжается сразу.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler):
+        self._scheduler = scheduler
+
+    async def __call__(self, handler, event, data):
+        await self._scheduler.submit(update_key(event), lambda: handler(event, data))
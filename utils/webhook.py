@@ -0,0 +1,69 @@
+"""
+Приём обновлений Telegram через webhook (aiohttp) вместо long polling.
+
+Telegram отправляет POST на WEBHOOK_PATH с заголовком
+X-Telegram-Bot-Api-Secret-Token; запрос с неверным секретом отклоняется
+(401). Принятое обновление передаётся UpdateScheduler
+(utils/update_scheduler.py) и сразу подтверждается (200) — медленный
+импорт Excel или отчёт не задерживает ответ Telegram.
+
+Если исчерпан лимит принятых обновлений (UPDATE_MAX_IN_FLIGHT), запрос
+получает 429 с Retry-After: Telegram повторит доставку позже, обновление
+не теряется.
+"""
+import hmac
+import logging
+import secrets
+
+from aiogram.types import Update
+from aiohttp import web
+
+from config import WEBHOOK_PATH
+from utils.update_scheduler import UpdateScheduler, update_key
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Через сколько секунд Telegram стоит повторить доставку при исчерпанном лимите
+RETRY_AFTER_SECONDS = 1
+
+
+def generate_secret() -> str:
+    """Секрет для set_webhook (допустимые символы: A-Z, a-z, 0-9, _ и -)."""
+    return secrets.token_urlsafe(32)
+
+
+def create_app(dispatcher, bot, secret_token: str, scheduler: UpdateScheduler = None,
+               path: str = WEBHOOK_PATH) -> web.Application:
+    """aiohttp-приложение webhook; воркеры планировщика запускаются и останавливаются вместе с ним."""
+    app = web.Application()
+    if scheduler is None:
+        scheduler = UpdateScheduler()
+    app["update_scheduler"] = scheduler
+
+    async def handle_update(request: web.Request) -> web.Response:
+        received = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received.encode(), secret_token.encode()):
+            return web.Response(status=401)
+
+        try:
+            payload = await request.json()
+            update = Update.model_validate(payload, context={"bot": bot})
+        except Exception:
+            logging.warning("Webhook: некорректное обновление")
+            return web.Response(status=400)
+
+        if not scheduler.try_submit(update_key(update), lambda: dispatcher.feed_update(bot, update)):
+            logging.warning(f"Webhook: лимит принятых обновлений исчерпан, обновление {update.update_id} отложено")
+            return web.Response(status=429, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        return web.Response()
+
+    async def start_scheduler(app: web.Application) -> None:
+        scheduler.start()
+
+    async def stop_scheduler(app: web.Application) -> None:
+        await scheduler.close()
+
+    app.router.add_post(path, handle_update)
+    app.on_startup.append(start_scheduler)
+    app.on_cleanup.append(stop_scheduler)
+    return app